@@ -3,6 +3,13 @@ ASGI config for bohemiacore project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Los eventos en vivo (/api/gestion/eventos/stream/, ver gestion/eventos.py)
+solo funcionan servidos por aquí, con un servidor ASGI, por ejemplo:
+
+    uvicorn bohemiacore.asgi:application --workers 4
+
+Cada worker abre su propia conexión LISTEN; bajo WSGI el endpoint responde 503.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -23,6 +23,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Apps de Terceros
     'rest_framework',
@@ -39,6 +40,8 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 
 
 MIDDLEWARE = [
+    # Primero, para que la latencia incluya al resto (se descarta si METRICAS_HABILITADAS es False)
+    'gestion.metricas.MiddlewareMetricas',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -48,6 +51,16 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
+
+# Métricas por endpoint expuestas en /api/metrics (ver gestion/metricas.py)
+METRICAS_HABILITADAS = config('METRICAS_HABILITADAS', default=False, cast=bool)
+
+# Detector de N+1 (solo desarrollo): avisa cuando un pedido repite la misma
+# consulta más de NMASUNO_UMBRAL veces (ver gestion/middleware.py)
+NMASUNO_UMBRAL = config('NMASUNO_UMBRAL', default=10, cast=int)
+if DEBUG:
+    MIDDLEWARE.append('gestion.middleware.DetectorNMasUno')
+
 ROOT_URLCONF = 'bohemiacore.urls'
 
 TEMPLATES = [
@@ -80,6 +93,30 @@ DATABASES = {
     }
 }
 
+# Cache (disponibilidad de agenda, versiones de gestion/cache_proceso.py, etc.)
+# En producción con varios workers usar un backend compartido (con LocMemCache
+# y DEBUG=False el chequeo gestion.W001 avisa), ej:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='bohemia-cache'),
+    }
+}
+
+# Segundos que vive en cache la disponibilidad calculada (se invalida por señales)
+DISPONIBILIDAD_CACHE_TTL = config('DISPONIBILIDAD_CACHE_TTL', default=600, cast=int)
+
+# El tablero del admin usa los contadores por estado solo si se reconciliaron
+# hace menos de estos segundos (ver gestion/contadores.py y reconciliar_contadores)
+CONTADORES_ANTIGUEDAD_MAXIMA = config('CONTADORES_ANTIGUEDAD_MAXIMA', default=6 * 60 * 60, cast=int)
+
+# Eventos en vivo por SSE (ver gestion/eventos.py): segundos entre latidos de
+# una conexión abierta y segundos que se guardan los eventos para reanudar
+EVENTOS_LATIDO = config('EVENTOS_LATIDO', default=15, cast=int)
+EVENTOS_RETENCION = config('EVENTOS_RETENCION', default=24 * 60 * 60, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
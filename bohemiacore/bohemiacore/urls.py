@@ -6,6 +6,7 @@ from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
+from gestion.views import MetricasView
 
 urlpatterns = [
     # Administración
@@ -19,6 +20,9 @@ urlpatterns = [
     path('api/usuarios/', include('usuarios.urls')),
     path('api/gestion/', include('gestion.urls')),
 
+    # Métricas de latencia / SQL por endpoint (Prometheus, solo staff)
+    path('api/metrics', MetricasView.as_view(), name='metricas'),
+
     
 ]
 
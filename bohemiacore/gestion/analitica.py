@@ -0,0 +1,397 @@
+"""
+Resúmenes diarios para los reportes del staff.
+
+ResumenDiario guarda, por (fecha, profesional), los turnos realizados,
+ausentes y cancelados, los ingresos (suma de DetalleTurno.precio_historico de
+los realizados) y los minutos reservados frente a los disponibles según
+HorarioLaboral menos bloqueos. ResumenServicioDiario abre los realizados por
+servicio, de donde salen también los totales por categoría.
+
+Mantenimiento incremental: cuando un turno entra a un estado terminal (o sale
+de uno, o se borra estando en uno) los receivers de gestion/signals.py suman
+la diferencia con un INSERT ... ON CONFLICT DO UPDATE, en la misma transacción
+que el cambio. La expiración por lotes (gestion/expiracion.py) hace lo mismo
+para sus cancelaciones. Los minutos disponibles del día se recalculan en cada
+escritura.
+
+Lo que no pasa por el ORM (SQL manual, cargas masivas) o cambia después del
+cierre (horarios nuevos, detalles editados de un turno ya realizado) se corrige
+con `reconstruir()` (comando `manage.py reconstruir_resumenes`), que rehace
+un rango de fechas desde Turno y DetalleTurno, un mes por transacción.
+
+Un reporte de cualquier rango lee a lo sumo un par de filas por profesional y
+por día: dos consultas, sin recorrer turnos ni detalles.
+"""
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.utils import timezone
+
+from .models import Turno, DetalleTurno, BloqueoAgenda, ResumenDiario, ResumenServicioDiario
+from .disponibilidad import a_minutos, fusionar_intervalos, intervalo_bloqueo, limites_del_dia, rango_ocupacion
+from . import snapshot_agenda
+
+logger = logging.getLogger(__name__)
+
+
+ESTADOS_TERMINALES = (Turno.Estado.REALIZADO, Turno.Estado.AUSENTE, Turno.Estado.CANCELADO)
+
+# El horario de un ausente también quedó reservado (y perdido)
+ESTADOS_RESERVAN = (Turno.Estado.REALIZADO, Turno.Estado.AUSENTE)
+
+AGRUPACIONES = ('dia', 'profesional', 'servicio', 'categoria')
+
+# Días reconstruidos por transacción
+DIAS_POR_TRAMO = 31
+
+SQL_SUMAR_DIA = """
+    INSERT INTO {tabla} AS r (
+        fecha, profesional_id, realizados, ausentes, cancelados, ingresos,
+        minutos_reservados, minutos_disponibles, actualizado
+    )
+    VALUES {valores}
+    ON CONFLICT (fecha, profesional_id) DO UPDATE SET
+        realizados = r.realizados + EXCLUDED.realizados,
+        ausentes = r.ausentes + EXCLUDED.ausentes,
+        cancelados = r.cancelados + EXCLUDED.cancelados,
+        ingresos = r.ingresos + EXCLUDED.ingresos,
+        minutos_reservados = r.minutos_reservados + EXCLUDED.minutos_reservados,
+        minutos_disponibles = EXCLUDED.minutos_disponibles,
+        actualizado = EXCLUDED.actualizado
+"""
+
+SQL_SUMAR_SERVICIO = """
+    INSERT INTO {tabla} AS r (fecha, profesional_id, servicio_id, cantidad, ingresos, minutos, actualizado)
+    VALUES {valores}
+    ON CONFLICT (fecha, profesional_id, servicio_id) DO UPDATE SET
+        cantidad = r.cantidad + EXCLUDED.cantidad,
+        ingresos = r.ingresos + EXCLUDED.ingresos,
+        minutos = r.minutos + EXCLUDED.minutos,
+        actualizado = EXCLUDED.actualizado
+"""
+
+
+def _orden(clave):
+    # El profesional puede ser None: se ordena como 0
+    return tuple(0 if parte is None else parte for parte in clave)
+
+
+# ============================================================
+# DIFERENCIAS
+# ============================================================
+
+class Aportes:
+    """
+    Diferencias acumuladas de uno o más turnos:
+      dias       {(fecha, profesional_id): [realizados, ausentes, cancelados, ingresos, minutos_reservados]}
+      servicios  {(fecha, profesional_id, servicio_id): [cantidad, ingresos, minutos]}
+    """
+
+    def __init__(self):
+        self.dias = {}
+        self.servicios = {}
+
+    def sumar_turno(self, fecha, profesional_id, estado, duracion, detalles, signo=1):
+        """
+        Suma (signo=1) o resta (signo=-1) un turno en `estado`. `detalles` son
+        (servicio_id, precio_historico, duracion_minutos); solo cuentan si fue realizado.
+        """
+        if estado not in ESTADOS_TERMINALES:
+            return
+        dia = self.dias.setdefault((fecha, profesional_id), [0, 0, 0, Decimal('0'), 0])
+        if estado == Turno.Estado.REALIZADO:
+            dia[0] += signo
+            for servicio_id, precio, minutos in detalles:
+                dia[3] += signo * precio
+                fila = self.servicios.setdefault((fecha, profesional_id, servicio_id), [0, Decimal('0'), 0])
+                fila[0] += signo
+                fila[1] += signo * precio
+                fila[2] += signo * minutos
+        elif estado == Turno.Estado.AUSENTE:
+            dia[1] += signo
+        else:
+            dia[2] += signo
+        if estado in ESTADOS_RESERVAN:
+            dia[4] += signo * (duracion or 0)
+
+
+def registrar_cambio(turno, anterior, nuevo):
+    """
+    Cambio de un turno: (fecha, profesional_id, estado) previo y nuevo (None si
+    no existe). No consulta nada si ninguno de los dos estados es terminal.
+    """
+    if anterior == nuevo:
+        return
+    terminales = [par for par in (anterior, nuevo) if par is not None and par[2] in ESTADOS_TERMINALES]
+    if not terminales:
+        return
+    detalles = ()
+    if any(par[2] == Turno.Estado.REALIZADO for par in terminales):
+        detalles = list(
+            DetalleTurno.objects.filter(turno_id=turno.pk).values_list('servicio_id', 'precio_historico', 'duracion_minutos')
+        )
+    aportes = Aportes()
+    if anterior is not None:
+        aportes.sumar_turno(*anterior, turno.duracion_total, detalles, signo=-1)
+    if nuevo is not None:
+        aportes.sumar_turno(*nuevo, turno.duracion_total, detalles)
+    aplicar(aportes)
+
+
+def aplicar(aportes):
+    """Escribe las diferencias (dos sentencias a lo sumo) dentro de la transacción en curso."""
+    dias = sorted(
+        ((clave, valores) for clave, valores in aportes.dias.items() if any(valores)),
+        key=lambda item: _orden(item[0]),
+    )
+    servicios = sorted(
+        ((clave, valores) for clave, valores in aportes.servicios.items() if any(valores)),
+        key=lambda item: _orden(item[0]),
+    )
+    if not dias and not servicios:
+        return
+
+    ahora = timezone.now()
+    disponibles = minutos_disponibles([clave for clave, _ in dias])
+    with connection.cursor() as cursor:
+        # Mismo orden de tablas que reconstruir(), que las bloquea juntas
+        if dias:
+            parametros = []
+            for (fecha, profesional_id), valores in dias:
+                parametros += [fecha, profesional_id, *valores, disponibles.get((fecha, profesional_id), 0), ahora]
+            cursor.execute(
+                SQL_SUMAR_DIA.format(
+                    tabla=ResumenDiario._meta.db_table,
+                    valores=', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(dias)),
+                ),
+                parametros,
+            )
+        if servicios:
+            parametros = []
+            for clave, valores in servicios:
+                parametros += [*clave, *valores, ahora]
+            cursor.execute(
+                SQL_SUMAR_SERVICIO.format(
+                    tabla=ResumenServicioDiario._meta.db_table,
+                    valores=', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(servicios)),
+                ),
+                parametros,
+            )
+
+
+# ============================================================
+# MINUTOS DISPONIBLES
+# ============================================================
+
+def minutos_disponibles(claves):
+    """
+    {(fecha, profesional_id): minutos} del horario laboral vigente menos los
+    bloqueos del profesional y los globales. Una consulta (bloqueos) para todas
+    las claves; los horarios salen del snapshot de agenda.
+    """
+    claves = [(fecha, profesional_id) for fecha, profesional_id in claves if profesional_id is not None]
+    if not claves:
+        return {}
+    snapshot = snapshot_agenda.obtener()
+    inicio, _ = limites_del_dia(min(fecha for fecha, _ in claves))
+    _, fin = limites_del_dia(max(fecha for fecha, _ in claves))
+    bloqueos_por_personal = {}
+    for bloqueo in BloqueoAgenda.objects.filter(
+        Q(personal_id__in={profesional_id for _, profesional_id in claves}) | Q(personal__isnull=True),
+        ocupacion__overlap=rango_ocupacion(inicio, fin),
+    ):
+        bloqueos_por_personal.setdefault(bloqueo.personal_id, []).append(bloqueo)
+    globales = bloqueos_por_personal.get(None, [])
+
+    resultado = {}
+    for fecha, profesional_id in claves:
+        horario = fusionar_intervalos(
+            (a_minutos(regla.hora_inicio), a_minutos(regla.hora_fin))
+            for regla in snapshot.reglas_vigentes(fecha) if regla.personal_id == profesional_id
+        )
+        bloqueado = fusionar_intervalos(
+            intervalo for intervalo in (
+                intervalo_bloqueo(bloqueo, fecha)
+                for bloqueo in bloqueos_por_personal.get(profesional_id, []) + globales
+            ) if intervalo
+        )
+        minutos = sum(fin - inicio for inicio, fin in horario)
+        for inicio, fin in horario:
+            for bloqueo_inicio, bloqueo_fin in bloqueado:
+                minutos -= max(0, min(fin, bloqueo_fin) - max(inicio, bloqueo_inicio))
+        resultado[(fecha, profesional_id)] = minutos
+    return resultado
+
+
+# ============================================================
+# RECONSTRUCCIÓN
+# ============================================================
+
+def reconstruir(desde=None, hasta=None, informar=None):
+    """
+    Rehace los resúmenes entre `desde` y `hasta` (por defecto, desde el primer
+    turno terminado hasta hoy o el último turno terminado). Devuelve cuántas
+    filas diarias escribió.
+    """
+    if desde is None or hasta is None:
+        extremos = Turno.objects.filter(estado__in=ESTADOS_TERMINALES).aggregate(primero=Min('fecha'), ultimo=Max('fecha'))
+        hoy = timezone.localdate()
+        desde = desde or extremos['primero'] or hoy
+        hasta = hasta or max(extremos['ultimo'] or hoy, hoy)
+
+    total = 0
+    tramo = desde
+    while tramo <= hasta:
+        fin_tramo = min(tramo + timedelta(days=DIAS_POR_TRAMO - 1), hasta)
+        total += _reconstruir_tramo(tramo, fin_tramo)
+        if informar:
+            informar(f"{tramo} a {fin_tramo}: {total} filas")
+        tramo = fin_tramo + timedelta(days=1)
+    logger.info(f"[ANALITICA] Resúmenes reconstruidos del {desde} al {hasta} ({total} filas)")
+    return total
+
+
+def _reconstruir_tramo(desde, hasta):
+    """
+    Un tramo en una transacción. LOCK TABLE espera a las transacciones que ya
+    sumaron diferencias (sus turnos se leen confirmados) y frena a las nuevas
+    hasta el COMMIT: ningún cambio se cuenta dos veces ni se pierde.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'LOCK TABLE {ResumenDiario._meta.db_table}, {ResumenServicioDiario._meta.db_table} IN EXCLUSIVE MODE'
+            )
+        ResumenDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+        ResumenServicioDiario.objects.filter(fecha__range=(desde, hasta)).delete()
+
+        dias = {}
+        for fecha, profesional_id, realizados, ausentes, cancelados, minutos in Turno.objects.filter(
+            fecha__range=(desde, hasta), estado__in=ESTADOS_TERMINALES
+        ).values_list('fecha', 'profesional').annotate(
+            realizados=Count('id', filter=Q(estado=Turno.Estado.REALIZADO)),
+            ausentes=Count('id', filter=Q(estado=Turno.Estado.AUSENTE)),
+            cancelados=Count('id', filter=Q(estado=Turno.Estado.CANCELADO)),
+            minutos=Sum('duracion_total', filter=Q(estado__in=ESTADOS_RESERVAN)),
+        ).order_by():
+            dias[(fecha, profesional_id)] = [realizados, ausentes, cancelados, Decimal('0'), minutos or 0]
+
+        servicios = {}
+        for fecha, profesional_id, servicio_id, cantidad, ingresos, minutos in DetalleTurno.objects.filter(
+            turno__fecha__range=(desde, hasta), turno__estado=Turno.Estado.REALIZADO
+        ).values_list('turno__fecha', 'turno__profesional', 'servicio').annotate(
+            cantidad=Count('id'), ingresos=Sum('precio_historico'), minutos=Sum('duracion_minutos'),
+        ).order_by():
+            servicios[(fecha, profesional_id, servicio_id)] = [cantidad, ingresos, minutos]
+            dias.setdefault((fecha, profesional_id), [0, 0, 0, Decimal('0'), 0])[3] += ingresos
+
+        # Días con horario pero sin turnos terminados: ocupación 0, no "sin datos"
+        snapshot = snapshot_agenda.obtener()
+        fecha = desde
+        while fecha <= hasta:
+            for regla in snapshot.reglas_vigentes(fecha):
+                if regla.personal_id is not None:
+                    dias.setdefault((fecha, regla.personal_id), [0, 0, 0, Decimal('0'), 0])
+            fecha += timedelta(days=1)
+
+        disponibles = minutos_disponibles(dias.keys())
+        ahora = timezone.now()
+        ResumenDiario.objects.bulk_create([
+            ResumenDiario(
+                fecha=fecha, profesional_id=profesional_id,
+                realizados=realizados, ausentes=ausentes, cancelados=cancelados, ingresos=ingresos,
+                minutos_reservados=minutos, minutos_disponibles=disponibles.get((fecha, profesional_id), 0),
+                actualizado=ahora,
+            )
+            for (fecha, profesional_id), (realizados, ausentes, cancelados, ingresos, minutos) in dias.items()
+        ], batch_size=2000)
+        ResumenServicioDiario.objects.bulk_create([
+            ResumenServicioDiario(
+                fecha=fecha, profesional_id=profesional_id, servicio_id=servicio_id,
+                cantidad=cantidad, ingresos=ingresos, minutos=minutos, actualizado=ahora,
+            )
+            for (fecha, profesional_id, servicio_id), (cantidad, ingresos, minutos) in servicios.items()
+        ], batch_size=2000)
+    return len(dias)
+
+
+# ============================================================
+# LECTURA (REPORTES)
+# ============================================================
+
+SUMAS_DIA = {
+    'realizados': Sum('realizados'),
+    'ausentes': Sum('ausentes'),
+    'cancelados': Sum('cancelados'),
+    'ingresos': Sum('ingresos'),
+    'minutos_reservados': Sum('minutos_reservados'),
+    'minutos_disponibles': Sum('minutos_disponibles'),
+}
+
+SUMAS_SERVICIO = {
+    'cantidad': Sum('cantidad'),
+    'ingresos': Sum('ingresos'),
+    'minutos': Sum('minutos'),
+}
+
+
+def _dinero(valor):
+    return str(Decimal(valor or 0).quantize(Decimal('0.01')))
+
+
+def _indicadores(fila):
+    """Completa ocupación y tasa de ausentismo (None si no hay base para calcularlas)."""
+    for campo in ('realizados', 'ausentes', 'cancelados', 'minutos_reservados', 'minutos_disponibles'):
+        fila[campo] = fila[campo] or 0
+    fila['ingresos'] = _dinero(fila['ingresos'])
+    disponibles = fila['minutos_disponibles']
+    fila['ocupacion'] = round(fila['minutos_reservados'] / disponibles, 4) if disponibles else None
+    atendibles = fila['realizados'] + fila['ausentes']
+    fila['tasa_ausentismo'] = round(fila['ausentes'] / atendibles, 4) if atendibles else None
+    return fila
+
+
+def reporte(desde, hasta, agrupar='dia', profesional_id=None):
+    """
+    Totales del rango y filas agrupadas por día, profesional, servicio o
+    categoría. Dos consultas sobre los resúmenes, sin importar el rango.
+    """
+    filtro = Q(fecha__range=(desde, hasta))
+    if profesional_id is not None:
+        filtro &= Q(profesional_id=profesional_id)
+
+    if agrupar == 'dia':
+        filas = [
+            _indicadores(fila) for fila in
+            ResumenDiario.objects.filter(filtro).values('fecha').annotate(**SUMAS_DIA).order_by('fecha')
+        ]
+    elif agrupar == 'profesional':
+        filas = []
+        for fila in ResumenDiario.objects.filter(filtro).values(
+            'profesional_id', 'profesional__nombre', 'profesional__apellido'
+        ).annotate(**SUMAS_DIA).order_by('profesional__nombre', 'profesional__apellido'):
+            nombre, apellido = fila.pop('profesional__nombre'), fila.pop('profesional__apellido')
+            fila['profesional'] = f"{nombre} {apellido}" if fila['profesional_id'] else 'Sin profesional'
+            filas.append(_indicadores(fila))
+    else:
+        campos = ('servicio_id', 'servicio__nombre') if agrupar == 'servicio' else ('servicio__categoria_id', 'servicio__categoria__nombre')
+        filas = []
+        for fila in ResumenServicioDiario.objects.filter(filtro).values(*campos).annotate(**SUMAS_SERVICIO).order_by('-ingresos'):
+            filas.append({
+                'id': fila[campos[0]],
+                'nombre': fila[campos[1]] or 'Sin categoría',
+                'cantidad': fila['cantidad'],
+                'ingresos': _dinero(fila['ingresos']),
+                'minutos': fila['minutos'],
+            })
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'agrupar': agrupar,
+        'totales': _indicadores(ResumenDiario.objects.filter(filtro).aggregate(**SUMAS_DIA)),
+        'filas': filas,
+    }
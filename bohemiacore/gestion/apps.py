@@ -7,3 +7,4 @@ class GestionConfig(AppConfig):
 
     def ready(self):
         import gestion.signals
+        import gestion.checks
@@ -0,0 +1,359 @@
+"""
+Procesos automatizados que corren en segundo plano (ver gestion/tareas.py).
+
+Los receivers de gestion/signals.py y algunas vistas solo encolan estas
+tareas al confirmar la transacción; el trabajo pesado (motor de diagnóstico,
+rutinas, agenda de cuidados y notificaciones) queda fuera de la petición HTTP.
+Cada tarea recibe IDs (no instancias) y vuelve a leer los datos al ejecutarse.
+"""
+import logging
+from datetime import timedelta
+
+from usuarios.models import Usuario
+from .models import Turno, AgendaCuidados, RutinaCliente, Notificacion, DiagnosticoCapilar
+from .tareas import tarea
+from . import eventos
+
+logger = logging.getLogger(__name__)
+
+
+#----------------------------------------------------
+# 0. DESPACHO POR TRANSICIÓN DE ESTADO
+#----------------------------------------------------
+# El receiver de Turno (signals.despachar_transicion_turno) encola UNA tarea
+# por cambio real de estado. Esa tarea arma un único ContextoTurno con todo lo
+# que usan los handlers y los ejecuta en orden: ningún handler vuelve a leer
+# detalles, reglas, rutinas o el usuario del cliente por su cuenta.
+
+HANDLERS_TRANSICION = []
+
+
+def al_transicionar(*estados):
+    """
+    Registra un handler de transición. Sin estados, corre en toda transición
+    (incluida la creación); con estados, solo cuando el turno llega a uno de ellos.
+    """
+    def decorador(funcion):
+        HANDLERS_TRANSICION.append((frozenset(estados), funcion))
+        return funcion
+    return decorador
+
+
+class ContextoTurno:
+    """Turno con sus relaciones precargadas, compartido por todos los handlers."""
+
+    def __init__(self, turno, estado_anterior, estado_nuevo, creado):
+        self.turno = turno
+        self.estado_anterior = estado_anterior
+        self.estado_nuevo = estado_nuevo
+        self.creado = creado
+        self.cliente = turno.cliente
+        self.usuario_cliente = turno.cliente.usuario
+        self.detalles = list(turno.detalles.all())
+        self.servicios = [detalle.servicio for detalle in self.detalles]
+        self.servicios_str = ', '.join(s.nombre for s in self.servicios) if self.servicios else 'Servicios'
+
+    @classmethod
+    def cargar(cls, turno_id, estado_anterior, estado_nuevo, creado):
+        """Cantidad fija de consultas sin importar cuántos servicios/reglas tenga el turno."""
+        turno = (
+            Turno.objects.select_related('cliente__usuario')
+            .prefetch_related(
+                'detalles__servicio__reglas_post_servicio',
+                'detalles__servicio__rutina_recomendada',
+                'detalles__servicio__impacto_porosidad',
+                'detalles__servicio__impacto_estado',
+            )
+            .filter(pk=turno_id)
+            .first()
+        )
+        return cls(turno, estado_anterior, estado_nuevo, creado) if turno else None
+
+    def reglas(self, tipo=None):
+        """[(servicio, regla), ...] de todos los servicios del turno."""
+        return [
+            (servicio, regla)
+            for servicio in self.servicios
+            for regla in servicio.reglas_post_servicio.all()
+            if tipo is None or regla.tipo == tipo
+        ]
+
+
+@tarea('procesar_transicion_turno')
+def procesar_transicion_turno(turno_id, estado_anterior, estado_nuevo, creado):
+    """Ejecuta los handlers que corresponden a la transición estado_anterior -> estado_nuevo."""
+    contexto = ContextoTurno.cargar(turno_id, estado_anterior, estado_nuevo, creado)
+    if contexto is None:
+        return
+    for estados, handler in HANDLERS_TRANSICION:
+        if not estados or estado_nuevo in estados:
+            handler(contexto)
+
+
+#----------------------------------------------------
+# 1. SISTEMA DE AGENDA DE CUIDADOS POST-SERVICIO
+#----------------------------------------------------
+
+@al_transicionar('realizado')
+def generar_cuidados_post_servicio(contexto):
+    """
+    PROCESO AUTOMATIZADO:
+    Disparador: El estado del turno cambia a 'REALIZADO'.
+    Acción: El sistema genera la agenda de cuidados post-servicio para el cliente.
+    """
+    logger.info(f"[AUTOMATIZACION] Turno {contexto.turno.id} realizado para {contexto.cliente}: generando agenda de cuidados")
+
+    # 1. Reglas configuradas para los servicios realizados (ej: Alisado -> No lavar)
+    reglas = contexto.reglas()
+    if not reglas:
+        logger.debug(f"[AUTOMATIZACION] Turno {contexto.turno.id}: sus servicios no tienen reglas automáticas")
+        return
+
+    # 2. Preparamos las tareas para la agenda
+    nuevos_items = []
+    fecha_base = contexto.turno.fecha # Fecha en que se hizo el servicio
+
+    for servicio, regla in reglas:
+        # CASO A: RESTRICCIONES (Lo que NO debe hacer)
+        if regla.tipo == 'RESTRICCION':
+            # Generamos una entrada por cada día que dure la restricción
+            duracion = regla.dias_duracion if regla.dias_duracion > 0 else 1
+            for i in range(duracion):
+                fecha_bloqueo = fecha_base + timedelta(days=i)
+                nuevos_items.append(AgendaCuidados(
+                    cliente=contexto.cliente,
+                    fecha=fecha_bloqueo,
+                    titulo="RESTRICCIÓN",
+                    descripcion=f"{regla.descripcion} (Día {i+1}/{duracion}) - Servicio: {servicio.nombre}"
+                ))
+
+        # CASO B: HÁBITOS (Lo que DEBE hacer)
+        elif regla.tipo == 'HABITO':
+            # Por defecto, sugerimos empezar el hábito al día siguiente
+            fecha_inicio = fecha_base + timedelta(days=1)
+
+            # Si es un hábito recurrente (ej: cada 7 días durante un mes)
+            if regla.frecuencia_dias and regla.frecuencia_dias > 0:
+                for i in range(0, 30, regla.frecuencia_dias):
+                    nuevos_items.append(AgendaCuidados(
+                        cliente=contexto.cliente,
+                        fecha=fecha_inicio + timedelta(days=i),
+                        titulo="Hábito Sugerido",
+                        descripcion=f"{regla.descripcion} - Servicio: {servicio.nombre}"
+                    ))
+            else:
+                # Es un hábito de una sola vez
+                nuevos_items.append(AgendaCuidados(
+                    cliente=contexto.cliente,
+                    fecha=fecha_inicio,
+                    titulo="🧴 Hábito Sugerido",
+                    descripcion=f"{regla.descripcion} - Servicio: {servicio.nombre}"
+                ))
+
+    # 3. Guardamos todo en la base de datos de una sola vez
+    if nuevos_items:
+        AgendaCuidados.objects.bulk_create(nuevos_items)
+        logger.info(f"[AUTOMATIZACION] {len(nuevos_items)} tareas agregadas a la agenda de {contexto.cliente}")
+
+
+#----------------------------------------------------
+# 2. SISTEMA DE NOTIFICACIONES IN-APP
+#----------------------------------------------------
+
+@al_transicionar()
+def crear_notificacion_cambio_estado(contexto):
+    """
+    Genera notificaciones In-App respetando el nuevo modelo del diagrama.
+    """
+    turno = contexto.turno
+    estado = contexto.estado_nuevo
+
+    # 1. NOTIFICACIÓN AL PROFESIONAL (Nuevo Turno)
+    if contexto.creado and estado == 'solicitado':
+        notificaciones = Notificacion.objects.bulk_create([
+            Notificacion(
+                usuario=admin,
+                titulo="Nuevo Turno Solicitado",
+                mensaje=f"{contexto.usuario_cliente.first_name} solicitó {contexto.servicios_str} el {turno.fecha}.",
+                tipo='alerta',
+                canal='app',
+                estado='pendiente',
+                origen_entidad='Turno',
+                origen_id=turno.id
+            )
+            for admin in Usuario.objects.filter(is_staff=True)
+        ])
+        # bulk_create no dispara post_save: los eventos en vivo se publican acá
+        eventos.publicar_notificaciones(notificaciones)
+
+    # 2. NOTIFICACIÓN AL CLIENTE (Cambio de Estado)
+    if not contexto.creado:
+        titulo = ""
+        mensaje = ""
+        tipo_notif = 'informativa'
+
+        if estado == 'esperando_sena':
+            titulo = "Turno Aceptado"
+            mensaje = f"Tu turno para {contexto.servicios_str} fue aceptado. ¡Sube tu seña!"
+            tipo_notif = 'alerta' # Es importante, requiere acción
+
+        elif estado == 'confirmado':
+            titulo = "Turno Confirmado"
+            mensaje = "Seña recibida. Tu turno está confirmado. Te esperamos."
+
+        elif estado == 'cancelado':
+            titulo = "Turno Cancelado"
+            mensaje = f"El turno del {turno.fecha} ha sido cancelado."
+            tipo_notif = 'alerta'
+
+        elif estado == 'realizado':
+            titulo = "¡Servicio Finalizado!"
+            mensaje = "Ya tienes disponible tu nueva Rutina de Cuidados en tu perfil."
+
+        if titulo:
+            Notificacion.objects.create(
+                usuario=contexto.usuario_cliente,
+                titulo=titulo,
+                mensaje=mensaje,
+                tipo=tipo_notif,
+                canal='app',
+                estado='pendiente',
+                origen_entidad='Turno',
+                origen_id=turno.id
+            )
+
+
+@al_transicionar('realizado')
+def automatizacion_post_servicio(contexto):
+    """
+    Gestiona el Flujo Post-Servicio:
+    1. Actualiza el Diagnóstico (Perfil) basado en el Impacto.
+    2. Asigna la Rutina Recomendada en la Agenda.
+    Las restricciones de cuidado las agenda generar_cuidados_post_servicio.
+    """
+    logger.info(f"[AUTOMATIZACION] Turno {contexto.turno.id} realizado: actualizando perfil y rutinas")
+
+    cliente = contexto.cliente
+
+    # --- PASO 1: ACTUALIZACIÓN DE DIAGNÓSTICO (Impacto) ---
+    cambio_perfil = False
+
+    for servicio in contexto.servicios:
+        if servicio.impacto_porosidad:
+            logger.debug(f"[AUTOMATIZACION] Diagnóstico: porosidad cambia a {servicio.impacto_porosidad}")
+            cliente.porosidad_cabello = servicio.impacto_porosidad
+            cambio_perfil = True
+
+        if servicio.impacto_estado:
+            logger.debug(f"[AUTOMATIZACION] Diagnóstico: estado cambia a {servicio.impacto_estado}")
+            cliente.estado_general = servicio.impacto_estado
+            cambio_perfil = True
+
+    if cambio_perfil:
+        cliente.save()
+
+    # --- PASO 2: ASIGNACIÓN DE RUTINA ---
+    # Si el servicio tiene Rutina Recomendada (Prioridad Alta):
+    # RutinaCliente = copia personalizada para el cliente
+    for servicio in contexto.servicios:
+        rutina = servicio.rutina_recomendada
+        if not rutina:
+            continue
+        rutina_cliente, created = RutinaCliente.objects.get_or_create(
+            cliente=cliente,
+            rutina_original=rutina,
+            defaults={
+                'nombre': rutina.nombre,
+                'objetivo': rutina.objetivo,
+                'descripcion': rutina.descripcion,
+                'version_asignada': 1,  # Versión inicial
+                'estado': 'activa'
+            }
+        )
+        logger.debug(
+            f"[AUTOMATIZACION] Rutina {rutina.nombre} {'asignada' if created else 'ya asignada'} "
+            f"a {cliente} (RutinaCliente {rutina_cliente.id})"
+        )
+
+
+#----------------------------------------------------
+# 3. DIAGNÓSTICO Y CUIDADOS AL FINALIZAR / REGISTRARSE
+#----------------------------------------------------
+
+@tarea('ejecutar_motor_diagnostico')
+def ejecutar_motor_diagnostico(diagnostico_id):
+    """Corre el motor de diagnóstico sobre un DiagnosticoCapilar ya creado."""
+    from .views import DiagnosticoCapilarViewSet
+
+    diagnostico = DiagnosticoCapilar.objects.filter(pk=diagnostico_id).first()
+    if diagnostico is None:
+        return
+    DiagnosticoCapilarViewSet()._ejecutar_motor_diagnostico(diagnostico)
+
+
+@tarea('post_finalizar_turno')
+def post_finalizar_turno(turno_id):
+    """
+    Después de finalizar un turno:
+    1. Crea un diagnóstico post-servicio (si el cliente tiene datos capilares).
+    2. Aplica las Reglas de Cuidado de cada servicio realizado.
+    """
+    turno = Turno.objects.select_related('cliente__usuario').filter(pk=turno_id).first()
+    if turno is None:
+        return
+
+    # 1. CREAR DIAGNÓSTICO POST-SERVICIO AUTOMÁTICAMENTE
+    # Se crea un nuevo diagnóstico después de cada servicio para reevaluar el estado del cabello
+    cliente = turno.cliente
+    
+    # Solo crear diagnóstico si el cliente tiene datos capilares registrados
+    if cliente.tipo_cabello or cliente.grosor_cabello or cliente.porosidad_cabello or cliente.cuero_cabelludo or cliente.estado_general:
+        diag = DiagnosticoCapilar.objects.create(
+            cliente=cliente,
+            tipo_cabello=cliente.tipo_cabello,
+            grosor_cabello=cliente.grosor_cabello,
+            porosidad_cabello=cliente.porosidad_cabello,
+            cuero_cabelludo=cliente.cuero_cabelludo,
+            estado_general=cliente.estado_general
+        )
+        
+        # Ejecutar el motor diagnóstico automáticamente
+        ejecutar_motor_diagnostico(diag.id)
+
+    # 2. PROCESO AUTOMATIZADO: Aplicar Reglas de Cuidado
+    # Buscamos todos los servicios que se hicieron en este turno
+    detalles = turno.detalles.select_related('servicio').prefetch_related('servicio__reglas_post_servicio__rutina')
+    servicios_realizados = [d.servicio for d in detalles]
+
+    for servicio in servicios_realizados:
+        # Buscamos las reglas configuradas para este servicio
+        reglas = servicio.reglas_post_servicio.all()
+        
+        for regla in reglas:
+            # A. Notificar a la clienta (Instrucciones de cuidado)
+            Notificacion.objects.create(
+                usuario=turno.cliente.usuario,
+                tipo='recordatorio',
+                titulo=f"Cuidados post {servicio.nombre}",
+                mensaje=f"{regla.descripcion}. (Válido por {regla.dias_duracion} días)",
+                origen_entidad='Turno',
+                origen_id=turno.id
+            )
+
+            # B. Si la regla tiene una RUTINA asociada, se la asignamos automáticamente
+            if regla.rutina:
+                # Verificamos si ya la tiene activa para no duplicar
+                if not RutinaCliente.objects.filter(
+                    cliente=turno.cliente, 
+                    rutina_original=regla.rutina, 
+                    estado='activa'
+                ).exists():
+                    RutinaCliente.objects.create(
+                        cliente=turno.cliente,
+                        rutina_original=regla.rutina,
+                        nombre=regla.rutina.nombre,
+                        objetivo=regla.rutina.objetivo,
+                        archivo=regla.rutina.archivo,
+                        version_asignada=regla.rutina.version,
+                        estado='activa'
+                    )
@@ -0,0 +1,258 @@
+"""
+Cache de disponibilidad.
+
+Guarda en el cache de Django (settings.CACHES) la ocupación calculada por el
+motor de disponibilidad para cada (profesional, fecha), más algunas respuestas
+derivadas (bloques del DisponibilidadService y datos del calendario mensual).
+
+INVALIDACIÓN POR VERSIONES:
+Cada clave cacheada incluye los números de versión de los "ámbitos" de los que
+depende (ej. 'agenda:3:2026-01-15', 'horarios', 'global'). Los receivers de
+gestion/signals.py incrementan la versión del ámbito afectado y las claves
+viejas quedan huérfanas (expiran por TTL). Así:
+  - solo se invalida lo que realmente cambió, y
+  - un recálculo que empezó ANTES del cambio escribe en la clave vieja y
+    nunca pisa el valor nuevo.
+
+SINGLE-FLIGHT:
+Si muchos clientes piden la misma clave justo después de una invalidación,
+solo uno recalcula (lock por hilo + lock distribuido con cache.add); el resto
+espera el resultado en lugar de repetir el mismo cálculo N veces.
+"""
+import hashlib
+import threading
+import time
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .disponibilidad import AgendaDia
+
+logger = logging.getLogger(__name__)
+
+
+PREFIJO = 'disponibilidad'
+
+# Tiempo de vida de los valores cacheados (las versiones no expiran)
+TTL_SEGUNDOS = getattr(settings, 'DISPONIBILIDAD_CACHE_TTL', 600)
+
+# Máximo que un pedido espera a que otro termine el mismo recálculo
+ESPERA_MAXIMA_SEGUNDOS = 5
+
+# Locks por hilo repartidos por hash de clave (cantidad fija, sin fugas de memoria)
+_LOCKS_LOCALES = [threading.Lock() for _ in range(64)]
+
+
+# ============================================================
+# VERSIONES POR ÁMBITO
+# ============================================================
+
+def _clave_version(ambito):
+    return f'{PREFIJO}:ver:{ambito}'
+
+
+def versiones(ambitos):
+    """Devuelve la versión actual de cada ámbito (una sola lectura al cache)."""
+    claves = [_clave_version(ambito) for ambito in ambitos]
+    encontradas = cache.get_many(claves)
+    resultado = []
+    for clave in claves:
+        if clave not in encontradas:
+            # Versión inicial única: si la clave fue desalojada nunca se
+            # reutiliza un número anterior (evita revivir valores viejos)
+            cache.add(clave, time.time_ns(), None)
+            encontradas[clave] = cache.get(clave)
+        resultado.append(encontradas[clave])
+    return resultado
+
+
+def invalidar(*ambitos):
+    """Incrementa la versión de los ámbitos indicados."""
+    for ambito in ambitos:
+        clave = _clave_version(ambito)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, time.time_ns(), None)
+
+
+def invalidar_al_confirmar(*ambitos):
+    """
+    Invalida cuando la transacción confirma (enseguida si no hay una abierta);
+    un ROLLBACK no toca las versiones. Un recálculo concurrente que leyó datos
+    previos al COMMIT quedó guardado con la versión anterior y no se vuelve a usar.
+    """
+    transaction.on_commit(lambda: invalidar(*ambitos))
+
+
+# ============================================================
+# ÁMBITOS
+# ============================================================
+
+def ambito_agenda(profesional_id, fecha):
+    return f'agenda:{profesional_id}:{fecha.isoformat()}'
+
+
+def ambito_dia(fecha):
+    return f'dia:{fecha.isoformat()}'
+
+
+def ambito_bloqueos_globales(fecha):
+    return f'bloqueos:{fecha.isoformat()}'
+
+
+def ambito_mes(anio, mes):
+    return f'mes:{anio}-{mes:02d}'
+
+
+def fechas_de_rango(inicio, fin):
+    """Fechas locales cubiertas por un rango de datetimes (inclusive)."""
+    if timezone.is_aware(inicio):
+        inicio = timezone.localtime(inicio)
+    if timezone.is_aware(fin):
+        fin = timezone.localtime(fin)
+    fecha = inicio.date()
+    while fecha <= fin.date():
+        yield fecha
+        fecha += timedelta(days=1)
+
+
+# ============================================================
+# SINGLE-FLIGHT
+# ============================================================
+
+def obtener_o_calcular(clave, calcular, ttl=None):
+    """
+    Devuelve el valor cacheado en `clave` o lo calcula con `calcular()`.
+    Garantiza que, ante pedidos simultáneos, la función se ejecute una sola vez.
+    """
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor
+
+    with _LOCKS_LOCALES[hash(clave) % len(_LOCKS_LOCALES)]:
+        # Otro hilo de este proceso pudo haberlo calculado mientras esperábamos
+        valor = cache.get(clave)
+        if valor is not None:
+            return valor
+
+        clave_lock = f'{clave}:calculando'
+        lock_propio = cache.add(clave_lock, 1, ESPERA_MAXIMA_SEGUNDOS)
+        limite = time.monotonic() + ESPERA_MAXIMA_SEGUNDOS
+        while not lock_propio:
+            # Otro proceso ya está recalculando: esperamos su resultado
+            time.sleep(0.05)
+            valor = cache.get(clave)
+            if valor is not None:
+                return valor
+            if time.monotonic() > limite:
+                logger.warning(f"[DISPONIBILIDAD] Espera agotada para {clave}, recalculando")
+                break
+            lock_propio = cache.add(clave_lock, 1, ESPERA_MAXIMA_SEGUNDOS)
+
+        try:
+            valor = calcular()
+            cache.set(clave, valor, ttl or TTL_SEGUNDOS)
+        finally:
+            if lock_propio:
+                cache.delete(clave_lock)
+        return valor
+
+
+def obtener_o_calcular_muchos(claves, calcular_faltantes, ttl=None):
+    """
+    Versión por lotes: lee todas las claves con un solo get_many y calcula las
+    faltantes juntas con `calcular_faltantes(faltantes) -> {clave: valor}`.
+    Pedidos simultáneos con el mismo conjunto de faltantes comparten el cálculo.
+    """
+    encontrados = cache.get_many(claves)
+    faltantes = [clave for clave in claves if clave not in encontrados]
+    if not faltantes:
+        return encontrados
+
+    def calcular_lote():
+        valores = calcular_faltantes(faltantes)
+        cache.set_many(valores, ttl or TTL_SEGUNDOS)
+        return valores
+
+    firma = hashlib.sha1('|'.join(faltantes).encode()).hexdigest()
+    encontrados.update(obtener_o_calcular(f'{PREFIJO}:lote:{firma}', calcular_lote, ttl=ESPERA_MAXIMA_SEGUNDOS * 2))
+    return encontrados
+
+
+# ============================================================
+# CONSULTAS CACHEADAS
+# ============================================================
+
+def obtener_agenda(profesional, fecha):
+    """
+    AgendaDia del profesional para `fecha`, usando la ocupación cacheada.
+    Depende de: configuración global, bloqueos globales del día y la agenda
+    propia del profesional (turnos + bloqueos personales).
+    """
+    return obtener_agendas([profesional.id], [fecha])[(profesional.id, fecha)]
+
+
+def obtener_agendas(profesionales_ids, fechas):
+    """
+    Agendas de varios profesionales y fechas: dos lecturas al cache (versiones
+    y valores) y, si faltan, una carga en bloque con AgendaDia.cargar_rango.
+    Devuelve {(profesional_id, fecha): AgendaDia}.
+    """
+    pares = [(prof_id, fecha) for prof_id in set(profesionales_ids) for fecha in sorted(set(fechas))]
+    if not pares:
+        return {}
+
+    ambitos = ['global']
+    for fecha in sorted(set(fechas)):
+        ambitos.append(ambito_bloqueos_globales(fecha))
+    ambitos += [ambito_agenda(prof_id, fecha) for prof_id, fecha in pares]
+    version = dict(zip(ambitos, versiones(ambitos)))
+
+    claves = {}
+    for prof_id, fecha in pares:
+        claves[(
+            f'{PREFIJO}:agenda:{prof_id}:{fecha.isoformat()}:{version["global"]}'
+            f':{version[ambito_bloqueos_globales(fecha)]}:{version[ambito_agenda(prof_id, fecha)]}'
+        )] = (prof_id, fecha)
+
+    def calcular_faltantes(faltantes):
+        pares_faltantes = [claves[clave] for clave in faltantes]
+        agendas = AgendaDia.cargar_rango(
+            [prof_id for prof_id, _ in pares_faltantes],
+            [fecha for _, fecha in pares_faltantes]
+        )
+        return {clave: agendas[claves[clave]].ocupado for clave in faltantes}
+
+    ocupados = obtener_o_calcular_muchos(list(claves), calcular_faltantes)
+    return {
+        par: AgendaDia(par[1], ocupados[clave])
+        for clave, par in claves.items()
+    }
+
+
+def obtener_bloques_servicio(fecha, servicio, calcular):
+    """
+    Bloques de inicio del DisponibilidadService para (fecha, servicio).
+    Depende de los turnos del día, los horarios, los recursos y la configuración.
+    """
+    v_global, v_horarios, v_recursos, v_dia = versiones([
+        'global', 'horarios', 'recursos', ambito_dia(fecha),
+    ])
+    categoria_id = servicio.categoria_id or 0
+    clave = (
+        f'{PREFIJO}:bloques:{fecha.isoformat()}:{servicio.id}:{servicio.duracion_estimada}:{categoria_id}'
+        f':{v_global}:{v_horarios}:{v_recursos}:{v_dia}'
+    )
+    return obtener_o_calcular(clave, calcular)
+
+
+def obtener_calendario(anio, mes, personal_id, calcular):
+    """Reglas + bloqueos serializados del calendario mensual."""
+    v_global, v_horarios, v_mes = versiones(['global', 'horarios', ambito_mes(anio, mes)])
+    clave = f'{PREFIJO}:calendario:{anio}-{mes:02d}:{personal_id or "todos"}:{v_global}:{v_horarios}:{v_mes}'
+    return obtener_o_calcular(clave, calcular)
@@ -0,0 +1,67 @@
+"""
+Valores armados una vez por proceso y versionados en el cache compartido.
+
+Para datos chicos que se leen en casi cada pedido y cambian muy poco (reglas
+del motor de diagnóstico, bundle de catálogos, configuración y horarios):
+
+  - El valor se arma una vez y queda en memoria del proceso.
+  - Su versión vive en el cache de Django (settings.CACHES), compartido por
+    todos los workers. Leerla es lo único que cuesta cada pedido. Con un
+    backend por proceso (LocMemCache) los workers no se enteran de las
+    invalidaciones de los otros: el chequeo gestion.W001 lo avisa.
+  - Los receivers de gestion/signals.py llaman a `invalidar_al_confirmar()`:
+    cada proceso ve la versión nueva y rearma el valor en su próximo pedido.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+class CacheProceso:
+    """
+    `armar()` construye el valor (consultando la base); `obtener()` lo devuelve
+    armado para la versión vigente.
+    """
+
+    def __init__(self, clave, armar):
+        self.clave = clave
+        self.armar = armar
+        self._lock = threading.Lock()
+        self._valor = None
+
+    def version(self):
+        version = cache.get(self.clave)
+        if version is None:
+            # Versión inicial única: nunca se reutiliza un número anterior
+            cache.add(self.clave, time.time_ns(), None)
+            version = cache.get(self.clave)
+        return version
+
+    def invalidar(self):
+        """Incrementa la versión: todos los procesos rearman el valor en su próxima consulta."""
+        try:
+            cache.incr(self.clave)
+        except ValueError:
+            cache.set(self.clave, time.time_ns(), None)
+
+    def invalidar_al_confirmar(self):
+        """
+        Invalida ahora y otra vez al confirmar la transacción: un proceso que
+        armó el valor con datos previos al COMMIT no lo deja como vigente.
+        """
+        self.invalidar()
+        transaction.on_commit(self.invalidar)
+
+    def obtener(self):
+        """Valor vigente (sin consultas a la base si la versión no cambió)."""
+        version = self.version()
+        # Lectura atómica del par (versión, valor) armado por otro hilo
+        armado = self._valor
+        if armado is not None and armado[0] == version:
+            return armado[1]
+        with self._lock:
+            if self._valor is None or self._valor[0] != version:
+                self._valor = (version, self.armar())
+            return self._valor[1]
@@ -0,0 +1,159 @@
+"""
+Capacidad de equipamiento (lavacabezas, puestos, etc.).
+
+Para un conjunto de fechas carga en DOS consultas:
+  1. el stock operativo por TipoEquipamiento, y
+  2. la demanda de cada turno activo (inicio, duración y unidades por tipo).
+
+Con eso arma, por (fecha, tipo), un perfil de demanda en el tiempo (barrido de
+eventos +n / -n) y responde "¿puedo sumar D unidades del tipo T en [a, b)?"
+en O(log n) con búsqueda binaria + tabla dispersa de máximos.
+
+Los tiempos se expresan en minutos desde la medianoche, intervalos [inicio, fin).
+"""
+from bisect import bisect_left, bisect_right
+
+from django.db.models import Count
+
+from .models import Equipamiento, DetalleTurno, RequisitoServicio
+from .disponibilidad import ESTADOS_OCUPAN_AGENDA, DURACION_POR_DEFECTO, a_minutos
+
+
+class PerfilDemanda:
+    """
+    Demanda de un tipo de equipo a lo largo de un día.
+
+    `tiempos[i]` es el inicio del segmento i y `demanda[i]` las unidades en uso
+    en [tiempos[i], tiempos[i+1]). Antes del primer tiempo la demanda es 0.
+    """
+
+    def __init__(self, intervalos):
+        # Barrido: +n al iniciar, -n al terminar
+        eventos = {}
+        for inicio, fin, cantidad in intervalos:
+            if fin <= inicio:
+                continue
+            eventos[inicio] = eventos.get(inicio, 0) + cantidad
+            eventos[fin] = eventos.get(fin, 0) - cantidad
+
+        self.tiempos = sorted(eventos)
+        self.demanda = []
+        actual = 0
+        for tiempo in self.tiempos:
+            actual += eventos[tiempo]
+            self.demanda.append(actual)
+
+        self._tabla = self._construir_tabla(self.demanda)
+
+    @staticmethod
+    def _construir_tabla(valores):
+        """Tabla dispersa: tabla[k][i] = max(valores[i : i + 2**k])."""
+        tabla = [list(valores)]
+        k = 1
+        while (1 << k) <= len(valores):
+            previa = tabla[-1]
+            salto = 1 << (k - 1)
+            tabla.append([
+                max(previa[i], previa[i + salto])
+                for i in range(len(valores) - (1 << k) + 1)
+            ])
+            k += 1
+        return tabla
+
+    def _maximo_segmentos(self, desde, hasta):
+        """Máximo de demanda en los segmentos [desde, hasta] (índices inclusive)."""
+        k = (hasta - desde + 1).bit_length() - 1
+        return max(self._tabla[k][desde], self._tabla[k][hasta - (1 << k) + 1])
+
+    def maximo(self, inicio, fin):
+        """Máxima demanda simultánea dentro de [inicio, fin)."""
+        if not self.tiempos or fin <= inicio:
+            return 0
+        # Segmento que contiene `inicio` y último segmento que empieza antes de `fin`
+        desde = bisect_right(self.tiempos, inicio) - 1
+        hasta = bisect_left(self.tiempos, fin) - 1
+        if hasta < 0:
+            return 0
+        return self._maximo_segmentos(max(desde, 0), hasta)
+
+
+def requisitos_por_tipo(servicios_ids):
+    """
+    Unidades obligatorias por tipo de equipo que piden los servicios:
+    {tipo_equipamiento_id: cantidad} (si varios piden lo mismo, el máximo).
+    """
+    requeridos = {}
+    if not servicios_ids:
+        return requeridos
+    filas = RequisitoServicio.objects.filter(
+        servicio_id__in=servicios_ids,
+        obligatorio=True
+    ).values_list('tipo_equipamiento_id', 'cantidad_minima')
+    for tipo_id, cantidad in filas:
+        requeridos[tipo_id] = max(requeridos.get(tipo_id, 0), cantidad)
+    return requeridos
+
+
+class CapacidadEquipamiento:
+    """Stock y perfiles de demanda por (fecha, tipo) para un conjunto de fechas."""
+
+    def __init__(self, stock, perfiles):
+        self.stock = stock
+        self.perfiles = perfiles
+
+    @classmethod
+    def cargar(cls, fechas, excluir_turno_id=None):
+        """Dos consultas sin importar cuántas fechas, turnos o tipos haya."""
+        fechas = list(set(fechas))
+
+        # 1. Stock operativo por tipo
+        stock = dict(
+            Equipamiento.objects.filter(
+                is_active=True,
+                estado=Equipamiento.EstadoRecurso.DISPONIBLE
+            ).values('tipo_id').annotate(total=Count('id')).values_list('tipo_id', 'total')
+        )
+
+        # 2. Demanda de los turnos activos: una fila por detalle x requisito
+        filas = DetalleTurno.objects.filter(
+            turno__fecha__in=fechas,
+            turno__estado__in=ESTADOS_OCUPAN_AGENDA
+        )
+        if excluir_turno_id:
+            filas = filas.exclude(turno_id=excluir_turno_id)
+        filas = filas.values_list(
+            'id', 'turno_id', 'turno__fecha', 'turno__hora_inicio', 'duracion_minutos',
+            'servicio__requisitos_equipamiento__tipo_equipamiento_id',
+            'servicio__requisitos_equipamiento__cantidad_minima',
+        )
+
+        turnos = {}
+        for detalle_id, turno_id, fecha, hora_inicio, duracion, tipo_id, cantidad in filas:
+            turno = turnos.setdefault(turno_id, {
+                'fecha': fecha, 'inicio': a_minutos(hora_inicio), 'detalles': {}, 'demanda': {}
+            })
+            turno['detalles'][detalle_id] = duracion
+            if tipo_id is not None:
+                turno['demanda'][tipo_id] = max(turno['demanda'].get(tipo_id, 0), cantidad or 1)
+
+        intervalos = {}
+        for turno in turnos.values():
+            fin = turno['inicio'] + (sum(turno['detalles'].values()) or DURACION_POR_DEFECTO)
+            for tipo_id, cantidad in turno['demanda'].items():
+                intervalos.setdefault((turno['fecha'], tipo_id), []).append((turno['inicio'], fin, cantidad))
+
+        perfiles = {clave: PerfilDemanda(lista) for clave, lista in intervalos.items()}
+        return cls(stock, perfiles)
+
+    def puede_agregar(self, fecha, tipo_id, cantidad, inicio, fin):
+        """True si hay `cantidad` unidades libres del tipo durante todo [inicio, fin)."""
+        perfil = self.perfiles.get((fecha, tipo_id))
+        en_uso = perfil.maximo(inicio, fin) if perfil else 0
+        return en_uso + cantidad <= self.stock.get(tipo_id, 0)
+
+    def admite(self, fecha, requeridos, inicio, fin):
+        """Valida todos los tipos requeridos ({tipo_id: cantidad}) para el rango."""
+        return all(
+            self.puede_agregar(fecha, tipo_id, cantidad, inicio, fin)
+            for tipo_id, cantidad in requeridos.items()
+        )
@@ -0,0 +1,85 @@
+"""
+Bundle de catálogos.
+
+Los catálogos que el frontend pide en casi todas las pantallas (atributos de
+cabello, categorías, servicios y productos) se sirven juntos en un solo JSON
+desde GET /api/gestion/catalogos/bundle/.
+
+- El JSON se arma una vez y queda en memoria del proceso, ya renderizado.
+- Su hash de contenido es el ETag: un If-None-Match igual responde 304 sin cuerpo.
+- Como el motor de diagnóstico, vive en memoria del proceso (ver
+  gestion/cache_proceso.py); los receivers de gestion/signals.py lo invalidan
+  cuando se guarda o borra cualquiera de los modelos incluidos.
+"""
+import hashlib
+import logging
+
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    TipoCabello, GrosorCabello, PorosidadCabello, CueroCabelludo, EstadoGeneral,
+    CategoriaServicio, Servicio, Producto, RequisitoServicio, TipoEquipamiento, Rutina,
+)
+from .serializers import (
+    TipoCabelloSerializer, GrosorCabelloSerializer, PorosidadCabelloSerializer,
+    CueroCabelludoSerializer, EstadoGeneralSerializer, CategoriaServicioSerializer,
+    ServicioSerializer, ProductoSerializer,
+)
+from .cache_proceso import CacheProceso
+
+logger = logging.getLogger(__name__)
+
+
+# Modelos cuyo cambio invalida el bundle (ver gestion/signals.py); los
+# últimos aportan nombres a los servicios serializados
+MODELOS_BUNDLE = (
+    TipoCabello, GrosorCabello, PorosidadCabello, CueroCabelludo, EstadoGeneral,
+    CategoriaServicio, Servicio, Producto, RequisitoServicio, TipoEquipamiento, Rutina,
+)
+
+def _secciones():
+    """(clave del JSON, queryset, serializer). Las claves son las rutas de cada catálogo."""
+    return (
+        ('tipos-cabello', TipoCabello.objects.all(), TipoCabelloSerializer),
+        ('grosores-cabello', GrosorCabello.objects.all(), GrosorCabelloSerializer),
+        ('porosidades-cabello', PorosidadCabello.objects.all(), PorosidadCabelloSerializer),
+        ('cueros-cabelludos', CueroCabelludo.objects.all(), CueroCabelludoSerializer),
+        ('estados-generales', EstadoGeneral.objects.all(), EstadoGeneralSerializer),
+        ('categorias-servicio', CategoriaServicio.objects.all(), CategoriaServicioSerializer),
+        (
+            'servicios',
+            ServicioSerializer.preparar_queryset(Servicio.objects.filter(activo=True).order_by('nombre')),
+            ServicioSerializer,
+        ),
+        ('productos', Producto.objects.filter(activo=True).order_by('nombre'), ProductoSerializer),
+    )
+
+
+class Bundle:
+    """JSON renderizado del bundle y su ETag."""
+
+    def __init__(self, datos):
+        # El hash se calcula sin el campo 'version' para que solo dependa del contenido
+        self.hash = hashlib.sha256(JSONRenderer().render(datos)).hexdigest()[:32]
+        self.etag = f'"{self.hash}"'
+        self.contenido = JSONRenderer().render({'version': self.hash, **datos})
+
+    @classmethod
+    def armar(cls):
+        datos = {
+            clave: serializer(queryset, many=True).data
+            for clave, queryset, serializer in _secciones()
+        }
+        bundle = cls(datos)
+        logger.info(f"[CATALOGOS] Bundle armado ({len(bundle.contenido)} bytes)")
+        return bundle
+
+
+# Bundle por proceso, versionado en el cache compartido
+_bundle = CacheProceso('catalogos:version', Bundle.armar)
+invalidar_al_confirmar = _bundle.invalidar_al_confirmar
+
+
+def obtener_bundle():
+    """Bundle vigente (sin consultas a la base si la versión no cambió)."""
+    return _bundle.obtener()
@@ -0,0 +1,34 @@
+"""
+Chequeos de sistema de la app (se corren con runserver, migrate, check, etc.).
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# Backends cuyo contenido no ven los demás workers
+BACKENDS_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def cache_compartido(app_configs, **kwargs):
+    """
+    CacheProceso (snapshot de agenda, motor de diagnóstico, bundle de
+    catálogos) guarda su versión en el cache 'default'. Con un backend por
+    proceso, lo que invalida un worker no lo ven los otros y siguen sirviendo
+    el valor viejo. Con DEBUG (runserver, un solo proceso) no aplica.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if settings.DEBUG or backend not in BACKENDS_POR_PROCESO:
+        return []
+    return [Warning(
+        f"El cache 'default' usa {backend}, que no se comparte entre workers.",
+        hint=(
+            "Con más de un worker, los cambios de Configuracion, HorarioLaboral, reglas de "
+            "diagnóstico o catálogos no llegan a los demás procesos. Configurar un backend "
+            "compartido (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache o "
+            "django.core.cache.backends.db.DatabaseCache con createcachetable)."
+        ),
+        id='gestion.W001',
+    )]
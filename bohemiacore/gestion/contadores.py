@@ -0,0 +1,175 @@
+"""
+Contadores de turnos por estado (tablero del administrador).
+
+Cuántos turnos hay en cada estado:
+  - 'estado:<estado>'           en total, y
+  - 'dia:<fecha>:<estado>'      en una fecha.
+
+El valor de una clave es su fila en ContadorEstado (foto de la última
+reconciliación) más la suma de sus filas en DeltaContador (cambios desde
+entonces).
+
+Los cambios de turno SOLO INSERTAN diferencias en DeltaContador, en la misma
+transacción que el cambio: los receivers de gestion/signals.py (alta, cambio
+de estado o de fecha, baja) y la expiración por lotes (gestion/expiracion.py)
+escriben un único INSERT sin ON CONFLICT. Ninguna reserva actualiza las filas
+'estado:*', que toca cada reserva: no hay bloqueos de fila entre reservas
+concurrentes ni esperas en cadena. Un COMMIT deja turnos y diferencias
+coherentes; un ROLLBACK descarta ambos.
+
+GARANTÍA DE FRESCURA: lo que se escribe por fuera del ORM (SQL manual,
+cargas masivas) no pasa por acá. `reconciliar()` (comando
+`manage.py reconciliar_contadores`, una vez o con --loop) reconstruye la foto
+desde Turno, vacía DeltaContador y fecha la fila CLAVE_RECONCILIACION. El
+tablero solo usa los contadores si esa fecha tiene menos de
+settings.CONTADORES_ANTIGUEDAD_MAXIMA segundos; si no, cuenta con una
+consulta agregada. Un desvío dura como mucho hasta la próxima reconciliación.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import ContadorEstado, DeltaContador, Turno
+
+logger = logging.getLogger(__name__)
+
+
+CLAVE_RECONCILIACION = 'reconciliacion'
+
+ANTIGUEDAD_MAXIMA = getattr(settings, 'CONTADORES_ANTIGUEDAD_MAXIMA', 6 * 60 * 60)
+
+# Foto + diferencias pendientes en una sola sentencia (una misma instantánea)
+SQL_LEER = """
+    SELECT clave, SUM(cantidad), MAX(actualizado) FROM (
+        SELECT clave, cantidad, actualizado FROM {contadores} WHERE clave = ANY(%s)
+        UNION ALL
+        SELECT clave, cantidad, NULL FROM {deltas} WHERE clave = ANY(%s)
+    ) AS filas
+    GROUP BY clave
+"""
+
+
+def clave_estado(estado):
+    return f'estado:{estado}'
+
+
+def clave_dia(fecha, estado):
+    # Una fecha date o ya como 'YYYY-MM-DD' dan la misma clave
+    return f'dia:{fecha}:{estado}'
+
+
+def diferencias(anterior, nuevo, acumuladas=None):
+    """
+    Suma a `acumuladas` ({clave: delta}) el paso de `anterior` a `nuevo`,
+    cada uno (fecha, estado) o None (turno creado / borrado).
+    """
+    acumuladas = {} if acumuladas is None else acumuladas
+    if anterior == nuevo:
+        return acumuladas
+    for par, signo in ((anterior, -1), (nuevo, 1)):
+        if par is None:
+            continue
+        fecha, estado = par
+        for clave in (clave_estado(estado), clave_dia(fecha, estado)):
+            acumuladas[clave] = acumuladas.get(clave, 0) + signo
+    return acumuladas
+
+
+def sumar(acumuladas):
+    """Inserta {clave: delta} en DeltaContador con una sola sentencia, dentro de la transacción en curso."""
+    deltas = [DeltaContador(clave=clave, cantidad=delta) for clave, delta in acumuladas.items() if delta]
+    if deltas:
+        DeltaContador.objects.bulk_create(deltas)
+
+
+def registrar_cambio(anterior, nuevo):
+    """Cambio de un turno: (fecha, estado) previo y nuevo (None si no existe)."""
+    sumar(diferencias(_normalizar(anterior), _normalizar(nuevo)))
+
+
+def _normalizar(par):
+    return None if par is None else (str(par[0]), par[1])
+
+
+# ============================================================
+# RECONCILIACIÓN
+# ============================================================
+
+def reconciliar():
+    """
+    Reconstruye la foto de ContadorEstado desde Turno y vacía DeltaContador.
+    Devuelve cuántos turnos contó.
+
+    LOCK TABLE sobre DeltaContador espera a las transacciones que ya
+    insertaron diferencias (sus turnos quedan confirmados antes del recuento)
+    y frena a las nuevas hasta el COMMIT: ninguna diferencia se cuenta dos
+    veces ni se pierde. Las lecturas del tablero no se bloquean.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {DeltaContador._meta.db_table} IN EXCLUSIVE MODE')
+
+        acumuladas = {}
+        total = 0
+        for fecha, estado, cantidad in Turno.objects.values_list('fecha', 'estado').annotate(n=Count('id')).order_by():
+            for clave in (clave_estado(estado), clave_dia(fecha, estado)):
+                acumuladas[clave] = acumuladas.get(clave, 0) + cantidad
+            total += cantidad
+
+        ahora = timezone.now()
+        DeltaContador.objects.all().delete()
+        ContadorEstado.objects.all().delete()
+        ContadorEstado.objects.bulk_create(
+            [ContadorEstado(clave=clave, cantidad=cantidad, actualizado=ahora) for clave, cantidad in acumuladas.items()]
+            + [ContadorEstado(clave=CLAVE_RECONCILIACION, cantidad=total, actualizado=ahora)],
+            batch_size=2000,
+        )
+    logger.info(f"[CONTADORES] Reconciliados {len(acumuladas)} contadores ({total} turnos)")
+    return total
+
+
+# ============================================================
+# LECTURA (TABLERO)
+# ============================================================
+
+def leer(claves):
+    """{clave: (cantidad, actualizado)} con las diferencias pendientes ya sumadas (una consulta)."""
+    claves = list(claves)
+    sql = SQL_LEER.format(contadores=ContadorEstado._meta.db_table, deltas=DeltaContador._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [claves, claves])
+        return {clave: (cantidad, actualizado) for clave, cantidad, actualizado in cursor.fetchall()}
+
+
+def contadores_tablero(hoy):
+    """
+    {'turnos_hoy', 'pendientes_accion', 'esperando_sena'} leídos por clave
+    (una consulta), o None si la última reconciliación es más vieja que
+    ANTIGUEDAD_MAXIMA (o nunca corrió).
+    """
+    claves = {
+        'turnos_hoy': clave_dia(hoy, Turno.Estado.CONFIRMADO),
+        'pendientes_accion': clave_estado(Turno.Estado.SOLICITADO),
+        'esperando_sena': clave_estado(Turno.Estado.ESPERANDO_SENA),
+    }
+    filas = leer([*claves.values(), CLAVE_RECONCILIACION])
+    reconciliado = filas.get(CLAVE_RECONCILIACION)
+    if reconciliado is None or reconciliado[1] < timezone.now() - timedelta(seconds=ANTIGUEDAD_MAXIMA):
+        return None
+    # Una clave ausente es un estado sin turnos
+    return {nombre: filas.get(clave, (0, None))[0] for nombre, clave in claves.items()}
+
+
+def contar_tablero(hoy):
+    """Los mismos contadores con UNA consulta agregada sobre Turno (sin rollup)."""
+    return Turno.objects.filter(
+        Q(fecha=hoy) | Q(estado__in=[Turno.Estado.SOLICITADO, Turno.Estado.ESPERANDO_SENA])
+    ).aggregate(
+        turnos_hoy=Count('id', filter=Q(fecha=hoy, estado=Turno.Estado.CONFIRMADO)),
+        pendientes_accion=Count('id', filter=Q(estado=Turno.Estado.SOLICITADO)),
+        esperando_sena=Count('id', filter=Q(estado=Turno.Estado.ESPERANDO_SENA)),
+    )
@@ -0,0 +1,529 @@
+"""
+Generador de datos sintéticos.
+
+Arma un salón con historia para medir el sistema a escala (comandos
+`generar_datos_sinteticos` y `benchmark_escala`):
+
+  - catálogos de cabello, categorías, servicios y rutinas (se reutilizan si
+    ya existen por nombre),
+  - personal con horarios semanales, equipamiento y requisitos por servicio,
+  - clientes con perfil capilar y diagnósticos evaluados por el motor,
+  - turnos sin solapamiento por profesional con sus detalles, bloqueos
+    (feriados, vacaciones, ausencias de unas horas) y notificaciones.
+
+Distribuciones: pocos clientes concentran muchos turnos (pesos Pareto), la
+historia está casi toda realizada y los próximos turnos se reparten entre
+solicitados, esperando seña y confirmados, con menos ocupación cuanto más
+lejos. La historia se extiende hacia atrás hasta llegar a la cantidad de
+turnos pedida.
+
+Todo se inserta con bulk_create en lotes. Como bulk_create no dispara
+señales, al terminar se reconcilian los contadores por estado, se invalidan
+a mano los caches de proceso y de disponibilidad y se reconstruyen los
+resúmenes diarios. La misma semilla genera exactamente los mismos datos.
+"""
+import logging
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from usuarios.models import Usuario, Cliente
+from .models import (
+    TipoCabello, GrosorCabello, PorosidadCabello, CueroCabelludo, EstadoGeneral,
+    CategoriaServicio, Servicio, Rutina, Personal, HorarioLaboral, BloqueoAgenda,
+    Configuracion, Turno, DetalleTurno, TipoEquipamiento, Equipamiento,
+    RequisitoServicio, DiagnosticoCapilar, Notificacion,
+)
+from . import motor_diagnostico, snapshot_agenda, catalogos, cache_disponibilidad, contadores, analitica
+from .disponibilidad import a_minutos, a_hora
+
+logger = logging.getLogger(__name__)
+
+
+DOMINIO = 'sintetico.local'
+LOTE_POR_DEFECTO = 2000
+
+# (catálogo, [(nombre, peso)]): los nombres son los que puntúa el motor de diagnóstico
+PERFILES = (
+    (TipoCabello, [('Lacio', 4), ('Ondulado', 3), ('Rizado', 2), ('Afro', 1)]),
+    (GrosorCabello, [('Fino', 3), ('Medio', 5), ('Grueso', 2)]),
+    (PorosidadCabello, [('Baja', 2), ('Media', 5), ('Alta', 3)]),
+    (CueroCabelludo, [('Seco', 2), ('Normal', 5), ('Mixto', 2), ('Graso', 2)]),
+    (EstadoGeneral, [('Dañado', 3), ('Normal', 5), ('Sano', 2)]),
+)
+
+# Las categorías con "Diseño" / "Complemento" definen qué profesional puede atender
+CATEGORIA_DISENO = 'Diseño de Color'
+CATEGORIA_COMPLEMENTO = 'Complementos'
+CATEGORIA_DIAGNOSTICO = 'Diagnóstico'
+
+# (nombre, categoría, duración, precio, peso, tipos de equipamiento requeridos)
+SERVICIOS = (
+    ('Balayage', CATEGORIA_DISENO, 180, 90000, 3, ('Lavacabezas', 'Puesto de color')),
+    ('Color global', CATEGORIA_DISENO, 120, 60000, 5, ('Lavacabezas', 'Puesto de color')),
+    ('Mechas', CATEGORIA_DISENO, 150, 75000, 3, ('Lavacabezas', 'Puesto de color')),
+    ('Decoloración', CATEGORIA_DISENO, 150, 70000, 1, ('Lavacabezas', 'Puesto de color')),
+    ('Corte', CATEGORIA_COMPLEMENTO, 45, 15000, 8, ('Sillón de corte',)),
+    ('Nutrición', CATEGORIA_COMPLEMENTO, 60, 20000, 5, ('Lavacabezas',)),
+    ('Tratamiento intensivo', CATEGORIA_COMPLEMENTO, 90, 35000, 2, ('Lavacabezas',)),
+    ('Peinado', CATEGORIA_COMPLEMENTO, 45, 12000, 3, ('Sillón de corte',)),
+    ('Diagnóstico capilar', CATEGORIA_DIAGNOSTICO, 30, 0, 2, ()),
+)
+
+# Servicios que se suman como segundo detalle de un turno
+COMPLEMENTOS = ('Corte', 'Nutrición', 'Peinado')
+
+# (tipo, abreviatura, unidades por profesional)
+EQUIPAMIENTO = (
+    ('Lavacabezas', 'LAV', 0.5),
+    ('Puesto de color', 'COL', 0.5),
+    ('Sillón de corte', 'SIL', 0.5),
+)
+
+# Rutinas que el motor asigna por nombre en el Nivel 2
+RUTINAS = (
+    ('Recuperación intensiva', 'Reparar cabello dañado o muy procesado'),
+    ('Nutrición semanal', 'Hidratación y prevención'),
+    ('Mantenimiento', 'Cuidado básico de cabello sano'),
+)
+
+# Semana del salón (ver cargar_horarios): {día: (inicio, fin)}; domingo cerrado
+SEMANA = {
+    0: (time(10, 0), time(19, 0)),
+    1: (time(8, 0), time(17, 0)),
+    2: (time(12, 0), time(21, 0)),
+    3: (time(8, 0), time(17, 0)),
+    4: (time(10, 0), time(19, 0)),
+    5: (time(8, 0), time(17, 0)),
+}
+
+# Estados según el momento del turno: [(estado, peso)]
+ESTADOS_PASADOS = [('realizado', 82), ('cancelado', 10), ('ausente', 8)]
+ESTADOS_FUTUROS = [('confirmado', 55), ('esperando_sena', 20), ('solicitado', 20), ('cancelado', 5)]
+
+# Probabilidades por día
+OCUPACION_PASADA = 0.7
+PROB_FERIADO = 12 / 365
+PROB_VACACIONES = 1 / 180
+PROB_AUSENCIA = 1 / 25
+PROB_COMPLEMENTO = 0.35
+
+NOMBRES = (
+    'Ana', 'Lucía', 'Sofía', 'Valentina', 'Camila', 'Martina', 'Julieta', 'Paula',
+    'Florencia', 'Carla', 'María', 'Laura', 'Daniela', 'Agustina', 'Micaela', 'Juan',
+    'Pedro', 'Mateo', 'Tomás', 'Nicolás',
+)
+APELLIDOS = (
+    'García', 'Rodríguez', 'Gómez', 'Fernández', 'López', 'Díaz', 'Martínez', 'Pérez',
+    'Romero', 'Sánchez', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores', 'Acosta',
+    'Benítez', 'Medina', 'Herrera', 'Suárez',
+)
+
+
+@contextmanager
+def _sin_auto_now_add(modelo, campo):
+    """Permite fijar un campo auto_now_add (fechas históricas) durante el bloque."""
+    field = modelo._meta.get_field(campo)
+    original = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = original
+
+
+def invalidar_caches():
+    """bulk_create no dispara las señales: se invalida todo lo derivado de los datos."""
+    snapshot_agenda.invalidar_al_confirmar()
+    motor_diagnostico.invalidar_al_confirmar()
+    catalogos.invalidar_al_confirmar()
+    cache_disponibilidad.invalidar_al_confirmar('global', 'horarios', 'recursos')
+
+
+def existe_semilla(semilla):
+    return Usuario.objects.filter(email__endswith=f'.s{semilla}@{DOMINIO}').exists()
+
+
+class GeneradorDatos:
+    """
+    Uso: GeneradorDatos(clientes=20000, turnos=200000, personal=12, semilla=1).generar()
+    Devuelve la cantidad de filas creadas por modelo.
+    """
+
+    def __init__(self, clientes, turnos, personal, semilla=0, lote=LOTE_POR_DEFECTO, informar=None):
+        self.cantidad_clientes = clientes
+        self.cantidad_turnos = turnos
+        self.cantidad_personal = personal
+        self.semilla = semilla
+        self.lote = lote
+        self.informar = informar or logger.info
+        self.rng = random.Random(semilla)
+        self.ahora = timezone.localtime()
+        self.hoy = self.ahora.date()
+        self.sin_clave = make_password(None)
+        self.creados = {}
+
+    def _sumar(self, clave, cantidad):
+        self.creados[clave] = self.creados.get(clave, 0) + cantidad
+
+    def _email(self, prefijo, i):
+        return f'{prefijo}{i}.s{self.semilla}@{DOMINIO}'
+
+    def _elegir(self, opciones):
+        """Elección ponderada sobre [(valor, peso)]."""
+        valores, pesos = zip(*opciones)
+        return self.rng.choices(valores, weights=pesos)[0]
+
+    def generar(self):
+        self.config = Configuracion.objects.first() or Configuracion.objects.create()
+        self._crear_catalogos()
+        self._crear_personal()
+        self._crear_equipamiento()
+        self._crear_clientes()
+        self._crear_diagnosticos()
+        self._crear_turnos()
+        contadores.reconciliar()
+        invalidar_caches()
+        # Después de invalidar: los resúmenes leen los horarios del snapshot de agenda
+        self.creados['ResumenDiario'] = analitica.reconstruir()
+        return self.creados
+
+    # ------------------------------------------------------------
+    # Catálogos, personal y equipamiento
+    # ------------------------------------------------------------
+
+    def _crear_catalogos(self):
+        self.perfiles = [
+            [(modelo.objects.get_or_create(nombre=nombre)[0], peso) for nombre, peso in opciones]
+            for modelo, opciones in PERFILES
+        ]
+        categorias = {
+            nombre: CategoriaServicio.objects.get_or_create(nombre=nombre)[0]
+            for nombre in (CATEGORIA_DISENO, CATEGORIA_COMPLEMENTO, CATEGORIA_DIAGNOSTICO)
+        }
+        self.servicios = {}
+        self.pesos_servicio = {}
+        for nombre, categoria, duracion, precio, peso, _ in SERVICIOS:
+            servicio, _ = Servicio.objects.get_or_create(nombre=nombre, defaults={
+                'categoria': categorias[categoria],
+                'duracion_estimada': duracion,
+                'precio_base': Decimal(precio),
+            })
+            self.servicios[nombre] = servicio
+            self.pesos_servicio[nombre] = peso
+
+    def _crear_personal(self):
+        # Un tercio son coloristas (diseño y diagnóstico); el resto asistentes de lavado y complementos
+        coloristas = max(1, self.cantidad_personal // 3)
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(
+                email=self._email('personal', i),
+                first_name=self.rng.choice(NOMBRES),
+                last_name=self.rng.choice(APELLIDOS),
+                password=self.sin_clave,
+                is_staff=True,
+            )
+            for i in range(coloristas)
+        ])
+        self.usuarios_staff = usuarios
+        self.personal = Personal.objects.bulk_create([
+            Personal(
+                usuario=usuarios[i] if i < coloristas else None,
+                nombre=self.rng.choice(NOMBRES),
+                apellido=self.rng.choice(APELLIDOS),
+                rol='colorista' if i < coloristas else 'asistente',
+                email=self._email('personal', i),
+                realiza_diagnostico=i < coloristas,
+                realiza_color=i < coloristas,
+                realiza_lavado=True,
+            )
+            for i in range(self.cantidad_personal)
+        ])
+        self._sumar('personal', len(self.personal))
+
+        # Semana del salón menos un día libre por profesional
+        horarios = []
+        self.semana = {}
+        for profesional in self.personal:
+            libre = self.rng.choice(list(SEMANA))
+            self.semana[profesional.id] = {
+                dia: (a_minutos(inicio), a_minutos(fin))
+                for dia, (inicio, fin) in SEMANA.items() if dia != libre
+            }
+            horarios += [
+                HorarioLaboral(personal=profesional, dia_semana=dia, hora_inicio=inicio, hora_fin=fin)
+                for dia, (inicio, fin) in SEMANA.items() if dia != libre
+            ]
+        HorarioLaboral.objects.bulk_create(horarios)
+        self._sumar('horarios', len(horarios))
+
+        for nombre, objetivo in RUTINAS:
+            if not Rutina.objects.filter(nombre=nombre).exists():
+                Rutina.objects.create(nombre=nombre, objetivo=objetivo, estado='publicada', creada_por=usuarios[0])
+
+    def _crear_equipamiento(self):
+        equipos = []
+        tipos = {}
+        for nombre, abreviatura, por_profesional in EQUIPAMIENTO:
+            tipo = tipos[nombre] = TipoEquipamiento.objects.get_or_create(nombre=nombre)[0]
+            for n in range(max(1, round(self.cantidad_personal * por_profesional))):
+                equipos.append(Equipamiento(
+                    codigo=f'S{self.semilla}-{abreviatura}-{n + 1:02d}',
+                    nombre=f'{nombre} {n + 1}',
+                    tipo=tipo,
+                    # Alguna unidad en mantenimiento, como en un salón real
+                    estado=(
+                        Equipamiento.EstadoRecurso.MANTENIMIENTO if self.rng.random() < 0.05
+                        else Equipamiento.EstadoRecurso.DISPONIBLE
+                    ),
+                ))
+        Equipamiento.objects.bulk_create(equipos)
+        self._sumar('equipamiento', len(equipos))
+
+        for nombre, _, _, _, _, requeridos in SERVICIOS:
+            for tipo in requeridos:
+                RequisitoServicio.objects.get_or_create(servicio=self.servicios[nombre], tipo_equipamiento=tipos[tipo])
+
+    # ------------------------------------------------------------
+    # Clientes y diagnósticos
+    # ------------------------------------------------------------
+
+    def _perfil_al_azar(self):
+        return [self._elegir(opciones) for opciones in self.perfiles]
+
+    def _crear_clientes(self):
+        self.perfil_cliente = {}
+        self.clientes_ids = []
+        for desde in range(0, self.cantidad_clientes, self.lote):
+            hasta = min(desde + self.lote, self.cantidad_clientes)
+            usuarios = Usuario.objects.bulk_create([
+                Usuario(
+                    email=self._email('cliente', i),
+                    first_name=self.rng.choice(NOMBRES),
+                    last_name=self.rng.choice(APELLIDOS),
+                    password=self.sin_clave,
+                )
+                for i in range(desde, hasta)
+            ])
+            clientes = []
+            for usuario in usuarios:
+                # Solo los clientes que pasaron por un diagnóstico tienen perfil
+                perfil = self._perfil_al_azar() if self.rng.random() < 0.4 else None
+                self.perfil_cliente[usuario.id] = perfil
+                tipo, grosor, porosidad, cuero, estado = perfil or (None,) * 5
+                clientes.append(Cliente(
+                    usuario=usuario, tipo_cabello=tipo, grosor_cabello=grosor,
+                    porosidad_cabello=porosidad, cuero_cabelludo=cuero, estado_general=estado,
+                ))
+            Cliente.objects.bulk_create(clientes)
+            self.clientes_ids += [usuario.id for usuario in usuarios]
+        self._sumar('clientes', len(self.clientes_ids))
+        self.informar(f"Clientes: {len(self.clientes_ids)}")
+
+        # Frecuencia de visita por cliente: cola larga (pocos clientes muy frecuentes)
+        self.pesos_clientes = list(accumulate(self.rng.paretovariate(2.5) for _ in self.clientes_ids))
+
+    def _crear_diagnosticos(self):
+        motor_diagnostico.invalidar_al_confirmar()
+        diagnosticos = []
+        for cliente_id, perfil in self.perfil_cliente.items():
+            if perfil is None:
+                continue
+            # El último diagnóstico es el perfil vigente del cliente
+            perfiles = [self._perfil_al_azar() for _ in range(self.rng.randint(0, 2))] + [perfil]
+            dias = sorted((self.rng.randint(0, 3 * 365) for _ in perfiles), reverse=True)
+            for perfil_diag, dias_atras in zip(perfiles, dias):
+                tipo, grosor, porosidad, cuero, estado = perfil_diag
+                diagnostico = DiagnosticoCapilar(
+                    cliente_id=cliente_id,
+                    profesional=self.rng.choice(self.usuarios_staff),
+                    tipo_cabello=tipo, grosor_cabello=grosor, porosidad_cabello=porosidad,
+                    cuero_cabelludo=cuero, estado_general=estado,
+                    fecha_diagnostico=self.ahora - timedelta(days=dias_atras, minutes=self.rng.randint(0, 600)),
+                )
+                regla, _, rutina, servicio_urgente = motor_diagnostico.evaluar(diagnostico)
+                diagnostico.regla_diagnostico = regla
+                diagnostico.rutina_sugerida = rutina
+                diagnostico.servicio_urgente = servicio_urgente
+                diagnosticos.append(diagnostico)
+
+        with _sin_auto_now_add(DiagnosticoCapilar, 'fecha_diagnostico'):
+            DiagnosticoCapilar.objects.bulk_create(diagnosticos, batch_size=self.lote)
+        self._sumar('diagnosticos', len(diagnosticos))
+        self.informar(f"Diagnósticos: {len(diagnosticos)}")
+
+    # ------------------------------------------------------------
+    # Turnos, bloqueos y notificaciones
+    # ------------------------------------------------------------
+
+    def _ocupacion(self, fecha):
+        """Probabilidad de que un hueco del día esté tomado."""
+        if fecha < self.hoy:
+            return OCUPACION_PASADA
+        # Lo más cercano está casi lleno; el final del horizonte, casi vacío
+        horizonte = self.config.max_dias_anticipacion or 60
+        return 0.05 + 0.6 * max(0.0, 1 - (fecha - self.hoy).days / horizonte)
+
+    def _bloqueo(self, profesional, inicio, fin, motivo, todo_el_dia=False):
+        bloqueo = BloqueoAgenda(
+            personal=profesional, motivo=motivo, bloquea_todo_el_dia=todo_el_dia,
+            fecha_inicio=timezone.make_aware(inicio), fecha_fin=timezone.make_aware(fin),
+        )
+        bloqueo.ocupacion = bloqueo.calcular_ocupacion()
+        self.bloqueos.append(bloqueo)
+
+    def _crear_turnos(self):
+        """
+        Recorre los días hacia atrás desde el final del horizonte de reservas
+        y llena la agenda de cada profesional hasta llegar a la cantidad pedida.
+        """
+        intervalo = self.config.intervalo_turnos or 30
+        fecha = self.hoy + timedelta(days=self.config.max_dias_anticipacion or 60)
+        vacaciones_desde = {}
+        self.bloqueos = []
+        pendientes = []
+        total = 0
+
+        disenos = [n for n, categoria, *_ in SERVICIOS if categoria == CATEGORIA_DISENO]
+        complementos = [n for n, categoria, *_ in SERVICIOS if categoria != CATEGORIA_DISENO]
+
+        while total < self.cantidad_turnos:
+            dia = fecha.weekday()
+            if self.rng.random() < PROB_FERIADO:
+                self._bloqueo(None, datetime.combine(fecha, time.min), datetime.combine(fecha, time(23, 59)), 'Feriado', True)
+                fecha -= timedelta(days=1)
+                continue
+
+            ocupacion = self._ocupacion(fecha)
+            ocupados_cliente = set()
+            for profesional in self.personal:
+                jornada = self.semana[profesional.id].get(dia)
+                if jornada is None:
+                    continue
+                if profesional.id in vacaciones_desde and fecha >= vacaciones_desde[profesional.id]:
+                    continue
+                if self.rng.random() < PROB_VACACIONES:
+                    # Recorriendo hacia atrás: las vacaciones terminan hoy y empiezan días antes
+                    desde = fecha - timedelta(days=self.rng.randint(6, 13))
+                    vacaciones_desde[profesional.id] = desde
+                    self._bloqueo(profesional, datetime.combine(desde, time.min), datetime.combine(fecha, time(23, 59)), 'Vacaciones', True)
+                    continue
+
+                inicio_jornada, fin_jornada = jornada
+                ausencia = None
+                if self.rng.random() < PROB_AUSENCIA:
+                    desde = inicio_jornada + self.rng.randrange(0, max(1, fin_jornada - inicio_jornada - 120), intervalo)
+                    ausencia = (desde, desde + self.rng.choice((60, 120, 180)))
+                    self._bloqueo(
+                        profesional, datetime.combine(fecha, a_hora(ausencia[0])),
+                        datetime.combine(fecha, a_hora(ausencia[1])), 'Turno médico',
+                    )
+
+                opciones = (disenos + complementos) if profesional.realiza_color else complementos
+                cursor = inicio_jornada
+                while cursor < fin_jornada:
+                    if ausencia and ausencia[0] <= cursor < ausencia[1]:
+                        cursor = ausencia[1]
+                        continue
+                    nombres = [self._elegir([(n, self.pesos_servicio[n]) for n in opciones])]
+                    if self.rng.random() < PROB_COMPLEMENTO:
+                        extra = self.rng.choice(COMPLEMENTOS)
+                        if extra not in nombres:
+                            nombres.append(extra)
+                    servicios = [self.servicios[n] for n in nombres]
+                    duracion = sum(s.duracion_estimada or 60 for s in servicios)
+                    fin = cursor + duracion
+                    if fin > fin_jornada or (ausencia and cursor < ausencia[1] and fin > ausencia[0]):
+                        cursor += intervalo
+                        continue
+                    if self.rng.random() >= ocupacion:
+                        cursor += intervalo
+                        continue
+
+                    hora = a_hora(cursor)
+                    cliente_id = self.rng.choices(self.clientes_ids, cum_weights=self.pesos_clientes)[0]
+                    if (hora, cliente_id) in ocupados_cliente:
+                        # unique (fecha, hora_inicio, cliente)
+                        cursor += intervalo
+                        continue
+                    ocupados_cliente.add((hora, cliente_id))
+                    pendientes.append(self._turno(fecha, hora, profesional, cliente_id, servicios, duracion))
+                    total += 1
+                    # Siguiente inicio sobre la grilla de la agenda
+                    cursor = -(-fin // intervalo) * intervalo
+                    if total >= self.cantidad_turnos:
+                        break
+                if total >= self.cantidad_turnos:
+                    break
+
+            if len(pendientes) >= self.lote:
+                self._guardar_turnos(pendientes)
+                pendientes = []
+                self.informar(f"Turnos: {total}/{self.cantidad_turnos} (hasta {fecha})")
+            fecha -= timedelta(days=1)
+
+        self._guardar_turnos(pendientes)
+        BloqueoAgenda.objects.bulk_create(self.bloqueos, batch_size=self.lote)
+        self._sumar('bloqueos', len(self.bloqueos))
+        self.informar(f"Turnos: {total} desde {fecha}; bloqueos: {len(self.bloqueos)}")
+
+    def _turno(self, fecha, hora, profesional, cliente_id, servicios, duracion):
+        pasado = (fecha, hora) < (self.hoy, self.ahora.time())
+        estado = self._elegir(ESTADOS_PASADOS if pasado else ESTADOS_FUTUROS)
+        turno = Turno(
+            cliente_id=cliente_id, profesional=profesional, fecha=fecha, hora_inicio=hora,
+            duracion_total=duracion, estado=estado,
+        )
+        turno.hora_fin_calculada = turno.calcular_hora_fin()
+        turno.ocupacion = turno.calcular_ocupacion()
+        if estado == 'esperando_sena':
+            turno.fecha_limite_pago = self.ahora + timedelta(hours=self.config.tiempo_limite_pago_sena)
+        detalles = [
+            DetalleTurno(
+                turno=turno, servicio=servicio, precio_historico=servicio.precio_base,
+                duracion_minutos=servicio.duracion_estimada or 60,
+            )
+            for servicio in servicios
+        ]
+        return turno, detalles
+
+    def _guardar_turnos(self, pendientes):
+        if not pendientes:
+            return
+        turnos = Turno.objects.bulk_create([turno for turno, _ in pendientes], batch_size=self.lote)
+        detalles = DetalleTurno.objects.bulk_create(
+            [detalle for _, detalles in pendientes for detalle in detalles], batch_size=self.lote
+        )
+        notificaciones = [n for n in map(self._notificacion, turnos) if n is not None]
+        with _sin_auto_now_add(Notificacion, 'fecha_envio'):
+            Notificacion.objects.bulk_create(notificaciones, batch_size=self.lote)
+        self._sumar('turnos', len(turnos))
+        self._sumar('detalles', len(detalles))
+        self._sumar('notificaciones', len(notificaciones))
+
+    def _notificacion(self, turno):
+        """Recordatorio o aviso de seña, como los que envía el sistema."""
+        inicio = timezone.make_aware(datetime.combine(turno.fecha, turno.hora_inicio))
+        if turno.estado == 'esperando_sena':
+            tipo, titulo, mensaje = 'alerta', 'Seña pendiente', 'Tu turno espera el comprobante de la seña.'
+            envio = self.ahora - timedelta(hours=self.rng.randint(1, 20))
+        elif turno.estado in ('confirmado', 'realizado', 'ausente') and self.rng.random() < 0.6:
+            tipo, titulo, mensaje = 'recordatorio', 'Recordatorio de turno', f'Te esperamos el {turno.fecha:%d/%m} a las {turno.hora_inicio:%H:%M}.'
+            envio = min(inicio - timedelta(days=1), self.ahora)
+        else:
+            return None
+
+        # Lo viejo está leído; lo reciente, a veces sin leer
+        if envio < self.ahora - timedelta(days=30) or self.rng.random() < 0.6:
+            estado = 'leido'
+        else:
+            estado = self._elegir([('enviado', 3), ('pendiente', 1)])
+        return Notificacion(
+            usuario_id=turno.cliente_id, tipo=tipo, titulo=titulo, mensaje=mensaje, estado=estado,
+            fecha_envio=envio, origen_entidad='turno', origen_id=turno.id,
+        )
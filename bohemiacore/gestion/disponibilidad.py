@@ -0,0 +1,279 @@
+"""
+Motor de disponibilidad de agenda.
+
+Carga UNA sola vez la ocupación de un profesional para un día (turnos activos
++ bloqueos), la convierte en una lista ordenada y fusionada de intervalos
+ocupados y calcula los horarios de inicio libres con un único barrido lineal.
+
+Todos los intervalos se expresan en minutos desde la medianoche (hora local)
+y son semiabiertos: [inicio, fin).
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+import math
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Turno, BloqueoAgenda
+
+
+# Estados en los que un turno ocupa la agenda del profesional
+ESTADOS_OCUPAN_AGENDA = [
+    Turno.Estado.CONFIRMADO,
+    Turno.Estado.ESPERANDO_SENA,
+    Turno.Estado.SOLICITADO,
+]
+
+MINUTOS_DIA = 24 * 60
+
+# Duración asumida para turnos sin detalles cargados
+DURACION_POR_DEFECTO = Turno.DURACION_POR_DEFECTO
+
+
+def a_minutos(hora):
+    """Convierte un objeto time a minutos desde la medianoche."""
+    return hora.hour * 60 + hora.minute
+
+
+def a_hora(minutos):
+    """Convierte minutos desde la medianoche a un objeto time."""
+    minutos = min(minutos, MINUTOS_DIA - 1)
+    return time(minutos // 60, minutos % 60)
+
+
+def fusionar_intervalos(intervalos):
+    """
+    Ordena y fusiona intervalos [inicio, fin) que se solapan o son contiguos.
+    Devuelve una lista de tuplas sin solapamientos, ordenada por inicio.
+    """
+    fusionados = []
+    for inicio, fin in sorted(intervalos):
+        if fin <= inicio:
+            continue
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1][1] = fin
+        else:
+            fusionados.append([inicio, fin])
+    return [(inicio, fin) for inicio, fin in fusionados]
+
+
+def limites_del_dia(fecha):
+    """Devuelve (inicio, fin) del día como datetimes aware en la zona local."""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, timezone.make_aware(datetime.combine(fecha + timedelta(days=1), time.min))
+
+
+def intervalo_turno(turno):
+    """
+    Intervalo [inicio, fin) en minutos que ocupa un turno en su día.
+    Usa la hora de fin persistida; solo los turnos viejos sin backfill
+    (ver comando recalcular_duracion_turnos) la calculan desde sus detalles.
+    """
+    inicio = a_minutos(turno.hora_inicio)
+    if turno.hora_fin_calculada is not None:
+        return inicio, max(a_minutos(turno.hora_fin_calculada), inicio)
+    duracion = sum(d.duracion_minutos for d in turno.detalles.all()) or DURACION_POR_DEFECTO
+    return inicio, min(inicio + duracion, MINUTOS_DIA)
+
+
+def rango_ocupacion(inicio, fin):
+    """
+    Rango [inicio, fin) para consultar las columnas `ocupacion` con `&&`
+    (ocupacion__overlap), resuelto por los índices GiST.
+    Los datetimes naive se interpretan en hora local.
+    """
+    if timezone.is_naive(inicio):
+        inicio = timezone.make_aware(inicio)
+    if timezone.is_naive(fin):
+        fin = timezone.make_aware(fin)
+    return DateTimeTZRange(inicio, fin, '[)')
+
+
+def intervalo_bloqueo(bloqueo, fecha):
+    """
+    Recorta un bloqueo al día `fecha` y lo devuelve en minutos locales.
+    Devuelve None si el bloqueo no afecta ese día.
+    """
+    if bloqueo.bloquea_todo_el_dia:
+        inicio_local = timezone.localtime(bloqueo.fecha_inicio).date() if timezone.is_aware(bloqueo.fecha_inicio) else bloqueo.fecha_inicio.date()
+        fin_local = timezone.localtime(bloqueo.fecha_fin).date() if timezone.is_aware(bloqueo.fecha_fin) else bloqueo.fecha_fin.date()
+        return (0, MINUTOS_DIA) if inicio_local <= fecha <= fin_local else None
+
+    dia_inicio = datetime.combine(fecha, time.min)
+    inicio = timezone.localtime(bloqueo.fecha_inicio).replace(tzinfo=None) if timezone.is_aware(bloqueo.fecha_inicio) else bloqueo.fecha_inicio
+    fin = timezone.localtime(bloqueo.fecha_fin).replace(tzinfo=None) if timezone.is_aware(bloqueo.fecha_fin) else bloqueo.fecha_fin
+
+    inicio = max(inicio, dia_inicio)
+    fin = min(fin, dia_inicio + timedelta(days=1))
+    if fin <= inicio:
+        return None
+    return (
+        int((inicio - dia_inicio).total_seconds() // 60),
+        int(math.ceil((fin - dia_inicio).total_seconds() / 60)),
+    )
+
+
+def minimo_inicio_para(fecha, ahora=None):
+    """
+    Primer minuto del día `fecha` en el que todavía se puede iniciar un turno.
+    Para días futuros es 0; para hoy, el minuto siguiente a la hora actual.
+    Devuelve None si la fecha ya pasó por completo.
+    """
+    ahora = timezone.localtime(ahora or timezone.now())
+    if fecha > ahora.date():
+        return 0
+    if fecha < ahora.date():
+        return None
+    return a_minutos(ahora.time()) + 1
+
+
+class AgendaDia:
+    """
+    Ocupación de un profesional en una fecha, lista para consultas rápidas.
+
+    - `ocupado`: intervalos ocupados, ordenados y fusionados.
+    - `esta_libre(inicio, fin)`: O(log n) con búsqueda binaria.
+    - `inicios_libres(...)`: barrido lineal sobre huecos libres y grilla.
+    """
+
+    def __init__(self, fecha, ocupado=()):
+        self.fecha = fecha
+        self.ocupado = fusionar_intervalos(ocupado)
+        self._inicios = [inicio for inicio, _ in self.ocupado]
+
+    @classmethod
+    def desde_registros(cls, fecha, turnos=(), bloqueos=()):
+        """Construye la agenda a partir de turnos y bloqueos."""
+        ocupado = [intervalo_turno(t) for t in turnos]
+        for bloqueo in bloqueos:
+            rango = intervalo_bloqueo(bloqueo, fecha)
+            if rango:
+                ocupado.append(rango)
+        return cls(fecha, ocupado)
+
+    @classmethod
+    def cargar(cls, profesional, fecha, excluir_turno_id=None):
+        """
+        Carga la agenda de un profesional para un día con una consulta
+        para los turnos y otra para los bloqueos.
+        """
+        turnos = Turno.objects.filter(
+            fecha=fecha,
+            profesional=profesional,
+            estado__in=ESTADOS_OCUPAN_AGENDA
+        )
+        if excluir_turno_id:
+            turnos = turnos.exclude(id=excluir_turno_id)
+
+        bloqueos = BloqueoAgenda.objects.filter(
+            Q(personal=profesional) | Q(personal__isnull=True),
+            ocupacion__overlap=rango_ocupacion(*limites_del_dia(fecha))
+        )
+        return cls.desde_registros(fecha, turnos, bloqueos)
+
+    @classmethod
+    def cargar_rango(cls, profesionales_ids, fechas):
+        """
+        Carga las agendas de varios profesionales en varias fechas con una
+        cantidad fija de consultas (turnos + bloqueos),
+        sin importar cuántos días o profesionales se pidan.
+        Devuelve {(profesional_id, fecha): AgendaDia}.
+        """
+        profesionales_ids = list(set(profesionales_ids))
+        fechas = sorted(set(fechas))
+        if not profesionales_ids or not fechas:
+            return {}
+
+        turnos_por_clave = {}
+        turnos = Turno.objects.filter(
+            fecha__in=fechas,
+            profesional_id__in=profesionales_ids,
+            estado__in=ESTADOS_OCUPAN_AGENDA
+        )
+        for turno in turnos:
+            turnos_por_clave.setdefault((turno.profesional_id, turno.fecha), []).append(turno)
+
+        rango_inicio, _ = limites_del_dia(fechas[0])
+        _, rango_fin = limites_del_dia(fechas[-1])
+        bloqueos_por_personal = {}
+        bloqueos = BloqueoAgenda.objects.filter(
+            Q(personal_id__in=profesionales_ids) | Q(personal__isnull=True),
+            ocupacion__overlap=rango_ocupacion(rango_inicio, rango_fin)
+        )
+        for bloqueo in bloqueos:
+            bloqueos_por_personal.setdefault(bloqueo.personal_id, []).append(bloqueo)
+
+        globales = bloqueos_por_personal.get(None, [])
+        return {
+            (prof_id, fecha): cls.desde_registros(
+                fecha,
+                turnos_por_clave.get((prof_id, fecha), []),
+                bloqueos_por_personal.get(prof_id, []) + globales
+            )
+            for prof_id in profesionales_ids
+            for fecha in fechas
+        }
+
+    def esta_libre(self, inicio, fin):
+        """True si [inicio, fin) no se solapa con ningún intervalo ocupado."""
+        idx = bisect_right(self._inicios, inicio) - 1
+        if idx >= 0 and self.ocupado[idx][1] > inicio:
+            return False
+        siguiente = idx + 1
+        if siguiente < len(self.ocupado) and self.ocupado[siguiente][0] < fin:
+            return False
+        return True
+
+    def huecos(self, desde, hasta):
+        """Intervalos libres dentro de la ventana [desde, hasta)."""
+        libres = []
+        cursor = desde
+        idx = max(bisect_right(self._inicios, desde) - 1, 0)
+        for inicio, fin in self.ocupado[idx:]:
+            if inicio >= hasta:
+                break
+            if fin <= cursor:
+                continue
+            if inicio > cursor:
+                libres.append((cursor, inicio))
+            cursor = max(cursor, fin)
+        if cursor < hasta:
+            libres.append((cursor, hasta))
+        return libres
+
+    def inicios_libres(self, desde, hasta, duracion, intervalo, minimo_inicio=0, validar=None):
+        """
+        Horarios de inicio (en minutos) de la grilla anclada en `desde` con paso
+        `intervalo`, donde entra un turno de `duracion` minutos sin choques.
+
+        `validar(inicio, fin)` es un chequeo opcional extra (ej. equipamiento)
+        que solo se ejecuta sobre los candidatos que ya están libres.
+        """
+        return list(self._iterar_inicios(desde, hasta, duracion, intervalo, minimo_inicio, validar))
+
+    def primer_inicio_libre(self, desde, hasta, duracion, intervalo, minimo_inicio=0, validar=None):
+        """Como inicios_libres, pero se detiene en el primer inicio válido (o None)."""
+        return next(self._iterar_inicios(desde, hasta, duracion, intervalo, minimo_inicio, validar), None)
+
+    def _iterar_inicios(self, desde, hasta, duracion, intervalo, minimo_inicio, validar):
+        for hueco_ini, hueco_fin in self.huecos(desde, hasta):
+            yield from inicios_en_hueco(hueco_ini, hueco_fin, desde, duracion, intervalo, minimo_inicio, validar)
+
+
+def inicios_en_hueco(hueco_ini, hueco_fin, ancla, duracion, intervalo, minimo_inicio=0, validar=None):
+    """
+    Inicios de la grilla (anclada en `ancla`, paso `intervalo`) donde un turno
+    de `duracion` minutos entra en el hueco libre [hueco_ini, hueco_fin).
+    Es un generador: quien solo necesita el primero no recorre el resto.
+    """
+    intervalo = max(int(intervalo or 1), 1)
+    # Primer punto de la grilla dentro del hueco (y no antes de minimo_inicio)
+    piso = max(hueco_ini, minimo_inicio or 0)
+    actual = ancla + max(math.ceil((piso - ancla) / intervalo), 0) * intervalo
+    while actual + duracion <= hueco_fin:
+        if validar is None or validar(actual, actual + duracion):
+            yield actual
+        actual += intervalo
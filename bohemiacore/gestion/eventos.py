@@ -0,0 +1,316 @@
+"""
+Eventos en vivo por usuario (Server-Sent Events).
+
+Publicación, en la misma transacción que el cambio:
+  - una Notificacion nueva genera un evento 'notificacion' para su usuario;
+  - un cambio de estado de un Turno (o un turno nuevo) genera un evento
+    'turno' para el cliente y otro para todo el staff (usuario NULL).
+Cada evento se guarda en EventoUsuario y se anuncia con pg_notify en CANAL,
+con una sola sentencia. NOTIFY es transaccional: Postgres lo entrega recién
+al COMMIT y lo descarta con un ROLLBACK, igual que la fila.
+
+Difusión: cada proceso ASGI abre UNA conexión con LISTEN CANAL (psycopg
+async) mientras tenga suscriptores, y reparte cada aviso a las colas asyncio
+de las conexiones SSE de ese usuario (pub/sub dentro del proceso). Un cambio
+hecho en cualquier worker, job o comando llega a los navegadores conectados
+a cualquier proceso.
+
+Reanudación: EventSource reconecta solo y manda Last-Event-ID (también se
+acepta ?ultimo_id=); se envían los eventos guardados posteriores. Cada vez
+que la conexión LISTEN se (re)establece, las suscripciones se resincronizan
+desde la tabla, así no se pierde lo ocurrido mientras no se escuchaba.
+
+Los eventos se guardan settings.EVENTOS_RETENCION segundos (`manage.py
+purgar_eventos`); cada settings.EVENTOS_LATIDO segundos sin eventos se envía
+un comentario de latido para que proxies y navegadores no corten la conexión.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import timedelta
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import EventoUsuario
+
+logger = logging.getLogger(__name__)
+
+
+CANAL = 'bohemia_eventos'
+
+LATIDO = getattr(settings, 'EVENTOS_LATIDO', 15)
+RETENCION = getattr(settings, 'EVENTOS_RETENCION', 24 * 60 * 60)
+
+# Milisegundos que espera EventSource antes de reconectar
+REINTENTO_MS = 3000
+
+# NOTIFY admite hasta 8000 bytes: un aviso más grande viaja sin datos y el
+# suscriptor lo lee de la tabla
+MAXIMO_AVISO = 7000
+
+# Eventos leídos de la tabla por consulta al reanudar / resincronizar
+LOTE_REANUDACION = 500
+
+# Avisos en espera por conexión; si se llena, se resincroniza desde la tabla
+MAXIMO_COLA = 1000
+
+SQL_PUBLICAR = """
+    WITH nuevos AS (
+        INSERT INTO {tabla} (usuario_id, tipo, datos, creado)
+        SELECT usuario, tipo, datos::jsonb, now()
+        FROM unnest(%(usuarios)s::bigint[], %(tipos)s::text[], %(datos)s::text[]) AS e(usuario, tipo, datos)
+        RETURNING id, usuario_id, tipo, datos
+    )
+    SELECT pg_notify(%(canal)s, CASE
+        WHEN octet_length(aviso::text) <= %(maximo)s THEN aviso::text
+        ELSE (aviso - 'datos')::text
+    END)
+    FROM nuevos, jsonb_build_object('id', id, 'usuario', usuario_id, 'tipo', tipo, 'datos', datos) AS aviso
+"""
+
+
+# ============================================================
+# PUBLICACIÓN
+# ============================================================
+
+def publicar(eventos):
+    """Guarda y anuncia [(usuario_id o None para staff, tipo, datos)] con una sentencia."""
+    if not eventos:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(SQL_PUBLICAR.format(tabla=EventoUsuario._meta.db_table), {
+            'usuarios': [usuario_id for usuario_id, _, _ in eventos],
+            'tipos': [tipo for _, tipo, _ in eventos],
+            # Sin escapes \uXXXX: jsonb los rechaza en bases SQL_ASCII
+            'datos': [json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False) for _, _, datos in eventos],
+            'canal': CANAL,
+            'maximo': MAXIMO_AVISO,
+        })
+
+
+def evento_notificacion(notificacion):
+    # Los mismos campos que el listado compacto (?campos=compacto)
+    return (notificacion.usuario_id, 'notificacion', {
+        'id': notificacion.id,
+        'titulo': notificacion.titulo,
+        'tipo': notificacion.tipo,
+        'estado': notificacion.estado,
+        'canal': notificacion.canal,
+        'fecha_envio': notificacion.fecha_envio,
+    })
+
+
+def eventos_turno(turno_id, cliente_id, estado_anterior, estado, fecha, hora_inicio):
+    """Para el cliente (Cliente usa al usuario como PK) y para el staff."""
+    datos = {
+        'id': turno_id,
+        'estado': estado,
+        'estado_anterior': estado_anterior,
+        'fecha': fecha,
+        'hora_inicio': hora_inicio,
+    }
+    return [(cliente_id, 'turno', datos), (None, 'turno', datos)]
+
+
+def publicar_notificaciones(notificaciones):
+    """Para las creadas con bulk_create, que no disparan post_save."""
+    publicar([evento_notificacion(notificacion) for notificacion in notificaciones])
+
+
+def purgar(antes=None):
+    """Borra los eventos más viejos que RETENCION. Devuelve cuántos borró."""
+    antes = antes or timezone.now() - timedelta(seconds=RETENCION)
+    borrados, _ = EventoUsuario.objects.filter(creado__lt=antes).delete()
+    logger.info(f"[EVENTOS] {borrados} eventos purgados")
+    return borrados
+
+
+# ============================================================
+# LECTURA DESDE LA TABLA (REANUDACIÓN)
+# ============================================================
+
+def _filtro_destinatario(usuario_id, es_staff):
+    return Q(usuario_id=usuario_id) | Q(usuario__isnull=True) if es_staff else Q(usuario_id=usuario_id)
+
+
+def ultimo_id(usuario_id, es_staff):
+    """Id del último evento del usuario (0 si no hay): punto de partida de una conexión nueva."""
+    return EventoUsuario.objects.filter(
+        _filtro_destinatario(usuario_id, es_staff)
+    ).aggregate(ultimo=Max('id'))['ultimo'] or 0
+
+
+def eventos_desde(usuario_id, es_staff, desde_id, limite=LOTE_REANUDACION):
+    """Avisos guardados posteriores a `desde_id`, en orden."""
+    return [
+        {'id': evento_id, 'usuario': destinatario, 'tipo': tipo, 'datos': datos}
+        for evento_id, destinatario, tipo, datos in EventoUsuario.objects.filter(
+            _filtro_destinatario(usuario_id, es_staff), id__gt=desde_id
+        ).order_by('id').values_list('id', 'usuario_id', 'tipo', 'datos')[:limite]
+    ]
+
+
+# ============================================================
+# DIFUSIÓN EN EL PROCESO (LISTEN)
+# ============================================================
+
+# Aviso interno: leer de la tabla lo que pudo perderse
+RESINCRONIZAR = {'resincronizar': True}
+
+
+class Suscripcion:
+    """Cola de avisos de una conexión SSE."""
+
+    def __init__(self, usuario_id, es_staff):
+        self.usuario_id = usuario_id
+        self.es_staff = es_staff
+        self.cola = asyncio.Queue(maxsize=MAXIMO_COLA)
+        self.desbordada = False
+
+    def recibe(self, aviso):
+        return aviso['usuario'] == self.usuario_id or (aviso['usuario'] is None and self.es_staff)
+
+    def entregar(self, aviso):
+        try:
+            self.cola.put_nowait(aviso)
+        except asyncio.QueueFull:
+            self.desbordada = True
+
+
+class Difusor:
+    """
+    Una conexión LISTEN por proceso (y por event loop), abierta mientras haya
+    suscripciones. Reintenta con backoff si la base se cae.
+    """
+
+    def __init__(self):
+        self.suscripciones = set()
+        self.escuchando = None
+        self._tarea = None
+        self._loop = None
+
+    def suscribir(self, usuario_id, es_staff):
+        suscripcion = Suscripcion(usuario_id, es_staff)
+        self.suscripciones.add(suscripcion)
+        self._asegurar_escucha()
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        self.suscripciones.discard(suscripcion)
+
+    def repartir(self, aviso):
+        for suscripcion in list(self.suscripciones):
+            if suscripcion.recibe(aviso):
+                suscripcion.entregar(aviso)
+
+    def resincronizar(self):
+        for suscripcion in list(self.suscripciones):
+            suscripcion.entregar(RESINCRONIZAR)
+
+    async def detener(self):
+        """Cancela la escucha (al cerrar el proceso o en tests)."""
+        if self._tarea is not None and not self._tarea.done():
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+        self._tarea = None
+
+    def _asegurar_escucha(self):
+        loop = asyncio.get_running_loop()
+        if self._tarea is None or self._tarea.done() or self._loop is not loop:
+            self._loop = loop
+            self.escuchando = asyncio.Event()
+            self._tarea = loop.create_task(self._escuchar())
+
+    @staticmethod
+    def _parametros():
+        # Los de la conexión de Django, sin los adaptadores propios del backend
+        parametros = connection.get_connection_params()
+        for clave in ('cursor_factory', 'context', 'prepare_threshold'):
+            parametros.pop(clave, None)
+        return parametros
+
+    async def _escuchar(self):
+        espera = 1
+        while self.suscripciones:
+            try:
+                async with await psycopg.AsyncConnection.connect(**self._parametros(), autocommit=True) as conexion:
+                    await conexion.execute(f'LISTEN {CANAL}')
+                    self.escuchando.set()
+                    espera = 1
+                    # Lo confirmado antes del LISTEN (o durante una caída) se lee de la tabla
+                    self.resincronizar()
+                    while self.suscripciones:
+                        async for notificacion in conexion.notifies(timeout=LATIDO):
+                            self.repartir(json.loads(notificacion.payload))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.escuchando.clear()
+                logger.warning(f"[EVENTOS] Conexión LISTEN caída, reintento en {espera}s: {e}")
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, 30)
+        self.escuchando.clear()
+
+
+difusor = Difusor()
+
+
+# ============================================================
+# FLUJO SSE DE UNA CONEXIÓN
+# ============================================================
+
+def formato_sse(aviso):
+    datos = json.dumps(aviso['datos'], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {aviso['id']}\nevent: {aviso['tipo']}\ndata: {datos}\n\n"
+
+
+async def flujo(usuario_id, es_staff, desde_id=None):
+    """
+    Generador asíncrono del cuerpo SSE: eventos pendientes desde `desde_id`
+    (o solo los nuevos si es None), luego los avisos en vivo y latidos.
+    """
+    suscripcion = difusor.suscribir(usuario_id, es_staff)
+    # Ids ya enviados: un aviso en vivo puede llegar también por una resincronización
+    enviados = deque(maxlen=MAXIMO_COLA)
+    try:
+        yield f"retry: {REINTENTO_MS}\n\n"
+        if desde_id is None:
+            desde_id = await sync_to_async(ultimo_id)(usuario_id, es_staff)
+        pendientes = await sync_to_async(eventos_desde)(usuario_id, es_staff, desde_id)
+
+        while True:
+            for aviso in pendientes:
+                if aviso['id'] in enviados:
+                    continue
+                enviados.append(aviso['id'])
+                desde_id = max(desde_id, aviso['id'])
+                yield formato_sse(aviso)
+            if len(pendientes) >= LOTE_REANUDACION:
+                # Reanudación larga: el resto en la próxima vuelta
+                pendientes = await sync_to_async(eventos_desde)(usuario_id, es_staff, desde_id)
+                continue
+
+            try:
+                aviso = await asyncio.wait_for(suscripcion.cola.get(), timeout=LATIDO)
+            except asyncio.TimeoutError:
+                yield ": latido\n\n"
+                pendientes = []
+                continue
+
+            if aviso is RESINCRONIZAR or suscripcion.desbordada or 'datos' not in aviso:
+                suscripcion.desbordada = False
+                pendientes = await sync_to_async(eventos_desde)(usuario_id, es_staff, desde_id)
+            else:
+                pendientes = [aviso]
+    finally:
+        difusor.desuscribir(suscripcion)
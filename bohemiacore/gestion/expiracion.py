@@ -0,0 +1,136 @@
+"""
+Expiración de turnos pendientes.
+
+Cancela, con UN UPDATE por lote, los turnos SOLICITADO / ESPERANDO_SENA que:
+  - ya pasaron su fecha y hora de inicio sin confirmarse, o
+  - están esperando seña y venció su fecha_limite_pago.
+
+Reemplaza a la auto-cancelación que corría en cada GET /turnos/ (un .save()
+por turno, con todas sus señales). Como el UPDATE no dispara señales, acá
+mismo se crean las notificaciones (bulk_create), se actualizan los contadores
+por estado y los resúmenes diarios, se publican los eventos en vivo y se invalida el cache de disponibilidad de las agendas liberadas.
+
+Lo ejecuta el comando `manage.py expirar_turnos` (una vez o con --loop).
+"""
+import logging
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Turno, Notificacion
+from . import cache_disponibilidad, contadores, analitica, eventos
+
+logger = logging.getLogger(__name__)
+
+
+LOTE_POR_DEFECTO = 500
+
+# Lote de turnos vencidos, bloqueados con SKIP LOCKED para que dos barridos
+# simultáneos (o una reserva en curso) no se pisen. La comparación de fila
+# (fecha, hora_inicio) < (hoy, ahora) usa el índice (estado, fecha, hora_inicio).
+# Devuelve también el estado previo para descontarlo de los contadores.
+SQL_EXPIRAR = """
+    UPDATE {tabla} AS t
+    SET estado = %(cancelado)s
+    FROM (
+        SELECT id, estado FROM {tabla}
+        WHERE estado IN (%(solicitado)s, %(esperando_sena)s)
+          AND (
+                (fecha, hora_inicio) < (%(hoy)s, %(hora)s)
+             OR (estado = %(esperando_sena)s AND fecha_limite_pago < %(ahora)s)
+          )
+        ORDER BY fecha, hora_inicio
+        LIMIT %(lote)s
+        FOR UPDATE SKIP LOCKED
+    ) AS previo
+    WHERE t.id = previo.id
+    RETURNING t.id, t.cliente_id, t.profesional_id, t.fecha, t.hora_inicio, t.fecha_limite_pago, previo.estado
+"""
+
+
+def _notificacion_expiracion(turno_id, usuario_id, fecha, hora_inicio, fecha_limite_pago, ahora):
+    inicio = datetime.combine(fecha, hora_inicio).strftime("%d/%m/%Y %H:%M")
+    if fecha_limite_pago and fecha_limite_pago < ahora and (fecha, hora_inicio) >= (ahora.date(), ahora.time()):
+        mensaje = (
+            f'Tu turno del {inicio} ha sido cancelado automáticamente porque venció '
+            f'el plazo para enviar la seña.'
+        )
+    else:
+        mensaje = (
+            f'Tu turno del {inicio} ha sido cancelado automáticamente porque pasó '
+            f'la fecha sin confirmación.'
+        )
+    return Notificacion(
+        usuario_id=usuario_id,
+        tipo='alerta',
+        canal='app',
+        titulo='Turno Cancelado - Expiración de plazo',
+        mensaje=mensaje,
+        estado='pendiente',
+        origen_entidad='Turno',
+        origen_id=turno_id,
+    )
+
+
+def expirar_lote(ahora=None, lote=LOTE_POR_DEFECTO):
+    """Expira hasta `lote` turnos. Devuelve cuántos se cancelaron."""
+    ahora = timezone.localtime(ahora or timezone.now())
+    parametros = {
+        'cancelado': Turno.Estado.CANCELADO,
+        'solicitado': Turno.Estado.SOLICITADO,
+        'esperando_sena': Turno.Estado.ESPERANDO_SENA,
+        'hoy': ahora.date(),
+        'hora': ahora.time().replace(microsecond=0),
+        'ahora': ahora,
+        'lote': lote,
+    }
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(SQL_EXPIRAR.format(tabla=Turno._meta.db_table), parametros)
+            filas = cursor.fetchall()
+
+        if not filas:
+            return 0
+
+        # Cliente usa al usuario como PK: cliente_id es el id del usuario
+        notificaciones = Notificacion.objects.bulk_create([
+            _notificacion_expiracion(turno_id, cliente_id, fecha, hora_inicio, fecha_limite_pago, ahora)
+            for turno_id, cliente_id, _, fecha, hora_inicio, fecha_limite_pago, _ in filas
+        ])
+
+        avisos = [eventos.evento_notificacion(notificacion) for notificacion in notificaciones]
+        for turno_id, cliente_id, _, fecha, hora_inicio, _, estado_previo in filas:
+            avisos += eventos.eventos_turno(turno_id, cliente_id, estado_previo, Turno.Estado.CANCELADO, fecha, hora_inicio)
+        eventos.publicar(avisos)
+
+        cambios = {}
+        for _, _, _, fecha, _, _, estado_previo in filas:
+            contadores.diferencias((str(fecha), estado_previo), (str(fecha), Turno.Estado.CANCELADO), cambios)
+        contadores.sumar(cambios)
+
+        resumen = analitica.Aportes()
+        for _, _, profesional_id, fecha, _, _, _ in filas:
+            resumen.sumar_turno(fecha, profesional_id, Turno.Estado.CANCELADO, 0, ())
+        analitica.aplicar(resumen)
+
+        ambitos = set()
+        for _, _, profesional_id, fecha, _, _, _ in filas:
+            ambitos.add(cache_disponibilidad.ambito_dia(fecha))
+            if profesional_id:
+                ambitos.add(cache_disponibilidad.ambito_agenda(profesional_id, fecha))
+        cache_disponibilidad.invalidar_al_confirmar(*ambitos)
+
+    logger.info(f"[EXPIRACION] {len(filas)} turnos cancelados por expiración")
+    return len(filas)
+
+
+def expirar_turnos(ahora=None, lote=LOTE_POR_DEFECTO):
+    """Expira todos los turnos vencidos, lote por lote. Devuelve el total."""
+    total = 0
+    while True:
+        cancelados = expirar_lote(ahora, lote)
+        total += cancelados
+        if cancelados < lote:
+            return total
@@ -0,0 +1,214 @@
+import json
+import random
+import statistics
+import sys
+import time as reloj
+from datetime import time, timedelta
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from usuarios.models import Usuario
+from gestion import cache_disponibilidad
+from gestion.datos_sinteticos import GeneradorDatos, invalidar_caches
+from gestion.models import (
+    Turno, DetalleTurno, BloqueoAgenda, Notificacion, DiagnosticoCapilar, HorarioLaboral,
+    ResumenDiario, ResumenServicioDiario,
+)
+from gestion.motor_diagnostico import MotorDiagnostico, evaluar
+from gestion.views import TurnoViewSet, AdminDashboardStatsView, ReporteResumenView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide disponibilidad, validación de slots, dashboard, reportes, listado de turnos y motor de diagnóstico '
+        'sobre datos sintéticos de distintos tamaños (los datos se descartan); salida en JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, nargs='+', default=[10000, 50000, 200000], help='Tamaños a medir')
+        parser.add_argument('--personal', type=int, default=12, help='Profesionales (default 12)')
+        parser.add_argument('--seed', type=int, default=0, help='Semilla de los datos y de las muestras')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Corridas por medición (default 5)')
+        parser.add_argument('--muestras', type=int, default=200, help='Llamadas a _validar_slot_libre por corrida (default 200)')
+        parser.add_argument('--etiqueta', default='', help='Versión o nombre de la corrida (ej. v1.4.0)')
+        parser.add_argument('--salida', help='Archivo JSON de salida (por defecto, stdout)')
+
+    def handle(self, *args, **options):
+        # Con el JSON en stdout, el progreso va a stderr
+        self.progreso = self.stderr if not options['salida'] else self.stdout
+        resultado = {
+            'etiqueta': options['etiqueta'],
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'django': django.get_version(),
+            'python': sys.version.split()[0],
+            'semilla': options['seed'],
+            'repeticiones': options['repeticiones'],
+            'escalas': [],
+        }
+        for turnos in sorted(options['turnos']):
+            try:
+                with transaction.atomic():
+                    resultado['escalas'].append(self._medir_escala(turnos, options))
+                    raise Rollback()
+            except Rollback:
+                pass
+            finally:
+                # Los caches se armaron con datos que ya no existen
+                invalidar_caches()
+
+        texto = json.dumps(resultado, indent=2, sort_keys=True, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Resultados en {options['salida']}"))
+        else:
+            self.stdout.write(texto)
+
+    def _medir_escala(self, turnos, options):
+        clientes = max(100, turnos // 10)
+        self.progreso.write(f"== {turnos} turnos, {clientes} clientes, {options['personal']} profesionales")
+        inicio = reloj.perf_counter()
+        generador = GeneradorDatos(
+            clientes=clientes, turnos=turnos, personal=options['personal'], semilla=options['seed'],
+            informar=lambda mensaje: self.progreso.write(f"  {mensaje}"),
+        )
+        creados = generador.generar()
+        segundos_generacion = reloj.perf_counter() - inicio
+
+        # Estadísticas al día para que los planes sean los de una base con historia
+        with connection.cursor() as cursor:
+            for modelo in (
+                Turno, DetalleTurno, BloqueoAgenda, Notificacion, DiagnosticoCapilar, HorarioLaboral,
+                ResumenDiario, ResumenServicioDiario,
+            ):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(modelo._meta.db_table)}')
+
+        self.rng = random.Random(options['seed'])
+        self.repeticiones = options['repeticiones']
+        mediciones = {}
+        for nombre, medicion in self._mediciones(generador, options['muestras']):
+            mediciones[nombre] = medicion()
+            self.progreso.write(
+                f"  {nombre:<32} {mediciones[nombre]['ms_mediana']:>9.1f} ms  "
+                f"{mediciones[nombre]['consultas']:>4} consultas"
+            )
+        return {
+            'turnos': turnos,
+            'clientes': clientes,
+            'personal': options['personal'],
+            'creados': creados,
+            'segundos_generacion': round(segundos_generacion, 1),
+            'mediciones': mediciones,
+        }
+
+    def _cronometrar(self, funcion, antes=None, **extra):
+        """Mejor, mediana y peor de N corridas; consultas SQL de la última."""
+        tiempos = []
+        for _ in range(self.repeticiones):
+            if antes:
+                antes()
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = reloj.perf_counter()
+                funcion()
+                tiempos.append((reloj.perf_counter() - inicio) * 1000)
+        return {
+            'ms_min': round(min(tiempos), 2),
+            'ms_mediana': round(statistics.median(tiempos), 2),
+            'ms_max': round(max(tiempos), 2),
+            'consultas': len(consultas),
+            **extra,
+        }
+
+    def _mediciones(self, generador, muestras):
+        """(nombre, función que mide) de cada camino medido."""
+        factory = APIRequestFactory()
+        staff = generador.usuarios_staff[0]
+        # El cliente con más turnos: el peor caso de "mis turnos"
+        frecuente = Turno.objects.values('cliente').annotate(n=Count('id')).order_by('-n').first()
+        cliente = Usuario.objects.get(pk=frecuente['cliente'])
+        servicio = generador.servicios['Color global']
+
+        def pedir(vista, usuario, ruta, **params):
+            def ejecutar():
+                request = factory.get(ruta, params)
+                force_authenticate(request, user=usuario)
+                respuesta = vista(request)
+                respuesta.render()
+                assert respuesta.status_code == 200, respuesta.content[:200]
+            return ejecutar
+
+        def sin_cache():
+            # Fuerza el recálculo de agendas y bloques (versiones nuevas, nada se borra)
+            cache_disponibilidad.invalidar('global')
+
+        disponibilidad = pedir(
+            TurnoViewSet.as_view({'get': 'consultar_disponibilidad'}), cliente,
+            '/api/gestion/turnos/consultar_disponibilidad/', servicio_id=servicio.id, dias=7,
+        )
+        listado = TurnoViewSet.as_view({'get': 'list'})
+
+        # Muestras fijas para todas las corridas: slots en los próximos 30 días
+        hoy = timezone.localdate()
+        profesionales = [p for p in generador.personal if p.realiza_color]
+        slots = [
+            (
+                hoy + timedelta(days=self.rng.randint(1, 30)),
+                time(self.rng.randint(8, 18), self.rng.choice((0, 30))),
+                self.rng.choice(profesionales),
+            )
+            for _ in range(muestras)
+        ]
+        vista_turnos = TurnoViewSet()
+
+        def validar_slots():
+            for fecha, hora, profesional in slots:
+                vista_turnos._validar_slot_libre(fecha, hora, profesional, servicio.duracion_estimada, [servicio.id])
+
+        diagnosticos = list(
+            DiagnosticoCapilar.objects.select_related(
+                'tipo_cabello', 'grosor_cabello', 'porosidad_cabello', 'cuero_cabelludo', 'estado_general'
+            )[:1000]
+        )
+
+        def evaluar_diagnosticos():
+            for diagnostico in diagnosticos:
+                evaluar(diagnostico)
+
+        return (
+            ('consultar_disponibilidad_frio', lambda: self._cronometrar(disponibilidad, antes=sin_cache)),
+            ('consultar_disponibilidad_cache', lambda: self._cronometrar(disponibilidad)),
+            ('validar_slot_libre', lambda: self._cronometrar(validar_slots, llamadas=len(slots))),
+            ('dashboard_admin', lambda: self._cronometrar(
+                pedir(AdminDashboardStatsView.as_view(), staff, '/api/gestion/admin-dashboard/stats/')
+            )),
+            ('reporte_resumen_anual', lambda: self._cronometrar(
+                pedir(
+                    ReporteResumenView.as_view(), staff, '/api/gestion/reportes/resumen/',
+                    desde=(hoy - timedelta(days=365)).isoformat(), hasta=hoy.isoformat(),
+                )
+            )),
+            ('reporte_por_servicio_anual', lambda: self._cronometrar(
+                pedir(
+                    ReporteResumenView.as_view(), staff, '/api/gestion/reportes/resumen/',
+                    desde=(hoy - timedelta(days=365)).isoformat(), hasta=hoy.isoformat(), agrupar='servicio',
+                )
+            )),
+            ('turnos_listado_staff', lambda: self._cronometrar(
+                pedir(listado, staff, '/api/gestion/turnos/')
+            )),
+            ('turnos_listado_cliente_frecuente', lambda: self._cronometrar(
+                pedir(listado, cliente, '/api/gestion/turnos/', desde=(hoy - timedelta(days=3650)).isoformat())
+            )),
+            ('motor_diagnostico_compilar', lambda: self._cronometrar(MotorDiagnostico.compilar)),
+            ('motor_diagnostico_evaluar', lambda: self._cronometrar(evaluar_diagnosticos, llamadas=len(diagnosticos))),
+        )
@@ -0,0 +1,89 @@
+import time as reloj
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from usuarios.models import Usuario, Cliente
+from gestion.models import Turno, DetalleTurno, Servicio, Personal
+from gestion.serializers import TurnoSerializer, TurnoListSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compara el costo por fila de TurnoSerializer y TurnoListSerializer (los datos se descartan al terminar)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--turnos', type=int, nargs='+', default=[500, 2000, 5000], help='Tamaños de listado a medir')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Corridas por medición (se toma la mejor)')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._medir(options['turnos'], options['repeticiones'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def _crear_turnos(self, lote, cantidad, servicios, profesional):
+        # Un cliente por cada 50 turnos, cada uno en un día distinto (unique fecha/hora/cliente)
+        hoy = timezone.localdate()
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(email=f'benchmark{lote}_{i}@bench.local', first_name='Bench', last_name=str(i))
+            for i in range(cantidad // 50 + 1)
+        ])
+        clientes = Cliente.objects.bulk_create([Cliente(usuario=usuario) for usuario in usuarios])
+        turnos = Turno.objects.bulk_create([
+            Turno(
+                cliente=clientes[i // 50],
+                profesional=profesional,
+                fecha=hoy + timedelta(days=(i % 50) - 25),
+                hora_inicio=time(9 + i % 8),
+                estado='confirmado' if i % 3 else 'solicitado',
+            )
+            for i in range(cantidad)
+        ], batch_size=1000)
+        DetalleTurno.objects.bulk_create([
+            DetalleTurno(turno=turno, servicio=servicio, precio_historico=0, duracion_minutos=30)
+            for turno in turnos
+            for servicio in servicios[:1 + turno.id % len(servicios)]
+        ], batch_size=1000)
+        return [turno.id for turno in turnos]
+
+    def _medir_serializer(self, serializer_class, queryset, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            with CaptureQueriesContext(connection) as consultas:
+                inicio = reloj.perf_counter()
+                filas = len(serializer_class(queryset.all(), many=True).data)
+                segundos = reloj.perf_counter() - inicio
+            if mejor is None or segundos < mejor[0]:
+                mejor = (segundos, len(consultas), filas)
+        return mejor
+
+    def _medir(self, tamanios, repeticiones):
+        servicios = [Servicio.objects.create(nombre=f'Benchmark {i}', duracion_estimada=30) for i in range(3)]
+        profesional = Personal.objects.create(nombre='Bench', apellido='Mark', rol='asistente')
+
+        self.stdout.write(f"{'turnos':>8} | {'serializer':<20} | {'consultas':>9} | {'total ms':>9} | {'µs/fila':>8}")
+        creados = []
+        for lote, cantidad in enumerate(sorted(tamanios)):
+            creados += self._crear_turnos(lote, cantidad - len(creados), servicios, profesional)
+            base = Turno.objects.filter(id__in=creados).order_by('-fecha', '-hora_inicio')
+
+            mediciones = (
+                # Queryset y serializer que usaba el listado antes
+                ('TurnoSerializer', TurnoSerializer, base.prefetch_related('detalles__servicio', 'cliente__usuario')),
+                ('TurnoListSerializer', TurnoListSerializer,
+                 TurnoListSerializer.preparar_queryset(base.prefetch_related('detalles__servicio'))),
+            )
+            for nombre, serializer_class, queryset in mediciones:
+                segundos, consultas, filas = self._medir_serializer(serializer_class, queryset, repeticiones)
+                self.stdout.write(
+                    f"{filas:>8} | {nombre:<20} | {consultas:>9} | {segundos * 1000:>9.1f} | {segundos * 1e6 / filas:>8.0f}"
+                )
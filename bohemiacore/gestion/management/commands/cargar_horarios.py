@@ -58,8 +58,10 @@ class Command(BaseCommand):
         ]
 
         for data in horarios_data:
+            # Horario general del salón (sin profesional asignado)
             horario, created = HorarioLaboral.objects.update_or_create(
-                dia=data['dia'],
+                personal=None,
+                dia_semana=data['dia'],
                 defaults={
                     'hora_inicio': data['inicio'],
                     'hora_fin': data['fin'],
@@ -67,9 +69,9 @@ class Command(BaseCommand):
                 }
             )
             action = "Creado" if created else "Actualizado"
-            self.stdout.write(f"- {horario.get_dia_display()}: {action}")
+            self.stdout.write(f"- {horario.get_dia_semana_display()}: {action}")
 
         # Desactivar Domingo explícitamente si existía
-        HorarioLaboral.objects.filter(dia=DiasSemana.DOMINGO).update(activo=False)
+        HorarioLaboral.objects.filter(personal=None, dia_semana=DiasSemana.DOMINGO).update(activo=False)
 
         self.stdout.write(self.style.SUCCESS('¡Horarios cargados exitosamente!'))
\ No newline at end of file
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion.expiracion import expirar_turnos, LOTE_POR_DEFECTO
+
+
+class Command(BaseCommand):
+    help = 'Cancela los turnos pendientes vencidos (fecha pasada o plazo de seña vencido) por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO, help=f'Turnos por UPDATE (default {LOTE_POR_DEFECTO})')
+        parser.add_argument('--loop', action='store_true', help='Queda corriendo y repite el barrido cada --intervalo segundos')
+        parser.add_argument('--intervalo', type=int, default=60, help='Segundos entre barridos con --loop (default 60)')
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            total = expirar_turnos(lote=options['lote'])
+            self.stdout.write(self.style.SUCCESS(f"¡Listo! {total} turnos expirados."))
+            return
+
+        self.stdout.write(f"Barrido de expiración cada {options['intervalo']}s (Ctrl+C para salir)...")
+        try:
+            while True:
+                # Conexiones caídas o viejas se reemplazan entre barridos
+                close_old_connections()
+                try:
+                    total = expirar_turnos(lote=options['lote'])
+                    if total:
+                        self.stdout.write(f"  {total} turnos expirados")
+                except Exception as e:
+                    # Un error puntual (ej. la base reiniciando) no detiene el scheduler
+                    self.stderr.write(f"  Error en el barrido: {e}")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("Barrido detenido.")
@@ -0,0 +1,50 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from gestion.tareas import procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Worker de tareas en segundo plano: toma Jobs pendientes con FOR UPDATE SKIP LOCKED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=1, help='Workers en paralelo en este proceso (default 1)')
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera cuando la cola está vacía (default 1)')
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            total = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f"¡Listo! {total} jobs procesados."))
+            return
+
+        detener = threading.Event()
+
+        def worker(numero):
+            while not detener.is_set():
+                close_old_connections()
+                try:
+                    procesados = procesar_pendientes(maximo=100)
+                except Exception as e:
+                    # Un error de conexión no mata al worker: se reintenta en el próximo ciclo
+                    self.stderr.write(f"  [worker {numero}] Error: {e}")
+                    procesados = 0
+                if not procesados:
+                    detener.wait(options['intervalo'])
+            connection.close()
+
+        hilos = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(max(options['hilos'], 1))]
+        self.stdout.write(f"Procesando jobs con {len(hilos)} worker(s) (Ctrl+C para salir)...")
+        for hilo in hilos:
+            hilo.start()
+        try:
+            while any(hilo.is_alive() for hilo in hilos):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            detener.set()
+            for hilo in hilos:
+                hilo.join()
+            self.stdout.write("Workers detenidos.")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion.eventos import purgar, RETENCION
+
+
+class Command(BaseCommand):
+    help = 'Borra los eventos en vivo (SSE) más viejos que settings.EVENTOS_RETENCION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Queda corriendo y purga cada --intervalo segundos')
+        parser.add_argument(
+            '--intervalo', type=int, default=60 * 60,
+            help='Segundos entre purgas con --loop (default 3600)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            borrados = purgar()
+            self.stdout.write(self.style.SUCCESS(f"¡Listo! {borrados} eventos de más de {RETENCION}s borrados."))
+            return
+
+        self.stdout.write(f"Purga de eventos cada {options['intervalo']}s (Ctrl+C para salir)...")
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    self.stdout.write(f"  {purgar()} eventos borrados")
+                except Exception as e:
+                    # Un error puntual no detiene el scheduler; la próxima purga borra lo pendiente
+                    self.stderr.write(f"  Error al purgar: {e}")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("Purga detenida.")
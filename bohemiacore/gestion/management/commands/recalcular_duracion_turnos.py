@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+
+from gestion.models import Turno
+
+
+class Command(BaseCommand):
+    help = 'Recalcula duracion_total, hora_fin_calculada y ocupacion de los turnos a partir de sus detalles (por lotes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Turnos por lote (default 1000)')
+        parser.add_argument(
+            '--solo-pendientes', action='store_true',
+            help='Procesa solo turnos sin hora_fin_calculada u ocupacion'
+        )
+
+    def handle(self, *args, **options):
+        tamano_lote = options['lote']
+        turnos = Turno.objects.all()
+        if options['solo_pendientes']:
+            turnos = turnos.filter(Q(hora_fin_calculada__isnull=True) | Q(ocupacion__isnull=True))
+
+        self.stdout.write("Recalculando duración de turnos...")
+
+        # Paginación por clave (id > último procesado): cada lote es una consulta
+        # acotada por el índice de la PK, sin OFFSET que se degrade con el volumen
+        ultimo_id = 0
+        procesados = 0
+        actualizados = 0
+        while True:
+            lote = list(
+                turnos.filter(id__gt=ultimo_id)
+                .order_by('id')
+                .annotate(suma_detalles=Coalesce(Sum('detalles__duracion_minutos'), 0))
+                .only('id', 'fecha', 'hora_inicio', 'duracion_total', 'hora_fin_calculada', 'ocupacion')[:tamano_lote]
+            )
+            if not lote:
+                break
+
+            cambiados = []
+            for turno in lote:
+                hora_fin = turno.calcular_hora_fin(turno.suma_detalles)
+                ocupacion = turno.calcular_ocupacion(turno.suma_detalles)
+                if (turno.duracion_total != turno.suma_detalles or turno.hora_fin_calculada != hora_fin
+                        or turno.ocupacion != ocupacion):
+                    turno.duracion_total = turno.suma_detalles
+                    turno.hora_fin_calculada = hora_fin
+                    turno.ocupacion = ocupacion
+                    cambiados.append(turno)
+
+            # bulk_update no dispara señales: no se reenvían notificaciones de estado
+            with transaction.atomic():
+                Turno.objects.bulk_update(cambiados, ['duracion_total', 'hora_fin_calculada', 'ocupacion'])
+
+            ultimo_id = lote[-1].id
+            procesados += len(lote)
+            actualizados += len(cambiados)
+            self.stdout.write(f"  {procesados} turnos revisados ({actualizados} actualizados)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"¡Listo! {actualizados} de {procesados} turnos actualizados."
+        ))
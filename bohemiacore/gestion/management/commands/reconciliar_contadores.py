@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from gestion.contadores import reconciliar, ANTIGUEDAD_MAXIMA
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero los contadores de turnos por estado que usa el tablero del admin'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Queda corriendo y reconcilia cada --intervalo segundos')
+        parser.add_argument(
+            '--intervalo', type=int, default=ANTIGUEDAD_MAXIMA // 2,
+            help=f'Segundos entre reconciliaciones con --loop (default {ANTIGUEDAD_MAXIMA // 2}, la mitad de la antigüedad máxima)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            total = reconciliar()
+            self.stdout.write(self.style.SUCCESS(f"¡Listo! Contadores reconstruidos ({total} turnos)."))
+            return
+
+        self.stdout.write(f"Reconciliación de contadores cada {options['intervalo']}s (Ctrl+C para salir)...")
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    total = reconciliar()
+                    self.stdout.write(f"  {total} turnos contados")
+                except Exception as e:
+                    # Un error puntual no detiene el scheduler; el tablero vuelve a contar si se vencen
+                    self.stderr.write(f"  Error al reconciliar: {e}")
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("Reconciliación detenida.")
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from gestion.analitica import reconstruir
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Fecha inválida '{valor}'. Use AAAA-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye los resúmenes diarios de turnos, ingresos y ocupación desde Turno y DetalleTurno '
+        '(por defecto, toda la historia)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primera fecha (AAAA-MM-DD); por defecto, el primer turno terminado')
+        parser.add_argument('--hasta', help='Última fecha (AAAA-MM-DD); por defecto, hoy o el último turno terminado')
+        parser.add_argument('--dias', type=int, help='Solo los últimos N días hasta hoy (ignora --desde/--hasta)')
+
+    def handle(self, *args, **options):
+        desde = _fecha(options['desde']) if options['desde'] else None
+        hasta = _fecha(options['hasta']) if options['hasta'] else None
+        if options['dias'] is not None:
+            if options['dias'] < 1:
+                raise CommandError('--dias debe ser al menos 1.')
+            hasta = timezone.localdate()
+            desde = hasta - timedelta(days=options['dias'] - 1)
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        filas = reconstruir(desde, hasta, informar=lambda mensaje: self.stdout.write(f"  {mensaje}"))
+        self.stdout.write(self.style.SUCCESS(f"¡Listo! {filas} resúmenes diarios reconstruidos."))
@@ -0,0 +1,49 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from gestion.rediagnostico import rediagnosticar, LOTE_POR_DEFECTO
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a correr el motor de diagnóstico sobre todos los clientes con perfil capilar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Omite clientes con un diagnóstico desde esta fecha (YYYY-MM-DD o ISO); sirve para retomar')
+        parser.add_argument('--workers', type=int, default=1, help='Procesos evaluando en paralelo (default 1)')
+        parser.add_argument('--lote', type=int, default=LOTE_POR_DEFECTO, help=f'Clientes por lote (default {LOTE_POR_DEFECTO})')
+        parser.add_argument('--dry-run', action='store_true', help='Evalúa y reporta sin escribir nada')
+
+    def handle(self, *args, **options):
+        desde = None
+        if options['since']:
+            desde = parse_datetime(options['since'])
+            if desde is None:
+                fecha = parse_date(options['since'])
+                if fecha is None:
+                    raise CommandError(f"Fecha inválida para --since: {options['since']}")
+                desde = datetime.combine(fecha, time.min)
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+
+        def progreso(totales, segundos):
+            ritmo = totales['clientes'] / segundos if segundos else 0
+            self.stdout.write(f"  {totales['clientes']} clientes evaluados ({ritmo:.0f}/s)")
+
+        modo = " (simulación, sin escribir)" if options['dry_run'] else ""
+        self.stdout.write(f"Re-diagnosticando con {max(options['workers'], 1)} worker(s){modo}...")
+        totales = rediagnosticar(
+            desde=desde,
+            workers=options['workers'],
+            lote=options['lote'],
+            simular=options['dry_run'],
+            progreso=progreso,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"¡Listo! {totales['clientes']} clientes: {totales['nivel_1']} por regla experta, "
+            f"{totales['urgentes']} con servicio urgente, {totales['diagnosticos']} diagnósticos creados, "
+            f"{totales['rutinas_asignadas']} rutinas asignadas, {totales['rutinas_actualizadas']} actualizadas."
+        ))
@@ -0,0 +1,194 @@
+"""
+Métricas de latencia y SQL por endpoint.
+
+Por cada (nombre de ruta, método) se acumulan:
+  - cantidad de pedidos e histograma de latencia,
+  - cantidad de consultas SQL y segundos dentro de la base.
+
+MiddlewareMetricas mide cada pedido; un execute_wrapper instalado una vez en
+cada conexión suma las consultas del pedido en curso. El costo son dos
+lecturas de reloj por pedido y por consulta más la suma en un dict del
+proceso (del orden de 2 µs por pedido).
+
+Agregación entre workers: cada proceso publica cada INTERVALO_PUBLICACION
+segundos su acumulado en el cache de Django (settings.CACHES, compartido si
+es Redis) bajo una clave propia; GET /api/metrics suma los acumulados de
+todos los procesos y responde en formato de texto de Prometheus. Como cada
+proceso sobrescribe su propia clave, no hay carreras entre workers. La lista
+de procesos vence junto con sus claves (TTL renovado en cada publicación) y
+el agregado descarta las claves de procesos que ya no publican, así que no
+crece con cada reinicio de workers.
+
+Con settings.METRICAS_HABILITADAS en False el middleware se descarta al
+arrancar (MiddlewareNotUsed) y no cuesta nada.
+"""
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Límites superiores (segundos) del histograma de latencia; el último es +Inf
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+INTERVALO_PUBLICACION = 5
+CLAVE_PROCESOS = 'metricas:procesos'
+# Un proceso que deja de publicar desaparece del agregado pasado este tiempo
+TTL_PROCESO = 24 * 60 * 60
+
+
+class Acumulador:
+    """Acumulado de un proceso: {(vista, método): [pedidos, latencia, consultas, segundos_sql, buckets...]}."""
+
+    def __init__(self):
+        self.clave = f'metricas:proceso:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.series = {}
+        self._lock = threading.Lock()
+        self._ultima_publicacion = 0.0
+
+    def registrar(self, vista, metodo, latencia, consultas, segundos_sql):
+        with self._lock:
+            serie = self.series.get((vista, metodo))
+            if serie is None:
+                serie = self.series[(vista, metodo)] = [0, 0.0, 0, 0.0] + [0] * (len(BUCKETS_LATENCIA) + 1)
+            serie[0] += 1
+            serie[1] += latencia
+            serie[2] += consultas
+            serie[3] += segundos_sql
+            serie[4 + bisect_left(BUCKETS_LATENCIA, latencia)] += 1
+
+    def publicar_si_corresponde(self, ahora):
+        if ahora - self._ultima_publicacion >= INTERVALO_PUBLICACION:
+            self.publicar(ahora)
+
+    def publicar(self, ahora=None):
+        """Escribe el acumulado del proceso en el cache compartido."""
+        self._ultima_publicacion = ahora or time.monotonic()
+        with self._lock:
+            copia = {clave: list(serie) for clave, serie in self.series.items()}
+        cache.set(self.clave, copia, TTL_PROCESO)
+        procesos = cache.get(CLAVE_PROCESOS) or []
+        if self.clave not in procesos:
+            # Si dos procesos se registran a la vez y uno se pierde, se vuelve a
+            # agregar en su próxima publicación
+            procesos = [*procesos, self.clave]
+        # Se reescribe siempre para renovar el TTL mientras haya procesos vivos
+        cache.set(CLAVE_PROCESOS, procesos, TTL_PROCESO)
+
+
+acumulador = Acumulador()
+
+
+# Contadores de SQL [consultas, segundos] del pedido en curso en este hilo
+_pedido = threading.local()
+
+
+def _medir_sql(execute, sql, params, many, context):
+    contador = getattr(_pedido, 'sql', None)
+    if contador is None:
+        # Consulta fuera de un pedido (comandos, jobs)
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        contador[0] += 1
+        contador[1] += time.perf_counter() - inicio
+
+
+def _instalar_en_conexion(connection, **kwargs):
+    if _medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir_sql)
+
+
+class MiddlewareMetricas:
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICAS_HABILITADAS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # El wrapper se instala una vez por conexión y no en cada pedido:
+        # connection.execute_wrapper() por pedido cuesta varios µs
+        connection_created.connect(_instalar_en_conexion, dispatch_uid='metricas_sql')
+        for conexion in connections.all(initialized_only=True):
+            _instalar_en_conexion(conexion)
+
+    def __call__(self, request):
+        _pedido.sql = sql = [0, 0.0]
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _pedido.sql = None
+        fin = time.perf_counter()
+
+        # Nombre de la ruta (no la URL) para que la cantidad de series sea acotada
+        ruta = request.resolver_match
+        vista = (ruta.view_name or ruta.route) if ruta else 'sin_ruta'
+        acumulador.registrar(vista, request.method, fin - inicio, sql[0], sql[1])
+        acumulador.publicar_si_corresponde(time.monotonic())
+        return response
+
+
+# ============================================================
+# AGREGACIÓN Y FORMATO PROMETHEUS
+# ============================================================
+
+def agregado():
+    """Suma de los acumulados publicados por todos los procesos (incluido este)."""
+    acumulador.publicar()
+    claves = cache.get(CLAVE_PROCESOS) or []
+    publicados = cache.get_many(claves)
+    if len(publicados) < len(claves):
+        # Procesos que dejaron de publicar (reinicios, workers reciclados):
+        # su clave ya venció y se quitan de la lista
+        cache.set(CLAVE_PROCESOS, [clave for clave in claves if clave in publicados], TTL_PROCESO)
+    total = {}
+    for series in publicados.values():
+        for clave, serie in series.items():
+            if clave in total:
+                total[clave] = [a + b for a, b in zip(total[clave], serie)]
+            else:
+                total[clave] = list(serie)
+    return total
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def _etiquetas(vista, metodo, **extra):
+    pares = {'vista': vista, 'metodo': metodo, **extra}
+    return '{' + ','.join(f'{nombre}="{_escapar(valor)}"' for nombre, valor in pares.items()) + '}'
+
+
+def formato_prometheus(series):
+    """Texto de exposición de Prometheus (version 0.0.4)."""
+    lineas = [
+        '# HELP bohemia_http_latencia_segundos Latencia de los pedidos por ruta y método.',
+        '# TYPE bohemia_http_latencia_segundos histogram',
+    ]
+    for (vista, metodo), serie in sorted(series.items()):
+        acumulado = 0
+        for limite, cantidad in zip(BUCKETS_LATENCIA + ('+Inf',), serie[4:]):
+            acumulado += cantidad
+            lineas.append(f'bohemia_http_latencia_segundos_bucket{_etiquetas(vista, metodo, le=limite)} {acumulado}')
+        lineas.append(f'bohemia_http_latencia_segundos_sum{_etiquetas(vista, metodo)} {serie[1]:.6f}')
+        lineas.append(f'bohemia_http_latencia_segundos_count{_etiquetas(vista, metodo)} {serie[0]}')
+
+    for nombre, indice, ayuda, formato in (
+        ('bohemia_http_pedidos_total', 0, 'Pedidos atendidos por ruta y método.', '{}'),
+        ('bohemia_sql_consultas_total', 2, 'Consultas SQL ejecutadas por ruta y método.', '{}'),
+        ('bohemia_sql_segundos_total', 3, 'Segundos dentro de la base por ruta y método.', '{:.6f}'),
+    ):
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} counter')
+        for (vista, metodo), serie in sorted(series.items()):
+            lineas.append(f'{nombre}{_etiquetas(vista, metodo)} {formato.format(serie[indice])}')
+    return '\n'.join(lineas) + '\n'
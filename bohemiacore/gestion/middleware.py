@@ -0,0 +1,74 @@
+"""
+Detector de consultas N+1 (desarrollo).
+
+Cuenta las consultas de cada pedido agrupadas por su forma (el SQL con los
+parámetros y las listas IN normalizados). Si una misma forma se repite más de
+settings.NMASUNO_UMBRAL veces, deja un warning con la consulta y un extracto
+de la pila del código del proyecto que la disparó: casi siempre es un
+serializer que recorre una relación sin select_related / prefetch_related.
+
+Se agrega a MIDDLEWARE solo con DEBUG (ver settings.py). Los tests de
+presupuesto de consultas (gestion/test.py) son los que fallan ante una
+regresión; esto ayuda a encontrar el origen mientras se desarrolla.
+"""
+import logging
+import re
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+UMBRAL_POR_DEFECTO = 10
+
+# Literales que pudieran quedar en el SQL y listas IN de largo variable
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+
+
+def forma_sql(sql):
+    """SQL sin valores: dos consultas con la misma forma solo difieren en parámetros."""
+    return _LISTAS.sub('(%s...)', _LITERALES.sub('%s', sql))
+
+
+def _extracto_pila(limite=6):
+    """Últimos frames del código del proyecto (sin Django ni librerías)."""
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename
+    ]
+    return ''.join(traceback.format_list(frames[-limite:]))
+
+
+class DetectorNMasUno:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'NMASUNO_UMBRAL', UMBRAL_POR_DEFECTO)
+
+    def __call__(self, request):
+        formas = Counter()
+        pilas = {}
+
+        def contar(execute, sql, params, many, context):
+            forma = forma_sql(sql)
+            formas[forma] += 1
+            # La pila se captura una sola vez, al pasar el umbral
+            if formas[forma] == self.umbral + 1:
+                pilas[forma] = _extracto_pila()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contar):
+            response = self.get_response(request)
+
+        for forma, veces in formas.items():
+            if veces > self.umbral:
+                logger.warning(
+                    f"[N+1] {request.method} {request.path}: {veces} consultas con la misma forma\n"
+                    f"  {forma[:300]}\n{pilas[forma]}"
+                )
+        return response
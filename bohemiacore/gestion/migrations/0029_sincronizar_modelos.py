@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0028_alter_turno_profesional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosticocapilar',
+            name='rutina_asignada',
+            field=models.ForeignKey(blank=True, help_text='Rutina efectivamente asignada al cliente', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='diagnosticos_que_la_asignaron', to='gestion.rutina'),
+        ),
+        migrations.AddField(
+            model_name='diagnosticocapilar',
+            name='servicio_urgente',
+            field=models.ForeignKey(blank=True, help_text='Servicio recomendado urgentemente si score ≤5', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='diagnosticos_urgentes', to='gestion.servicio'),
+        ),
+        migrations.AddField(
+            model_name='regladiagnostico',
+            name='servicio_sugerido',
+            field=models.ForeignKey(blank=True, help_text='Servicio específico para este diagnóstico técnico.', null=True, on_delete=django.db.models.deletion.SET_NULL, to='gestion.servicio'),
+        ),
+        migrations.AddField(
+            model_name='turno',
+            name='fecha_limite_pago',
+            field=models.DateTimeField(blank=True, help_text='Fecha y hora máxima para recibir el comprobante', null=True),
+        ),
+        migrations.AlterField(
+            model_name='cuerocabelludo',
+            name='puntaje_base',
+            field=models.IntegerField(default=0, help_text='Usado por el motor de reglas (ej. Sano=10, Dañado=50)', verbose_name='Puntaje (Lógica Diagnóstico)'),
+        ),
+        migrations.AlterField(
+            model_name='estadogeneral',
+            name='puntaje_base',
+            field=models.IntegerField(default=0, help_text='Usado por el motor de reglas (ej. Sano=10, Dañado=50)', verbose_name='Puntaje (Lógica Diagnóstico)'),
+        ),
+        migrations.AlterField(
+            model_name='grosorcabello',
+            name='puntaje_base',
+            field=models.IntegerField(default=0, help_text='Usado por el motor de reglas (ej. Sano=10, Dañado=50)', verbose_name='Puntaje (Lógica Diagnóstico)'),
+        ),
+        migrations.AlterField(
+            model_name='porosidadcabello',
+            name='puntaje_base',
+            field=models.IntegerField(default=0, help_text='Usado por el motor de reglas (ej. Sano=10, Dañado=50)', verbose_name='Puntaje (Lógica Diagnóstico)'),
+        ),
+        migrations.AlterField(
+            model_name='tipocabello',
+            name='puntaje_base',
+            field=models.IntegerField(default=0, help_text='Usado por el motor de reglas (ej. Sano=10, Dañado=50)', verbose_name='Puntaje (Lógica Diagnóstico)'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+# Duración y hora de fin desde los detalles, igual que Turno.calcular_hora_fin:
+# sin detalles se asume DURACION_POR_DEFECTO (60) y el fin no pasa de las 23:59.
+# Tiene que correr antes de 0031, que arma `ocupacion` con duracion_total.
+POBLAR_DURACION = """
+    WITH duraciones AS (
+        SELECT t.id, t.hora_inicio, COALESCE(SUM(d.duracion_minutos), 0)::int AS total
+        FROM gestion_turno t
+        LEFT JOIN gestion_detalleturno d ON d.turno_id = t.id
+        GROUP BY t.id
+    ), finales AS (
+        SELECT id, total, LEAST(
+            (extract(hour FROM hora_inicio) * 60 + extract(minute FROM hora_inicio))::int
+                + COALESCE(NULLIF(total, 0), 60),
+            24 * 60 - 1
+        ) AS fin
+        FROM duraciones
+    )
+    UPDATE gestion_turno t
+    SET duracion_total = f.total,
+        hora_fin_calculada = make_time(f.fin / 60, mod(f.fin, 60), 0)
+    FROM finales f
+    WHERE f.id = t.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0029_sincronizar_modelos'),
+        ('usuarios', '0003_remove_cliente_historial_servicios_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='turno',
+            name='duracion_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(POBLAR_DURACION, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['profesional', 'fecha', 'hora_inicio', 'hora_fin_calculada'], name='turno_prof_fecha_horas_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0031_ocupacion_rangos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notificacion',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('leido', 'Leído'), ('error', 'Error'), ('expirado', 'Expirado')], default='pendiente', max_length=20),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0032_notificacion_estado_expirado'),
+        ('usuarios', '0003_remove_cliente_historial_servicios_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['estado', 'fecha', 'hora_inicio'], name='turno_estado_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(condition=models.Q(('estado', 'esperando_sena')), fields=['fecha_limite_pago'], name='turno_limite_pago_idx'),
+        ),
+    ]
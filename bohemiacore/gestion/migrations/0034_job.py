@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0033_turno_indices_expiracion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tarea', models.CharField(help_text='Nombre registrado de la tarea', max_length=100)),
+                ('argumentos', models.JSONField(blank=True, default=dict)),
+                ('clave_idempotencia', models.CharField(blank=True, max_length=200, null=True, unique=True)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completado', 'Completado'), ('fallido', 'Fallido (sin más reintentos)')], default='pendiente', max_length=20)),
+                ('intentos', models.PositiveIntegerField(default=0)),
+                ('max_intentos', models.PositiveIntegerField(default=5)),
+                ('ejecutar_despues', models.DateTimeField(default=django.utils.timezone.now, help_text='No se toma antes de este momento (backoff)')),
+                ('ultimo_error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Job',
+                'verbose_name_plural': 'Jobs',
+                'ordering': ['-fecha_creacion'],
+                'indexes': [models.Index(condition=models.Q(('estado', 'pendiente')), fields=['ejecutar_despues', 'id'], name='job_pendientes_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0035_notificacion_indice_listado'),
+        ('usuarios', '0003_remove_cliente_historial_servicios_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendacuidados',
+            index=models.Index(fields=['cliente', 'fecha'], name='agenda_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloqueoagenda',
+            index=models.Index(fields=['personal', 'fecha_fin', 'fecha_inicio'], name='bloqueo_personal_fin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='horariolaboral',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['personal', 'dia_semana', 'hora_inicio'], name='horario_activo_personal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'enviado'])), fields=['usuario', '-fecha_envio'], name='notif_no_leidas_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rutinacliente',
+            index=models.Index(condition=models.Q(('estado', 'activa')), fields=['cliente', 'rutina_original'], name='rutina_cliente_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(condition=models.Q(('estado__in', ['solicitado', 'esperando_sena', 'confirmado'])), fields=['fecha', 'hora_inicio'], name='turno_activos_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='turno',
+            index=models.Index(fields=['cliente', '-fecha', '-hora_inicio'], name='turno_cliente_fecha_idx'),
+        ),
+    ]
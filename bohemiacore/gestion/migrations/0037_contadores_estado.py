@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0036_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorEstado',
+            fields=[
+                ('clave', models.CharField(max_length=60, primary_key=True, serialize=False)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Contador de Estado',
+                'verbose_name_plural': 'Contadores de Estado',
+            },
+        ),
+    ]
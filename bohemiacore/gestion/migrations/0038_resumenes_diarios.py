@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0037_contadores_estado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('realizados', models.IntegerField(default=0)),
+                ('ausentes', models.IntegerField(default=0)),
+                ('cancelados', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('minutos_reservados', models.IntegerField(default=0)),
+                ('minutos_disponibles', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('profesional', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='gestion.personal')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario',
+                'verbose_name_plural': 'Resúmenes Diarios',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'profesional'), name='resumen_dia_profesional_uniq', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenServicioDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('minutos', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('profesional', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_servicio', to='gestion.personal')),
+                ('servicio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='gestion.servicio')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario por Servicio',
+                'verbose_name_plural': 'Resúmenes Diarios por Servicio',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'profesional', 'servicio'), name='resumen_servicio_dia_uniq', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0038_resumenes_diarios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('notificacion', 'Notificación nueva'), ('turno', 'Cambio de estado de turno')], max_length=30)),
+                ('datos', models.JSONField(default=dict)),
+                ('creado', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, help_text='Si se deja vacío, lo recibe todo el staff', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Evento de Usuario',
+                'verbose_name_plural': 'Eventos de Usuario',
+                'indexes': [models.Index(fields=['usuario', 'id'], name='evento_usuario_id_idx'), models.Index(fields=['creado'], name='evento_creado_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0039_eventos_usuario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notificacion',
+            name='notif_no_leidas_idx',
+        ),
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente'])), fields=['usuario', '-fecha_envio'], name='notif_no_leidas_idx'),
+        ),
+    ]
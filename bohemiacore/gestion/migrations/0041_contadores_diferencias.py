@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion', '0040_notificacion_no_leidas_solo_pendientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeltaContador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(db_index=True, max_length=60)),
+                ('cantidad', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'Diferencia de Contador',
+                'verbose_name_plural': 'Diferencias de Contador',
+            },
+        ),
+    ]
@@ -1,6 +1,12 @@
-from django.db import models
-from datetime import datetime, timedelta
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Func, Q, Value
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from datetime import datetime, timedelta, time
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_time
 from django.conf import settings
 from django.core.exceptions import ValidationError
 
@@ -444,6 +450,14 @@ class RutinaCliente(models.Model):
         verbose_name = "Rutina del Cliente"
         verbose_name_plural = "Rutinas del Cliente"
         ordering = ['-fecha_asignacion']
+        indexes = [
+            # "¿Ya tiene esta rutina activa?" al asignar rutinas (automatización, re-diagnóstico)
+            models.Index(
+                fields=['cliente', 'rutina_original'],
+                name='rutina_cliente_activa_idx',
+                condition=Q(estado='activa')
+            ),
+        ]
 
     def actualizar_desde_original(self):
         """Actualiza la copia con el nuevo archivo de la original."""
@@ -508,6 +522,10 @@ class AgendaCuidados(models.Model):
         verbose_name = "Agenda de Cuidados"
         verbose_name_plural = "Agendas de Cuidados"
         ordering = ['fecha']
+        indexes = [
+            # Agenda del cliente: WHERE cliente = ? ORDER BY fecha
+            models.Index(fields=['cliente', 'fecha'], name='agenda_cliente_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.cliente} - {self.fecha}: {self.titulo}"
@@ -590,6 +608,14 @@ class HorarioLaboral(models.Model):
         verbose_name = "Horario Laboral"
         verbose_name_plural = "Horarios Laborales"
         ordering = ['dia_semana', 'hora_inicio']
+        indexes = [
+            # Horarios vigentes de un profesional; los inactivos quedan como histórico
+            models.Index(
+                fields=['personal', 'dia_semana', 'hora_inicio'],
+                name='horario_activo_personal_idx',
+                condition=Q(activo=True)
+            ),
+        ]
 
     def __str__(self):
         if self.personal:
@@ -625,16 +651,45 @@ class BloqueoAgenda(models.Model):
     fecha_fin = models.DateTimeField()
     motivo = models.CharField(max_length=200)
     bloquea_todo_el_dia = models.BooleanField(default=False)
+    # tstzrange [inicio, fin) que realmente bloquea (días completos si bloquea_todo_el_dia)
+    ocupacion = DateTimeRangeField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Bloqueo / Excepción de Agenda"
         verbose_name_plural = "Bloqueos de Agenda"
         ordering = ['fecha_inicio']
+        indexes = [
+            GistIndex(fields=['ocupacion'], name='bloqueo_ocupacion_gist'),
+            # Bloqueos vigentes de un profesional (o globales): WHERE personal = ? AND fecha_fin >= ?
+            models.Index(fields=['personal', 'fecha_fin', 'fecha_inicio'], name='bloqueo_personal_fin_idx'),
+        ]
 
     def clean(self):
         if self.fecha_fin < self.fecha_inicio:
             raise ValidationError("La fecha de fin no puede ser anterior a la de inicio.")
 
+    def calcular_ocupacion(self):
+        inicio = self.fecha_inicio
+        fin = self.fecha_fin
+        if inicio is None or fin is None:
+            return None
+        if timezone.is_naive(inicio):
+            inicio = timezone.make_aware(inicio)
+        if timezone.is_naive(fin):
+            fin = timezone.make_aware(fin)
+        if self.bloquea_todo_el_dia:
+            # Desde la medianoche local del primer día hasta la del día siguiente al último
+            inicio = timezone.make_aware(datetime.combine(timezone.localtime(inicio).date(), time.min))
+            fin = timezone.make_aware(datetime.combine(timezone.localtime(fin).date() + timedelta(days=1), time.min))
+        return DateTimeTZRange(inicio, fin, '[)')
+
+    def save(self, *args, **kwargs):
+        self.ocupacion = self.calcular_ocupacion()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'ocupacion' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['ocupacion']
+        super().save(*args, **kwargs)
+
     def __str__(self):
         persona = self.personal.nombre if self.personal else "TODO EL SALÓN"
         return f"Bloqueo: {persona} - {self.motivo}"
@@ -679,6 +734,10 @@ class Turno(models.Model):
     fecha = models.DateField()
     hora_inicio = models.TimeField()
     hora_fin_calculada = models.TimeField(blank=True, null=True)
+    # Suma de duracion_minutos de los detalles (se mantiene al cambiar los detalles)
+    duracion_total = models.PositiveIntegerField(default=0)
+    # tstzrange [inicio, inicio + duración) en hora local; base de la restricción anti doble reserva
+    ocupacion = DateTimeRangeField(null=True, blank=True, editable=False)
     
     # Estado
     estado = models.CharField(
@@ -703,14 +762,134 @@ class Turno(models.Model):
         verbose_name_plural = "Turnos"
         ordering = ['fecha', 'hora_inicio']
         unique_together = ['fecha', 'hora_inicio', 'cliente']
+        indexes = [
+            # Chequeos de solapamiento: WHERE profesional = ? AND fecha = ?
+            #   AND hora_inicio < :fin AND hora_fin_calculada > :inicio
+            models.Index(
+                fields=['profesional', 'fecha', 'hora_inicio', 'hora_fin_calculada'],
+                name='turno_prof_fecha_horas_idx'
+            ),
+            GistIndex(fields=['ocupacion'], name='turno_ocupacion_gist'),
+            # Barrido de expiración: WHERE estado IN (...) AND (fecha, hora_inicio) < (hoy, ahora)
+            models.Index(fields=['estado', 'fecha', 'hora_inicio'], name='turno_estado_fecha_hora_idx'),
+            # Señas vencidas: solo los turnos que esperan seña tienen plazo
+            models.Index(
+                fields=['fecha_limite_pago'],
+                name='turno_limite_pago_idx',
+                condition=Q(estado='esperando_sena')
+            ),
+            # Próximos turnos activos (dashboard): WHERE estado IN (...) AND fecha >= hoy
+            #   ORDER BY fecha, hora_inicio; los realizados / cancelados no entran al índice
+            models.Index(
+                fields=['fecha', 'hora_inicio'],
+                name='turno_activos_fecha_idx',
+                condition=Q(estado__in=['solicitado', 'esperando_sena', 'confirmado'])
+            ),
+            # Historial del cliente: WHERE cliente = ? ORDER BY fecha DESC, hora_inicio DESC
+            models.Index(fields=['cliente', '-fecha', '-hora_inicio'], name='turno_cliente_fecha_idx'),
+        ]
+        constraints = [
+            # Un profesional no puede tener dos turnos activos que se solapen.
+            # int8range(profesional, profesional, '[]') && ... equivale a
+            # "mismo profesional" usando solo operadores GiST nativos (sin btree_gist)
+            ExclusionConstraint(
+                name='turno_sin_solapamiento_profesional',
+                expressions=[
+                    (
+                        Func(F('profesional'), F('profesional'), Value('[]'), function='int8range'),
+                        RangeOperators.OVERLAPS
+                    ),
+                    ('ocupacion', RangeOperators.OVERLAPS),
+                ],
+                condition=Q(
+                    profesional__isnull=False,
+                    estado__in=['solicitado', 'esperando_sena', 'confirmado']
+                ),
+            ),
+        ]
+
+    # Duración asumida cuando el turno todavía no tiene detalles
+    DURACION_POR_DEFECTO = 60
+
+    # Restricción de exclusión de Meta.constraints (SQLSTATE 23P01 al violarse)
+    RESTRICCION_SOLAPAMIENTO = 'turno_sin_solapamiento_profesional'
+    MENSAJE_SOLAPAMIENTO = "El turno se solapa con otro turno activo del mismo profesional."
+
+    @classmethod
+    def es_solapamiento(cls, error):
+        """True si el IntegrityError lo lanzó la restricción de exclusión (y no otra)."""
+        causa = error.__cause__
+        diag = getattr(causa, 'diag', None)
+        return (
+            getattr(causa, 'sqlstate', None) == '23P01'
+            or getattr(diag, 'constraint_name', None) == cls.RESTRICCION_SOLAPAMIENTO
+        )
 
     def __str__(self):
         return f"Turno {self.fecha} {self.hora_inicio} - {self.cliente}"
-    
-    @property
-    def duracion_total(self):
-        """Suma la duración de todos los servicios asociados a este turno"""
-        return sum(detalle.duracion_minutos for detalle in self.detalles.all())
+
+    def calcular_hora_fin(self, duracion_total=None):
+        """Hora de fin según hora_inicio + duración total (tope 23:59, mismo día)."""
+        hora_inicio = self.hora_inicio
+        if isinstance(hora_inicio, str):
+            hora_inicio = parse_time(hora_inicio)
+        if hora_inicio is None:
+            return None
+        duracion = duracion_total if duracion_total is not None else self.duracion_total
+        minutos = min(
+            hora_inicio.hour * 60 + hora_inicio.minute + (duracion or self.DURACION_POR_DEFECTO),
+            24 * 60 - 1
+        )
+        return time(minutos // 60, minutos % 60)
+
+    def calcular_ocupacion(self, duracion_total=None):
+        """Rango [inicio, inicio + duración) como datetimes aware en hora local."""
+        fecha = self.fecha
+        hora_inicio = self.hora_inicio
+        if isinstance(fecha, str):
+            fecha = parse_date(fecha)
+        if isinstance(hora_inicio, str):
+            hora_inicio = parse_time(hora_inicio)
+        if fecha is None or hora_inicio is None:
+            return None
+        duracion = duracion_total if duracion_total is not None else self.duracion_total
+        inicio = timezone.make_aware(datetime.combine(fecha, hora_inicio))
+        return DateTimeTZRange(inicio, inicio + timedelta(minutes=duracion or self.DURACION_POR_DEFECTO), '[)')
+
+    def save(self, *args, **kwargs):
+        # hora_fin_calculada y ocupacion siempre acompañan a fecha / hora_inicio / duracion_total
+        self.hora_fin_calculada = self.calcular_hora_fin()
+        self.ocupacion = self.calcular_ocupacion()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'hora_fin_calculada', 'ocupacion'}
+        # Con sus señales en la misma transacción: las diferencias de contadores,
+        # los resúmenes diarios y los eventos se confirman o descartan junto con
+        # el turno. Dentro de otra transacción es un savepoint: un error del
+        # guardado no deja marcada para rollback a la transacción de afuera.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def actualizar_duracion(self):
+        """
+        Recalcula duracion_total y hora_fin_calculada desde los detalles.
+        Usa UPDATE directo para no disparar las señales de cambio de estado del turno.
+        Si la nueva duración pisa otro turno activo del profesional lanza
+        ValidationError (y DetalleTurno.save / delete deshacen el cambio).
+        """
+        self.duracion_total = self.detalles.aggregate(total=models.Sum('duracion_minutos'))['total'] or 0
+        self.hora_fin_calculada = self.calcular_hora_fin()
+        self.ocupacion = self.calcular_ocupacion()
+        try:
+            Turno.objects.filter(pk=self.pk).update(
+                duracion_total=self.duracion_total,
+                hora_fin_calculada=self.hora_fin_calculada,
+                ocupacion=self.ocupacion
+            )
+        except IntegrityError as e:
+            if not Turno.es_solapamiento(e):
+                raise
+            raise ValidationError(Turno.MENSAJE_SOLAPAMIENTO, code='solapamiento') from e
 
 
 class DetalleTurno(models.Model):
@@ -730,6 +909,17 @@ class DetalleTurno(models.Model):
 
     def __str__(self):
         return f"{self.servicio.nombre} - Turno ID: {self.turno.id}"
+
+    # El receiver que recalcula la duración del turno corre dentro de la misma
+    # transacción: si la duración nueva se solapa con otro turno, el detalle
+    # tampoco queda guardado (ver Turno.actualizar_duracion)
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
     
 
 class FichaTecnica(models.Model):
@@ -1037,8 +1227,13 @@ class Notificacion(models.Model):
         ('enviado', 'Enviado'),
         ('leido', 'Leído'),
         ('error', 'Error'),
+        ('expirado', 'Expirado'),  # Oferta de adelanto tomada por otro cliente
     ]
 
+    # Las que cuenta la campana (la misma regla que usa el frontend: 'enviado'
+    # solo indica que salió por el canal); coincide con notif_no_leidas_idx
+    ESTADOS_NO_LEIDAS = ['pendiente']
+
     usuario = models.ForeignKey(
         'usuarios.Usuario', 
         on_delete=models.CASCADE, 
@@ -1061,6 +1256,216 @@ class Notificacion(models.Model):
         verbose_name = "Notificación"
         verbose_name_plural = "Notificaciones"
         ordering = ['-fecha_envio']
+        indexes = [
+            # Listado paginado por clave: WHERE usuario = ? ORDER BY fecha_envio DESC, id DESC
+            models.Index(
+                fields=['usuario', '-fecha_envio', '-id'],
+                name='notif_usuario_fecha_idx',
+            ),
+            # No leídas del usuario (contador de la campana)
+            models.Index(
+                fields=['usuario', '-fecha_envio'],
+                name='notif_no_leidas_idx',
+                condition=Q(estado__in=['pendiente'])
+            ),
+        ]
+
+    def __str__(self):
+        return f"[{self.canal}] {self.titulo} -> {self.usuario}"
+
+# ============================================================
+# SECCIÓN 6: TAREAS EN SEGUNDO PLANO
+# ============================================================
+
+class Job(models.Model):
+    """
+    Tarea en segundo plano encolada en la base (sin broker externo).
+    La procesan los workers de `manage.py procesar_jobs` (ver gestion/tareas.py).
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'pendiente', 'Pendiente'
+        COMPLETADO = 'completado', 'Completado'
+        FALLIDO = 'fallido', 'Fallido (sin más reintentos)'
+
+    tarea = models.CharField(max_length=100, help_text="Nombre registrado de la tarea")
+    argumentos = models.JSONField(default=dict, blank=True)
+    # Encolar dos veces con la misma clave no crea un segundo job
+    clave_idempotencia = models.CharField(max_length=200, unique=True, null=True, blank=True)
+
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    ejecutar_despues = models.DateTimeField(default=timezone.now, help_text="No se toma antes de este momento (backoff)")
+    ultimo_error = models.TextField(blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Job"
+        verbose_name_plural = "Jobs"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            # Polling de los workers: solo los pendientes, en orden de ejecución
+            models.Index(
+                fields=['ejecutar_despues', 'id'],
+                name='job_pendientes_idx',
+                condition=Q(estado='pendiente')
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea} #{self.id} ({self.estado})"
+
+
+# ============================================================
+# SECCIÓN 7: CONTADORES
+# ============================================================
+
+class ContadorEstado(models.Model):
+    """
+    Cantidad de turnos por estado, en total ('estado:<estado>') y por día
+    ('dia:<fecha>:<estado>'), a la fecha de la última reconciliación. Los
+    cambios posteriores están en DeltaContador (ver gestion/contadores.py); el
+    tablero del admin suma ambos por clave en lugar de contar.
+    """
+    clave = models.CharField(max_length=60, primary_key=True)
+    cantidad = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Contador de Estado"
+        verbose_name_plural = "Contadores de Estado"
+
+    def __str__(self):
+        return f"{self.clave} = {self.cantidad}"
+
+
+class DeltaContador(models.Model):
+    """
+    Diferencia de un ContadorEstado desde la última reconciliación. Solo se
+    insertan filas (una por clave en cada cambio de turno), así las reservas
+    concurrentes no se bloquean en las filas 'estado:*'; reconciliar() las
+    vacía al rehacer la foto.
+    """
+    clave = models.CharField(max_length=60, db_index=True)
+    cantidad = models.IntegerField()
+
+    class Meta:
+        verbose_name = "Diferencia de Contador"
+        verbose_name_plural = "Diferencias de Contador"
+
+    def __str__(self):
+        return f"{self.clave} {self.cantidad:+d}"
+
+
+# ============================================================
+# SECCIÓN 8: REPORTES
+# ============================================================
+
+class ResumenDiario(models.Model):
+    """
+    Rollup por día y profesional de los turnos que llegaron a un estado
+    terminal (realizado / ausente / cancelado): cantidades, ingresos según
+    DetalleTurno.precio_historico y minutos reservados vs disponibles según
+    HorarioLaboral. Lo mantiene gestion/analitica.py; los reportes del staff
+    leen estas filas en lugar de recorrer los turnos.
+    """
+    fecha = models.DateField()
+    profesional = models.ForeignKey(
+        Personal,
+        on_delete=models.CASCADE,
+        related_name='resumenes_diarios',
+        null=True, blank=True
+    )
+    realizados = models.IntegerField(default=0)
+    ausentes = models.IntegerField(default=0)
+    cancelados = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Minutos de turnos realizados o ausentes: el horario quedó tomado aunque no vinieran
+    minutos_reservados = models.IntegerField(default=0)
+    # Horario laboral del día menos bloqueos
+    minutos_disponibles = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Resumen Diario"
+        verbose_name_plural = "Resúmenes Diarios"
+        constraints = [
+            # Un turno sin profesional suma en la fila (fecha, NULL), que también es única
+            models.UniqueConstraint(
+                fields=['fecha', 'profesional'], name='resumen_dia_profesional_uniq', nulls_distinct=False
+            ),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.fecha} - {self.profesional or 'Sin profesional'}"
+
+
+class ResumenServicioDiario(models.Model):
+    """Servicios realizados por día y profesional: cantidad, ingresos y minutos (ver ResumenDiario)."""
+    fecha = models.DateField()
+    profesional = models.ForeignKey(
+        Personal,
+        on_delete=models.CASCADE,
+        related_name='resumenes_servicio',
+        null=True, blank=True
+    )
+    servicio = models.ForeignKey(Servicio, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    cantidad = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    minutos = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Resumen Diario por Servicio"
+        verbose_name_plural = "Resúmenes Diarios por Servicio"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['fecha', 'profesional', 'servicio'], name='resumen_servicio_dia_uniq', nulls_distinct=False
+            ),
+        ]
+
+    def __str__(self):
+        return f"Resumen {self.fecha} - {self.servicio_id} x{self.cantidad}"
+
+
+# ============================================================
+# SECCIÓN 9: EVENTOS EN VIVO
+# ============================================================
+
+class EventoUsuario(models.Model):
+    """
+    Evento enviado por SSE (nueva notificación, cambio de estado de un turno).
+    Se guarda en la misma transacción que el cambio y se anuncia con NOTIFY;
+    el id creciente permite reanudar desde el último recibido (Last-Event-ID).
+    Ver gestion/eventos.py.
+    """
+    TIPO_CHOICES = [
+        ('notificacion', 'Notificación nueva'),
+        ('turno', 'Cambio de estado de turno'),
+    ]
+
+    usuario = models.ForeignKey(
+        'usuarios.Usuario',
+        on_delete=models.CASCADE,
+        related_name='eventos',
+        null=True, blank=True,
+        help_text="Si se deja vacío, lo recibe todo el staff"
+    )
+    tipo = models.CharField(max_length=30, choices=TIPO_CHOICES)
+    datos = models.JSONField(default=dict)
+    creado = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = "Evento de Usuario"
+        verbose_name_plural = "Eventos de Usuario"
+        indexes = [
+            # Reanudación: WHERE usuario = ? (o NULL para staff) AND id > ?
+            models.Index(fields=['usuario', 'id'], name='evento_usuario_id_idx'),
+            # Purga por antigüedad
+            models.Index(fields=['creado'], name='evento_creado_idx'),
+        ]
 
     def __str__(self):
-        return f"[{self.canal}] {self.titulo} -> {self.usuario}"
\ No newline at end of file
+        return f"Evento {self.tipo} #{self.id} -> {self.usuario_id or 'staff'}"
@@ -0,0 +1,154 @@
+"""
+Motor de diagnóstico capilar compilado.
+
+NIVEL 1 (reglas expertas): cada ReglaDiagnostico es un patrón sobre el perfil
+(tipo, grosor, porosidad, cuero, estado) donde un campo vacío es comodín.
+En lugar de recorrer todas las reglas comparando FKs, se compilan en un
+índice: por cada combinación de campos fijos que usa alguna regla (a lo sumo
+2^5 = 32) un dict {valores fijos: regla de mayor prioridad}. Buscar un perfil
+cuesta una consulta a dict por combinación, sin importar cuántas reglas haya.
+
+NIVEL 2 (matriz de puntuación): las rutinas y el servicio intensivo que se
+asignan por nombre se resuelven una sola vez al compilar.
+
+El índice vive en memoria del proceso (ver gestion/cache_proceso.py); los
+receivers de gestion/signals.py lo invalidan al guardar o borrar reglas,
+rutinas o servicios, y cada proceso recompila en su próxima consulta.
+"""
+import logging
+
+from django.db.models import Q
+
+from .models import ReglaDiagnostico, Rutina, Servicio
+from .cache_proceso import CacheProceso
+
+logger = logging.getLogger(__name__)
+
+
+# Orden de los campos del perfil en las claves del índice
+CAMPOS_PERFIL = (
+    'tipo_cabello_id',
+    'grosor_cabello_id',
+    'porosidad_cabello_id',
+    'cuero_cabelludo_id',
+    'estado_general_id',
+)
+
+# --- MATRIZ DE PUNTUACIÓN (Escala 0-13) ---
+PUNTOS_TIPO = {"Lacio": 2, "Ondulado": 1, "Rizado": 0, "Afro": 0}
+PUNTOS_GROSOR = {"Fino": 2, "Medio": 1, "Grueso": 0}
+PUNTOS_POROSIDAD = {"Baja": 4, "Media": 2, "Alta": 0}
+PUNTOS_CUERO = {"Seco": 3, "Normal": 2, "Mixto": 1, "Graso": 0}
+PUNTOS_ESTADO = {"Dañado": 0, "Normal": 1, "Sano": 2}
+
+UMBRAL_CRITICO = 5
+UMBRAL_ALERTA = 9
+
+def perfil_de(objeto):
+    """Tupla de ids del perfil capilar de un Cliente o DiagnosticoCapilar."""
+    return tuple(getattr(objeto, campo) for campo in CAMPOS_PERFIL)
+
+
+class MotorDiagnostico:
+    """Reglas y resultados de Nivel 2 compilados."""
+
+    def __init__(self, reglas, rutinas, servicio_intensivo):
+        self.rutinas = rutinas
+        self.servicio_intensivo = servicio_intensivo
+
+        # {posiciones fijas: {valores: (orden, regla)}}
+        self.indice = {}
+        for orden, regla in enumerate(reglas):
+            patron = perfil_de(regla)
+            fijos = tuple(i for i, valor in enumerate(patron) if valor is not None)
+            valores = tuple(patron[i] for i in fijos)
+            # Las reglas llegan por prioridad: la primera de cada clave gana
+            self.indice.setdefault(fijos, {}).setdefault(valores, (orden, regla))
+
+    @classmethod
+    def compilar(cls):
+        reglas = list(
+            ReglaDiagnostico.objects.select_related('rutina_sugerida').order_by('-prioridad', 'id')
+        )
+        rutinas = {
+            nombre: Rutina.objects.filter(nombre__icontains=nombre).first()
+            for nombre in ("Recuperación", "Nutrición", "Mantenimiento")
+        }
+        servicio_intensivo = Servicio.objects.filter(
+            Q(nombre__icontains="Tratamiento") & Q(nombre__icontains="intensivo")).first()
+        logger.info(f"[DIAGNOSTICO] Motor compilado ({len(reglas)} reglas)")
+        return cls(reglas, rutinas, servicio_intensivo)
+
+    def buscar_regla(self, perfil):
+        """Regla de mayor prioridad que coincide con el perfil (tupla de ids) o None."""
+        mejor = None
+        for fijos, reglas in self.indice.items():
+            candidata = reglas.get(tuple(perfil[i] for i in fijos))
+            if candidata is not None and (mejor is None or candidata[0] < mejor[0]):
+                mejor = candidata
+        return mejor[1] if mejor else None
+
+    def resultado_nivel_2(self, puntos):
+        """(rutina, servicio_urgente) según el puntaje de la matriz."""
+        if puntos <= UMBRAL_CRITICO:
+            # ESTADO CRÍTICO: Cabello dañado o muy procesado
+            return self.rutinas["Recuperación"], self.servicio_intensivo
+        if puntos <= UMBRAL_ALERTA:
+            # ESTADO DE ALERTA: Requiere cuidado preventivo
+            return self.rutinas["Nutrición"], None
+        # ESTADO SALUDABLE: Mantenimiento básico
+        return self.rutinas["Mantenimiento"], None
+
+
+# Índice compilado por proceso, versionado en el cache compartido
+_motor = CacheProceso('motor_diagnostico:version', MotorDiagnostico.compilar)
+invalidar_al_confirmar = _motor.invalidar_al_confirmar
+
+
+def obtener_motor():
+    """Motor compilado vigente (sin consultas a la base si la versión no cambió)."""
+    return _motor.obtener()
+
+
+# ============================================================
+# EVALUACIÓN
+# ============================================================
+
+def buscar_regla(objeto):
+    """Nivel 1: regla experta para un Cliente o DiagnosticoCapilar, o None."""
+    return obtener_motor().buscar_regla(perfil_de(objeto))
+
+
+def puntuar(diagnostico):
+    """Nivel 2: puntaje 0-13 de la matriz según los nombres del perfil."""
+    def nombre(campo):
+        valor = getattr(diagnostico, campo)
+        return valor.nombre if valor else ""
+
+    return (
+        PUNTOS_TIPO.get(nombre('tipo_cabello'), 0)
+        + PUNTOS_GROSOR.get(nombre('grosor_cabello'), 0)
+        + PUNTOS_POROSIDAD.get(nombre('porosidad_cabello'), 0)
+        + PUNTOS_CUERO.get(nombre('cuero_cabelludo'), 0)
+        + PUNTOS_ESTADO.get(nombre('estado_general'), 0)
+    )
+
+
+def evaluar(diagnostico):
+    """
+    Diagnóstico en dos niveles. Devuelve (regla, puntos, rutina, servicio_urgente):
+    con regla experta `puntos` es None; sin ella, `regla` es None.
+    """
+    motor = obtener_motor()
+    regla = motor.buscar_regla(perfil_de(diagnostico))
+    if regla:
+        # Si hay regla experta (ej. Desequilibrio de pH), manda la regla
+        servicio_urgente = None
+        # Si la regla tiene una acción que indique necesidad de turno
+        if "TURNO" in regla.accion_resultado.upper():
+            servicio_urgente = motor.servicio_intensivo
+        return regla, None, regla.rutina_sugerida, servicio_urgente
+
+    puntos = puntuar(diagnostico)
+    rutina, servicio_urgente = motor.resultado_nivel_2(puntos)
+    return None, puntos, rutina, servicio_urgente
@@ -0,0 +1,120 @@
+"""
+Paginación por clave (keyset / cursor).
+
+En lugar de OFFSET (que recorre y descarta todas las filas anteriores) cada
+página continúa desde la última fila de la anterior:
+
+    WHERE (fecha, hora_inicio, id) > (:fecha, :hora, :id)
+    ORDER BY fecha, hora_inicio, id
+    LIMIT :tamaño + 1
+
+El costo de cada página es el mismo sin importar cuánta historia se acumule,
+siempre que exista un índice que siga el orden de `campos`.
+
+Respuesta: {"next": url o null, "results": [...]}. El cursor es opaco
+(base64 de los valores de la última fila).
+"""
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PaginacionPorClave(BasePagination):
+    # Orden total: el último campo debe ser único (ej. 'id')
+    campos = ('id',)
+    descendente = False
+    page_size = 100
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limite'
+
+    def _tamanio(self, request):
+        try:
+            tamanio = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(tamanio, self.max_page_size))
+
+    def _codificar(self, fila):
+        valores = [getattr(fila, campo) for campo in self.campos]
+        texto = json.dumps([v.isoformat() if hasattr(v, 'isoformat') else v for v in valores])
+        return base64.urlsafe_b64encode(texto.encode()).decode()
+
+    def _decodificar(self, cursor):
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound("Cursor inválido.")
+        if not isinstance(valores, list) or len(valores) != len(self.campos):
+            raise NotFound("Cursor inválido.")
+        return valores
+
+    def _despues_de(self, valores):
+        """(c1, c2, ..., cn) > (v1, v2, ..., vn) expandido a OR de igualdades (o < si es descendente)."""
+        operador = 'lt' if self.descendente else 'gt'
+        condicion = Q()
+        for i, campo in enumerate(self.campos):
+            iguales = {c: v for c, v in zip(self.campos[:i], valores[:i])}
+            condicion |= Q(**iguales, **{f'{campo}__{operador}': valores[i]})
+        # Cota sobre el primer campo para que el índice acote el rango escaneado
+        primero = {f"{self.campos[0]}__{operador}e": valores[0]}
+        return Q(**primero) & condicion
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        tamanio = self._tamanio(request)
+        orden = [f'-{campo}' if self.descendente else campo for campo in self.campos]
+        queryset = queryset.order_by(*orden)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._despues_de(self._decodificar(cursor)))
+
+        filas = list(queryset[:tamanio + 1])
+        self.siguiente = self._codificar(filas[tamanio - 1]) if len(filas) > tamanio else None
+        return filas[:tamanio]
+
+    def get_next_link(self):
+        if self.siguiente is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.siguiente)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PaginacionTurnos(PaginacionPorClave):
+    """Orden cronológico; usa los índices que empiezan por (fecha, hora_inicio)."""
+    campos = ('fecha', 'hora_inicio', 'id')
+
+
+class PaginacionNotificaciones(PaginacionPorClave):
+    """Más recientes primero; índice (usuario, -fecha_envio, -id)."""
+    campos = ('fecha_envio', 'id')
+    descendente = True
+    page_size = 50
+
+
+class PaginacionRecientes(PaginacionPorClave):
+    """Más nuevos primero por id (fichas técnicas)."""
+    descendente = True
+
+
+class PaginacionClientes(PaginacionPorClave):
+    """Clientes por su PK (el usuario)."""
+    campos = ('usuario_id',)
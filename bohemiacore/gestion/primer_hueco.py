@@ -0,0 +1,100 @@
+"""
+Primer hueco disponible ("earliest fit").
+
+Responde "¿cuál es el primer inicio >= hoy donde entra un turno de D minutos
+con algún profesional habilitado para el servicio?" sin generar grillas
+completas de slots.
+
+El índice guarda, por fecha, los huecos libres de cada profesional (ventana
+de su regla de HorarioLaboral menos la ocupación de su agenda) ordenados por
+inicio. Se arma por tramos de TRAMO_DIAS días a medida que la búsqueda avanza:
+si el primer hueco está en la primera semana, las siguientes nunca se cargan.
+Cada tramo cuesta una cantidad fija de consultas (agendas cacheadas y, si el
+servicio usa equipos, la capacidad), sin importar profesionales ni días.
+"""
+from .disponibilidad import a_minutos, a_hora, minimo_inicio_para, inicios_en_hueco
+from .capacidad_equipamiento import CapacidadEquipamiento, requisitos_por_tipo
+from .cache_disponibilidad import obtener_agendas
+
+
+TRAMO_DIAS = 7
+
+
+class IndiceHuecos:
+    """
+    Huecos libres por fecha para un conjunto de reglas ya filtradas por servicio.
+    `reglas_por_fecha`: {fecha: [ReglaHoraria, ...]} (ver TurnoViewSet._reglas_por_fecha).
+    """
+
+    def __init__(self, reglas_por_fecha, servicios_ids=(), tramo=TRAMO_DIAS):
+        # Solo interesan las fechas con al menos una regla
+        self.fechas = sorted(fecha for fecha, reglas in reglas_por_fecha.items() if reglas)
+        self.reglas_por_fecha = reglas_por_fecha
+        self.requeridos = requisitos_por_tipo(list(servicios_ids))
+        self.tramo = max(int(tramo), 1)
+        self._huecos = {}
+        self._capacidad = {}
+
+    def _cargar_tramo(self, desde_idx):
+        fechas = self.fechas[desde_idx:desde_idx + self.tramo]
+        profesionales_ids = {regla.personal_id for fecha in fechas for regla in self.reglas_por_fecha[fecha]}
+        agendas = obtener_agendas(profesionales_ids, fechas)
+        capacidad = CapacidadEquipamiento.cargar(fechas) if self.requeridos else None
+
+        for fecha in fechas:
+            huecos = []
+            for regla in self.reglas_por_fecha[fecha]:
+                ancla = a_minutos(regla.hora_inicio)
+                agenda = agendas[(regla.personal_id, fecha)]
+                for inicio, fin in agenda.huecos(ancla, a_minutos(regla.hora_fin)):
+                    huecos.append((inicio, fin, ancla, regla))
+            huecos.sort(key=lambda hueco: hueco[0])
+            self._huecos[fecha] = huecos
+            self._capacidad[fecha] = capacidad
+
+    def huecos(self, fecha):
+        """[(inicio, fin, ancla_grilla, regla), ...] de la fecha, ordenados por inicio."""
+        if fecha not in self._huecos:
+            self._cargar_tramo(self.fechas.index(fecha))
+        return self._huecos[fecha]
+
+    def primer_hueco(self, duracion, intervalo):
+        """
+        Primer inicio (fecha más temprana y, dentro de ella, hora más temprana)
+        donde entra un turno de `duracion` minutos en la grilla de `intervalo`.
+        Devuelve {'fecha', 'inicio', 'hora', 'regla'} o None.
+        """
+        duracion = duracion or 60
+        for fecha in self.fechas:
+            minimo_inicio = minimo_inicio_para(fecha)
+            if minimo_inicio is None:
+                continue
+
+            huecos = self.huecos(fecha)
+            if self.requeridos:
+                capacidad = self._capacidad[fecha]
+
+                def validar(inicio, fin, fecha=fecha, capacidad=capacidad):
+                    return capacidad.admite(fecha, self.requeridos, inicio, fin)
+            else:
+                validar = None
+
+            mejor = None
+            for inicio, fin, ancla, regla in huecos:
+                # Huecos ordenados por inicio: ninguno posterior puede mejorar
+                if mejor is not None and inicio >= mejor[0]:
+                    break
+                candidato = next(
+                    inicios_en_hueco(inicio, fin, ancla, duracion, intervalo, minimo_inicio, validar), None
+                )
+                if candidato is not None and (mejor is None or candidato < mejor[0]):
+                    mejor = (candidato, regla)
+
+            if mejor is not None:
+                return {
+                    'fecha': fecha,
+                    'inicio': mejor[0],
+                    'hora': a_hora(mejor[0]).strftime('%H:%M'),
+                    'regla': mejor[1],
+                }
+        return None
@@ -0,0 +1,223 @@
+"""
+Re-diagnóstico masivo de clientes.
+
+Después de editar reglas de diagnóstico o catálogos, vuelve a correr el motor
+(gestion/motor_diagnostico.py) sobre el perfil actual de cada cliente:
+
+  - Los clientes se leen por lotes con paginación por clave (usuario_id > último),
+    solo los campos del perfil: nunca se tiene la base completa en memoria.
+  - Cada lote se evalúa en un pool de procesos; los workers devuelven filas
+    planas y el proceso principal escribe con bulk_create / bulk_update
+    (una transacción por lote).
+  - Por cada cliente se agrega un DiagnosticoCapilar nuevo (el histórico se
+    conserva). La rutina resultante se asigna si el cliente no la tiene activa;
+    si la tiene con una versión vieja, la copia se actualiza.
+
+Lo ejecuta `manage.py rediagnosticar`.
+"""
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import transaction
+
+from usuarios.models import Cliente
+from .models import (
+    DiagnosticoCapilar, RutinaCliente, Rutina,
+    TipoCabello, GrosorCabello, PorosidadCabello, CueroCabelludo, EstadoGeneral,
+)
+from . import motor_diagnostico
+
+logger = logging.getLogger(__name__)
+
+
+LOTE_POR_DEFECTO = 1000
+
+# Campo FK del perfil -> catálogo (mismo orden que motor_diagnostico.CAMPOS_PERFIL)
+CATALOGOS_PERFIL = (
+    ('tipo_cabello', TipoCabello),
+    ('grosor_cabello', GrosorCabello),
+    ('porosidad_cabello', PorosidadCabello),
+    ('cuero_cabelludo', CueroCabelludo),
+    ('estado_general', EstadoGeneral),
+)
+
+# Catálogos por id, cargados una vez por proceso (para el mensaje del diagnóstico)
+_catalogos = None
+
+
+def _cargar_catalogos():
+    global _catalogos
+    if _catalogos is None:
+        _catalogos = {campo: modelo.objects.in_bulk() for campo, modelo in CATALOGOS_PERFIL}
+    return _catalogos
+
+
+# ============================================================
+# LECTURA POR LOTES
+# ============================================================
+
+def lotes_clientes(lote=LOTE_POR_DEFECTO, desde=None):
+    """
+    Genera listas de (cliente_id, perfil) con al menos un dato capilar.
+    Con `desde`, omite los clientes que ya tienen un diagnóstico posterior
+    (permite retomar una corrida interrumpida).
+    """
+    # exclude(a=None, b=None, ...) deja a los que tienen algún campo cargado
+    clientes = Cliente.objects.exclude(**{campo: None for campo in motor_diagnostico.CAMPOS_PERFIL})
+    if desde:
+        clientes = clientes.exclude(diagnosticos_capilares__fecha_diagnostico__gte=desde)
+
+    ultimo = 0
+    while True:
+        filas = list(
+            clientes.filter(usuario_id__gt=ultimo)
+            .order_by('usuario_id')
+            .values_list('usuario_id', *motor_diagnostico.CAMPOS_PERFIL)[:lote]
+        )
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+        yield [(fila[0], fila[1:]) for fila in filas]
+
+
+# ============================================================
+# EVALUACIÓN (corre en los workers)
+# ============================================================
+
+def evaluar_lote(filas):
+    """
+    Evalúa un lote de (cliente_id, perfil). Devuelve dicts planos con los
+    campos del DiagnosticoCapilar a crear (sin instancias de modelos).
+    """
+    from .views import DiagnosticoCapilarViewSet
+
+    catalogos = _cargar_catalogos()
+    generar_mensaje = DiagnosticoCapilarViewSet()._generar_mensaje_diagnostico
+    resultados = []
+    for cliente_id, perfil in filas:
+        diagnostico = DiagnosticoCapilar(cliente_id=cliente_id)
+        for (campo, _), valor in zip(CATALOGOS_PERFIL, perfil):
+            setattr(diagnostico, campo, catalogos[campo].get(valor))
+
+        regla, puntos, rutina, servicio_urgente = motor_diagnostico.evaluar(diagnostico)
+        resultados.append({
+            'cliente_id': cliente_id,
+            **{f'{campo}_id': valor for (campo, _), valor in zip(CATALOGOS_PERFIL, perfil)},
+            'regla_diagnostico_id': regla.id if regla else None,
+            'rutina_sugerida_id': rutina.id if rutina else None,
+            'rutina_asignada_id': rutina.id if rutina else None,
+            'servicio_urgente_id': servicio_urgente.id if servicio_urgente else None,
+            'observaciones': generar_mensaje(diagnostico, puntos, servicio_urgente, regla),
+        })
+    return resultados
+
+
+# ============================================================
+# ESCRITURA (proceso principal)
+# ============================================================
+
+def guardar_resultados(resultados, rutinas):
+    """
+    Escribe un lote evaluado en una transacción. `rutinas`: {id: Rutina}.
+    Devuelve (diagnósticos creados, rutinas asignadas, rutinas actualizadas).
+    """
+    por_asignar = {
+        (r['cliente_id'], r['rutina_asignada_id'])
+        for r in resultados if r['rutina_asignada_id'] in rutinas
+    }
+
+    with transaction.atomic():
+        DiagnosticoCapilar.objects.bulk_create(
+            [DiagnosticoCapilar(**resultado) for resultado in resultados], batch_size=500
+        )
+
+        # Copias activas que ya tienen los clientes del lote
+        existentes = {}
+        for copia in RutinaCliente.objects.filter(
+            cliente_id__in={cliente_id for cliente_id, _ in por_asignar},
+            rutina_original_id__in={rutina_id for _, rutina_id in por_asignar},
+            estado='activa',
+        ):
+            existentes.setdefault((copia.cliente_id, copia.rutina_original_id), copia)
+
+        nuevas = []
+        desactualizadas = []
+        for clave in por_asignar:
+            rutina = rutinas[clave[1]]
+            copia = existentes.get(clave)
+            if copia is None:
+                nuevas.append(RutinaCliente(
+                    cliente_id=clave[0],
+                    rutina_original=rutina,
+                    nombre=rutina.nombre,
+                    objetivo=rutina.objetivo,
+                    archivo=rutina.archivo,
+                    version_asignada=rutina.version,
+                    estado='activa',
+                ))
+            elif copia.version_asignada < rutina.version:
+                # Los mismos campos que actualizar_desde_original(), sin su save():
+                # se escriben todas juntas con bulk_update
+                copia.rutina_original = rutina
+                copia.nombre = rutina.nombre
+                copia.objetivo = rutina.objetivo
+                copia.archivo = rutina.archivo
+                copia.version_asignada = rutina.version
+                copia.estado = 'activa'
+                desactualizadas.append(copia)
+
+        RutinaCliente.objects.bulk_create(nuevas, batch_size=500)
+        RutinaCliente.objects.bulk_update(
+            desactualizadas, ['nombre', 'objetivo', 'archivo', 'version_asignada', 'estado'], batch_size=500
+        )
+
+    return len(resultados), len(nuevas), len(desactualizadas)
+
+
+def rediagnosticar(desde=None, workers=1, lote=LOTE_POR_DEFECTO, simular=False, progreso=None):
+    """
+    Re-evalúa a todos los clientes con perfil capilar.
+    `progreso(totales, segundos)` se llama después de cada lote.
+    Devuelve el Counter de totales.
+    """
+    rutinas = Rutina.objects.in_bulk()
+    totales = Counter()
+    inicio = time.monotonic()
+
+    def registrar(resultados):
+        totales['clientes'] += len(resultados)
+        totales['nivel_1'] += sum(1 for r in resultados if r['regla_diagnostico_id'])
+        totales['urgentes'] += sum(1 for r in resultados if r['servicio_urgente_id'])
+        if not simular:
+            creados, asignadas, actualizadas = guardar_resultados(resultados, rutinas)
+            totales['diagnosticos'] += creados
+            totales['rutinas_asignadas'] += asignadas
+            totales['rutinas_actualizadas'] += actualizadas
+        if progreso:
+            progreso(totales, time.monotonic() - inicio)
+
+    lotes = lotes_clientes(lote, desde)
+
+    if workers <= 1:
+        for filas in lotes:
+            registrar(evaluar_lote(filas))
+    else:
+        # 'spawn': los workers arrancan limpios (django.setup) y abren su propia
+        # conexión en lugar de heredar el socket del padre con fork
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto, initializer=django.setup) as pool:
+            # A lo sumo 2 lotes por worker en vuelo: la memoria no crece con la base
+            en_vuelo = []
+            for filas in lotes:
+                en_vuelo.append(pool.submit(evaluar_lote, filas))
+                if len(en_vuelo) >= workers * 2:
+                    registrar(en_vuelo.pop(0).result())
+            for futuro in en_vuelo:
+                registrar(futuro.result())
+
+    logger.info(f"[REDIAGNOSTICO] {dict(totales)} en {time.monotonic() - inicio:.1f}s")
+    return totales
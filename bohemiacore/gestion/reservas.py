@@ -0,0 +1,162 @@
+"""
+Escrituras de reservas serializadas por agenda.
+
+Toda operación que ocupa o libera un horario (crear, reprogramar, aceptar un
+adelanto) sigue el patrón leer -> validar -> escribir. Para que dos pedidos
+simultáneos no validen ambos contra el mismo estado "libre", la escritura se
+hace dentro de transaction.atomic tomando:
+
+  - un advisory lock de transacción de Postgres por (profesional, fecha):
+    pg_advisory_xact_lock, se libera solo al hacer COMMIT/ROLLBACK, y
+  - select_for_update sobre las filas que se modifican.
+
+Orden de locks (siempre el mismo para evitar deadlocks):
+  1. turno cancelado que originó una oferta de adelanto (grupo de ofertas)
+  2. notificación aceptada
+  3. turno a mover
+  4. agendas (profesional, fecha) en orden de fecha
+
+La restricción de exclusión de Turno sigue siendo la garantía final: si igual
+se produce un solapamiento, su IntegrityError (SQLSTATE 23P01) se traduce a
+ReservaNoDisponible; cualquier otro error de integridad se propaga.
+"""
+import logging
+from datetime import datetime
+
+from django.db import connection, transaction, IntegrityError
+
+from .models import Turno, Notificacion
+
+logger = logging.getLogger(__name__)
+
+
+MENSAJE_NO_DISPONIBLE = "El horario seleccionado ya no está disponible."
+
+
+class ReservaNoDisponible(Exception):
+    """El horario pedido ya no puede reservarse (otro pedido lo tomó primero)."""
+
+    def __init__(self, mensaje=MENSAJE_NO_DISPONIBLE):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+
+
+class OfertaNoVigente(ReservaNoDisponible):
+    """La oferta de adelanto ya fue aceptada por otro cliente o expiró."""
+
+    def __init__(self, mensaje="Esta oferta ya no está disponible: otro cliente tomó el horario."):
+        super().__init__(mensaje)
+
+
+# ============================================================
+# LOCKS POR AGENDA
+# ============================================================
+
+def clave_agenda(profesional_id, fecha):
+    """Clave bigint del advisory lock de la agenda (profesional, fecha)."""
+    # toordinal() < 1e6 para cualquier fecha razonable: la clave no colisiona
+    return (profesional_id or 0) * 1_000_000 + fecha.toordinal()
+
+
+def bloquear_agendas(profesional_id, fechas):
+    """
+    Toma (o espera) el lock de cada agenda (profesional, fecha) hasta el fin
+    de la transacción actual. Debe llamarse dentro de transaction.atomic.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for fecha in sorted(set(fechas)):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [clave_agenda(profesional_id, fecha)])
+
+
+# ============================================================
+# OPERACIONES
+# ============================================================
+
+def reprogramar_turno(turno_id, nueva_fecha, nueva_hora, verificar=None, aplicar=None, turnos=None):
+    """
+    Mueve un turno a (nueva_fecha, nueva_hora) con la agenda de origen y la de
+    destino bloqueadas.
+
+    verificar(turno) -> mensaje de error o None: se ejecuta con los locks
+        tomados, así lo que valida sigue siendo cierto al guardar.
+    aplicar(turno): cambios adicionales (estado, contador de cambios, etc.).
+    turnos: queryset base para buscar el turno (ej. solo los del cliente).
+    """
+    turnos = Turno.objects.all() if turnos is None else turnos
+
+    with transaction.atomic():
+        turno = turnos.select_for_update().get(pk=turno_id)
+        bloquear_agendas(turno.profesional_id, [turno.fecha, nueva_fecha])
+
+        if verificar:
+            error = verificar(turno)
+            if error:
+                raise ReservaNoDisponible(error)
+
+        turno.fecha = nueva_fecha
+        turno.hora_inicio = nueva_hora
+        if aplicar:
+            aplicar(turno)
+
+        try:
+            with transaction.atomic():
+                turno.save()
+        except IntegrityError as e:
+            if not Turno.es_solapamiento(e):
+                raise
+            raise ReservaNoDisponible()
+
+    return turno
+
+
+def aceptar_adelanto(notificacion_id, usuario, verificar=None):
+    """
+    Acepta una oferta de adelanto. Las ofertas generadas por la misma
+    cancelación (datos_extra.turno_cancelado_id) se serializan entre sí: la
+    primera que confirma se queda con el horario y marca las demás como
+    'expirado' en la misma transacción.
+
+    Lanza OfertaNoVigente si otra oferta del grupo ya fue aceptada,
+    ReservaNoDisponible si el horario dejó de estar libre y
+    Turno.DoesNotExist si el turno no pertenece al usuario.
+    """
+    with transaction.atomic():
+        notificacion = Notificacion.objects.get(pk=notificacion_id, usuario=usuario)
+        datos = notificacion.datos_extra or {}
+        grupo_id = datos.get('turno_cancelado_id')
+
+        # 1. Lock del grupo de ofertas hermanas
+        if grupo_id:
+            list(Turno.objects.select_for_update().filter(pk=grupo_id).values_list('pk', flat=True))
+
+        # 2. Releer la oferta ya serializada: otra pudo haberla expirado
+        notificacion = Notificacion.objects.select_for_update().get(pk=notificacion.pk)
+        if notificacion.estado == 'expirado':
+            raise OfertaNoVigente()
+
+        nueva_fecha = datetime.strptime(datos['fecha_oferta'], '%Y-%m-%d').date()
+        nueva_hora = datetime.strptime(datos['hora_oferta'], '%H:%M').time()
+
+        # 3 y 4. Mover el turno con las agendas bloqueadas
+        turno = reprogramar_turno(
+            datos['turno_actual_id'], nueva_fecha, nueva_hora,
+            verificar=verificar,
+            turnos=Turno.objects.filter(cliente__usuario=usuario),
+        )
+
+        notificacion.estado = 'leido'
+        notificacion.save(update_fields=['estado'])
+
+        if grupo_id:
+            expiradas = Notificacion.objects.filter(
+                tipo='ADELANTO',
+                datos_extra__turno_cancelado_id=grupo_id,
+            ).exclude(pk=notificacion.pk).exclude(estado='expirado').update(estado='expirado')
+            logger.info(
+                f"[RESERVAS] Adelanto del turno cancelado {grupo_id} tomado por el turno {turno.id}; "
+                f"{expiradas} ofertas hermanas expiradas"
+            )
+
+    return turno
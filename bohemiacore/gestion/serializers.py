@@ -9,11 +9,17 @@ from .models import (
 )
 
 from .services import DisponibilidadService
+from .disponibilidad import rango_ocupacion, ESTADOS_OCUPAN_AGENDA
+from . import reservas
 from usuarios.models import Usuario, Cliente
 import os
 from django.core.exceptions import ValidationError 
 from datetime import datetime
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import BooleanField, Case, CharField, Count, FloatField, OuterRef, Prefetch, Q, Subquery, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
 
 # 1. EL SERIALIZER BASE (El "Molde")
 # Define los campos que TODOS los catálogos compartirán
@@ -68,6 +74,14 @@ class ServicioSerializer(serializers.ModelSerializer):
             'activo'
         ]
     
+    @staticmethod
+    def preparar_queryset(queryset):
+        """Categoría, rutina y requisitos (con sus nombres) en 3 consultas para toda la lista."""
+        return queryset.select_related('categoria', 'rutina_recomendada').prefetch_related(Prefetch(
+            'requisitos_equipamiento',
+            queryset=RequisitoServicio.objects.select_related('servicio', 'tipo_equipamiento'),
+        ))
+
     def get_requisitos_equipamiento(self, obj):
         """Retorna los requisitos de equipamiento para este servicio"""
         requisitos = obj.requisitos_equipamiento.all()
@@ -100,10 +114,12 @@ class TurnoSerializer(serializers.ModelSerializer):
         model = Turno
         fields = [
             'id', 'cliente', 'cliente_nombre', 'profesional', 'profesional_nombre', 
-            'equipamiento', 'fecha', 'hora_inicio', 'estado', 'detalles', 'servicio', 
+            'equipamiento', 'fecha', 'hora_inicio', 'hora_fin_calculada', 'duracion_total', 'estado', 'detalles', 'servicio', 
             'servicio_nombre', 'comprobante_pago', 'expired', 'horas_transcurridas', 'puede_modificar'
         ]
-        read_only_fields = ['cliente', 'expired', 'horas_transcurridas', 'puede_modificar']
+        read_only_fields = [
+            'cliente', 'hora_fin_calculada', 'duracion_total', 'expired', 'horas_transcurridas', 'puede_modificar'
+        ]
     
     def get_cliente_nombre(self, obj):
         """Retorna el nombre completo del cliente"""
@@ -207,18 +223,39 @@ class TurnoSerializer(serializers.ModelSerializer):
             except Servicio.DoesNotExist:
                 raise serializers.ValidationError(f"Servicio {servicio_id} no existe.")
         
-        # Crear el Turno principal
-        turno = Turno.objects.create(**validated_data)
-        
-        # Crear cada detalle en la tabla intermedia
-        for detalle_data in detalles_data:
-            if isinstance(detalle_data.get('servicio'), dict):
-                # Si viene serializado, extraer el ID
-                servicio_id = detalle_data['servicio'].get('id')
-                detalle_data['servicio'] = Servicio.objects.get(id=servicio_id)
-            
-            DetalleTurno.objects.create(turno=turno, **detalle_data)
+        try:
+            with transaction.atomic():
+                # Serializa las altas sobre la misma agenda (profesional, fecha)
+                profesional = validated_data.get('profesional')
+                reservas.bloquear_agendas(profesional.id if profesional else None, [validated_data['fecha']])
+
+                # Crear el Turno principal
+                turno = Turno.objects.create(**validated_data)
+                
+                # Crear cada detalle en la tabla intermedia
+                for detalle_data in detalles_data:
+                    if isinstance(detalle_data.get('servicio'), dict):
+                        # Si viene serializado, extraer el ID
+                        servicio_id = detalle_data['servicio'].get('id')
+                        detalle_data['servicio'] = Servicio.objects.get(id=servicio_id)
+                    
+                    DetalleTurno.objects.create(turno=turno, **detalle_data)
+        except IntegrityError as e:
+            # La restricción de exclusión de la base rechazó un solapamiento
+            # con otro turno activo del mismo profesional
+            if not Turno.es_solapamiento(e):
+                raise
+            raise serializers.ValidationError(
+                "El horario seleccionado ya no está disponible. Por favor, elige otro horario."
+            )
+        except ValidationError:
+            # La duración de los detalles alargó el turno sobre otro (Turno.actualizar_duracion)
+            raise serializers.ValidationError(
+                "El horario seleccionado ya no está disponible. Por favor, elige otro horario."
+            )
         
+        # duracion_total / hora_fin_calculada se actualizaron al crear los detalles
+        turno.refresh_from_db(fields=['duracion_total', 'hora_fin_calculada'])
         return turno
     
     def update(self, instance, validated_data):
@@ -233,13 +270,72 @@ class TurnoSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         
-        instance.save()
+        try:
+            with transaction.atomic():
+                instance.save()
+        except IntegrityError as e:
+            if not Turno.es_solapamiento(e):
+                raise
+            raise serializers.ValidationError(Turno.MENSAJE_SOLAPAMIENTO)
         
         # No actualizar detalles en un PATCH de estado
         # Los detalles solo se crean en POST
         
         return instance
 
+
+class TurnoListSerializer(TurnoSerializer):
+    """
+    Mismo formato que TurnoSerializer, optimizado para listados.
+    Los campos calculados salen de anotaciones de `preparar_queryset`:
+      - servicio_nombre: StringAgg de los servicios del turno (subconsulta)
+      - expired / horas_transcurridas / puede_modificar: calculados en SQL
+        contra UN instante leído una sola vez por pedido
+    y cliente/profesional llegan con select_related.
+    """
+    ESTADOS_MODIFICABLES = ('solicitado', 'esperando_sena')
+
+    @staticmethod
+    def preparar_queryset(queryset, ahora=None):
+        ahora = timezone.localtime(ahora or timezone.now())
+        hoy, hora = ahora.date(), ahora.time()
+        tabla = Turno._meta.db_table
+
+        servicios_nombres = (
+            DetalleTurno.objects.filter(turno=OuterRef('pk'))
+            .values('turno')
+            .annotate(nombres=StringAgg('servicio__nombre', ', ', ordering='id'))
+            .values('nombres')
+        )
+        return queryset.select_related('profesional', 'cliente__usuario').annotate(
+            servicios_nombres=Subquery(servicios_nombres, output_field=CharField()),
+            expirado=Case(
+                When(Q(fecha__lt=hoy) | Q(fecha=hoy, hora_inicio__lt=hora), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+            # Hora local sin zona: misma cuenta que datetime.combine + make_aware
+            horas_desde_inicio=RawSQL(
+                f'EXTRACT(EPOCH FROM (%s::timestamp - ("{tabla}"."fecha" + "{tabla}"."hora_inicio"))) / 3600',
+                (ahora.replace(tzinfo=None),),
+                output_field=FloatField(),
+            ),
+        )
+
+    def get_servicio_nombre(self, obj):
+        return obj.servicios_nombres or "Sin servicios"
+
+    def get_expired(self, obj):
+        return obj.expirado
+
+    def get_horas_transcurridas(self, obj):
+        if obj.expirado:
+            return round(float(obj.horas_desde_inicio), 1)
+        return 0
+
+    def get_puede_modificar(self, obj):
+        return not obj.expirado and obj.estado in self.ESTADOS_MODIFICABLES
+
 class FichaTecnicaSerializer(serializers.ModelSerializer):
     """Serializador para el registro técnico del profesional"""
     detalle_turno_id = serializers.IntegerField(source='detalle_turno.id', read_only=True)
@@ -343,8 +439,15 @@ class RutinaSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'fecha_creacion', 'fecha_obsoleta', 'creada_por', 'creada_por_nombre', 'estado_display', 'usuarios_usando']
     
+    @staticmethod
+    def preparar_queryset(queryset):
+        """Autor con select_related y cantidad de copias como anotación (sin COUNT por rutina)."""
+        return queryset.select_related('creada_por').annotate(cantidad_copias=Count('copias_cliente'))
+
     def get_usuarios_usando(self, obj):
         """Retorna la cantidad de usuarios que tienen esta rutina asignada."""
+        if hasattr(obj, 'cantidad_copias'):
+            return obj.cantidad_copias
         return obj.copias_cliente.count()
     
     def create(self, validated_data):
@@ -365,7 +468,7 @@ class PasoRutinaClienteSerializer(serializers.ModelSerializer):
 class RutinaClienteSerializer(serializers.ModelSerializer):
     # pasos = PasoRutinaClienteSerializer(many=True, read_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
-    rutina_original = serializers.IntegerField(source='rutina_original.id', read_only=True)
+    rutina_original = serializers.IntegerField(source='rutina_original_id', read_only=True)
 
     class Meta:
         model = RutinaCliente
@@ -420,6 +523,11 @@ class PersonalSerializer(serializers.ModelSerializer):
             'usuario_email', 'horarios'
         ]
 
+    @staticmethod
+    def preparar_queryset(queryset):
+        """Usuario y horarios de todo el personal en 2 consultas."""
+        return queryset.select_related('usuario').prefetch_related('horarios')
+
     def get_horarios(self, obj):
         """Obtiene los horarios laborales asociados"""
         horarios = obj.horarios.all()
@@ -439,6 +547,16 @@ class AgendaCuidadosSerializer(serializers.ModelSerializer):
         fields = ['id', 'fecha', 'titulo', 'descripcion', 'completado']
 
 class NotificacionSerializer(serializers.ModelSerializer):
+    """
+    Con `campos` (lista de nombres) serializa solo esos campos: el listado
+    compacto (?campos=) no lee ni envía mensaje / datos_extra.
+    """
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if campos is not None:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
     class Meta:
         model = Notificacion
         fields = ['id', 'titulo', 'mensaje', 'tipo', 'estado', 'fecha_envio', 'datos_extra', 'usuario', 'canal']
@@ -564,28 +682,23 @@ class BloqueoAgendaSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La fecha de fin debe ser posterior a la de inicio.")
 
         # 2. Búsqueda de Conflictos (Optimización SQL) 
-        # Filtramos turnos activos en el rango de fechas involucradas
+        # El solapamiento se resuelve en la base: ocupacion && [inicio, fin) (índice GiST)
         turnos_en_rango = Turno.objects.filter(
-            fecha__range=[inicio_bloqueo.date(), fin_bloqueo.date()],
-            estado__in=['pendiente', 'confirmado']
-        )
+            ocupacion__overlap=rango_ocupacion(inicio_bloqueo, fin_bloqueo),
+            estado__in=ESTADOS_OCUPAN_AGENDA
+        ).select_related('cliente__usuario').prefetch_related('detalles__servicio')
 
         if personal:
-            turnos_en_rango = turnos_en_rango.filter(personal=personal)
+            turnos_en_rango = turnos_en_rango.filter(profesional=personal)
 
         conflictos = []
         for turno in turnos_en_rango:
-            # Combinamos fecha y hora para la comparación precisa
-            t_inicio = datetime.combine(turno.fecha, turno.hora_inicio)
-            t_fin = datetime.combine(turno.fecha, turno.hora_fin_calculada)
-            
-            # Lógica de solapamiento: (StartA < EndB) y (EndA > StartB) 
-            if (t_inicio < fin_bloqueo.replace(tzinfo=None)) and (t_fin > inicio_bloqueo.replace(tzinfo=None)):
-                conflictos.append({
-                    "cliente": f"{turno.cliente.usuario.first_name} {turno.cliente.usuario.last_name}",
-                    "horario": f"{turno.hora_inicio} - {turno.hora_fin_calculada}",
-                    "servicio": turno.servicio.nombre
-                })
+            servicios = [d.servicio.nombre for d in turno.detalles.all()]
+            conflictos.append({
+                "cliente": f"{turno.cliente.usuario.first_name} {turno.cliente.usuario.last_name}",
+                "horario": f"{turno.hora_inicio} - {turno.hora_fin_calculada}",
+                "servicio": ', '.join(servicios) if servicios else 'Sin servicios'
+            })
 
         if conflictos:
             raise serializers.ValidationError({
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, time, date
-from .models import Turno, HorarioLaboral, Configuracion, Equipamiento
+from .models import Turno, Equipamiento
+from . import snapshot_agenda
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,35 +22,21 @@ class DisponibilidadService:
         duracion_servicio_minutos = getattr(servicio, 'duracion_estimada', None) or 60
 
         # 1. Buscar la regla horaria que coincida con el tipo de servicio
-        filtros = {
-            'dia_semana': dia_semana,
-            'activo': True
-        }
+        # (del snapshot en memoria: no consulta la base)
+        if servicio and getattr(servicio, 'categoria', None) and getattr(servicio.categoria, 'nombre', '') == 'Diseño de color':
+            campo_permiso = 'permite_diseno_color'
+        else:
+            campo_permiso = 'permite_complemento'
 
-        # Si nos pasan el servicio, intentamos filtrar por campos específicos
-        campo_diseno = 'permite_diseno_color'
-        campo_complemento = 'permite_complemento'
-
-        model_fields = [f.name for f in HorarioLaboral._meta.get_fields()]
-        try:
-            if servicio and getattr(servicio, 'categoria', None) and getattr(servicio.categoria, 'nombre', '') == 'Diseño de color':
-                if campo_diseno in model_fields:
-                    filtros[campo_diseno] = True
-            else:
-                if campo_complemento in model_fields:
-                    filtros[campo_complemento] = True
-
-            horario_laboral = HorarioLaboral.objects.filter(**filtros).first()
-            if not horario_laboral:
-                logger.warning(f"No hay horario laboral configurado que cumpla filtros: {filtros}")
-                return []  # Día cerrado o servicio no permitido ese día
-            logger.info(f"Horario encontrado: {horario_laboral.hora_inicio} - {horario_laboral.hora_fin}")
-        except Exception as e:
-            logger.error(f"Error al buscar horario laboral con filtros {filtros}: {str(e)}", exc_info=True)
-            raise Exception(f"Error al obtener horario laboral: {str(e)}")
+        reglas_dia = snapshot_agenda.obtener().reglas_del_dia(dia_semana)
+        horario_laboral = next((regla for regla in reglas_dia if getattr(regla, campo_permiso)), None)
+        if not horario_laboral:
+            logger.warning(f"No hay horario laboral configurado para el día {dia_semana} con {campo_permiso}")
+            return []  # Día cerrado o servicio no permitido ese día
+        logger.info(f"Horario encontrado: {horario_laboral.hora_inicio} - {horario_laboral.hora_fin}")
 
         # Obtenemos configuración (ej: intervalos de 60 min para respetar la grilla de turnos)
-        config = Configuracion.objects.first()
+        config = snapshot_agenda.configuracion()
         # FORZAMOS intervalo de 60 min si es un servicio largo, o usamos el de config
         # Según tus docs, los turnos de diseño son a las 10, 11, 12 (en punto).
         intervalo = 60 
@@ -81,7 +68,7 @@ class DisponibilidadService:
 
             # Convertimos a set para búsqueda rápida
             horarios_ocupados_set = set(turnos_ocupados)
-            logger.info(f"Horarios ocupados: {horarios_ocupados_set}")
+            logger.debug(f"Horarios ocupados: {horarios_ocupados_set}")
         except Exception as e:
             logger.error(f"Error al obtener turnos ocupados: {str(e)}")
             horarios_ocupados_set = set()
@@ -131,7 +118,7 @@ class DisponibilidadService:
             ).exists()
             
             if turnos_solapados_inicio:
-                logger.warning(f"Horario {hora_inicio} ya ocupado (solapamiento de inicio)")
+                logger.debug(f"Horario {hora_inicio} ya ocupado (solapamiento de inicio)")
                 return False
             
             # 2. Validar Sillas Técnicas (si existe Equipamiento)
@@ -153,11 +140,11 @@ class DisponibilidadService:
                 
                 # Si no hay sillas definidas, asumir que hay infinitas
                 if total_sillas == 0:
-                    logger.info(f"No hay sillas técnicas definidas, permitiendo reserva")
+                    logger.debug(f"No hay sillas técnicas definidas, permitiendo reserva")
                     return True
                 
                 if sillas_ocupadas >= total_sillas:
-                    logger.warning(f"No hay sillas técnicas disponibles ({sillas_ocupadas}/{total_sillas})")
+                    logger.debug(f"No hay sillas técnicas disponibles ({sillas_ocupadas}/{total_sillas})")
                     return False
                 
             except Exception as e:
@@ -166,7 +153,7 @@ class DisponibilidadService:
                 return True
             
             # 3. Si pasó todas las validaciones, está disponible
-            logger.info(f"Horario {hora_inicio} - Validación OK (recursos disponibles)")
+            logger.debug(f"Horario {hora_inicio} - Validación OK (recursos disponibles)")
             return True
             
         except Exception as e:
@@ -1,242 +1,244 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.utils import timezone
-from datetime import timedelta
-from .models import Turno, ReglaCuidado, AgendaCuidados, RutinaCliente #PasoRutinaCliente
-from usuarios.models import Usuario
-from .models import Notificacion
+from .models import Turno
+from .models import DetalleTurno, BloqueoAgenda, HorarioLaboral, Equipamiento, RequisitoServicio, Configuracion
+from .models import ReglaDiagnostico, Rutina, Servicio, Personal, Notificacion
+from . import cache_disponibilidad, tareas, motor_diagnostico, catalogos, snapshot_agenda, contadores, analitica, eventos
+# Registra las tareas en segundo plano que encolan estos receivers
+from . import automatizacion  # noqa: F401
 
 
 #----------------------------------------------------
-# 1. SISTEMA DE AGENDA DE CUIDADOS POST-SERVICIO
+# 1. TRANSICIONES DE ESTADO DEL TURNO
 #----------------------------------------------------
-@receiver(post_save, sender=Turno)
-def generar_cuidados_post_servicio(sender, instance, created, **kwargs):
+# Un solo receiver para agenda de cuidados, notificaciones y flujo
+# post-servicio: solo actúa cuando el estado cambia de verdad (o el turno se
+# crea) y encola una única tarea que comparte el contexto precargado entre
+# todos los handlers (ver automatizacion.procesar_transicion_turno).
+# Reprogramaciones o cambios de contador no disparan nada.
+
+@receiver(pre_save, sender=Turno)
+def recordar_estado_previo_turno(sender, instance, **kwargs):
     """
-    PROCESO AUTOMATIZADO:
-    Disparador: El estado del turno cambia a 'REALIZADO'.
-    Acción: El sistema genera la agenda de cuidados post-servicio para el cliente.
+    Snapshot previo al guardado (una consulta): el estado para detectar
+    transiciones y profesional/fecha para liberar la agenda vieja si el turno se mueve.
     """
-    # Verificamos que sea un turno 'realizado' (ajusta el string según tus choices en Turno)
-    if instance.estado == 'realizado': 
-        print(f"[SISTEMA] Turno finalizado detectado para {instance.cliente}. Iniciando automatización...")
-        
-        # 1. Buscamos si el servicio realizado tiene reglas configuradas (ej: Alisado -> No lavar)
-        reglas = ReglaCuidado.objects.filter(servicio=instance.servicio)
-        
-        if not reglas.exists():
-            print("El servicio no tiene reglas automáticas asociadas.")
-            return
-
-        # 2. Preparamos las tareas para la agenda
-        nuevos_items = []
-        fecha_base = instance.fecha # Fecha en que se hizo el servicio
-        
-        for regla in reglas:
-            # CASO A: RESTRICCIONES (Lo que NO debe hacer)
-            if regla.tipo == 'RESTRICCION':
-                # Generamos una entrada por cada día que dure la restricción
-                duracion = regla.dias_duracion if regla.dias_duracion > 0 else 1
-                for i in range(duracion):
-                    fecha_bloqueo = fecha_base + timedelta(days=i)
-                    nuevos_items.append(AgendaCuidados(
-                        cliente=instance.cliente,
-                        fecha=fecha_bloqueo,
-                        titulo="RESTRICCIÓN",
-                        descripcion=f"{regla.descripcion} (Día {i+1}/{duracion}) - Servicio: {instance.servicio.nombre}"
-                    ))
-
-            # CASO B: HÁBITOS (Lo que DEBE hacer)
-            elif regla.tipo == 'HABITO':
-                # Por defecto, sugerimos empezar el hábito al día siguiente
-                fecha_inicio = fecha_base + timedelta(days=1)
-                
-                # Si es un hábito recurrente (ej: cada 7 días durante un mes)
-                if regla.frecuencia_dias and regla.frecuencia_dias > 0:
-                    # Generamos 4 repeticiones (ejemplo: un mes de tratamiento)
-                    for i in range(0, 30, regla.frecuencia_dias):
-                        nuevos_items.append(AgendaCuidados(
-                            cliente=instance.cliente,
-                            fecha=fecha_inicio + timedelta(days=i),
-                            titulo="Hábito Sugerido",
-                            descripcion=f"{regla.descripcion} - Servicio: {instance.servicio.nombre}"
-                        ))
-                else:
-                    # Es un hábito de una sola vez
-                    nuevos_items.append(AgendaCuidados(
-                        cliente=instance.cliente,
-                        fecha=fecha_inicio,
-                        titulo="🧴 Hábito Sugerido",
-                        descripcion=f"{regla.descripcion} - Servicio: {instance.servicio.nombre}"
-                    ))
-
-        # 3. Guardamos todo en la base de datos de una sola vez
-        if nuevos_items:
-            AgendaCuidados.objects.bulk_create(nuevos_items)
-            print(f"Se generaron automáticamete {len(nuevos_items)} tareas en la agenda de {instance.cliente}.")
-
-
-#----------------------------------------------------
-# 2. SISTEMA DE NOTIFICACIONES IN-APP
+    previo = None
+    if instance.pk:
+        previo = Turno.objects.filter(pk=instance.pk).values_list('profesional_id', 'fecha', 'estado').first()
+    instance._estado_previo = previo[2] if previo else None
+    instance._agenda_previa = previo[:2] if previo else None
+
+
+@receiver(post_save, sender=Turno)
+def despachar_transicion_turno(sender, instance, created, **kwargs):
+    estado_anterior = None if created else getattr(instance, '_estado_previo', None)
+    if not created and estado_anterior == instance.estado:
+        return
+    tareas.encolar_al_confirmar(
+        'procesar_transicion_turno',
+        turno_id=instance.id,
+        estado_anterior=estado_anterior,
+        estado_nuevo=instance.estado,
+        creado=created,
+    )
+
+
+#----------------------------------------------------
+# 2. DURACIÓN Y HORA DE FIN DEL TURNO
+#----------------------------------------------------
+
+@receiver(post_save, sender=DetalleTurno)
+@receiver(post_delete, sender=DetalleTurno)
+def actualizar_duracion_turno(sender, instance, **kwargs):
+    """Mantiene Turno.duracion_total y Turno.hora_fin_calculada al día con sus detalles."""
+    turno = Turno.objects.filter(pk=instance.turno_id).first()
+    if turno:
+        turno.actualizar_duracion()
+
+
+#----------------------------------------------------
+# 3. INVALIDACIÓN DEL CACHE DE DISPONIBILIDAD
 #----------------------------------------------------
+# Cada cambio incrementa solo la versión de los ámbitos afectados
+# (ver gestion/cache_disponibilidad.py).
+
+def _ambitos_turno(profesional_id, fecha):
+    ambitos = [cache_disponibilidad.ambito_dia(fecha)]
+    if profesional_id:
+        ambitos.append(cache_disponibilidad.ambito_agenda(profesional_id, fecha))
+    return ambitos
+
 
 @receiver(post_save, sender=Turno)
-def crear_notificacion_cambio_estado(sender, instance, created, **kwargs):
-    """
-    Genera notificaciones In-App respetando el nuevo modelo del diagrama.
-    """
-    # Obtener nombres de servicios del turno
-    servicios_nombres = [d.servicio.nombre for d in instance.detalles.all()]
-    servicios_str = ', '.join(servicios_nombres) if servicios_nombres else 'Servicios'
-    
-    # 1. NOTIFICACIÓN AL PROFESIONAL (Nuevo Turno)
-    if created and instance.estado == 'solicitado':
-        admins = Usuario.objects.filter(is_staff=True)
-        for admin in admins:
-            Notificacion.objects.create(
-                usuario=admin,
-                titulo="Nuevo Turno Solicitado",
-                mensaje=f"{instance.cliente.usuario.first_name} solicitó {servicios_str} el {instance.fecha}.",
-                tipo='alerta',
-                canal='app',
-                estado='pendiente',
-                origen_entidad='Turno', 
-                origen_id=instance.id    
-            )
-
-    # 2. NOTIFICACIÓN AL CLIENTE (Cambio de Estado)
-    if not created:
-        usuario_cliente = instance.cliente.usuario
-        titulo = ""
-        mensaje = ""
-        tipo_notif = 'informativa'
-
-        if instance.estado == 'esperando_sena':
-            titulo = "Turno Aceptado"
-            mensaje = f"Tu turno para {servicios_str} fue aceptado. ¡Sube tu seña!"
-            tipo_notif = 'alerta' # Es importante, requiere acción
-        
-        elif instance.estado == 'confirmado':
-            titulo = "Turno Confirmado"
-            mensaje = "Seña recibida. Tu turno está confirmado. Te esperamos."
-        
-        elif instance.estado == 'cancelado':
-            titulo = "Turno Cancelado"
-            mensaje = f"El turno del {instance.fecha} ha sido cancelado."
-            tipo_notif = 'alerta'
-
-        elif instance.estado == 'realizado':
-            titulo = "¡Servicio Finalizado!"
-            mensaje = "Ya tienes disponible tu nueva Rutina de Cuidados en tu perfil."
-
-        if titulo:
-            Notificacion.objects.create(
-                usuario=usuario_cliente,
-                titulo=titulo,
-                mensaje=mensaje,
-                tipo=tipo_notif,
-                canal='app',
-                estado='pendiente',
-                origen_entidad='Turno',
-                origen_id=instance.id
-            )
+@receiver(post_delete, sender=Turno)
+def invalidar_disponibilidad_turno(sender, instance, **kwargs):
+    ambitos = _ambitos_turno(instance.profesional_id, instance.fecha)
+    previa = getattr(instance, '_agenda_previa', None)
+    if previa and previa != (instance.profesional_id, instance.fecha):
+        ambitos += _ambitos_turno(*previa)
+    cache_disponibilidad.invalidar_al_confirmar(*ambitos)
+
+
+@receiver(post_save, sender=DetalleTurno)
+@receiver(post_delete, sender=DetalleTurno)
+def invalidar_disponibilidad_detalle(sender, instance, **kwargs):
+    """La duración del turno sale de sus detalles."""
+    turno = Turno.objects.filter(pk=instance.turno_id).values_list('profesional_id', 'fecha').first()
+    if turno:
+        cache_disponibilidad.invalidar_al_confirmar(*_ambitos_turno(*turno))
+
+
+def _ambitos_bloqueo(personal_id, fecha_inicio, fecha_fin):
+    ambitos = set()
+    for fecha in cache_disponibilidad.fechas_de_rango(fecha_inicio, fecha_fin):
+        if personal_id:
+            ambitos.add(cache_disponibilidad.ambito_agenda(personal_id, fecha))
+        else:
+            ambitos.add(cache_disponibilidad.ambito_bloqueos_globales(fecha))
+        ambitos.add(cache_disponibilidad.ambito_mes(fecha.year, fecha.month))
+    return ambitos
+
+
+@receiver(pre_save, sender=BloqueoAgenda)
+def recordar_rango_previo_bloqueo(sender, instance, **kwargs):
+    instance._rango_previo = None
+    if instance.pk:
+        instance._rango_previo = BloqueoAgenda.objects.filter(pk=instance.pk).values_list(
+            'personal_id', 'fecha_inicio', 'fecha_fin'
+        ).first()
+
+
+@receiver(post_save, sender=BloqueoAgenda)
+@receiver(post_delete, sender=BloqueoAgenda)
+def invalidar_disponibilidad_bloqueo(sender, instance, **kwargs):
+    ambitos = _ambitos_bloqueo(instance.personal_id, instance.fecha_inicio, instance.fecha_fin)
+    previo = getattr(instance, '_rango_previo', None)
+    if previo:
+        ambitos |= _ambitos_bloqueo(*previo)
+    cache_disponibilidad.invalidar_al_confirmar(*ambitos)
+
+
+@receiver(post_save, sender=HorarioLaboral)
+@receiver(post_delete, sender=HorarioLaboral)
+def invalidar_disponibilidad_horarios(sender, instance, **kwargs):
+    cache_disponibilidad.invalidar_al_confirmar('horarios')
+
+
+@receiver(post_save, sender=Equipamiento)
+@receiver(post_delete, sender=Equipamiento)
+@receiver(post_save, sender=RequisitoServicio)
+@receiver(post_delete, sender=RequisitoServicio)
+def invalidar_disponibilidad_recursos(sender, instance, **kwargs):
+    cache_disponibilidad.invalidar_al_confirmar('recursos')
+
+
+@receiver(post_save, sender=Configuracion)
+def invalidar_disponibilidad_configuracion(sender, instance, **kwargs):
+    cache_disponibilidad.invalidar_al_confirmar('global')
+
+
+#----------------------------------------------------
+# 4. INVALIDACIÓN DEL MOTOR DE DIAGNÓSTICO
+#----------------------------------------------------
+# Reglas, rutinas y servicios forman el índice compilado
+# (ver gestion/motor_diagnostico.py).
+
+@receiver(post_save, sender=ReglaDiagnostico)
+@receiver(post_delete, sender=ReglaDiagnostico)
+@receiver(post_save, sender=Rutina)
+@receiver(post_delete, sender=Rutina)
+@receiver(post_save, sender=Servicio)
+@receiver(post_delete, sender=Servicio)
+def invalidar_motor_diagnostico(sender, instance, **kwargs):
+    motor_diagnostico.invalidar_al_confirmar()
+
+
+#----------------------------------------------------
+# 5. INVALIDACIÓN DEL BUNDLE DE CATÁLOGOS
+#----------------------------------------------------
+# (ver gestion/catalogos.py)
+
+def invalidar_bundle_catalogos(sender, instance, **kwargs):
+    catalogos.invalidar_al_confirmar()
+
+
+for _modelo in catalogos.MODELOS_BUNDLE:
+    post_save.connect(invalidar_bundle_catalogos, sender=_modelo, dispatch_uid=f'bundle_catalogos_save_{_modelo.__name__}')
+    post_delete.connect(invalidar_bundle_catalogos, sender=_modelo, dispatch_uid=f'bundle_catalogos_delete_{_modelo.__name__}')
+
+
+#----------------------------------------------------
+# 6. INVALIDACIÓN DEL SNAPSHOT DE CONFIGURACIÓN Y HORARIOS
+#----------------------------------------------------
+# (ver gestion/snapshot_agenda.py)
+
+@receiver(post_save, sender=Configuracion)
+@receiver(post_delete, sender=Configuracion)
+@receiver(post_save, sender=HorarioLaboral)
+@receiver(post_delete, sender=HorarioLaboral)
+@receiver(post_save, sender=Personal)
+@receiver(post_delete, sender=Personal)
+def invalidar_snapshot_agenda(sender, instance, **kwargs):
+    snapshot_agenda.invalidar_al_confirmar()
+
+
+#----------------------------------------------------
+# 7. CONTADORES POR ESTADO DEL TABLERO
+#----------------------------------------------------
+# Diferencias insertadas en la transacción del guardado / borrado (ver gestion/contadores.py).
 
 @receiver(post_save, sender=Turno)
-def automatizacion_post_servicio(sender, instance, created, **kwargs):
-    """
-    Gestiona el Flujo Post-Servicio:
-    1. Actualiza el Diagnóstico (Perfil) basado en el Impacto.
-    2. Asigna la Rutina Recomendada en la Agenda.
-    """
-    if instance.estado == 'realizado':
-        print(f"[SISTEMA] Finalizando turno {instance.id}. Iniciando automatización...")
-        
-        cliente = instance.cliente
-        servicio = instance.servicio
-        fecha_base = instance.fecha
-
-        # --- PASO 1: ACTUALIZACIÓN DE DIAGNÓSTICO (Impacto) ---
-        cambio_perfil = False
-        
-        if servicio.impacto_porosidad:
-            print(f"   Diagnóstico: Porosidad cambia a {servicio.impacto_porosidad}")
-            cliente.porosidad_cabello = servicio.impacto_porosidad
-            cambio_perfil = True
-            
-        if servicio.impacto_estado:
-            print(f"   Diagnóstico: Estado cambia a {servicio.impacto_estado}")
-            cliente.estado_general = servicio.impacto_estado
-            cambio_perfil = True
-            
-        if cambio_perfil:
-            cliente.save()
-
-        # --- PASO 2: ASIGNACIÓN DE RUTINA ---
-        nuevos_items = []
-
-        # A. Si el servicio tiene Rutina Recomendada (Prioridad Alta)
-        if servicio.rutina_recomendada:
-            rutina = servicio.rutina_recomendada
-            print(f"   📘 Asignando Rutina: {rutina.nombre}")
-            
-            # 1. Crear RutinaCliente (copia personalizada para el cliente)
-            rutina_cliente, created = RutinaCliente.objects.get_or_create(
-                cliente=cliente,
-                rutina_original=rutina,
-                defaults={
-                    'nombre': rutina.nombre,
-                    'objetivo': rutina.objetivo,
-                    'descripcion': rutina.descripcion,
-                    'version_asignada': 1,  # Versión inicial
-                    'estado': 'activa'
-                }
-            )
-            
-            if created:
-                print(f"    RutinaCliente creada: {rutina_cliente.nombre}")
-            else:
-                print(f"    RutinaCliente ya existía: {rutina_cliente.nombre}")
-            
-            # 2. Verificar y copiar los pasos (tanto para nuevas como existentes)
-            """
-            pasos_existentes = rutina_cliente.pasos.count()
-            if pasos_existentes == 0:
-                print(f"    🔄 Copiando pasos de la rutina original...")
-                
-                pasos_originales = rutina.pasos.all().order_by('orden')
-                pasos_cliente = []
-                for paso_original in pasos_originales:
-                    pasos_cliente.append(PasoRutinaCliente(
-                        rutina_cliente=rutina_cliente,
-                        orden=paso_original.orden,
-                        descripcion=paso_original.descripcion,
-                        frecuencia=paso_original.frecuencia
-                    ))
-                
-                # Crear todos los pasos de una vez
-                if pasos_cliente:
-                    PasoRutinaCliente.objects.bulk_create(pasos_cliente)
-                    print(f"    ✅ {len(pasos_cliente)} pasos copiados a la rutina del cliente")
-                else:
-                    print(f"    ⚠️  La rutina original no tiene pasos definidos")
-            else:
-                print(f"    ℹ️  La rutina ya tiene {pasos_existentes} pasos")
-            
-            print(f"   ✅ Rutina asignada correctamente. Disponible en 'Mis Rutinas'")
-            """
-
-        # B. Restricciones puntuales (Si las hay)
-        # (Ej: "No lavar por 48hs" - Esto es independiente de la rutina)
-        restricciones = ReglaCuidado.objects.filter(servicio=servicio, tipo='RESTRICCION')
-        for regla in restricciones:
-            nuevos_items.append(AgendaCuidados(
-                cliente=cliente,
-                fecha=fecha_base,
-                titulo="RESTRICCIÓN",
-                descripcion=f"{regla.descripcion} - Servicio: {servicio.nombre}"
-            ))
-
-        # Guardamos todo en la agenda
-        if nuevos_items:
-            AgendaCuidados.objects.bulk_create(nuevos_items)
-            print(f" Se generaron {len(nuevos_items)} items en la agenda.")
\ No newline at end of file
+def contar_estado_turno(sender, instance, created, **kwargs):
+    anterior = None
+    previa = getattr(instance, '_agenda_previa', None)
+    if not created and previa:
+        anterior = (previa[1], instance._estado_previo)
+    contadores.registrar_cambio(anterior, (instance.fecha, instance.estado))
+
+
+@receiver(post_delete, sender=Turno)
+def descontar_estado_turno(sender, instance, **kwargs):
+    contadores.registrar_cambio((instance.fecha, instance.estado), None)
+
+
+#----------------------------------------------------
+# 8. RESÚMENES DIARIOS (REPORTES)
+#----------------------------------------------------
+# Solo escriben si el estado previo o el nuevo es terminal (ver gestion/analitica.py).
+
+@receiver(post_save, sender=Turno)
+def resumir_turno(sender, instance, created, **kwargs):
+    anterior = None
+    previa = getattr(instance, '_agenda_previa', None)
+    if not created and previa:
+        anterior = (previa[1], previa[0], instance._estado_previo)
+    analitica.registrar_cambio(instance, anterior, (instance.fecha, instance.profesional_id, instance.estado))
+
+
+@receiver(pre_delete, sender=Turno)
+def descontar_resumen_turno(sender, instance, **kwargs):
+    # En pre_delete los detalles (ingresos del turno) todavía existen
+    analitica.registrar_cambio(instance, (instance.fecha, instance.profesional_id, instance.estado), None)
+
+
+#----------------------------------------------------
+# 9. EVENTOS EN VIVO (SSE)
+#----------------------------------------------------
+# Se guardan y anuncian con NOTIFY en la misma transacción (ver gestion/eventos.py).
+# Las notificaciones creadas con bulk_create se publican donde se crean.
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar([eventos.evento_notificacion(instance)])
+
+
+@receiver(post_save, sender=Turno)
+def publicar_estado_turno(sender, instance, created, **kwargs):
+    estado_anterior = None if created else getattr(instance, '_estado_previo', None)
+    if not created and estado_anterior == instance.estado:
+        return
+    eventos.publicar(eventos.eventos_turno(
+        instance.id, instance.cliente_id, estado_anterior, instance.estado, instance.fecha, instance.hora_inicio
+    ))
@@ -0,0 +1,138 @@
+"""
+Snapshot de configuración y horarios.
+
+Configuracion, las reglas activas de HorarioLaboral y el Personal (con sus
+habilidades) se leen en casi cada pedido de disponibilidad y cambian solo
+cuando el admin los edita. Se cargan juntos una vez por proceso (ver
+gestion/cache_proceso.py) en un objeto inmutable:
+
+  - config: ConfiguracionAgenda (o None si todavía no se creó)
+  - personal: {id: ProfesionalAgenda}, activos e inactivos
+  - reglas (todas o por día de la semana): ReglaHoraria en el orden del
+    modelo, con `personal` ya resuelto contra el mismo diccionario
+
+Son copias congeladas (dataclasses frozen), no instancias del modelo: el
+snapshot lo comparten todos los hilos del proceso y nadie puede modificarlo
+para los demás. Para escribir, leer el modelo de la base.
+
+Los receivers de gestion/signals.py invalidan el snapshot al guardar o borrar
+cualquiera de los tres modelos: todos los workers lo rearman en su próximo
+pedido y, mientras tanto, la disponibilidad no consulta reglas horarias.
+"""
+import logging
+from dataclasses import dataclass, fields
+from datetime import date, time
+from decimal import Decimal
+from types import MappingProxyType
+
+from .models import Configuracion, DiasSemana, HorarioLaboral, Personal
+from .cache_proceso import CacheProceso
+
+logger = logging.getLogger(__name__)
+
+
+def _congelar(tipo, instancia, **resueltos):
+    """Copia en `tipo` los campos homónimos de la instancia del modelo."""
+    valores = {campo.name: getattr(instancia, campo.name) for campo in fields(tipo) if campo.name not in resueltos}
+    return tipo(**valores, **resueltos)
+
+
+@dataclass(frozen=True)
+class ConfiguracionAgenda:
+    intervalo_turnos: int
+    max_dias_anticipacion: int
+    monto_sena: Decimal
+    tiempo_limite_pago_sena: int
+    max_reprogramaciones: int
+    horas_limite_cancelacion: int
+
+
+@dataclass(frozen=True)
+class ProfesionalAgenda:
+    id: int
+    nombre: str
+    apellido: str
+    rol: str
+    activo: bool
+    realiza_diagnostico: bool
+    realiza_lavado: bool
+    realiza_color: bool
+    color_calendario: str
+
+    @property
+    def pk(self):
+        return self.id
+
+
+@dataclass(frozen=True)
+class ReglaHoraria:
+    id: int
+    personal_id: int
+    personal: ProfesionalAgenda
+    dia_semana: int
+    fecha_desde: date
+    fecha_hasta: date
+    hora_inicio: time
+    hora_fin: time
+    permite_diseno_color: bool
+    permite_complemento: bool
+    activo: bool
+
+    def get_dia_semana_display(self):
+        # Como el de HorarioLaboral (lo usa HorarioLaboralSerializer)
+        return DiasSemana(self.dia_semana).label
+
+
+class SnapshotAgenda:
+    """Configuración, reglas horarias activas y personal, inmutables."""
+
+    def __init__(self, config, reglas, personal):
+        self.config = config
+        self.personal = MappingProxyType(dict(personal))
+        self.reglas = tuple(reglas)
+        por_dia = {}
+        for regla in self.reglas:
+            por_dia.setdefault(regla.dia_semana, []).append(regla)
+        self._por_dia = {dia: tuple(reglas_dia) for dia, reglas_dia in por_dia.items()}
+
+    @classmethod
+    def armar(cls):
+        config = Configuracion.objects.first()
+        personal = {
+            personal_id: _congelar(ProfesionalAgenda, profesional)
+            for personal_id, profesional in Personal.objects.in_bulk().items()
+        }
+        reglas = [
+            # Todas las reglas comparten los ProfesionalAgenda del snapshot
+            _congelar(ReglaHoraria, regla, personal=personal.get(regla.personal_id))
+            for regla in HorarioLaboral.objects.filter(activo=True).order_by('dia_semana', 'hora_inicio', 'id')
+        ]
+        logger.info(f"[SNAPSHOT] Configuración y horarios cargados ({len(reglas)} reglas, {len(personal)} profesionales)")
+        config = _congelar(ConfiguracionAgenda, config) if config else None
+        return cls(config, reglas, personal)
+
+    def reglas_del_dia(self, dia_semana):
+        """Reglas activas del día de la semana (0 = lunes), sin filtrar por fecha."""
+        return self._por_dia.get(dia_semana, ())
+
+    def reglas_vigentes(self, fecha):
+        """Reglas activas que aplican en `fecha` (día de la semana y rango de vigencia)."""
+        return [
+            regla for regla in self.reglas_del_dia(fecha.weekday())
+            if (regla.fecha_desde is None or regla.fecha_desde <= fecha)
+            and (regla.fecha_hasta is None or regla.fecha_hasta >= fecha)
+        ]
+
+
+_snapshot = CacheProceso('snapshot_agenda:version', SnapshotAgenda.armar)
+invalidar_al_confirmar = _snapshot.invalidar_al_confirmar
+
+
+def obtener():
+    """Snapshot vigente (sin consultas a la base si la versión no cambió)."""
+    return _snapshot.obtener()
+
+
+def configuracion():
+    """ConfiguracionAgenda vigente o None (en lugar de Configuracion.objects.first())."""
+    return obtener().config
@@ -0,0 +1,138 @@
+"""
+Cola de tareas en segundo plano sobre la propia base de datos.
+
+- Las tareas se registran por nombre con @tarea('nombre').
+- `encolar_al_confirmar(...)` agrega el Job cuando la transacción actual
+  confirma: si la petición falla y hace ROLLBACK, no queda ningún job huérfano
+  y el worker nunca ve datos que todavía no existen.
+- Los workers (`manage.py procesar_jobs`) toman jobs con
+  SELECT ... FOR UPDATE SKIP LOCKED: varios workers en paralelo nunca toman
+  el mismo job y no se bloquean entre sí.
+- La tarea corre en la misma transacción que marca el job como completado:
+  si falla, sus escrituras se deshacen y el job se reintenta con backoff
+  exponencial hasta `max_intentos`.
+- `clave_idempotencia` evita encolar dos veces el mismo trabajo.
+"""
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+# Backoff exponencial: 10s, 20s, 40s... con tope de una hora
+BACKOFF_BASE_SEGUNDOS = 10
+BACKOFF_MAXIMO_SEGUNDOS = 3600
+
+TAREAS = {}
+
+
+def tarea(nombre):
+    """Registra una función como tarea ejecutable por los workers."""
+    def decorador(funcion):
+        TAREAS[nombre] = funcion
+        return funcion
+    return decorador
+
+
+# ============================================================
+# ENCOLAR
+# ============================================================
+
+def encolar(nombre, clave=None, max_intentos=5, retraso_segundos=0, **argumentos):
+    """
+    Crea el Job (dentro de la transacción actual, si la hay).
+    Con `clave`, si ya existe un job con esa clave se devuelve el existente.
+    """
+    if nombre not in TAREAS:
+        raise ValueError(f"Tarea no registrada: {nombre}")
+
+    datos = {
+        'tarea': nombre,
+        'argumentos': argumentos,
+        'max_intentos': max_intentos,
+        'ejecutar_despues': timezone.now() + timedelta(seconds=retraso_segundos),
+    }
+    if not clave:
+        return Job.objects.create(**datos)
+
+    try:
+        with transaction.atomic():
+            job, _ = Job.objects.get_or_create(clave_idempotencia=clave, defaults=datos)
+    except IntegrityError:
+        # Otro pedido encoló la misma clave al mismo tiempo
+        job = Job.objects.get(clave_idempotencia=clave)
+    return job
+
+
+def encolar_al_confirmar(nombre, clave=None, **argumentos):
+    """Encola la tarea cuando la transacción actual confirma (o ya, si no hay transacción)."""
+    if nombre not in TAREAS:
+        raise ValueError(f"Tarea no registrada: {nombre}")
+    transaction.on_commit(lambda: encolar(nombre, clave=clave, **argumentos))
+
+
+# ============================================================
+# WORKER
+# ============================================================
+
+def espera_reintento(intentos):
+    """Segundos hasta el próximo intento tras `intentos` fallidos."""
+    return min(BACKOFF_BASE_SEGUNDOS * 2 ** (intentos - 1), BACKOFF_MAXIMO_SEGUNDOS)
+
+
+def procesar_siguiente():
+    """
+    Toma el próximo job listo y lo ejecuta. Devuelve el Job procesado o None
+    si no había ninguno disponible.
+    """
+    with transaction.atomic():
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(estado=Job.Estado.PENDIENTE, ejecutar_despues__lte=timezone.now())
+            .order_by('ejecutar_despues', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.intentos += 1
+        inicio = time.monotonic()
+        try:
+            funcion = TAREAS[job.tarea]
+            # Savepoint: si la tarea falla se deshace solo lo suyo
+            with transaction.atomic():
+                funcion(**job.argumentos)
+        except Exception as e:
+            job.ultimo_error = f"{e}\n{traceback.format_exc()}"[-4000:]
+            if job.intentos >= job.max_intentos:
+                job.estado = Job.Estado.FALLIDO
+                job.fecha_fin = timezone.now()
+                logger.error(f"[JOBS] {job} falló definitivamente: {e}")
+            else:
+                job.ejecutar_despues = timezone.now() + timedelta(seconds=espera_reintento(job.intentos))
+                logger.warning(f"[JOBS] {job} falló (intento {job.intentos}), se reintenta: {e}")
+        else:
+            job.estado = Job.Estado.COMPLETADO
+            job.fecha_fin = timezone.now()
+            job.ultimo_error = ''
+            logger.info(f"[JOBS] {job} completado en {time.monotonic() - inicio:.2f}s")
+
+        job.save(update_fields=['estado', 'intentos', 'ejecutar_despues', 'ultimo_error', 'fecha_fin'])
+    return job
+
+
+def procesar_pendientes(maximo=None):
+    """Procesa jobs hasta vaciar la cola (o hasta `maximo`). Devuelve cuántos corrió."""
+    procesados = 0
+    while maximo is None or procesados < maximo:
+        if procesar_siguiente() is None:
+            break
+        procesados += 1
+    return procesados
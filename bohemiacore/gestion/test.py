@@ -0,0 +1,1833 @@
+import asyncio
+import importlib
+import threading
+from dataclasses import FrozenInstanceError
+from io import StringIO
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction, IntegrityError
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from usuarios.models import Usuario, Cliente
+from .models import (
+    CategoriaServicio, Servicio, Personal, HorarioLaboral, Turno, DetalleTurno,
+    TipoEquipamiento, Equipamiento, RequisitoServicio, Notificacion, Job,
+    ReglaCuidado, AgendaCuidados, ReglaDiagnostico, TipoCabello, PorosidadCabello, EstadoGeneral,
+    Rutina, RutinaCliente, DiagnosticoCapilar, Configuracion, BloqueoAgenda, FichaTecnica, Producto,
+    ContadorEstado, DeltaContador, ResumenDiario, ResumenServicioDiario, EventoUsuario,
+)
+from .capacidad_equipamiento import PerfilDemanda
+from .primer_hueco import IndiceHuecos
+from .disponibilidad import AgendaDia, MINUTOS_DIA, fusionar_intervalos, limites_del_dia, rango_ocupacion
+from .expiracion import expirar_turnos
+from .middleware import DetectorNMasUno, forma_sql
+from . import cache_disponibilidad, motor_diagnostico, snapshot_agenda, metricas, contadores, analitica, eventos
+from .checks import cache_compartido
+from .rediagnostico import rediagnosticar
+from .datos_sinteticos import GeneradorDatos
+from . import tareas
+from .automatizacion import procesar_transicion_turno
+from .views import TurnoViewSet, NotificacionViewSet
+from .serializers import TurnoSerializer, TurnoListSerializer
+
+
+# ============================================================
+# HELPERS
+# ============================================================
+
+def crear_cliente(email='cliente@test.com'):
+    usuario = Usuario.objects.create_user(
+        email=email, password='clave-segura-123', first_name='Ana', last_name='Test'
+    )
+    cliente, _ = Cliente.objects.get_or_create(usuario=usuario)
+    return usuario, cliente
+
+
+def crear_profesional(nombre, dias=range(7), hora_inicio=time(9), hora_fin=time(18)):
+    profesional = Personal.objects.create(nombre=nombre, apellido='Test', rol='asistente')
+    for dia in dias:
+        HorarioLaboral.objects.create(
+            personal=profesional,
+            dia_semana=dia,
+            hora_inicio=hora_inicio,
+            hora_fin=hora_fin,
+            permite_complemento=True,
+        )
+    return profesional
+
+
+def crear_turno(cliente, profesional, fecha, hora, servicio, duracion=60):
+    turno = Turno.objects.create(
+        cliente=cliente, profesional=profesional, fecha=fecha, hora_inicio=hora, estado='confirmado'
+    )
+    DetalleTurno.objects.create(
+        turno=turno, servicio=servicio, precio_historico=0, duracion_minutos=duracion
+    )
+    return turno
+
+
+# ============================================================
+# DISPONIBILIDAD
+# ============================================================
+
+def en_hora_local(fecha, hora):
+    return timezone.make_aware(datetime.combine(fecha, hora))
+
+
+class AgendaDiaTest(SimpleTestCase):
+    """Motor de intervalos: fusión, huecos e inicios libres, sin tocar la base."""
+
+    fecha = date(2030, 5, 10)
+
+    def test_fusionar_intervalos(self):
+        self.assertEqual(fusionar_intervalos([]), [])
+        # Contiguos y solapados se fusionan; vacíos o invertidos se descartan
+        self.assertEqual(
+            fusionar_intervalos([(600, 660), (540, 600), (630, 700), (800, 800), (900, 850), (720, 780)]),
+            [(540, 700), (720, 780)],
+        )
+        # Uno contenido en otro no lo acorta
+        self.assertEqual(fusionar_intervalos([(540, 720), (600, 630)]), [(540, 720)])
+
+    def test_agenda_vacia(self):
+        agenda = AgendaDia(self.fecha)
+        self.assertEqual(agenda.ocupado, [])
+        self.assertEqual(agenda.huecos(540, 1080), [(540, 1080)])
+        self.assertTrue(agenda.esta_libre(0, MINUTOS_DIA))
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 60, 30), 540)
+        self.assertIsNone(agenda.primer_inicio_libre(540, 570, 60, 30))
+
+    def test_huecos_y_esta_libre(self):
+        agenda = AgendaDia(self.fecha, [(600, 660), (660, 720), (690, 750), (900, 960)])
+        self.assertEqual(agenda.ocupado, [(600, 750), (900, 960)])
+        self.assertEqual(agenda.huecos(540, 1080), [(540, 600), (750, 900), (960, 1080)])
+        # La ventana empieza dentro de un intervalo ocupado
+        self.assertEqual(agenda.huecos(700, 950), [(750, 900)])
+
+        # Semiabiertos: tocar un borde no es solaparse
+        self.assertTrue(agenda.esta_libre(540, 600))
+        self.assertTrue(agenda.esta_libre(750, 900))
+        self.assertFalse(agenda.esta_libre(570, 601))
+        self.assertFalse(agenda.esta_libre(749, 800))
+        self.assertFalse(agenda.esta_libre(800, 1000))
+        self.assertFalse(agenda.esta_libre(910, 920))
+
+    def test_primer_inicio_libre(self):
+        agenda = AgendaDia(self.fecha, [(540, 600), (630, 700)])
+        # El hueco de 10:00 a 10:30 no alcanza; la grilla sigue anclada en 9:00
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 60, 30), 720)
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 30, 30), 600)
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 60, 30, minimo_inicio=725), 750)
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 60, 30, validar=lambda inicio, fin: inicio >= 800), 810)
+        self.assertIsNone(agenda.primer_inicio_libre(540, 1080, 600, 30))
+
+    def test_bloqueos_que_cruzan_la_medianoche_y_la_jornada(self):
+        anterior, siguiente = self.fecha - timedelta(days=1), self.fecha + timedelta(days=1)
+        agenda = AgendaDia.desde_registros(self.fecha, bloqueos=[
+            # De las 22 del día anterior a las 9:30 (pisa el inicio de la jornada)
+            BloqueoAgenda(fecha_inicio=en_hora_local(anterior, time(22)), fecha_fin=en_hora_local(self.fecha, time(9, 30))),
+            # De las 17:15 a la 1 del día siguiente (pisa el fin de la jornada)
+            BloqueoAgenda(fecha_inicio=en_hora_local(self.fecha, time(17, 15)), fecha_fin=en_hora_local(siguiente, time(1))),
+            # Termina justo a la medianoche: no afecta el día
+            BloqueoAgenda(fecha_inicio=en_hora_local(anterior, time(20)), fecha_fin=en_hora_local(self.fecha, time(0))),
+        ])
+        self.assertEqual(agenda.ocupado, [(0, 570), (1035, MINUTOS_DIA)])
+        self.assertEqual(agenda.huecos(540, 1080), [(570, 1035)])
+        self.assertEqual(agenda.primer_inicio_libre(540, 1080, 60, 30), 570)
+        self.assertTrue(agenda.esta_libre(975, 1035))
+        self.assertFalse(agenda.esta_libre(990, 1050))
+
+        # Un bloqueo de día completo tapa toda la jornada
+        agenda = AgendaDia.desde_registros(self.fecha, bloqueos=[
+            BloqueoAgenda(
+                fecha_inicio=en_hora_local(anterior, time(12)), fecha_fin=en_hora_local(self.fecha, time(8)),
+                bloquea_todo_el_dia=True,
+            ),
+        ])
+        self.assertEqual(agenda.huecos(540, 1080), [])
+        self.assertIsNone(agenda.primer_inicio_libre(540, 1080, 30, 30))
+
+
+class ConsultarDisponibilidadQueriesTest(TestCase):
+    """La cantidad de consultas no depende del horizonte ni de la cantidad de profesionales."""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario, self.cliente = crear_cliente()
+        categoria = CategoriaServicio.objects.create(nombre='Turno de Complemento')
+        self.servicio = Servicio.objects.create(nombre='Corte', categoria=categoria, duracion_estimada=60)
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+        self.manana = timezone.localdate() + timedelta(days=1)
+
+    def _contar_consultas(self, dias):
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.api.get('/api/gestion/turnos/consultar_disponibilidad/', {
+                'servicio_id': self.servicio.id,
+                'fecha': self.manana.isoformat(),
+                'dias': dias,
+            })
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta.data
+
+    def _agregar_profesional_con_turnos(self, nombre, dias):
+        profesional = crear_profesional(nombre)
+        _, cliente = crear_cliente(f'{nombre.lower()}@test.com')
+        for i in range(dias):
+            crear_turno(cliente, profesional, self.manana + timedelta(days=i), time(10), self.servicio)
+        return profesional
+
+    def test_consultas_constantes(self):
+        self._agregar_profesional_con_turnos('Uno', 14)
+        base, datos = self._contar_consultas(dias=1)
+        self.assertEqual(len(datos['disponibilidad']), 1)
+
+        # Más días en el horizonte
+        horizonte_largo, datos = self._contar_consultas(dias=14)
+        self.assertEqual(len(datos['disponibilidad']), 14)
+        self.assertEqual(horizonte_largo, base)
+
+        # Más profesionales con turnos
+        for nombre in ('Dos', 'Tres', 'Cuatro'):
+            self._agregar_profesional_con_turnos(nombre, 14)
+        muchos_profesionales, datos = self._contar_consultas(dias=14)
+        self.assertEqual(len(datos['disponibilidad'][0]['profesionales']), 4)
+        self.assertEqual(muchos_profesionales, base)
+
+    def test_sin_consultas_de_horarios_en_caliente(self):
+        profesional = self._agregar_profesional_con_turnos('Uno', 3)
+        self._contar_consultas(dias=3)
+
+        tablas = (HorarioLaboral._meta.db_table, Personal._meta.db_table, Configuracion._meta.db_table)
+        with CaptureQueriesContext(connection) as consultas:
+            self.api.get('/api/gestion/turnos/consultar_disponibilidad/', {
+                'servicio_id': self.servicio.id, 'fecha': self.manana.isoformat(), 'dias': 3,
+            })
+        self.assertFalse([c['sql'] for c in consultas if any(f'"{tabla}"' in c['sql'] for tabla in tablas)])
+
+        # Un cambio del admin se ve en el pedido siguiente
+        HorarioLaboral.objects.filter(personal=profesional).update(activo=False)
+        snapshot_agenda.invalidar_al_confirmar()
+        respuesta = self.api.get('/api/gestion/turnos/consultar_disponibilidad/', {
+            'servicio_id': self.servicio.id, 'fecha': self.manana.isoformat(), 'dias': 3,
+        })
+        self.assertEqual(respuesta.data['disponibilidad'], [])
+
+    def test_turno_ocupa_su_duracion(self):
+        profesional = crear_profesional('Uno')
+        crear_turno(self.cliente, profesional, self.manana, time(10), self.servicio, duracion=90)
+
+        _, datos = self._contar_consultas(dias=1)
+        horas = [slot['hora'] for slot in datos['disponibilidad'][0]['profesionales'][0]['slots']]
+        self.assertNotIn('09:30', horas)
+        self.assertNotIn('10:00', horas)
+        self.assertNotIn('11:00', horas)
+        self.assertIn('09:00', horas)
+        self.assertIn('11:30', horas)
+
+
+class SnapshotAgendaTest(TestCase):
+    """El snapshot compartido por los hilos es inmutable y no guarda instancias del modelo."""
+
+    def setUp(self):
+        Configuracion.objects.create(intervalo_turnos=15)
+        self.profesional = crear_profesional('Uno', dias=[0, 2])
+        snapshot_agenda.invalidar_al_confirmar()
+
+    def test_copias_congeladas(self):
+        snapshot = snapshot_agenda.obtener()
+        self.assertEqual(snapshot.config.intervalo_turnos, 15)
+        self.assertEqual(len(snapshot.reglas), 2)
+        regla = snapshot.reglas_del_dia(2)[0]
+        self.assertNotIsInstance(regla, HorarioLaboral)
+        self.assertNotIsInstance(regla.personal, Personal)
+        # Todas las reglas comparten el mismo profesional del snapshot
+        self.assertIs(regla.personal, snapshot.personal[self.profesional.id])
+
+        with self.assertRaises(FrozenInstanceError):
+            snapshot.config.intervalo_turnos = 60
+        with self.assertRaises(FrozenInstanceError):
+            regla.personal = None
+        with self.assertRaises(FrozenInstanceError):
+            regla.personal.activo = False
+        with self.assertRaises(TypeError):
+            snapshot.personal[0] = regla.personal
+        self.assertEqual(snapshot_agenda.configuracion().intervalo_turnos, 15)
+
+    def test_agenda_general_serializa_las_reglas(self):
+        usuario, _ = crear_cliente()
+        api = APIClient()
+        api.force_authenticate(usuario)
+        respuesta = api.get('/api/gestion/agenda/general/', {'personal_id': self.profesional.id})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['configuracion']['intervalo'], 15)
+        self.assertEqual(
+            [(h['personal'], h['dia_nombre']) for h in respuesta.data['horarios_base']],
+            [(self.profesional.id, 'Lunes'), (self.profesional.id, 'Miércoles')],
+        )
+
+    def test_chequeo_cache_por_proceso(self):
+        """Con un cache por proceso los workers no ven las invalidaciones de los otros."""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem, DEBUG=False):
+            self.assertEqual([aviso.id for aviso in cache_compartido(None)], ['gestion.W001'])
+        with override_settings(CACHES=locmem, DEBUG=True):
+            self.assertEqual(cache_compartido(None), [])
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        with override_settings(CACHES=redis, DEBUG=False):
+            self.assertEqual(cache_compartido(None), [])
+
+
+class CacheDisponibilidadTest(TestCase):
+    """Invalidación por ámbito y un solo cálculo ante pedidos simultáneos."""
+
+    def setUp(self):
+        cache.clear()
+        _, self.cliente = crear_cliente()
+        categoria = CategoriaServicio.objects.create(nombre='Turno de Complemento')
+        self.servicio = Servicio.objects.create(nombre='Corte', categoria=categoria, duracion_estimada=60)
+        self.uno = crear_profesional('Uno')
+        self.dos = crear_profesional('Dos')
+        self.manana = timezone.localdate() + timedelta(days=1)
+        self.pasado = self.manana + timedelta(days=1)
+
+    def test_invalidar_un_ambito_conserva_los_demas(self):
+        cache_disponibilidad.obtener_agendas([self.uno.id, self.dos.id], [self.manana, self.pasado])
+
+        # El turno invalida solo la agenda (Uno, mañana)
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_turno(self.cliente, self.uno, self.manana, time(10), self.servicio)
+
+        with self.assertNumQueries(0):
+            cache_disponibilidad.obtener_agenda(self.dos, self.manana)
+            cache_disponibilidad.obtener_agenda(self.uno, self.pasado)
+        # Turnos + bloqueos, con el turno nuevo
+        with self.assertNumQueries(2):
+            agenda = cache_disponibilidad.obtener_agenda(self.uno, self.manana)
+        self.assertEqual(agenda.ocupado, [(600, 660)])
+
+    def test_rollback_no_invalida(self):
+        ambito = cache_disponibilidad.ambito_agenda(self.uno.id, self.manana)
+        antes = cache_disponibilidad.versiones([ambito])
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    cache_disponibilidad.invalidar_al_confirmar(ambito)
+                    raise IntegrityError('rollback forzado')
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(cache_disponibilidad.versiones([ambito]), antes)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cache_disponibilidad.invalidar_al_confirmar(ambito)
+        self.assertNotEqual(cache_disponibilidad.versiones([ambito]), antes)
+
+    def test_un_solo_calculo_ante_pedidos_simultaneos(self):
+        llamadas, resultados = [], []
+        barrera = threading.Barrier(8)
+
+        def calcular():
+            llamadas.append(1)
+            threading.Event().wait(0.2)
+            return 'valor'
+
+        def pedir():
+            barrera.wait()
+            resultados.append(cache_disponibilidad.obtener_o_calcular('disponibilidad:prueba', calcular))
+
+        hilos = [threading.Thread(target=pedir) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, ['valor'] * 8)
+
+        # Otro proceso tiene el lock distribuido: se espera su resultado
+        clave = 'disponibilidad:otra'
+        cache.add(f'{clave}:calculando', 1, cache_disponibilidad.ESPERA_MAXIMA_SEGUNDOS)
+        threading.Timer(0.2, lambda: cache.set(clave, 'del otro proceso')).start()
+        self.assertEqual(cache_disponibilidad.obtener_o_calcular(clave, calcular), 'del otro proceso')
+        self.assertEqual(len(llamadas), 1)
+
+
+class CapacidadEquipamientoTest(TestCase):
+    """Perfil de demanda de equipos y su uso en la disponibilidad."""
+
+    def test_perfil_demanda_maximo(self):
+        perfil = PerfilDemanda([(600, 660, 1), (630, 720, 1), (700, 760, 2)])
+        self.assertEqual(perfil.maximo(540, 600), 0)
+        self.assertEqual(perfil.maximo(600, 630), 1)
+        self.assertEqual(perfil.maximo(600, 700), 2)
+        self.assertEqual(perfil.maximo(650, 710), 3)
+        self.assertEqual(perfil.maximo(720, 760), 2)
+        self.assertEqual(perfil.maximo(760, 800), 0)
+
+    def test_slots_respetan_stock(self):
+        cache.clear()
+        usuario, cliente = crear_cliente()
+        categoria = CategoriaServicio.objects.create(nombre='Turno de Complemento')
+        servicio = Servicio.objects.create(nombre='Lavado', categoria=categoria, duracion_estimada=60)
+        tipo = TipoEquipamiento.objects.create(nombre='Lavacabezas')
+        Equipamiento.objects.create(codigo='LAV-1', nombre='Lavacabezas 1', tipo=tipo)
+        RequisitoServicio.objects.create(servicio=servicio, tipo_equipamiento=tipo, cantidad_minima=1)
+
+        manana = timezone.localdate() + timedelta(days=1)
+        crear_profesional('Uno', hora_inicio=time(9), hora_fin=time(12))
+        otra = crear_profesional('Dos', hora_inicio=time(9), hora_fin=time(12))
+        # La única unidad queda ocupada de 10:00 a 11:00 por el turno de otra profesional
+        crear_turno(cliente, otra, manana, time(10), servicio)
+
+        api = APIClient()
+        api.force_authenticate(usuario)
+        respuesta = api.get('/api/gestion/turnos/consultar_disponibilidad/', {
+            'servicio_id': servicio.id, 'fecha': manana.isoformat(), 'dias': 1,
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        for profesional in respuesta.data['disponibilidad'][0]['profesionales']:
+            horas = [slot['hora'] for slot in profesional['slots']]
+            self.assertEqual(horas, ['09:00', '11:00'])
+
+
+
+class PrimerHuecoTest(TestCase):
+    """Búsqueda del primer hueco: resultado correcto y carga solo lo necesario."""
+
+    def setUp(self):
+        cache.clear()
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.manana = timezone.localdate() + timedelta(days=1)
+        self.fechas = [self.manana + timedelta(days=i) for i in range(30)]
+        self.profesional = crear_profesional('Uno', hora_inicio=time(9), hora_fin=time(12))
+
+    def _indice(self):
+        return IndiceHuecos(TurnoViewSet()._reglas_por_fecha(self.servicio, self.fechas), servicios_ids=[self.servicio.id])
+
+    def test_primer_hueco_salta_dias_completos(self):
+        # Los tres primeros días están completos; el cuarto solo tiene libre desde las 10:30
+        for i in range(3):
+            _, cliente = crear_cliente(f'lleno{i}@test.com')
+            for hora in (9, 10, 11):
+                crear_turno(cliente, self.profesional, self.manana + timedelta(days=i), time(hora), self.servicio)
+        _, cliente = crear_cliente('parcial@test.com')
+        crear_turno(cliente, self.profesional, self.manana + timedelta(days=3), time(9), self.servicio, duracion=90)
+
+        indice = self._indice()
+        hueco = indice.primer_hueco(60, 30)
+        self.assertEqual(hueco['fecha'], self.manana + timedelta(days=3))
+        self.assertEqual(hueco['hora'], '10:30')
+        self.assertEqual(hueco['regla'].personal_id, self.profesional.id)
+        # Solo se cargó el primer tramo del mes
+        self.assertEqual(len(indice._huecos), 7)
+
+    def test_consultas_acotadas(self):
+        indice = self._indice()
+        with CaptureQueriesContext(connection) as consultas:
+            hueco = indice.primer_hueco(60, 15)
+        self.assertEqual((hueco['fecha'], hueco['hora']), (self.manana, '09:00'))
+        self.assertLessEqual(len(consultas), 2)
+
+    def test_sin_hueco_que_alcance(self):
+        self.assertIsNone(self._indice().primer_hueco(240, 30))
+
+
+class DuracionTurnoTest(TestCase):
+    """duracion_total, hora_fin_calculada y ocupacion siguen a los detalles del turno."""
+
+    def setUp(self):
+        _, self.cliente = crear_cliente()
+        self.servicio = Servicio.objects.create(nombre='Color', duracion_estimada=90)
+        self.lavado = Servicio.objects.create(nombre='Lavado', duracion_estimada=30)
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.fecha = timezone.localdate() + timedelta(days=1)
+
+    def _duracion(self, turno):
+        turno.refresh_from_db()
+        return turno.duracion_total, turno.hora_fin_calculada, turno.ocupacion.upper - turno.ocupacion.lower
+
+    def test_detalles_actualizan_duracion(self):
+        turno = crear_turno(self.cliente, self.profesional, self.fecha, time(10), self.servicio, duracion=45)
+        self.assertEqual(self._duracion(turno), (45, time(10, 45), timedelta(minutes=45)))
+
+        detalle = DetalleTurno.objects.create(turno=turno, servicio=self.lavado, precio_historico=0, duracion_minutos=30)
+        self.assertEqual(self._duracion(turno), (75, time(11, 15), timedelta(minutes=75)))
+
+        detalle.duracion_minutos = 60
+        detalle.save()
+        self.assertEqual(self._duracion(turno), (105, time(11, 45), timedelta(minutes=105)))
+
+        detalle.delete()
+        self.assertEqual(self._duracion(turno), (45, time(10, 45), timedelta(minutes=45)))
+
+        # Sin detalles se asume la duración por defecto
+        turno.detalles.all().delete()
+        self.assertEqual(self._duracion(turno), (0, time(11), timedelta(minutes=Turno.DURACION_POR_DEFECTO)))
+
+        # Guardar el turno recalcula el fin con la duración persistida
+        DetalleTurno.objects.create(turno=turno, servicio=self.servicio, precio_historico=0, duracion_minutos=90)
+        turno.refresh_from_db()
+        turno.save()
+        self.assertEqual(self._duracion(turno), (90, time(11, 30), timedelta(minutes=90)))
+
+    def test_comando_recalcula_turnos_sin_backfill(self):
+        turno = crear_turno(self.cliente, self.profesional, self.fecha, time(10), self.servicio, duracion=90)
+        crear_turno(self.cliente, self.profesional, self.fecha, time(15), self.servicio, duracion=30)
+        Turno.objects.filter(pk=turno.pk).update(duracion_total=0, hora_fin_calculada=None, ocupacion=None)
+
+        salida = StringIO()
+        call_command('recalcular_duracion_turnos', '--solo-pendientes', '--lote', '1', stdout=salida)
+        self.assertEqual(self._duracion(turno), (90, time(11, 30), timedelta(minutes=90)))
+        self.assertIn('1 de 1 turnos actualizados', salida.getvalue())
+
+        # Sin pendientes, una pasada completa no cambia nada
+        salida = StringIO()
+        call_command('recalcular_duracion_turnos', stdout=salida)
+        self.assertIn('0 de 2 turnos actualizados', salida.getvalue())
+
+    def test_backfill_de_la_migracion(self):
+        migracion = importlib.import_module('gestion.migrations.0030_turno_duracion_total')
+        crear_turno(self.cliente, self.profesional, self.fecha, time(10), self.servicio, duracion=90)
+        crear_turno(self.cliente, self.profesional, self.fecha, time(22, 30), self.servicio, duracion=120)
+        Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.fecha, hora_inicio=time(14), estado='confirmado'
+        )
+        esperado = list(Turno.objects.order_by('id').values_list('duracion_total', 'hora_fin_calculada'))
+
+        Turno.objects.update(duracion_total=0, hora_fin_calculada=None)
+        with connection.cursor() as cursor:
+            cursor.execute(migracion.POBLAR_DURACION)
+        self.assertEqual(list(Turno.objects.order_by('id').values_list('duracion_total', 'hora_fin_calculada')), esperado)
+        self.assertEqual(esperado, [(90, time(11, 30)), (120, time(23, 59)), (0, time(15))])
+
+
+class RestriccionSolapamientoTest(TestCase):
+    """La base rechaza dos turnos activos solapados del mismo profesional."""
+
+    def setUp(self):
+        _, self.cliente = crear_cliente()
+        _, self.otro_cliente = crear_cliente('otro@test.com')
+        self.servicio = Servicio.objects.create(nombre='Color', duracion_estimada=90)
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.fecha = timezone.localdate() + timedelta(days=1)
+        crear_turno(self.cliente, self.profesional, self.fecha, time(10), self.servicio, duracion=90)
+
+    def test_turno_solapado_es_rechazado(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            crear_turno(self.otro_cliente, self.profesional, self.fecha, time(11), self.servicio)
+
+    def test_turnos_contiguos_o_de_otro_profesional(self):
+        crear_turno(self.otro_cliente, self.profesional, self.fecha, time(11, 30), self.servicio)
+        otra = crear_profesional('Dos', dias=[])
+        _, tercer_cliente = crear_cliente('tercero@test.com')
+        crear_turno(tercer_cliente, otra, self.fecha, time(10), self.servicio)
+        self.assertEqual(Turno.objects.filter(fecha=self.fecha).count(), 3)
+
+    def test_turno_cancelado_no_ocupa(self):
+        Turno.objects.update(estado='cancelado')
+        crear_turno(self.otro_cliente, self.profesional, self.fecha, time(10), self.servicio)
+
+    def test_detalle_que_alarga_el_turno_sobre_otro(self):
+        crear_turno(self.otro_cliente, self.profesional, self.fecha, time(11, 30), self.servicio)
+        turno = Turno.objects.get(hora_inicio=time(10))
+        lavado = Servicio.objects.create(nombre='Lavado', duracion_estimada=30)
+
+        with self.assertRaises(ValidationError) as error:
+            DetalleTurno.objects.create(turno=turno, servicio=lavado, precio_historico=0, duracion_minutos=30)
+        self.assertEqual(error.exception.messages, [Turno.MENSAJE_SOLAPAMIENTO])
+        # Ni el detalle ni la duración nueva quedaron guardados
+        turno.refresh_from_db()
+        self.assertEqual((turno.detalles.count(), turno.duracion_total), (1, 90))
+
+        detalle = turno.detalles.get()
+        detalle.duracion_minutos = 120
+        with self.assertRaises(ValidationError):
+            detalle.save()
+        self.assertEqual(DetalleTurno.objects.get(pk=detalle.pk).duracion_minutos, 90)
+
+    def test_serializer_responde_conflicto_solo_por_solapamiento(self):
+        request = RequestFactory().post('/api/gestion/turnos/')
+        request.user = self.otro_cliente.usuario
+        serializer = TurnoSerializer(context={'request': request})
+        datos = {'profesional': self.profesional, 'fecha': self.fecha, 'hora_inicio': time(9), 'estado': 'confirmado'}
+
+        # El turno entra con la duración por defecto (9 a 10), pero sus detalles lo alargan sobre el de las 10
+        with self.assertRaises(serializers.ValidationError):
+            serializer.create({**datos, 'detalles': [
+                {'servicio': self.servicio, 'precio_historico': 0, 'duracion_minutos': 120},
+            ]})
+        self.assertFalse(Turno.objects.filter(hora_inicio=time(9)).exists())
+
+        # Otro error de integridad (servicio repetido) no se disfraza de horario ocupado
+        with self.assertRaises(IntegrityError):
+            serializer.create({**datos, 'detalles': [
+                {'servicio': self.servicio, 'precio_historico': 0, 'duracion_minutos': 30},
+                {'servicio': self.servicio, 'precio_historico': 0, 'duracion_minutos': 30},
+            ]})
+
+
+
+class ExpiracionTurnosTest(TestCase):
+    """Barrido de expiración por lotes y listado de turnos sin escrituras."""
+
+    def setUp(self):
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.usuario, self.cliente = crear_cliente()
+        hoy = timezone.localdate()
+
+        def turno(fecha, hora, estado, **extra):
+            return Turno.objects.create(
+                cliente=self.cliente, profesional=self.profesional,
+                fecha=fecha, hora_inicio=hora, estado=estado, **extra
+            )
+
+        self.vencido = turno(hoy - timedelta(days=1), time(10), 'solicitado')
+        self.sin_sena = turno(
+            hoy + timedelta(days=2), time(10), 'esperando_sena',
+            fecha_limite_pago=timezone.now() - timedelta(hours=1)
+        )
+        self.vigente = turno(hoy + timedelta(days=2), time(12), 'esperando_sena',
+                             fecha_limite_pago=timezone.now() + timedelta(hours=1))
+        self.confirmado = turno(hoy - timedelta(days=1), time(12), 'confirmado')
+        Notificacion.objects.all().delete()
+
+    def test_expira_vencidos_y_senas_vencidas(self):
+        self.assertEqual(expirar_turnos(lote=1), 2)
+        estados = dict(Turno.objects.values_list('id', 'estado'))
+        self.assertEqual(estados[self.vencido.id], 'cancelado')
+        self.assertEqual(estados[self.sin_sena.id], 'cancelado')
+        self.assertEqual(estados[self.vigente.id], 'esperando_sena')
+        self.assertEqual(estados[self.confirmado.id], 'confirmado')
+
+        mensajes = dict(Notificacion.objects.values_list('origen_id', 'mensaje'))
+        self.assertEqual(set(mensajes), {self.vencido.id, self.sin_sena.id})
+        self.assertIn('seña', mensajes[self.sin_sena.id])
+
+        # Idempotente: un segundo barrido no cancela ni notifica de nuevo
+        self.assertEqual(expirar_turnos(), 0)
+        self.assertEqual(Notificacion.objects.count(), 2)
+
+    def test_listado_no_escribe(self):
+        api = APIClient()
+        api.force_authenticate(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = api.get('/api/gestion/turnos/')
+        self.assertEqual(respuesta.status_code, 200)
+        escrituras = [q['sql'] for q in consultas if q['sql'].lstrip().upper().startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(escrituras, [])
+        self.assertEqual(Turno.objects.get(pk=self.vencido.pk).estado, 'solicitado')
+
+
+
+EJECUCIONES_PRUEBA = []
+
+
+@tareas.tarea('prueba_registrar')
+def _tarea_prueba_registrar(valor):
+    EJECUCIONES_PRUEBA.append(valor)
+
+
+@tareas.tarea('prueba_falla')
+def _tarea_prueba_falla():
+    Notificacion.objects.all().delete()  # Debe deshacerse al fallar
+    raise RuntimeError('falla de prueba')
+
+
+class ColaJobsTest(TestCase):
+    """Cola de tareas en la base: on_commit, idempotencia y reintentos."""
+
+    def setUp(self):
+        EJECUCIONES_PRUEBA.clear()
+
+    def test_encolar_al_confirmar_e_idempotencia(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            tareas.encolar_al_confirmar('prueba_registrar', clave='prueba:1', valor=1)
+            tareas.encolar_al_confirmar('prueba_registrar', clave='prueba:1', valor=1)
+            self.assertEqual(Job.objects.count(), 0)  # Nada hasta confirmar
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(Job.objects.count(), 1)
+
+        self.assertEqual(tareas.procesar_pendientes(), 1)
+        self.assertEqual(EJECUCIONES_PRUEBA, [1])
+        self.assertEqual(Job.objects.get().estado, Job.Estado.COMPLETADO)
+        self.assertEqual(tareas.procesar_pendientes(), 0)
+
+    def test_reintentos_con_backoff(self):
+        usuario, _ = crear_cliente()
+        Notificacion.objects.create(usuario=usuario, titulo='x', mensaje='x')
+        job = tareas.encolar('prueba_falla', max_intentos=2)
+
+        tareas.procesar_siguiente()
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), (Job.Estado.PENDIENTE, 1))
+        self.assertGreater(job.ejecutar_despues, timezone.now())
+        self.assertIn('falla de prueba', job.ultimo_error)
+        self.assertEqual(Notificacion.objects.count(), 1)  # Lo que hizo la tarea se deshizo
+        self.assertIsNone(tareas.procesar_siguiente())     # Todavía en backoff
+
+        Job.objects.filter(pk=job.pk).update(ejecutar_despues=timezone.now())
+        tareas.procesar_siguiente()
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos), (Job.Estado.FALLIDO, 2))
+
+    def test_finalizar_turno_encola_automatizacion(self):
+        usuario, cliente = crear_cliente()
+        usuario.is_staff = True
+        usuario.save()
+        servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        turno = crear_turno(cliente, crear_profesional('Uno', dias=[]), timezone.localdate(), time(10), servicio)
+
+        api = APIClient()
+        api.force_authenticate(usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = api.post(f'/api/gestion/turnos/{turno.id}/finalizar_turno/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('post_finalizar_turno', set(Job.objects.values_list('tarea', flat=True)))
+
+
+
+class TransicionesTurnoTest(TestCase):
+    """Los automatismos de Turno corren solo en cambios reales de estado."""
+
+    def setUp(self):
+        _, self.cliente = crear_cliente()
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.fecha = timezone.localdate() + timedelta(days=1)
+
+    def _turno_con_servicios(self, cantidad, hora=time(10)):
+        turno = Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.fecha, hora_inicio=hora, estado='confirmado'
+        )
+        for i in range(cantidad):
+            servicio = Servicio.objects.create(nombre=f'Servicio {hora.hour}-{i}', duracion_estimada=30)
+            ReglaCuidado.objects.create(servicio=servicio, tipo='RESTRICCION', descripcion='No mojar', dias_duracion=2)
+            ReglaCuidado.objects.create(servicio=servicio, tipo='HABITO', descripcion='Hidratar')
+            DetalleTurno.objects.create(turno=turno, servicio=servicio, precio_historico=0, duracion_minutos=30)
+        return turno
+
+    def _transiciones_encoladas(self):
+        return Job.objects.filter(tarea='procesar_transicion_turno').count()
+
+    def test_solo_cambios_de_estado(self):
+        turno = self._turno_con_servicios(1)
+        Job.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.hora_inicio = time(11)
+            turno.cambios_realizados += 1
+            turno.save()
+        self.assertEqual(self._transiciones_encoladas(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            turno.estado = 'realizado'
+            turno.save()
+        self.assertEqual(self._transiciones_encoladas(), 1)
+
+        tareas.procesar_pendientes()
+        # 2 días de restricción + 1 hábito
+        self.assertEqual(AgendaCuidados.objects.filter(cliente=self.cliente).count(), 3)
+        self.assertTrue(Notificacion.objects.filter(origen_id=turno.id, titulo='¡Servicio Finalizado!').exists())
+
+    def test_realizado_agenda_cada_restriccion_una_vez(self):
+        turno = self._turno_con_servicios(2)
+        puntual = Servicio.objects.create(nombre='Planchado', duracion_estimada=30)
+        ReglaCuidado.objects.create(servicio=puntual, tipo='RESTRICCION', descripcion='No atar', dias_duracion=0)
+        DetalleTurno.objects.create(turno=turno, servicio=puntual, precio_historico=0, duracion_minutos=30)
+
+        Turno.objects.filter(pk=turno.pk).update(estado='realizado')
+        procesar_transicion_turno(turno.id, 'confirmado', 'realizado', False)
+
+        agenda = AgendaCuidados.objects.filter(cliente=self.cliente)
+        # 2 servicios x 2 días de "No mojar" + 1 día de "No atar"; 1 hábito por servicio
+        self.assertEqual(agenda.filter(titulo='RESTRICCIÓN').count(), 5)
+        self.assertEqual(agenda.filter(titulo__contains='Hábito').count(), 2)
+        self.assertEqual(
+            agenda.filter(titulo='RESTRICCIÓN', fecha=self.fecha, descripcion__startswith='No atar').count(), 1
+        )
+
+    def test_consultas_constantes_por_turno(self):
+        def consultas_para(turno):
+            Turno.objects.filter(pk=turno.pk).update(estado='realizado')
+            with CaptureQueriesContext(connection) as consultas:
+                procesar_transicion_turno(turno.id, 'confirmado', 'realizado', False)
+            return len(consultas)
+
+        self.assertEqual(
+            consultas_para(self._turno_con_servicios(1, time(9))),
+            consultas_para(self._turno_con_servicios(4, time(14)))
+        )
+
+
+class MotorDiagnosticoTest(TestCase):
+    """Las reglas expertas se compilan una vez y se buscan por perfil sin consultas."""
+
+    def setUp(self):
+        self.rizado = TipoCabello.objects.create(nombre='Rizado')
+        self.lacio = TipoCabello.objects.create(nombre='Lacio')
+        self.alta = PorosidadCabello.objects.create(nombre='Alta')
+        self.danado = EstadoGeneral.objects.create(nombre='Dañado')
+        self.general = ReglaDiagnostico.objects.create(
+            porosidad_cabello=self.alta, prioridad=1, mensaje_resultado='General', accion_resultado='INFO'
+        )
+        self.especifica = ReglaDiagnostico.objects.create(
+            tipo_cabello=self.rizado, porosidad_cabello=self.alta, prioridad=5,
+            mensaje_resultado='Específica', accion_resultado='TURNO'
+        )
+        _, self.cliente = crear_cliente()
+
+    def _perfil(self, tipo, porosidad=None, estado=None):
+        self.cliente.tipo_cabello = tipo
+        self.cliente.porosidad_cabello = porosidad
+        self.cliente.estado_general = estado
+        return self.cliente
+
+    def test_comodines_y_prioridad(self):
+        self.assertEqual(motor_diagnostico.buscar_regla(self._perfil(self.rizado, self.alta)), self.especifica)
+        self.assertEqual(motor_diagnostico.buscar_regla(self._perfil(self.lacio, self.alta)), self.general)
+        self.assertIsNone(motor_diagnostico.buscar_regla(self._perfil(self.rizado)))
+
+    def test_sin_consultas_en_caliente_e_invalidacion(self):
+        motor_diagnostico.obtener_motor()
+        with CaptureQueriesContext(connection) as consultas:
+            regla = motor_diagnostico.buscar_regla(self._perfil(self.lacio, self.alta, self.danado))
+        self.assertEqual(regla, self.general)
+        self.assertEqual(len(consultas), 0)
+
+        ReglaDiagnostico.objects.create(
+            tipo_cabello=self.lacio, estado_general=self.danado, prioridad=9,
+            mensaje_resultado='Nueva', accion_resultado='INFO'
+        )
+        regla = motor_diagnostico.buscar_regla(self._perfil(self.lacio, self.alta, self.danado))
+        self.assertEqual(regla.mensaje_resultado, 'Nueva')
+
+
+class RediagnosticoTest(TestCase):
+    """El re-diagnóstico masivo escribe por lotes y no duplica rutinas activas."""
+
+    def setUp(self):
+        rizado = TipoCabello.objects.create(nombre='Rizado')
+        admin = Usuario.objects.create_user(email='admin@test.com', password='test1234')
+        self.rutina = Rutina.objects.create(nombre='Rizos', objetivo='Definir', archivo='rizos.pdf', creada_por=admin)
+        ReglaDiagnostico.objects.create(
+            tipo_cabello=rizado, prioridad=1, mensaje_resultado='Rizos', accion_resultado='INFO',
+            rutina_sugerida=self.rutina,
+        )
+        for i in range(5):
+            _, cliente = crear_cliente(f'rizado{i}@test.com')
+            cliente.tipo_cabello = rizado
+            cliente.save()
+        crear_cliente('sin_perfil@test.com')
+
+    def test_lotes_y_rutinas(self):
+        totales = rediagnosticar(lote=2)
+        self.assertEqual(totales['clientes'], 5)
+        self.assertEqual(totales['nivel_1'], 5)
+        self.assertEqual(DiagnosticoCapilar.objects.filter(regla_diagnostico__isnull=False).count(), 5)
+        self.assertEqual(RutinaCliente.objects.filter(rutina_original=self.rutina).count(), 5)
+
+        # Nueva versión de la rutina: se actualizan las copias, no se duplican
+        Rutina.objects.filter(pk=self.rutina.pk).update(version=2)
+        with CaptureQueriesContext(connection) as consultas:
+            totales = rediagnosticar(lote=2)
+        # Un UPDATE en lote por cada lote de clientes (5 clientes / 2), no uno por copia
+        tabla = RutinaCliente._meta.db_table
+        actualizaciones = [c['sql'] for c in consultas.captured_queries if c['sql'].startswith(f'UPDATE "{tabla}"')]
+        self.assertEqual(len(actualizaciones), 3)
+        self.assertEqual(totales['rutinas_asignadas'], 0)
+        self.assertEqual(totales['rutinas_actualizadas'], 5)
+        self.assertEqual(RutinaCliente.objects.filter(rutina_original=self.rutina, version_asignada=2).count(), 5)
+
+    def test_simulacion_y_desde(self):
+        totales = rediagnosticar(simular=True)
+        self.assertEqual(totales['clientes'], 5)
+        self.assertFalse(DiagnosticoCapilar.objects.exists())
+
+        rediagnosticar()
+        totales = rediagnosticar(desde=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(totales['clientes'], 0)
+
+
+class CatalogosBundleTest(TestCase):
+    """Un solo pedido con todos los catálogos, ETag por contenido y 304."""
+
+    URL = '/api/gestion/catalogos/bundle/'
+
+    def setUp(self):
+        self.api = APIClient()
+        TipoCabello.objects.create(nombre='Rizado')
+        categoria = CategoriaServicio.objects.create(nombre='Color')
+        Servicio.objects.create(nombre='Balayage', categoria=categoria, duracion_estimada=120)
+
+    def test_bundle_etag_y_304(self):
+        respuesta = self.api.get(self.URL)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual([t['nombre'] for t in datos['tipos-cabello']], ['Rizado'])
+        self.assertEqual([s['nombre'] for s in datos['servicios']], ['Balayage'])
+        etag = respuesta['ETag']
+        self.assertIn('must-revalidate', respuesta['Cache-Control'])
+
+        # En caliente no consulta la base y responde 304 al revalidar
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.api.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(len(consultas), 0)
+
+        respuesta = self.api.get(self.URL, {'v': datos['version']})
+        self.assertIn('immutable', respuesta['Cache-Control'])
+
+    def test_invalidacion_al_guardar(self):
+        etag = self.api.get(self.URL)['ETag']
+        TipoCabello.objects.create(nombre='Lacio')
+        respuesta = self.api.get(self.URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(len(respuesta.json()['tipos-cabello']), 2)
+
+
+class TurnoListSerializerTest(TestCase):
+    """El listado de turnos da lo mismo que TurnoSerializer con consultas constantes."""
+
+    def setUp(self):
+        self.usuario, self.cliente = crear_cliente()
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+
+    def _crear_turnos(self, cantidad, desde):
+        for i in range(cantidad):
+            _, cliente = crear_cliente(f'lista{desde}_{i}@test.com')
+            fecha = timezone.localdate() + timedelta(days=desde + i)
+            turno = crear_turno(cliente, self.profesional, fecha, time(10), self.servicio)
+            Turno.objects.filter(pk=turno.pk).update(estado='confirmado')
+
+    def test_mismo_resultado_que_turno_serializer(self):
+        self._crear_turnos(3, desde=-2)
+        turnos = Turno.objects.order_by('fecha')
+        esperado = TurnoSerializer(turnos, many=True).data
+        obtenido = TurnoListSerializer(TurnoListSerializer.preparar_queryset(turnos), many=True).data
+        for antes, despues in zip(esperado, obtenido):
+            self.assertAlmostEqual(antes.pop('horas_transcurridas'), despues.pop('horas_transcurridas'), delta=0.1)
+            self.assertEqual(dict(antes), dict(despues))
+
+    def test_consultas_constantes(self):
+        def consultas_listado():
+            with CaptureQueriesContext(connection) as consultas:
+                respuesta = self.api.get('/api/gestion/turnos/')
+            self.assertEqual(respuesta.status_code, 200)
+            return len(consultas)
+
+        self._crear_turnos(2, desde=1)
+        consultas_listado()  # arma el snapshot de configuración (ventana por defecto)
+        pocos = consultas_listado()
+        self._crear_turnos(10, desde=5)
+        self.assertEqual(consultas_listado(), pocos)
+
+
+class PaginacionTurnosTest(TestCase):
+    """Listado de turnos paginado por (fecha, hora_inicio, id) dentro de una ventana de fechas."""
+
+    def setUp(self):
+        self.usuario, _ = crear_cliente()
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.uno = crear_profesional('Uno', dias=[])
+        self.dos = crear_profesional('Dos', dias=[])
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+
+        hoy = timezone.localdate()
+        # Varios turnos por fecha y hora para ejercitar el desempate por id
+        self.turnos = []
+        for dia in (1, 2):
+            for hora in (9, 9, 11):
+                _, cliente = crear_cliente(f'pag{len(self.turnos)}@test.com')
+                profesional = self.uno if len(self.turnos) % 2 else self.dos
+                self.turnos.append(crear_turno(cliente, profesional, hoy + timedelta(days=dia), time(hora), self.servicio))
+        _, viejo = crear_cliente('viejo@test.com')
+        self.viejo = crear_turno(viejo, self.uno, hoy - timedelta(days=40), time(9), self.servicio)
+
+    def _recorrer(self, url):
+        ids = []
+        while url:
+            respuesta = self.api.get(url)
+            self.assertEqual(respuesta.status_code, 200)
+            ids += [turno['id'] for turno in respuesta.data['results']]
+            url = respuesta.data['next']
+        return ids
+
+    def test_paginas_sin_repetidos_en_orden(self):
+        ids = self._recorrer('/api/gestion/turnos/?limite=2')
+        esperado = [t.id for t in sorted(self.turnos, key=lambda t: (t.fecha, t.hora_inicio, t.id))]
+        # El turno de hace 40 días queda fuera de la ventana por defecto
+        self.assertEqual(ids, esperado)
+
+    def test_ventana_y_filtros(self):
+        hoy = timezone.localdate()
+        desde = (hoy - timedelta(days=60)).isoformat()
+        self.assertIn(self.viejo.id, self._recorrer(f'/api/gestion/turnos/?desde={desde}'))
+
+        ids = self._recorrer(f'/api/gestion/turnos/?profesional={self.uno.id}&hasta={hoy + timedelta(days=1)}')
+        self.assertEqual(ids, [t.id for t in self.turnos[:3] if t.profesional_id == self.uno.id])
+
+        self.assertEqual(self.api.get('/api/gestion/turnos/?desde=ayer').status_code, 400)
+        self.assertEqual(self.api.get('/api/gestion/turnos/?cursor=nada').status_code, 404)
+
+
+class IndicesConsultasFrecuentesTest(TestCase):
+    """
+    Con un volumen parecido al de producción (un año de agenda), ninguna de
+    las consultas frecuentes recorre su tabla completa (Seq Scan en el EXPLAIN).
+    """
+
+    PROFESIONALES = 10
+    CLIENTES = 300
+    DIAS_PASADOS = 300
+    DIAS_FUTUROS = 65
+    HORAS = range(9, 17)
+
+    @classmethod
+    def setUpTestData(cls):
+        hoy = timezone.localdate()
+        cls.hoy = hoy
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(email=f'volumen{i}@test.com', first_name='Vol', last_name=str(i))
+            for i in range(cls.CLIENTES)
+        ])
+        clientes = Cliente.objects.bulk_create([Cliente(usuario=usuario) for usuario in usuarios])
+        profesionales = Personal.objects.bulk_create([
+            Personal(nombre=f'Prof{i}', apellido='Test', rol='asistente') for i in range(cls.PROFESIONALES)
+        ])
+        rutinas = [
+            Rutina.objects.create(
+                nombre=f'Rutina {i}', objetivo='Test', archivo='rutinas/test.pdf', creada_por=usuarios[0]
+            )
+            for i in range(5)
+        ]
+        cls.cliente, cls.profesional, cls.rutina = clientes[0], profesionales[0], rutinas[0]
+
+        # Los turnos pasados ya están realizados o cancelados; los futuros, activos
+        turnos = []
+        for dia in range(-cls.DIAS_PASADOS, cls.DIAS_FUTUROS):
+            fecha = hoy + timedelta(days=dia)
+            for hora in cls.HORAS:
+                for p, profesional in enumerate(profesionales):
+                    i = len(turnos)
+                    if dia < 0:
+                        estado = 'cancelado' if i % 10 == 0 else 'realizado'
+                    else:
+                        estado = ('confirmado', 'esperando_sena', 'solicitado')[i % 3]
+                    turno = Turno(
+                        cliente=clientes[i % cls.CLIENTES], profesional=profesional,
+                        fecha=fecha, hora_inicio=time(hora), estado=estado, duracion_total=60,
+                    )
+                    turno.hora_fin_calculada = turno.calcular_hora_fin()
+                    turno.ocupacion = turno.calcular_ocupacion()
+                    turnos.append(turno)
+        Turno.objects.bulk_create(turnos, batch_size=2000)
+
+        Notificacion.objects.bulk_create([
+            Notificacion(
+                usuario=usuarios[i % cls.CLIENTES], titulo='Aviso', mensaje='Test',
+                estado='leido' if i % 20 else 'pendiente',
+            )
+            for i in range(cls.CLIENTES * 50)
+        ], batch_size=2000)
+
+        AgendaCuidados.objects.bulk_create([
+            AgendaCuidados(
+                cliente=clientes[i % cls.CLIENTES], fecha=hoy + timedelta(days=i // cls.CLIENTES),
+                titulo='Cuidado', descripcion='Test',
+            )
+            for i in range(cls.CLIENTES * 40)
+        ], batch_size=2000)
+
+        # Un año de bloqueos por profesional (francos, médico)
+        bloqueos = []
+        for profesional in profesionales:
+            for dia in range(-cls.DIAS_PASADOS, cls.DIAS_FUTUROS, 2):
+                inicio = timezone.make_aware(datetime.combine(hoy + timedelta(days=dia), time(13)))
+                bloqueo = BloqueoAgenda(
+                    personal=profesional, fecha_inicio=inicio, fecha_fin=inicio + timedelta(hours=1), motivo='Test'
+                )
+                bloqueo.ocupacion = bloqueo.calcular_ocupacion()
+                bloqueos.append(bloqueo)
+        BloqueoAgenda.objects.bulk_create(bloqueos, batch_size=2000)
+
+        # Horarios: los cambios de grilla dejan las versiones anteriores inactivas
+        HorarioLaboral.objects.bulk_create([
+            HorarioLaboral(
+                personal=profesional, dia_semana=dia, hora_inicio=time(9), hora_fin=time(18),
+                activo=version == 0,
+            )
+            for profesional in profesionales for dia in range(7) for version in range(20)
+        ], batch_size=2000)
+
+        RutinaCliente.objects.bulk_create([
+            RutinaCliente(
+                cliente=clientes[i % cls.CLIENTES], rutina_original=rutinas[i % 5],
+                nombre='Rutina', objetivo='Test', archivo='rutinas/test.pdf', version_asignada=1,
+                estado='activa' if i < cls.CLIENTES else 'archivada',
+            )
+            for i in range(cls.CLIENTES * 10)
+        ], batch_size=2000)
+
+        with connection.cursor() as cursor:
+            for modelo in (Turno, Notificacion, AgendaCuidados, BloqueoAgenda, HorarioLaboral, RutinaCliente):
+                cursor.execute(f'ANALYZE {modelo._meta.db_table}')
+
+    def _consultas(self):
+        """(descripción, queryset) con la forma de cada consulta frecuente del código."""
+        hoy, cliente, profesional = self.hoy, self.cliente, self.profesional
+        activos = ['solicitado', 'esperando_sena', 'confirmado']
+        manana = hoy + timedelta(days=1)
+        ahora = timezone.now()
+        return [
+            ('agenda de un profesional (AgendaDia.cargar)',
+             Turno.objects.filter(fecha=manana, profesional=profesional, estado__in=activos)),
+            ('agendas en rango (AgendaDia.cargar_rango)',
+             Turno.objects.filter(
+                 fecha__in=[manana + timedelta(days=i) for i in range(14)],
+                 profesional_id__in=[profesional.id], estado__in=activos,
+             )),
+            ('turnos vencidos (expirar_turnos)',
+             Turno.objects.filter(estado__in=['solicitado', 'esperando_sena'], fecha__lt=hoy)
+             .order_by('fecha', 'hora_inicio')[:500]),
+            ('próximos turnos (dashboard)',
+             Turno.objects.filter(fecha__gte=hoy, estado__in=['confirmado', 'esperando_sena'])
+             .order_by('fecha', 'hora_inicio')[:5]),
+            ('turnos de hoy (dashboard)',
+             Turno.objects.filter(fecha=hoy, estado='confirmado')),
+            ('solicitudes pendientes (dashboard)',
+             Turno.objects.filter(estado='solicitado')),
+            ('listado por ventana (TurnoViewSet)',
+             Turno.objects.filter(fecha__gte=hoy - timedelta(days=30), fecha__lte=hoy + timedelta(days=60))
+             .order_by('fecha', 'hora_inicio', 'id')[:101]),
+            ('historial del cliente',
+             Turno.objects.filter(cliente=cliente).order_by('-fecha', '-hora_inicio')),
+            ('notificaciones del usuario',
+             Notificacion.objects.filter(usuario=cliente.usuario).order_by('-fecha_envio', '-id')[:51]),
+            ('notificaciones no leídas',
+             Notificacion.objects.filter(usuario=cliente.usuario, estado__in=Notificacion.ESTADOS_NO_LEIDAS)),
+            ('agenda de cuidados del cliente',
+             AgendaCuidados.objects.filter(cliente=cliente).order_by('fecha')),
+            ('bloqueos vigentes (obtener_agenda_general)',
+             BloqueoAgenda.objects.filter(Q(personal=profesional) | Q(personal__isnull=True), fecha_fin__gte=ahora)),
+            ('bloqueos que se solapan (AgendaDia.cargar)',
+             BloqueoAgenda.objects.filter(
+                 Q(personal=profesional) | Q(personal__isnull=True),
+                 ocupacion__overlap=rango_ocupacion(*limites_del_dia(manana)),
+             )),
+            ('horarios vigentes de un profesional',
+             HorarioLaboral.objects.filter(personal=profesional, dia_semana=1, activo=True)),
+            ('rutina activa del cliente (automatización)',
+             RutinaCliente.objects.filter(cliente=cliente, rutina_original=self.rutina, estado='activa')),
+        ]
+
+    def test_sin_seq_scan(self):
+        for descripcion, queryset in self._consultas():
+            with self.subTest(descripcion):
+                plan = queryset.explain()
+                self.assertNotIn(f'Seq Scan on {queryset.model._meta.db_table}', plan, plan)
+
+
+class PresupuestoConsultasTest(TestCase):
+    """
+    Cada listado hace las mismas consultas con N y con 10N filas: una
+    relación recorrida fila por fila (N+1) rompe la igualdad.
+    """
+
+    N = 3
+
+    ENDPOINTS = (
+        '/api/gestion/tipos-cabello/',
+        '/api/gestion/categorias-servicio/',
+        '/api/gestion/servicios/',
+        '/api/gestion/servicios-quimicos/',
+        '/api/gestion/horariolaboral/',
+        '/api/gestion/turnos/',
+        '/api/gestion/notificaciones/',
+        '/api/gestion/rutinas/',
+        '/api/gestion/reglas-diagnostico/',
+        '/api/gestion/rutinas-cliente/',
+        '/api/gestion/admin/usuarios/',
+        '/api/gestion/productos/',
+        '/api/gestion/personal/',
+        '/api/gestion/tipo-equipamiento/',
+        '/api/gestion/equipamiento/',
+        '/api/gestion/fichas-tecnicas/',
+        '/api/gestion/requisitos-servicio/',
+        '/api/gestion/diagnosticos-capilares/',
+        '/api/gestion/mi-agenda/',
+        '/api/usuarios/clientes/',
+    )
+
+    def setUp(self):
+        self.admin, self.admin_cliente = crear_cliente('admin@test.com')
+        self.admin.is_staff = self.admin.is_superuser = True
+        self.admin.save()
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+        self.categoria = CategoriaServicio.objects.create(nombre='Diseño de Color')
+        self.porosidad = PorosidadCabello.objects.create(nombre='Alta')
+        self.estado = EstadoGeneral.objects.create(nombre='Dañado')
+        self.rutina_base = Rutina.objects.create(
+            nombre='Base', objetivo='Test', archivo='base.pdf', creada_por=self.admin, estado='publicada'
+        )
+        self.lotes = 0
+
+    def _poblar(self, cantidad):
+        """`cantidad` filas nuevas de cada modelo listado, con sus relaciones cargadas."""
+        lote = self.lotes = self.lotes + 1
+        manana = timezone.localdate() + timedelta(days=1)
+        for i in range(cantidad):
+            clave = f'{lote}-{i}'
+            usuario, cliente = crear_cliente(f'presupuesto{clave}@test.com')
+            tipo_cabello = TipoCabello.objects.create(nombre=f'Tipo {clave}')
+            rutina = Rutina.objects.create(
+                nombre=f'Rutina {clave}', objetivo='Test', archivo='r.pdf', creada_por=self.admin, estado='publicada'
+            )
+            servicio = Servicio.objects.create(
+                nombre=f'Color {clave}', categoria=self.categoria, rutina_recomendada=rutina, duracion_estimada=60
+            )
+            tipo_equipo = TipoEquipamiento.objects.create(nombre=f'Equipo {clave}')
+            Equipamiento.objects.create(codigo=f'EQ-{clave}', nombre='Equipo', tipo=tipo_equipo)
+            RequisitoServicio.objects.create(servicio=servicio, tipo_equipamiento=tipo_equipo)
+            Producto.objects.create(nombre=f'Producto {clave}', precio=10)
+
+            profesional = crear_profesional(f'Prof {clave}', dias=[0, 1])
+            profesional.usuario = usuario
+            profesional.save()
+            turno = crear_turno(cliente, profesional, manana, time(10), servicio)
+            FichaTecnica.objects.create(
+                detalle_turno=turno.detalles.get(), profesional_autor=self.admin, formula='Test',
+                porosidad_final=self.porosidad, estado_general_final=self.estado,
+            )
+
+            ReglaDiagnostico.objects.create(
+                tipo_cabello=tipo_cabello, estado_general=self.estado, prioridad=i,
+                mensaje_resultado='Test', accion_resultado='INFO', rutina_sugerida=rutina,
+            )
+            DiagnosticoCapilar.objects.create(
+                cliente=cliente, profesional=self.admin, tipo_cabello=tipo_cabello,
+                porosidad_cabello=self.porosidad, estado_general=self.estado, rutina_sugerida=rutina,
+            )
+            for original in (rutina, self.rutina_base):
+                RutinaCliente.objects.create(
+                    cliente=cliente, rutina_original=original, nombre=original.nombre,
+                    objetivo='Test', archivo='r.pdf', version_asignada=1,
+                )
+            Notificacion.objects.create(usuario=self.admin, titulo='Aviso', mensaje='Test')
+            AgendaCuidados.objects.create(cliente=self.admin_cliente, fecha=manana, titulo='Cuidado', descripcion='Test')
+
+    def _contar(self, url):
+        self.api.get(url)  # arma los caches por proceso (snapshot, motor)
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.api.get(url)
+        self.assertEqual(respuesta.status_code, 200, url)
+        return len(consultas)
+
+    def test_consultas_constantes(self):
+        urls = self.ENDPOINTS + (f'/api/gestion/rutinas/{self.rutina_base.id}/usuarios_usando/',)
+
+        self._poblar(self.N)
+        pocos = {url: self._contar(url) for url in urls}
+        self._poblar(self.N * 9)
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self._contar(url), pocos[url])
+
+
+class DetectorNMasUnoTest(TestCase):
+    """El middleware avisa cuando un pedido repite la misma forma de consulta."""
+
+    def _pedido(self, repeticiones):
+        def vista(request):
+            for i in range(repeticiones):
+                list(Turno.objects.filter(id=i))
+            return HttpResponse()
+        return DetectorNMasUno(vista)(RequestFactory().get('/api/gestion/turnos/'))
+
+    def test_formas(self):
+        self.assertEqual(
+            forma_sql('SELECT 1 FROM t WHERE id IN (%s, %s, %s) AND x = 5'),
+            forma_sql('SELECT 1 FROM t WHERE id IN (%s) AND x = 7'),
+        )
+
+    @override_settings(NMASUNO_UMBRAL=5)
+    def test_avisa_sobre_el_umbral(self):
+        with self.assertNoLogs('gestion.middleware', 'WARNING'):
+            self._pedido(5)
+        with self.assertLogs('gestion.middleware', 'WARNING') as registro:
+            self._pedido(6)
+        self.assertIn('6 consultas con la misma forma', registro.output[0])
+        self.assertIn('test.py', registro.output[0])
+
+
+class MetricasTest(TestCase):
+    """Pedidos, latencia y SQL por ruta en /api/metrics."""
+
+    def setUp(self):
+        cache.clear()
+        metricas.acumulador.series.clear()
+        self.usuario, _ = crear_cliente()
+
+    @override_settings(METRICAS_HABILITADAS=True)
+    def test_metricas_por_ruta(self):
+        api = APIClient()
+        TipoCabello.objects.create(nombre='Rizado')
+        for _ in range(2):
+            self.assertEqual(api.get('/api/gestion/tipos-cabello/').status_code, 200)
+
+        api.force_authenticate(self.usuario)
+        self.assertEqual(api.get('/api/metrics').status_code, 403)
+        self.usuario.is_staff = True
+        self.usuario.save()
+        respuesta = api.get('/api/metrics')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        texto = respuesta.content.decode()
+        etiquetas = '{vista="tipocabello-list",metodo="GET"}'
+        self.assertIn(f'bohemia_http_pedidos_total{etiquetas} 2', texto)
+        # Listado paginado: COUNT + SELECT por pedido
+        self.assertIn(f'bohemia_sql_consultas_total{etiquetas} 4', texto)
+        self.assertIn('bohemia_http_latencia_segundos_bucket{vista="tipocabello-list",metodo="GET",le="+Inf"} 2', texto)
+
+    def test_agregado_de_procesos(self):
+        otro = metricas.Acumulador()
+        for acumulador in (metricas.acumulador, otro):
+            acumulador.registrar('turno-list', 'GET', 0.02, 3, 0.004)
+        otro.publicar()
+        serie = metricas.agregado()[('turno-list', 'GET')]
+        self.assertEqual(serie[:3], [2, 0.04, 6])
+
+    def test_agregado_descarta_procesos_vencidos(self):
+        otro = metricas.Acumulador()
+        otro.registrar('turno-list', 'GET', 0.02, 3, 0.004)
+        otro.publicar()
+        # El otro proceso deja de publicar y su clave vence
+        cache.delete(otro.clave)
+        metricas.agregado()
+        self.assertEqual(cache.get(metricas.CLAVE_PROCESOS), [metricas.acumulador.clave])
+
+
+class DatosSinteticosTest(TestCase):
+    """Generador de datos de escala y semilla de horarios."""
+
+    def test_genera_agenda_coherente(self):
+        creados = GeneradorDatos(clientes=40, turnos=400, personal=4, semilla=7).generar()
+        self.assertEqual(creados['turnos'], 400)
+        self.assertEqual(Turno.objects.count(), 400)
+        self.assertEqual(creados['ResumenDiario'], ResumenDiario.objects.count())
+        self.assertEqual(Cliente.objects.filter(usuario__email__endswith='.s7@sintetico.local').count(), 40)
+
+        # Duración y ocupación coherentes con los detalles (como si se hubieran guardado con save())
+        for turno in Turno.objects.prefetch_related('detalles'):
+            self.assertEqual(turno.duracion_total, sum(d.duracion_minutos for d in turno.detalles.all()))
+            self.assertEqual(turno.ocupacion, turno.calcular_ocupacion())
+            self.assertEqual(turno.hora_fin_calculada, turno.calcular_hora_fin())
+
+        # Los turnos realizados quedan en el pasado y los pendientes en el futuro
+        hoy = timezone.localdate()
+        self.assertFalse(Turno.objects.filter(estado='realizado', fecha__gt=hoy).exists())
+        self.assertFalse(Turno.objects.filter(estado='solicitado', fecha__lt=hoy).exists())
+        self.assertTrue(DiagnosticoCapilar.objects.exists())
+
+    def test_semilla_repetida(self):
+        call_command('generar_datos_sinteticos', clientes=5, turnos=20, personal=2, seed=3, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generar_datos_sinteticos', clientes=5, turnos=20, personal=2, seed=3, stdout=StringIO())
+
+    def test_cargar_horarios(self):
+        call_command('cargar_horarios', stdout=StringIO())
+        horarios = HorarioLaboral.objects.filter(personal=None, activo=True)
+        self.assertEqual(sorted(horarios.values_list('dia_semana', flat=True)), [0, 1, 2, 3, 4, 5])
+
+
+class ContadoresEstadoTest(TestCase):
+    """Contadores por estado del tablero: al día en cada transición y reconciliables."""
+
+    def setUp(self):
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.usuario, self.cliente = crear_cliente()
+        self.hoy = timezone.localdate()
+        contadores.reconciliar()
+
+    def assertContadoresExactos(self):
+        """Foto más diferencias coincide con una reconstrucción desde cero."""
+        claves = {
+            *ContadorEstado.objects.values_list('clave', flat=True),
+            *DeltaContador.objects.values_list('clave', flat=True),
+        } - {contadores.CLAVE_RECONCILIACION}
+        actuales = {clave: cantidad for clave, (cantidad, _) in contadores.leer(claves).items() if cantidad}
+        self.assertEqual(contadores.contadores_tablero(self.hoy), contadores.contar_tablero(self.hoy))
+        contadores.reconciliar()
+        self.assertFalse(DeltaContador.objects.exists())
+        reconstruidos = dict(
+            ContadorEstado.objects.exclude(clave=contadores.CLAVE_RECONCILIACION).values_list('clave', 'cantidad')
+        )
+        self.assertEqual(actuales, reconstruidos)
+
+    def test_transiciones(self):
+        foto = sorted(ContadorEstado.objects.values_list('clave', 'cantidad', 'actualizado'))
+        turno = Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.hoy, hora_inicio=time(10)
+        )
+        self.assertEqual(contadores.contadores_tablero(self.hoy)['pendientes_accion'], 1)
+        # La reserva solo inserta diferencias: las filas de ContadorEstado no se tocan
+        self.assertEqual(sorted(ContadorEstado.objects.values_list('clave', 'cantidad', 'actualizado')), foto)
+        self.assertEqual(
+            sorted(DeltaContador.objects.values_list('clave', 'cantidad')),
+            [(contadores.clave_dia(self.hoy, 'solicitado'), 1), ('estado:solicitado', 1)]
+        )
+
+        turno.estado = 'confirmado'
+        turno.save()
+        self.assertEqual(contadores.contadores_tablero(self.hoy)['turnos_hoy'], 1)
+        self.assertContadoresExactos()
+
+        turno.fecha = self.hoy + timedelta(days=1)
+        turno.save()
+        self.assertEqual(contadores.contadores_tablero(self.hoy)['turnos_hoy'], 0)
+        self.assertContadoresExactos()
+
+        # Un rollback descarta el turno y sus contadores
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Turno.objects.create(
+                cliente=self.cliente, profesional=self.profesional, fecha=self.hoy, hora_inicio=time(12)
+            )
+            raise IntegrityError()
+
+        # Expiración por UPDATE en lote (sin señales)
+        Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional,
+            fecha=self.hoy - timedelta(days=1), hora_inicio=time(10), estado='esperando_sena'
+        )
+        self.assertEqual(expirar_turnos(), 1)
+        self.assertEqual(contadores.contadores_tablero(self.hoy)['esperando_sena'], 0)
+        self.assertContadoresExactos()
+
+        turno.delete()
+        self.assertContadoresExactos()
+
+    def test_tablero(self):
+        crear_turno(self.cliente, self.profesional, self.hoy, time(23), self.servicio)
+        Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.hoy + timedelta(days=3),
+            hora_inicio=time(10), estado='solicitado'
+        )
+        admin = Usuario.objects.create_user(email='admin@test.com', password='x', is_staff=True)
+        api = APIClient()
+        api.force_authenticate(admin)
+
+        # Contadores reconciliados: una lectura por clave + próximos turnos
+        with self.assertNumQueries(2):
+            respuesta = api.get('/api/gestion/admin-dashboard/stats/')
+        self.assertEqual(respuesta.data['turnos_hoy'], 1)
+        self.assertEqual(respuesta.data['pendientes_accion'], 1)
+        self.assertEqual(respuesta.data['proximos_turnos'][0]['servicios'], 'Corte')
+
+        # Reconciliación vencida: cuenta con la consulta agregada
+        ContadorEstado.objects.filter(clave=contadores.CLAVE_RECONCILIACION).update(
+            actualizado=timezone.now() - timedelta(seconds=contadores.ANTIGUEDAD_MAXIMA + 1)
+        )
+        ContadorEstado.objects.exclude(clave=contadores.CLAVE_RECONCILIACION).update(cantidad=99)
+        self.assertIsNone(contadores.contadores_tablero(self.hoy))
+        with self.assertNumQueries(3):
+            respuesta = api.get('/api/gestion/admin-dashboard/stats/')
+        self.assertEqual(respuesta.data['turnos_hoy'], 1)
+        self.assertEqual(respuesta.data['pendientes_accion'], 1)
+
+        call_command('reconciliar_contadores', stdout=StringIO())
+        self.assertEqual(contadores.contadores_tablero(self.hoy)['turnos_hoy'], 1)
+
+
+class ResumenesDiariosTest(TestCase):
+    """Resúmenes diarios de reportes: al día en cada cierre de turno y reconstruibles."""
+
+    def setUp(self):
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        # 9 a 18 todos los días, con dos horas bloqueadas ayer: 420 minutos disponibles
+        self.profesional = crear_profesional('Uno')
+        self.usuario, self.cliente = crear_cliente()
+        self.ayer = timezone.localdate() - timedelta(days=1)
+        BloqueoAgenda.objects.create(
+            personal=self.profesional, motivo='Médico',
+            fecha_inicio=timezone.make_aware(datetime.combine(self.ayer, time(9))),
+            fecha_fin=timezone.make_aware(datetime.combine(self.ayer, time(11))),
+        )
+
+    def _cerrar(self, hora, estado, precio='100.00', duracion=60):
+        turno = crear_turno(self.cliente, self.profesional, self.ayer, hora, self.servicio, duracion)
+        DetalleTurno.objects.filter(turno=turno).update(precio_historico=precio)
+        turno.refresh_from_db()
+        turno.estado = estado
+        turno.save()
+        return turno
+
+    def _resumen(self):
+        return ResumenDiario.objects.get(fecha=self.ayer, profesional=self.profesional)
+
+    def _filas(self):
+        return (
+            list(ResumenDiario.objects.order_by('fecha', 'profesional_id').values_list(
+                'fecha', 'profesional_id', 'realizados', 'ausentes', 'cancelados', 'ingresos',
+                'minutos_reservados', 'minutos_disponibles'
+            )),
+            list(ResumenServicioDiario.objects.exclude(cantidad=0).order_by('fecha', 'servicio_id').values_list(
+                'fecha', 'profesional_id', 'servicio_id', 'cantidad', 'ingresos', 'minutos'
+            )),
+        )
+
+    def assertReconstruible(self):
+        """Lo acumulado por diferencias coincide con una reconstrucción desde Turno."""
+        acumulado = self._filas()
+        analitica.reconstruir(self.ayer, self.ayer)
+        self.assertEqual(acumulado, self._filas())
+
+    def test_cierres_incrementales(self):
+        # Un turno que no está cerrado no escribe resúmenes
+        crear_turno(self.cliente, self.profesional, self.ayer + timedelta(days=2), time(10), self.servicio)
+        self.assertFalse(ResumenDiario.objects.exists())
+
+        realizado = self._cerrar(time(12), 'realizado', '100.00', 60)
+        ausente = self._cerrar(time(14), 'ausente', '80.00', 30)
+        self._cerrar(time(16), 'cancelado')
+        resumen = self._resumen()
+        self.assertEqual((resumen.realizados, resumen.ausentes, resumen.cancelados), (1, 1, 1))
+        self.assertEqual(resumen.ingresos, Decimal('100.00'))
+        self.assertEqual((resumen.minutos_reservados, resumen.minutos_disponibles), (90, 420))
+        servicio = ResumenServicioDiario.objects.get(fecha=self.ayer, servicio=self.servicio)
+        self.assertEqual((servicio.cantidad, servicio.ingresos, servicio.minutos), (1, Decimal('100.00'), 60))
+        self.assertReconstruible()
+
+        # Corrección de un cierre, borrado y expiración por UPDATE en lote
+        realizado.estado = 'ausente'
+        realizado.save()
+        self.assertEqual((self._resumen().realizados, self._resumen().ingresos), (0, Decimal('0.00')))
+        ausente.delete()
+        Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.ayer,
+            hora_inicio=time(17), estado='esperando_sena'
+        )
+        self.assertEqual(expirar_turnos(), 1)
+        resumen = self._resumen()
+        self.assertEqual((resumen.realizados, resumen.ausentes, resumen.cancelados), (0, 1, 2))
+        self.assertReconstruible()
+
+    def test_reporte(self):
+        self._cerrar(time(12), 'realizado', '100.00', 60)
+        self._cerrar(time(14), 'ausente', '80.00', 30)
+        admin = Usuario.objects.create_user(email='admin@test.com', password='x', is_staff=True)
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = '/api/gestion/reportes/resumen/'
+        rango = {'desde': self.ayer.isoformat(), 'hasta': self.ayer.isoformat()}
+
+        # Filas del rango + totales, sin tocar turnos
+        with self.assertNumQueries(2):
+            respuesta = api.get(url, rango)
+        self.assertEqual(respuesta.status_code, 200)
+        totales = respuesta.data['totales']
+        self.assertEqual(totales['ingresos'], '100.00')
+        self.assertEqual(totales['ocupacion'], round(90 / 420, 4))
+        self.assertEqual(totales['tasa_ausentismo'], 0.5)
+        self.assertEqual(len(respuesta.data['filas']), 1)
+
+        self.assertEqual(api.get(url, {**rango, 'agrupar': 'profesional'}).data['filas'][0]['profesional'], 'Uno Test')
+        self.assertEqual(api.get(url, {**rango, 'agrupar': 'servicio'}).data['filas'][0]['nombre'], 'Corte')
+        self.assertEqual(api.get(url, {**rango, 'agrupar': 'categoria'}).data['filas'][0]['nombre'], 'Sin categoría')
+        self.assertEqual(api.get(url, {**rango, 'agrupar': 'mes'}).status_code, 400)
+        self.assertEqual(api.get(url, {'desde': 'ayer'}).status_code, 400)
+
+        api.force_authenticate(self.usuario)
+        self.assertEqual(api.get(url, rango).status_code, 403)
+
+    def test_comando_reconstruye_dias_sin_turnos(self):
+        call_command('reconstruir_resumenes', '--dias', '7', stdout=StringIO())
+        # Un día con horario y sin turnos cerrados es ocupación 0, no "sin datos"
+        self.assertEqual(ResumenDiario.objects.filter(profesional=self.profesional).count(), 7)
+        self.assertEqual(self._resumen().minutos_disponibles, 420)
+        with self.assertRaises(CommandError):
+            call_command('reconstruir_resumenes', '--desde', '2026-02-01', '--hasta', '2026-01-01', stdout=StringIO())
+
+
+class NotificacionesCampanaTest(TestCase):
+    """Contador de no leídas, marcado en lote y listado compacto de notificaciones."""
+
+    URL = '/api/gestion/notificaciones/'
+
+    def setUp(self):
+        self.usuario, _ = crear_cliente()
+        otro, _ = crear_cliente('otro@test.com')
+        self.pendientes = [
+            Notificacion.objects.create(usuario=self.usuario, titulo=f'Aviso {i}', mensaje='Largo' * 100, datos_extra={'i': i})
+            for i in range(3)
+        ]
+        Notificacion.objects.create(usuario=self.usuario, titulo='Vieja', mensaje='Test', estado='leido')
+        self.ajena = Notificacion.objects.create(usuario=otro, titulo='Ajena', mensaje='Test')
+        self.api = APIClient()
+        self.api.force_authenticate(self.usuario)
+
+    def _no_leidas(self):
+        with self.assertNumQueries(1):
+            respuesta = self.api.get(f'{self.URL}no-leidas/count/')
+        return respuesta.data['no_leidas']
+
+    def test_contador_y_marcado(self):
+        # Enviada por el canal pero sin leer: no cuenta en la campana
+        enviada = Notificacion.objects.create(usuario=self.usuario, titulo='Enviada', mensaje='Test', estado='enviado')
+        self.assertEqual(self._no_leidas(), 3)
+
+        with self.assertNumQueries(1):
+            respuesta = self.api.post(f'{self.URL}{self.pendientes[0].id}/marcar_leida/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self.api.post(f'{self.URL}{self.ajena.id}/marcar_leida/').status_code, 404)
+        self.assertEqual(self._no_leidas(), 2)
+
+        # Por ids: las ajenas se ignoran
+        with self.assertNumQueries(1):
+            respuesta = self.api.post(
+                f'{self.URL}marcar_todas_leidas/', {'ids': [self.pendientes[1].id, self.ajena.id]}, format='json'
+            )
+        self.assertEqual(respuesta.data['marcadas'], 1)
+        self.assertEqual(
+            self.api.post(f'{self.URL}marcar_todas_leidas/', {'ids': 'todas'}, format='json').status_code, 400
+        )
+
+        self.assertEqual(self.api.post(f'{self.URL}marcar_todas_leidas/').data['marcadas'], 1)
+        self.assertEqual(self._no_leidas(), 0)
+        self.ajena.refresh_from_db()
+        self.assertEqual(self.ajena.estado, 'pendiente')
+        enviada.refresh_from_db()
+        self.assertEqual(enviada.estado, 'enviado')
+
+    def test_listado_compacto(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.api.get(self.URL, {'campos': 'compacto'})
+        self.assertEqual(len(respuesta.data['results']), 4)
+        self.assertEqual(set(respuesta.data['results'][0]), set(NotificacionViewSet.CAMPOS_COMPACTOS))
+        self.assertNotIn('"mensaje"', consultas.captured_queries[-1]['sql'])
+        self.assertNotIn('"datos_extra"', consultas.captured_queries[-1]['sql'])
+
+        respuesta = self.api.get(self.URL, {'campos': 'id,estado', 'limite': 2})
+        self.assertEqual(respuesta.data['results'][1], {'id': self.pendientes[2].id, 'estado': 'pendiente'})
+        # El cursor sigue funcionando con la proyección
+        self.assertEqual(len(self.api.get(respuesta.data['next']).data['results']), 2)
+
+        self.assertEqual(self.api.get(self.URL, {'campos': 'id,clave'}).status_code, 400)
+        self.assertIn('mensaje', self.api.get(self.URL).data['results'][0])
+
+
+class EventosEnVivoTest(TestCase):
+    """Eventos SSE: se guardan con cada cambio y el stream reanuda desde Last-Event-ID."""
+
+    URL = '/api/gestion/eventos/stream/'
+
+    def setUp(self):
+        self.profesional = crear_profesional('Uno', dias=[])
+        self.usuario, self.cliente = crear_cliente()
+        self.manana = timezone.localdate() + timedelta(days=1)
+
+    def _eventos(self, **filtro):
+        return list(EventoUsuario.objects.filter(**filtro).order_by('id').values_list('usuario_id', 'tipo'))
+
+    def test_publicacion(self):
+        turno = Turno.objects.create(
+            cliente=self.cliente, profesional=self.profesional, fecha=self.manana, hora_inicio=time(10)
+        )
+        self.assertEqual(self._eventos(), [(self.usuario.id, 'turno'), (None, 'turno')])
+
+        EventoUsuario.objects.all().delete()
+        turno.hora_inicio = time(11)
+        turno.save()
+        self.assertEqual(self._eventos(), [])
+        turno.estado = 'confirmado'
+        turno.save()
+        evento = EventoUsuario.objects.get(usuario=self.usuario)
+        self.assertEqual((evento.datos['estado_anterior'], evento.datos['estado']), ('solicitado', 'confirmado'))
+
+        Notificacion.objects.create(usuario=self.usuario, titulo='Aviso', mensaje='Test')
+        self.assertEqual(self._eventos(tipo='notificacion'), [(self.usuario.id, 'notificacion')])
+
+        # Un rollback descarta el evento (y su NOTIFY)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Notificacion.objects.create(usuario=self.usuario, titulo='Aviso', mensaje='Test')
+            raise IntegrityError()
+        self.assertEqual(len(self._eventos(tipo='notificacion')), 1)
+
+        EventoUsuario.objects.update(creado=timezone.now() - timedelta(seconds=eventos.RETENCION + 1))
+        call_command('purgar_eventos', stdout=StringIO())
+        self.assertFalse(EventoUsuario.objects.exists())
+
+    async def test_stream_reanuda_desde_ultimo_id(self):
+        def preparar():
+            notificaciones = [
+                Notificacion.objects.create(usuario=self.usuario, titulo=f'Aviso {i}', mensaje='Test') for i in range(3)
+            ]
+            ids = list(EventoUsuario.objects.filter(usuario=self.usuario).order_by('id').values_list('id', flat=True))
+            return notificaciones, ids, str(AccessToken.for_user(self.usuario))
+        notificaciones, ids, token = await sync_to_async(preparar)()
+
+        cliente = AsyncClient()
+        self.assertEqual((await cliente.get(self.URL)).status_code, 401)
+
+        respuesta = await cliente.get(self.URL, {'token': token}, headers={'Last-Event-ID': str(ids[0])})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        contenido = aiter(respuesta.streaming_content)
+        try:
+            self.assertEqual(await anext(contenido), b'retry: 3000\n\n')
+            # Solo los posteriores al último recibido, en orden
+            for evento_id, notificacion in zip(ids[1:], notificaciones[1:]):
+                bloque = (await anext(contenido)).decode()
+                self.assertTrue(bloque.startswith(f'id: {evento_id}\nevent: notificacion\n'), bloque)
+                self.assertIn(f'"titulo": "{notificacion.titulo}"', bloque)
+        finally:
+            await contenido.aclose()
+            await eventos.difusor.detener()
+
+    def test_requiere_asgi(self):
+        api = APIClient()
+        api.force_authenticate(self.usuario)
+        self.assertEqual(api.get(self.URL).status_code, 503)
+
+
+class EventosListenNotifyTest(TransactionTestCase):
+    """El aviso de un COMMIT hecho en otra conexión llega por LISTEN/NOTIFY al stream."""
+
+    def test_aviso_entre_conexiones(self):
+        usuario, _ = crear_cliente()
+
+        def notificar_en_otra_conexion():
+            def crear():
+                try:
+                    Notificacion.objects.create(usuario=usuario, titulo='En vivo', mensaje='Test')
+                finally:
+                    connections.close_all()
+            hilo = threading.Thread(target=crear)
+            hilo.start()
+            hilo.join()
+
+        async def recibir():
+            flujo = eventos.flujo(usuario.id, False)
+            try:
+                await anext(flujo)
+                await asyncio.wait_for(eventos.difusor.escuchando.wait(), 10)
+                await sync_to_async(notificar_en_otra_conexion, thread_sensitive=False)()
+                bloque = await asyncio.wait_for(anext(flujo), 10)
+                # Antes del evento puede llegar un latido
+                while 'event: notificacion' not in bloque:
+                    bloque = await asyncio.wait_for(anext(flujo), 10)
+                return bloque
+            finally:
+                await flujo.aclose()
+                await eventos.difusor.detener()
+                # La conexión del hilo de sync_to_async no la cierra ningún pedido
+                await sync_to_async(connections.close_all)()
+
+        self.assertIn('"titulo": "En vivo"', asyncio.run(recibir()))
+
+
+class ReservasConcurrentesTest(TransactionTestCase):
+    """Pedidos simultáneos sobre el mismo horario: exactamente un ganador."""
+
+    HILOS = 5
+
+    def setUp(self):
+        cache.clear()
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_estimada=60)
+        self.profesional = crear_profesional('Uno')
+        self.fecha = timezone.localdate() + timedelta(days=3)
+        self.fecha_hueco = timezone.localdate() + timedelta(days=1)
+
+    def _en_paralelo(self, pedidos):
+        """Ejecuta los pedidos a la vez (cada hilo con su conexión) y devuelve los status."""
+        barrera = threading.Barrier(len(pedidos))
+        resultados = []
+
+        def ejecutar(pedido):
+            try:
+                barrera.wait()
+                resultados.append(pedido())
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=ejecutar, args=(pedido,)) for pedido in pedidos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return sorted(resultados)
+
+    def _pedido(self, usuario, url, datos=None):
+        def pedido():
+            api = APIClient()
+            api.force_authenticate(usuario)
+            return api.post(url, datos or {}, format='json').status_code
+        return pedido
+
+    def test_una_sola_oferta_de_adelanto_aceptada(self):
+        _, cliente_cancelo = crear_cliente('cancelo@test.com')
+        cancelado = crear_turno(cliente_cancelo, self.profesional, self.fecha_hueco, time(10), self.servicio)
+        cancelado.estado = 'cancelado'
+        cancelado.save()
+
+        pedidos = []
+        for i in range(self.HILOS):
+            usuario, cliente = crear_cliente(f'adelanto{i}@test.com')
+            turno = crear_turno(cliente, self.profesional, self.fecha, time(9 + i), self.servicio)
+            oferta = Notificacion.objects.create(
+                usuario=usuario, tipo='ADELANTO', titulo='Adelanto', mensaje='-',
+                datos_extra={
+                    'fecha_oferta': self.fecha_hueco.isoformat(),
+                    'hora_oferta': '10:00',
+                    'turno_actual_id': turno.id,
+                    'turno_cancelado_id': cancelado.id,
+                },
+            )
+            pedidos.append(self._pedido(usuario, f'/api/gestion/notificaciones/{oferta.id}/aceptar/'))
+
+        self.assertEqual(self._en_paralelo(pedidos), [200] + [409] * (self.HILOS - 1))
+        self.assertEqual(
+            Turno.objects.filter(fecha=self.fecha_hueco, estado='confirmado').count(), 1
+        )
+        self.assertEqual(Notificacion.objects.filter(estado='leido').count(), 1)
+        self.assertEqual(Notificacion.objects.filter(estado='expirado').count(), self.HILOS - 1)
+
+    def test_una_sola_reprogramacion_al_mismo_horario(self):
+        pedidos = []
+        for i in range(self.HILOS):
+            usuario, cliente = crear_cliente(f'reprograma{i}@test.com')
+            turno = crear_turno(cliente, self.profesional, self.fecha, time(9 + i), self.servicio)
+            Turno.objects.filter(pk=turno.pk).update(estado='solicitado')
+            pedidos.append(self._pedido(
+                usuario, f'/api/gestion/turnos/{turno.id}/reprogramar_cliente/',
+                {'fecha': self.fecha_hueco.isoformat(), 'hora_inicio': '10:00'}
+            ))
+
+        self.assertEqual(self._en_paralelo(pedidos), [200] + [409] * (self.HILOS - 1))
+        self.assertEqual(Turno.objects.filter(fecha=self.fecha_hueco).count(), 1)
@@ -49,9 +49,12 @@ urlpatterns = [
     path('', include(router.urls)),
     
     # Endpoints personalizados (fuera del router)
+    path('catalogos/bundle/', views.CatalogosBundleView.as_view(), name='catalogos-bundle'),
     path('disponibilidad/', DisponibilidadTurnosView.as_view(), name='disponibilidad-turnos'),
     path('mi-agenda/', MiAgendaCuidadosView.as_view(), name='mi-agenda'),
     path('admin-dashboard/stats/', AdminDashboardStatsView.as_view(), name='admin-stats'),
+    path('reportes/resumen/', views.ReporteResumenView.as_view(), name='reporte-resumen'),
+    path('eventos/stream/', views.stream_eventos, name='eventos-stream'),
     path('prueba-rutina/', views.SeleccionarRutinaView.as_view(), name='prueba-rutina'),
     #path('lista-espera/', ListaEsperaCreateView.as_view(), name='unirse-lista-espera'),
     path('agenda/general/', views.obtener_agenda_general, name='agenda-general'),
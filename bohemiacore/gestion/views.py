@@ -6,10 +6,13 @@ from rest_framework import generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from datetime import datetime, date, timedelta, time
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from asgiref.sync import sync_to_async
+from datetime import datetime, date, timedelta
 import datetime as dt
 from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 import logging
@@ -18,14 +21,13 @@ from .models import (
     TipoCabello, GrosorCabello, PorosidadCabello, CueroCabelludo, EstadoGeneral, CategoriaServicio, Servicio, Turno, DetalleTurno,
     Configuracion, ListaEspera, Producto, Equipamiento, Rutina, Notificacion, AgendaCuidados, Producto, ReglaDiagnostico,
     RutinaCliente, HorarioLaboral, BloqueoAgenda, Personal, TipoEquipamiento, FichaTecnica, DiagnosticoCapilar, RequisitoServicio,
-    DiasSemana,
     #PasoRutinaCliente
     #PasoRutina
 )
 
 from .serializers import (
     TipoCabelloSerializer, GrosorCabelloSerializer, PorosidadCabelloSerializer, CueroCabelludoSerializer, EstadoGeneralSerializer,
-    CategoriaServicioSerializer, ServicioSerializer, TurnoSerializer, RutinaSerializer, RutinaClienteSerializer,
+    CategoriaServicioSerializer, ServicioSerializer, TurnoSerializer, TurnoListSerializer, RutinaSerializer, RutinaClienteSerializer,
     RutinaClienteCreateSerializer, ReglaDiagnosticoSerializer, NotificacionSerializer, ProductoSerializer, EquipamientoSerializer,
     UsuarioAdminSerializer, AgendaCuidadosSerializer, HorarioLaboralSerializer, BloqueoAgendaSerializer, PersonalSerializer,
     TipoEquipamientoSerializer, FichaTecnicaSerializer, RequisitoServicioSerializer, DiagnosticoCapilarSerializer,
@@ -33,8 +35,18 @@ from .serializers import (
 )
 
 from .services import DisponibilidadService 
+from .disponibilidad import (
+    a_minutos, a_hora, minimo_inicio_para, rango_ocupacion, MINUTOS_DIA, ESTADOS_OCUPAN_AGENDA,
+)
+from .capacidad_equipamiento import CapacidadEquipamiento, requisitos_por_tipo
+from .primer_hueco import IndiceHuecos
+from .paginacion import PaginacionTurnos, PaginacionNotificaciones, PaginacionRecientes
+from . import reservas, tareas, motor_diagnostico, catalogos, snapshot_agenda, metricas, contadores, analitica, eventos
+from .cache_disponibilidad import obtener_agenda, obtener_agendas, obtener_bloques_servicio, obtener_calendario
 from usuarios.models import Usuario, Cliente
 
+logger = logging.getLogger(__name__)
+
 class CatalogoBaseListView(generics.ListAPIView):
     permission_classes = [AllowAny]
 
@@ -93,7 +105,7 @@ class ServicioViewSet(viewsets.ModelViewSet):
     pagination_class = None
     
     def get_queryset(self):
-        return Servicio.objects.all().order_by('nombre')
+        return ServicioSerializer.preparar_queryset(Servicio.objects.all().order_by('nombre'))
 
 class ServiciosQuimicosViewSet(viewsets.ReadOnlyModelViewSet):
     """
@@ -115,16 +127,113 @@ class ServiciosQuimicosViewSet(viewsets.ReadOnlyModelViewSet):
         # 2. Filtramos los servicios:
         # Busca en el modelo Servicio, mira la 'categoria' relacionada,
         # y filtra por el 'nombre' de esa categoría usando la lista.
-        return Servicio.objects.filter(
+        return ServicioSerializer.preparar_queryset(Servicio.objects.filter(
             categoria__nombre__in=categorias_relevantes
-        ).order_by('nombre')
+        ).order_by('nombre'))
+
+
+class CatalogosBundleView(APIView):
+    """
+    GET /api/gestion/catalogos/bundle/
+    Todos los catálogos en una sola respuesta (ver gestion/catalogos.py).
+    - ETag = hash del contenido; con If-None-Match igual responde 304.
+    - Con ?v=<version> (el campo 'version' del bundle) la URL es inmutable y se
+      puede cachear por un año; sin él, el navegador revalida siempre.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+    CACHE_REVALIDAR = 'public, max-age=0, must-revalidate'
+
+    def get(self, request):
+        bundle = catalogos.obtener_bundle()
+
+        if request.query_params.get('v') == bundle.hash:
+            cache_control = self.CACHE_INMUTABLE
+        else:
+            cache_control = self.CACHE_REVALIDAR
+
+        etags = [etag.strip() for etag in request.headers.get('If-None-Match', '').split(',')]
+        if bundle.etag in etags or '*' in etags:
+            respuesta = HttpResponseNotModified()
+        else:
+            # Ya renderizado: se envía tal cual, sin pasar por el serializer
+            respuesta = HttpResponse(bundle.contenido, content_type='application/json')
+        respuesta['ETag'] = bundle.etag
+        respuesta['Cache-Control'] = cache_control
+        return respuesta
+
+
+class MetricasView(APIView):
+    """
+    GET /api/metrics
+    Latencia y SQL por endpoint en formato de texto de Prometheus, sumando
+    todos los workers (ver gestion/metricas.py). Solo staff.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(
+            metricas.formato_prometheus(metricas.agregado()),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+def _usuario_jwt(request):
+    """
+    Usuario del token JWT del header Authorization o de ?token= (EventSource
+    no permite enviar headers). None si no hay token o no es válido.
+    """
+    autenticador = JWTAuthentication()
+    crudo = request.GET.get('token')
+    if not crudo:
+        encabezado = autenticador.get_header(request)
+        crudo = autenticador.get_raw_token(encabezado) if encabezado else None
+    if not crudo:
+        return None
+    try:
+        return autenticador.get_user(autenticador.get_validated_token(crudo))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def stream_eventos(request):
+    """
+    GET /api/gestion/eventos/stream/  (text/event-stream)
+    Notificaciones nuevas y cambios de estado de turnos del usuario (todos los
+    turnos si es staff), empujados en vivo (ver gestion/eventos.py). Reanuda
+    desde el header Last-Event-ID o ?ultimo_id=. Requiere servidor ASGI.
+    """
+    if 'wsgi.version' in request.META:
+        # Bajo WSGI la respuesta se armaría completa antes de enviarse: nunca terminaría
+        return JsonResponse({'error': 'Los eventos en vivo requieren un servidor ASGI.'}, status=503)
+
+    usuario = await sync_to_async(_usuario_jwt)(request)
+    if usuario is None:
+        usuario = await request.auser()
+    if not usuario.is_authenticated or not usuario.is_active:
+        return JsonResponse({'error': 'No autenticado'}, status=401)
+
+    ultimo = request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id')
+    if ultimo is not None and not ultimo.isdigit():
+        return JsonResponse({'error': "'ultimo_id' debe ser numérico"}, status=400)
+
+    respuesta = StreamingHttpResponse(
+        eventos.flujo(usuario.id, usuario.is_staff, int(ultimo) if ultimo else None),
+        content_type='text/event-stream',
+    )
+    respuesta['Cache-Control'] = 'no-cache'
+    # Sin buffer en nginx: cada evento sale apenas se escribe
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
 
 
 class PersonalViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gestionar el personal / staff del salón (CRUD completo).
     """
-    queryset = Personal.objects.all()
+    queryset = PersonalSerializer.preparar_queryset(Personal.objects.all())
     serializer_class = PersonalSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = None
@@ -185,9 +294,13 @@ class DisponibilidadTurnosView(APIView):
             duracion = servicio.duracion_estimada or 60
             logger.info(f"Calculando bloques disponibles para {fecha_consulta} con duración {duracion} min")
             
-            bloques_libres = DisponibilidadService.obtener_bloques_disponibles(
-                fecha_consulta=fecha_consulta,
-                servicio=servicio
+            bloques_libres = obtener_bloques_servicio(
+                fecha_consulta,
+                servicio,
+                lambda: DisponibilidadService.obtener_bloques_disponibles(
+                    fecha_consulta=fecha_consulta,
+                    servicio=servicio
+                )
             )
             
             logger.info(f"Bloques libres encontrados: {len(bloques_libres)}")
@@ -221,9 +334,10 @@ class ServicioViewSet(viewsets.ModelViewSet):
         # Admins ven todos los servicios (activos e inactivos)
         # Clientes ven solo activos
         if self.request.user.is_staff:
-            return Servicio.objects.all().order_by('nombre')
+            queryset = Servicio.objects.all().order_by('nombre')
         else:
-            return Servicio.objects.filter(activo=True).order_by('nombre')
+            queryset = Servicio.objects.filter(activo=True).order_by('nombre')
+        return ServicioSerializer.preparar_queryset(queryset)
     
     def get_permissions(self):
         """Permisos dinámicos: lista/retrieve abierto, CRUD solo para admins"""
@@ -243,55 +357,14 @@ class TurnoViewSet(viewsets.ModelViewSet):
     # Usamos prefetch_related para optimizar la consulta de la tabla intermedia
     queryset = Turno.objects.all().prefetch_related('detalles__servicio', 'cliente__usuario')
     serializer_class = TurnoSerializer
-    pagination_class = None 
+    # El listado se pagina por (fecha, hora_inicio, id) dentro de una ventana de fechas
+    pagination_class = PaginacionTurnos
     permission_classes = [IsAuthenticated]
-
-    def _auto_cancel_expired_turnos(self):
-        """
-        Detecta y cancela automáticamente turnos que pasaron su fecha
-        sin confirmación (estados SOLICITADO o ESPERANDO_SENA).
-        """
-        now = timezone.now()
-        
-        # Buscar turnos expirados comparando fecha + hora contra ahora
-        expired_turnos = Turno.objects.filter(
-            estado__in=[Turno.Estado.SOLICITADO, Turno.Estado.ESPERANDO_SENA]
-        )
-
-        for turno in expired_turnos:
-            try:
-                # Combinar fecha e hora para comparar
-                turno_dt = timezone.make_aware(datetime.combine(turno.fecha, turno.hora_inicio)) \
-                    if timezone.is_naive(datetime.combine(turno.fecha, turno.hora_inicio)) \
-                    else datetime.combine(turno.fecha, turno.hora_inicio)
-                
-                # Si ya pasó
-                if turno_dt < now:
-                    estado_anterior = turno.estado
-                    
-                    # Cancelar automáticamente
-                    turno.estado = Turno.Estado.CANCELADO
-                    turno.motivo_cancelacion = "Cancelado automáticamente: Turno expirado sin confirmación"
-                    turno.save()
-
-                    # Notificar al cliente
-                    Notificacion.objects.get_or_create(
-                        usuario=turno.cliente.usuario,
-                        tipo='TURNO',
-                        titulo='Turno Cancelado - Expiración de plazo',
-                        defaults={
-                            'canal': 'in-app',
-                            'mensaje': f'Tu turno del {turno_dt.strftime("%d/%m/%Y %H:%M")} ha sido cancelado automáticamente porque pasó la fecha sin confirmación.',
-                            'estado': 'pendiente'
-                        }
-                    )
-            except Exception as e:
-                logging.error(f"Error auto-cancelando turno {turno.id}: {str(e)}")
+    # Ventana por defecto del listado: desde hace 30 días hasta el horizonte de reservas
+    DIAS_HISTORIA_POR_DEFECTO = 30
 
     def get_queryset(self):
-        # ✅ NUEVO: Auto-limpiar turnos expirados cada vez que se consulta
-        self._auto_cancel_expired_turnos()
-        
+        # Solo lectura: los turnos vencidos los cancela `manage.py expirar_turnos`
         queryset = super().get_queryset()
         ahora = timezone.now()
 
@@ -317,15 +390,52 @@ class TurnoViewSet(viewsets.ModelViewSet):
         # ✅ Ordenar por fecha y hora
         queryset = queryset.order_by('-fecha', '-hora_inicio')
         
+        if self.action == 'list':
+            queryset = self._filtrar_listado(queryset)
+            # Campos calculados en SQL y relaciones en la misma consulta
+            queryset = TurnoListSerializer.preparar_queryset(queryset)
+        
+        return queryset
+
+    def _filtrar_listado(self, queryset):
+        """
+        Ventana ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD (por defecto: hace 30 días
+        hasta el horizonte de reservas) y ?profesional=<id>. Con los índices
+        (fecha, hora_inicio, ...), (profesional, fecha, ...) y (estado, fecha, ...)
+        cada página cuesta lo mismo aunque crezca la historia.
+        """
+        params = self.request.query_params
+        hoy = timezone.localdate()
+        try:
+            desde = datetime.strptime(params['desde'], '%Y-%m-%d').date() if params.get('desde') else None
+            hasta = datetime.strptime(params['hasta'], '%Y-%m-%d').date() if params.get('hasta') else None
+            profesional = int(params['profesional']) if params.get('profesional') else None
+        except ValueError:
+            raise ValidationError({"error": "Formato inválido. Usa: desde/hasta='YYYY-MM-DD', profesional=<id>"})
+        
+        config = snapshot_agenda.configuracion()
+        desde = desde or hoy - timedelta(days=self.DIAS_HISTORIA_POR_DEFECTO)
+        hasta = hasta or hoy + timedelta(days=config.max_dias_anticipacion if config else 60)
+        if hasta < desde:
+            raise ValidationError({"error": "'hasta' no puede ser anterior a 'desde'"})
+        
+        queryset = queryset.filter(fecha__gte=desde, fecha__lte=hasta)
+        if profesional:
+            queryset = queryset.filter(profesional_id=profesional)
         return queryset
 
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return TurnoListSerializer
+        return TurnoSerializer
+
     def perform_create(self, serializer):
         """Crear turno y calcular fecha_limite_pago si es necesario"""
         turno = serializer.save()
         
         # Si el turno se crea directamente en ESPERANDO_SENA, calcular plazo de pago
         if turno.estado == Turno.Estado.ESPERANDO_SENA:
-            config = Configuracion.objects.first()
+            config = snapshot_agenda.configuracion()
             if config:
                 turno.fecha_limite_pago = timezone.now() + timedelta(hours=config.tiempo_limite_pago_sena)
                 turno.save()
@@ -341,7 +451,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
         
         if nuevo_estado == Turno.Estado.ESPERANDO_SENA and turno.estado != Turno.Estado.ESPERANDO_SENA:
             # Primera vez que pasa a ESPERANDO_SENA, calcular plazo de pago
-            config = Configuracion.objects.first()
+            config = snapshot_agenda.configuracion()
             if config:
                 turno.fecha_limite_pago = timezone.now() + timedelta(hours=config.tiempo_limite_pago_sena)
         
@@ -385,7 +495,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         # 4. Validar política de tiempo para reprogramación (48hs antes para confirmados)
-        config = Configuracion.objects.first()
+        config = snapshot_agenda.configuracion()
         if turno.estado == 'confirmado':
             horas_limite = config.horas_limite_cancelacion if config else 48
             fecha_hora_actual = datetime.combine(turno.fecha, turno.hora_inicio)
@@ -412,29 +522,31 @@ class TurnoViewSet(viewsets.ModelViewSet):
                 "error": "Ya tienes un turno en esa fecha y hora."
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # 6. Validar que el nuevo slot está disponible (sin conflictos)
-        # Extraer IDs de servicios del turno
+        # 6. Validar el slot y guardar con la agenda bloqueada: la validación
+        # corre dentro del lock, así dos pedidos simultáneos no toman el mismo horario
         servicios_ids = [d.servicio.id for d in turno.detalles.all()]
-        
-        es_valido = self._validar_slot_libre(
-            fecha=nueva_fecha,
-            hora=nueva_hora,
-            profesional=turno.profesional,
-            duracion_minutos=sum(d.duracion_minutos for d in turno.detalles.all()) or 60,
-            servicios_ids=servicios_ids,
-            excluir_turno_id=turno.id  # Excluir el turno actual de la validación
-        )
-        
-        if not es_valido:
-            return Response({
-                "error": "El horario seleccionado ya no está disponible."
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
+
+        def verificar(turno_bloqueado):
+            if turno_bloqueado.estado not in ['solicitado', 'esperando_sena']:
+                return f"No puedes reprogramar un turno en estado '{turno_bloqueado.estado}'."
+            es_valido = self._validar_slot_libre(
+                fecha=nueva_fecha,
+                hora=nueva_hora,
+                profesional=turno_bloqueado.profesional,
+                duracion_minutos=turno_bloqueado.duracion_total or 60,
+                servicios_ids=servicios_ids,
+                excluir_turno_id=turno_bloqueado.id  # Excluir el turno actual de la validación
+            )
+            return None if es_valido else "El horario seleccionado ya no está disponible."
+
+        def aplicar(turno_bloqueado):
+            turno_bloqueado.cambios_realizados += 1
+
         # 7. Guardar cambios
-        turno.fecha = nueva_fecha
-        turno.hora_inicio = nueva_hora
-        turno.cambios_realizados += 1
-        turno.save()
+        try:
+            turno = reservas.reprogramar_turno(turno.id, nueva_fecha, nueva_hora, verificar=verificar, aplicar=aplicar)
+        except reservas.ReservaNoDisponible as e:
+            return Response({"error": e.mensaje}, status=status.HTTP_409_CONFLICT)
         
         # Refrescar desde BD para asegurar que los cambios se persistieron
         turno.refresh_from_db()
@@ -453,55 +565,32 @@ class TurnoViewSet(viewsets.ModelViewSet):
         if not profesional:
             return False
         
-        # Convertir hora a datetime para comparación
+        duracion_minutos = duracion_minutos or 60
+        if a_minutos(hora) + duracion_minutos > MINUTOS_DIA:
+            return False
+        
         inicio_dt = datetime.combine(fecha, hora)
-        duracion_min = duracion_minutos or 60
-        fin_minutos = hora.hour * 60 + hora.minute + duracion_min
-        fin_horas = fin_minutos // 60
-        fin_mins = fin_minutos % 60
-        fin_hora = time(fin_horas, fin_mins)
-        fin_dt = datetime.combine(fecha, fin_hora)
-        
-        # 1. Verificar conflictos con otros turnos
+        fin_dt = inicio_dt + timedelta(minutes=duracion_minutos)
+        
+        # 1. Conflictos con otros turnos (&& sobre la columna de rango, índice GiST)
+        rango = rango_ocupacion(inicio_dt, fin_dt)
         turnos_conflicto = Turno.objects.filter(
-            fecha=fecha,
             profesional=profesional,
-            estado__in=['confirmado', 'esperando_sena', 'solicitado']
-        ).prefetch_related('detalles')
-        
-        # Excluir el turno actual si se proporciona un ID
+            estado__in=ESTADOS_OCUPAN_AGENDA,
+            ocupacion__overlap=rango
+        )
         if excluir_turno_id:
             turnos_conflicto = turnos_conflicto.exclude(id=excluir_turno_id)
+        if turnos_conflicto.exists():
+            return False
         
-        for turno in turnos_conflicto:
-            turno_duracion = sum(d.duracion_minutos for d in turno.detalles.all()) or 60
-            turno_fin_minutos = turno.hora_inicio.hour * 60 + turno.hora_inicio.minute + turno_duracion
-            turno_fin_horas = turno_fin_minutos // 60
-            turno_fin_mins = turno_fin_minutos % 60
-            turno_fin_hora = time(turno_fin_horas, turno_fin_mins)
-            turno_fin_dt = datetime.combine(fecha, turno_fin_hora)
-            
-            turno_inicio_dt = datetime.combine(fecha, turno.hora_inicio)
-            
-            # Verificar solapamiento: (inicio < otro_fin) AND (fin > otro_inicio)
-            if (inicio_dt < turno_fin_dt) and (fin_dt > turno_inicio_dt):
-                return False
-        
-        # 2. Verificar conflictos con bloqueos
+        # 2. Conflictos con bloqueos (propios o de todo el salón)
         bloqueos_conflicto = BloqueoAgenda.objects.filter(
             Q(personal=profesional) | Q(personal__isnull=True),
-            fecha_inicio__date__lte=fecha,
-            fecha_fin__date__gte=fecha
+            ocupacion__overlap=rango
         )
-        
-        for bloqueo in bloqueos_conflicto:
-            bloqueo_inicio = bloqueo.fecha_inicio.replace(tzinfo=None) if bloqueo.fecha_inicio.tzinfo else bloqueo.fecha_inicio
-            bloqueo_fin = bloqueo.fecha_fin.replace(tzinfo=None) if bloqueo.fecha_fin.tzinfo else bloqueo.fecha_fin
-            inicio_dt_naive = inicio_dt.replace(tzinfo=None) if hasattr(inicio_dt, 'tzinfo') else inicio_dt
-            fin_dt_naive = fin_dt.replace(tzinfo=None) if hasattr(fin_dt, 'tzinfo') else fin_dt
-            
-            if (inicio_dt_naive < bloqueo_fin) and (fin_dt_naive > bloqueo_inicio):
-                return False
+        if bloqueos_conflicto.exists():
+            return False
         
         # 3. Nueva Validación: Recursos Físicos
         if servicios_ids:
@@ -539,7 +628,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
         # Determinar fecha de inicio
         try:
             if fecha_inicio_str:
-                fecha_inicio = datetime.datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
+                fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
             else:
                 fecha_inicio = timezone.now().date()
         except ValueError:
@@ -549,7 +638,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
             )
         
         # 1. Obtener horizonte de reserva (config)
-        config = Configuracion.objects.first()
+        config = snapshot_agenda.configuracion()
         max_dias = config.max_dias_anticipacion if config else 60
         intervalo_minutos = config.intervalo_turnos if config else 30
         fecha_limite = fecha_inicio + timedelta(days=max_dias)
@@ -561,65 +650,41 @@ class TurnoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 3. Determinar tipo de servicio (para filtrar reglas)
-        categoria_nombre = servicio.categoria.nombre if servicio.categoria else ""
-        requiere_diseno = "Diseño" in categoria_nombre
-        requiere_complemento = "Complemento" in categoria_nombre or "Turno de Complemento" in categoria_nombre
-        
         duracion_minutos = servicio.duracion_estimada or 60
         
-        # 4. Iterar próximos días (hasta 7 para mostrar lo más cercano)
+        # 3. Horizonte a mostrar (por defecto 7 días para mostrar lo más cercano)
+        try:
+            dias_horizonte = min(max(int(request.query_params.get('dias', 7)), 1), max_dias)
+        except ValueError:
+            dias_horizonte = 7
+        
+        hoy = timezone.localdate()
+        fechas_horizonte = [
+            fecha_inicio + timedelta(days=i)
+            for i in range(dias_horizonte)
+            if fecha_inicio + timedelta(days=i) <= fecha_limite and fecha_inicio + timedelta(days=i) >= hoy
+        ]
+        
+        # 4. Carga en bloque de todo el horizonte (cantidad fija de consultas):
+        #    reglas aplicables (con personal), agendas (turnos + detalles + bloqueos),
+        #    requisitos de equipamiento del servicio y capacidad de equipos
+        reglas_por_fecha = self._reglas_por_fecha(servicio, fechas_horizonte)
+        profesionales_ids = {regla.personal_id for reglas in reglas_por_fecha.values() for regla in reglas}
+        agendas = obtener_agendas(profesionales_ids, fechas_horizonte)
+        
+        requeridos = requisitos_por_tipo([servicio.id])
+        capacidad = CapacidadEquipamiento.cargar(fechas_horizonte) if requeridos else None
+        
         disponibilidad_total = []
         
-        for i in range(7):
-            fecha_consulta = fecha_inicio + timedelta(days=i)
-            
-            # Validar horizonte
-            if fecha_consulta > fecha_limite:
-                break
-            
-            # No agendar en fechas pasadas
-            if fecha_consulta < timezone.now().date():
-                continue
-            
+        for fecha_consulta in fechas_horizonte:
             dia_semana = fecha_consulta.weekday()
             
-            # 5. Obtener reglas de horarios para este día
-            reglas = HorarioLaboral.objects.filter(
-                dia_semana=dia_semana,
-                activo=True,
-                personal__activo=True,  # Solo profesionales activos
-            )
-            
-            # Filtrar solo reglas que aplican en esta fecha (null = aplica siempre)
-            reglas = reglas.filter(
-                Q(fecha_desde__isnull=True) | Q(fecha_desde__lte=fecha_consulta),
-                Q(fecha_hasta__isnull=True) | Q(fecha_hasta__gte=fecha_consulta)
-            )
-            
-            # --- FILTRO DE COMPETENCIA TÉCNICA (Refinado) ---
-            # Identificamos qué habilidad se requiere según la categoría
-            habilidad_requerida = None
-            if requiere_diseno:
-                habilidad_requerida = 'realiza_color'
-                reglas = reglas.filter(permite_diseno_color=True)
-            elif requiere_complemento:
-                habilidad_requerida = 'realiza_lavado'
-                reglas = reglas.filter(permite_complemento=True)
-            
-            # Aplicamos el filtro dinámico de habilidad a las reglas
-            if habilidad_requerida:
-                filtro_habilidad = {f'personal__{habilidad_requerida}': True}
-                reglas = reglas.filter(**filtro_habilidad)
-            
-            if not reglas.exists():
-                continue
-            
-            # 6. Generar slots disponibles para este día
-            slots_del_dia = []
+            # 5. Generar slots disponibles para este día (reglas ya filtradas por competencia técnica)
+            # La agenda de cada profesional se reutiliza entre sus reglas (ej. turno mañana y tarde)
             profesionales_dia = {}
             
-            for regla in reglas:
+            for regla in reglas_por_fecha.get(fecha_consulta, []):
                 prof_id = regla.personal.id
                 prof_nombre = regla.personal.nombre
                 
@@ -628,7 +693,10 @@ class TurnoViewSet(viewsets.ModelViewSet):
                     regla, 
                     duracion_minutos,
                     intervalo_minutos,
-                    servicios_ids=[servicio.id]
+                    servicios_ids=[servicio.id],
+                    agenda=agendas[(prof_id, fecha_consulta)],
+                    capacidad=capacidad,
+                    requeridos=requeridos
                 )
                 
                 if slots:
@@ -647,187 +715,164 @@ class TurnoViewSet(viewsets.ModelViewSet):
                     "profesionales": list(profesionales_dia.values())
                 })
         
-        return Response({
+        respuesta = {
             "servicio_id": servicio.id,
             "servicio_nombre": servicio.nombre,
             "duracion_minutos": duracion_minutos,
             "disponibilidad": disponibilidad_total,
             "horizonte_dias": max_dias
-        }, status=status.HTTP_200_OK)
+        }
+        
+        # 6. Sin lugar en el horizonte: sugerir la próxima fecha disponible
+        if not disponibilidad_total and fechas_horizonte:
+            respuesta["proxima_fecha_disponible"] = self._buscar_proxima_fecha(
+                servicio.id, fechas_horizonte[-1] + timedelta(days=1), fecha_limite
+            )
+        
+        return Response(respuesta, status=status.HTTP_200_OK)
     
-    def _generar_slots_disponibles(self, fecha, regla, duracion_minutos, intervalo_minutos, servicios_ids=None):
-        slots_disponibles = []
-        
-        # 1. Traemos TODOS los turnos y bloqueos del día UNA SOLA VEZ (Optimización)
-        turnos_del_dia = Turno.objects.filter(
-            fecha=fecha,
-            profesional=regla.personal,
-            estado__in=['confirmado', 'esperando_sena', 'solicitado']
-        ).prefetch_related('detalles')
-
-        bloqueos_del_dia = BloqueoAgenda.objects.filter(
-            Q(personal=regla.personal) | Q(personal__isnull=True),
-            fecha_inicio__date__lte=fecha,
-            fecha_fin__date__gte=fecha
-        )
-
-        # Convertimos los horarios de la regla a minutos
-        actual_min = regla.hora_inicio.hour * 60 + regla.hora_inicio.minute
-        fin_min = regla.hora_fin.hour * 60 + regla.hora_fin.minute
-
-        while actual_min + duracion_minutos <= fin_min:
-            hora_inicio_slot = time(actual_min // 60, actual_min % 60)
-            hora_fin_slot = time((actual_min + duracion_minutos) // 60, (actual_min + duracion_minutos) % 60)
-            
-            # Combinamos con fecha para comparar datetimes completos (más seguro)
-            inicio_dt = datetime.combine(fecha, hora_inicio_slot)
-            fin_dt = datetime.combine(fecha, hora_fin_slot)
-
-            # --- VALIDACIÓN DE CONFLICTOS ---
-            hay_choque = False
-
-            # A. Choque con Turnos (Validación de Rango)
-            for turno in turnos_del_dia:
-                # Fórmula: (StartA < EndB) y (EndA > StartB)
-                t_ini = datetime.combine(fecha, turno.hora_inicio)
-                # Calculamos la hora fin basándose en duración total de servicios del turno
-                duracion_turno = sum(d.duracion_minutos for d in turno.detalles.all()) or 60
-                t_fin_minutos = turno.hora_inicio.hour * 60 + turno.hora_inicio.minute + duracion_turno
-                t_fin_hours = t_fin_minutos // 60
-                t_fin_mins = t_fin_minutos % 60
-                t_fin = datetime.combine(fecha, time(t_fin_hours, t_fin_mins))
-                
-                if (inicio_dt < t_fin) and (fin_dt > t_ini):
-                    hay_choque = True
-                    break
-            
-            # B. Choque con Bloqueos
-            if not hay_choque:
-                for bloqueo in bloqueos_del_dia:
-                    # Quitamos zona horaria si es necesario para comparar
-                    b_ini = bloqueo.fecha_inicio.replace(tzinfo=None) if bloqueo.fecha_inicio.tzinfo else bloqueo.fecha_inicio
-                    b_fin = bloqueo.fecha_fin.replace(tzinfo=None) if bloqueo.fecha_fin.tzinfo else bloqueo.fecha_fin
-                    
-                    if (inicio_dt < b_fin) and (fin_dt > b_ini):
-                        hay_choque = True
-                        break
-            
-            # C. Choque con Equipamiento (Recursos físicos)
-            if not hay_choque and servicios_ids:
-                if not self._verificar_disponibilidad_equipamiento(fecha, inicio_dt, fin_dt, servicios_ids):
-                    hay_choque = True
-            
-            if not hay_choque:
-                # Validación extra: si es HOY, no mostrar horas que ya pasaron
-                ahora_naive = timezone.now().replace(tzinfo=None)
-                if inicio_dt > ahora_naive:
-                    slots_disponibles.append({
-                        "hora": hora_inicio_slot.strftime("%H:%M"),
-                        "profesional_id": regla.personal.id,
-                    })
+    def _reglas_para_servicio(self, servicio, fecha_desde, fecha_hasta=None):
+        """
+        Reglas de HorarioLaboral vigentes entre `fecha_desde` y `fecha_hasta` que
+        pueden atender el servicio, según el tipo de servicio (Diseño/Complemento)
+        y la habilidad del profesional. Salen del snapshot en memoria (ver
+        gestion/snapshot_agenda.py): no consultan la base. Incluyen `personal`.
+        """
+        fecha_hasta = fecha_hasta or fecha_desde
+        dias_semana = {
+            (fecha_desde + timedelta(days=i)).weekday()
+            for i in range(min((fecha_hasta - fecha_desde).days + 1, 7))
+        }
+        
+        # --- FILTRO DE COMPETENCIA TÉCNICA (Refinado) ---
+        # Identificamos qué habilidad se requiere según la categoría
+        categoria_nombre = servicio.categoria.nombre if servicio.categoria else ""
+        requiere_diseno = "Diseño" in categoria_nombre
+        requiere_complemento = "Complemento" in categoria_nombre
+        
+        snapshot = snapshot_agenda.obtener()
+        reglas = []
+        for dia in sorted(dias_semana):
+            for regla in snapshot.reglas_del_dia(dia):
+                personal = regla.personal
+                # Solo profesionales activos
+                if personal is None or not personal.activo:
+                    continue
+                # Filtrar solo reglas que aplican en el rango (null = aplica siempre)
+                if regla.fecha_desde is not None and regla.fecha_desde > fecha_hasta:
+                    continue
+                if regla.fecha_hasta is not None and regla.fecha_hasta < fecha_desde:
+                    continue
+                # La regla debe permitir el tipo de servicio y el profesional tener la habilidad
+                if requiere_diseno and not (regla.permite_diseno_color and personal.realiza_color):
+                    continue
+                if not requiere_diseno and requiere_complemento and not (regla.permite_complemento and personal.realiza_lavado):
+                    continue
+                reglas.append(regla)
+        
+        return reglas
+    
+    def _reglas_por_fecha(self, servicio, fechas):
+        """
+        Reglas de todo el rango agrupadas por fecha: {fecha: [ReglaHoraria, ...]}.
+        """
+        if not fechas:
+            return {}
+        
+        reglas = self._reglas_para_servicio(servicio, min(fechas), max(fechas))
+        reglas_por_fecha = {}
+        for fecha in fechas:
+            reglas_por_fecha[fecha] = [
+                regla for regla in reglas
+                if regla.dia_semana == fecha.weekday()
+                and (regla.fecha_desde is None or regla.fecha_desde <= fecha)
+                and (regla.fecha_hasta is None or regla.fecha_hasta >= fecha)
+            ]
+        return reglas_por_fecha
+    
+    def _generar_slots_disponibles(self, fecha, regla, duracion_minutos, intervalo_minutos, servicios_ids=None, agenda=None, capacidad=None, requeridos=None):
+        """
+        Horarios libres de una regla de HorarioLaboral en `fecha`.
+        Usa el motor de disponibilidad: un único barrido sobre los huecos libres
+        del profesional en lugar de comparar cada slot contra cada turno/bloqueo.
+        `agenda`, `capacidad` y `requeridos` permiten reutilizar lo ya cargado.
+        """
+        if agenda is None:
+            agenda = obtener_agenda(regla.personal, fecha)
+        
+        minimo_inicio = minimo_inicio_para(fecha)
+        if minimo_inicio is None:
+            return []
+        
+        # C. Choque con Equipamiento (Recursos físicos): solo sobre candidatos libres
+        if servicios_ids and requeridos is None:
+            requeridos = requisitos_por_tipo(servicios_ids)
+        if servicios_ids and requeridos:
+            if capacidad is None:
+                capacidad = CapacidadEquipamiento.cargar([fecha])
             
-            actual_min += intervalo_minutos
+            def validar(inicio, fin):
+                return capacidad.admite(fecha, requeridos, inicio, fin)
+        else:
+            validar = None
+        
+        inicios = agenda.inicios_libres(
+            a_minutos(regla.hora_inicio),
+            a_minutos(regla.hora_fin),
+            duracion_minutos or 60,
+            intervalo_minutos,
+            minimo_inicio=minimo_inicio,
+            validar=validar
+        )
         
-        return slots_disponibles
+        return [
+            {
+                "hora": a_hora(inicio).strftime("%H:%M"),
+                "profesional_id": regla.personal.id,
+            }
+            for inicio in inicios
+        ]
     
-    def _buscar_proxima_fecha(self, servicio_id, fecha_desde):
+    def _buscar_proxima_fecha(self, servicio_id, fecha_desde, fecha_limite=None):
         """
-        Escanea los próximos 30 días para encontrar el primer día con al menos un slot.
+        Primer día desde `fecha_desde` (hasta 30 días) con al menos un slot.
+        Usa el índice de huecos: se detiene en el primer hueco que entra.
         """
         servicio = Servicio.objects.get(id=servicio_id)
-        config = Configuracion.objects.first()
+        config = snapshot_agenda.configuracion()
+        intervalo_minutos = config.intervalo_turnos if config else 30
         max_busqueda = 30 # No buscamos eternamente, solo un mes
         
-        for i in range(7, max_busqueda): # Empezamos desde el día 7
-            fecha_proxima = fecha_desde + timedelta(days=i)
-            
-            # 1. Filtramos reglas para ese día
-            weekday = fecha_proxima.weekday()
-            reglas = HorarioLaboral.objects.filter(
-                dia_semana=weekday,
-                fecha_desde__lte=fecha_proxima,
-                fecha_hasta__gte=fecha_proxima,
-                activo=True
-            )
-            
-            # Filtro por tipo de servicio (lo que ya tienes)
-            # ... (aquí aplicas el filtro de Diseño/Complemento) ...
-
-            for regla in reglas:
-                slots = self._generar_slots_disponibles(
-                    fecha_proxima, 
-                    regla, 
-                    servicio.duracion_estimada, 
-                    config.intervalo_turnos
-                )
-                if slots:
-                    return fecha_proxima.isoformat()
-                    
-        return None # No hay nada en todo el mes
+        fechas = [fecha_desde + timedelta(days=i) for i in range(max_busqueda)]
+        if fecha_limite:
+            fechas = [fecha for fecha in fechas if fecha <= fecha_limite]
+        
+        indice = IndiceHuecos(self._reglas_por_fecha(servicio, fechas), servicios_ids=[servicio.id])
+        hueco = indice.primer_hueco(servicio.duracion_estimada, intervalo_minutos)
+        return hueco['fecha'].isoformat() if hueco else None # None: no hay nada en todo el mes
 
-    def _verificar_disponibilidad_equipamiento(self, fecha, inicio_dt, fin_dt, servicios_ids, excluir_turno_id=None):
+    def _verificar_disponibilidad_equipamiento(self, fecha, inicio_dt, fin_dt, servicios_ids, excluir_turno_id=None, capacidad=None, requeridos=None):
         """
         Valida si hay unidades físicas disponibles (lavacabezas, puestos)
         para realizar los servicios en el rango horario solicitado.
+        `capacidad` y `requeridos` permiten reutilizar lo ya cargado para el día.
         """
-        from django.db.models import Max
         if not servicios_ids:
             return True
 
-        # 1. Obtener los tipos de equipo requeridos por los servicios
-        requisitos = RequisitoServicio.objects.filter(
-            servicio_id__in=servicios_ids,
-            obligatorio=True
-        ).select_related('tipo_equipamiento')
-
-        if not requisitos.exists():
+        # 1. Tipos de equipo requeridos por los servicios (consolidados por tipo)
+        if requeridos is None:
+            requeridos = requisitos_por_tipo(servicios_ids)
+        if not requeridos:
             return True
 
-        # 2. Consolidar requerimientos (por si varios servicios piden lo mismo)
-        req_por_tipo = {}
-        for req in requisitos:
-            tid = req.tipo_equipamiento_id
-            req_por_tipo[tid] = max(req_por_tipo.get(tid, 0), req.cantidad_minima)
-
-        # 3. Chequear stock vs ocupación para cada tipo
-        for tipo_id, cant_necesaria in req_por_tipo.items():
-            # Unidades totales operativas de este tipo
-            stock_total = Equipamiento.objects.filter(
-                tipo_id=tipo_id,
-                is_active=True,
-                estado='DISPONIBLE'
-            ).count()
-
-            # Turnos que ya ocupan este recurso en esa fecha
-            turnos_competencia = Turno.objects.filter(
-                fecha=fecha,
-                estado__in=['confirmado', 'esperando_sena', 'solicitado'],
-                detalles__servicio__requisitos_equipamiento__tipo_equipamiento_id=tipo_id
-            ).distinct()
-
-            if excluir_turno_id:
-                turnos_competencia = turnos_competencia.exclude(id=excluir_turno_id)
-
-            # Contar cuántos equipos están 'en uso' en ese rango exacto
-            ocupados = 0
-            for t in turnos_competencia:
-                t_ini = datetime.combine(fecha, t.hora_inicio)
-                dur_t = sum(d.duracion_minutos for d in t.detalles.all()) or 60
-                t_fin = t_ini + timedelta(minutes=dur_t)
-
-                # Si hay solapamiento de horarios
-                if (inicio_dt < t_fin) and (fin_dt > t_ini):
-                    # Ver cuánto pide ese turno específico
-                    req_t = RequisitoServicio.objects.filter(
-                        servicio__detalles__turno=t,
-                        tipo_equipamiento_id=tipo_id
-                    ).aggregate(m=Max('cantidad_minima'))['m'] or 1
-                    ocupados += req_t
-
-            if (ocupados + cant_necesaria) > stock_total:
-                return False # No hay suficientes lavacabezas/puestos
+        # 2. Stock vs perfil de demanda del día (dos consultas, luego O(log n) por tipo)
+        if capacidad is None:
+            capacidad = CapacidadEquipamiento.cargar([fecha], excluir_turno_id=excluir_turno_id)
 
-        return True
+        inicio = a_minutos(inicio_dt.time())
+        fin = inicio + int((fin_dt - inicio_dt).total_seconds() // 60)
+        return capacidad.admite(fecha, requeridos, inicio, fin)
 
     # =====================================================================
     # ✅ NUEVO: VERIFICAR SI TURNO ESTÁ EXPIRADO
@@ -901,7 +946,7 @@ class TurnoViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("No tienes permiso sobre este turno.")
 
         # Valores de configuración
-        config = Configuracion.objects.first() or Configuracion()
+        config = snapshot_agenda.configuracion() or Configuracion()
         limite_cambios = config.max_reprogramaciones
         horas_limite = config.horas_limite_cancelacion
 
@@ -987,36 +1032,52 @@ class TurnoViewSet(viewsets.ModelViewSet):
             except ValueError:
                 return Response({"error": "Formato inválido"}, status=400)
 
-            # --- LÓGICA ESTADO A (Solicitado) ---
-            if turno.estado == Turno.Estado.SOLICITADO:
-                turno.fecha = nueva_fecha
-                turno.hora_inicio = nueva_hora
-                # No cambia estado, no suma contador
-                turno.save()
-                return Response({"mensaje": "Solicitud modificada correctamente."})
+            # El estado y el contador de cambios se releen con el turno y la
+            # agenda bloqueados (reservas.reprogramar_turno): dos pedidos
+            # simultáneos no pueden pasar ambos el límite ni tomar el mismo horario
+            servicios_ids = [d.servicio_id for d in turno.detalles.all()]
+            estado_previo = {}
+
+            def verificar(turno_bloqueado):
+                if turno_bloqueado.estado not in (
+                    Turno.Estado.SOLICITADO, Turno.Estado.ESPERANDO_SENA, Turno.Estado.CONFIRMADO
+                ):
+                    return f"No se puede reprogramar un turno en estado '{turno_bloqueado.estado}'."
+                if (turno_bloqueado.estado == Turno.Estado.CONFIRMADO
+                        and turno_bloqueado.cambios_realizados >= limite_cambios):
+                    return "Límite de cambios excedido."
+                if not self._validar_slot_libre(
+                    fecha=nueva_fecha,
+                    hora=nueva_hora,
+                    profesional=turno_bloqueado.profesional,
+                    duracion_minutos=turno_bloqueado.duracion_total or 60,
+                    servicios_ids=servicios_ids,
+                    excluir_turno_id=turno_bloqueado.id
+                ):
+                    return "El horario seleccionado ya no está disponible."
+                return None
+
+            def aplicar(turno_bloqueado):
+                estado_previo['estado'] = turno_bloqueado.estado
+                # --- LÓGICA ESTADO A (Solicitado): no cambia estado, no suma contador ---
+                # --- LÓGICA ESTADO B (Esperando Seña) ---
+                if turno_bloqueado.estado == Turno.Estado.ESPERANDO_SENA:
+                    turno_bloqueado.estado = Turno.Estado.SOLICITADO  # REINICIO DEL FLUJO
+                    turno_bloqueado.fecha_limite_pago = None  # Limpiar deadline de pago
+                # --- LÓGICA ESTADO C (Confirmado): mantiene estado (Seña se traslada) ---
+                elif turno_bloqueado.estado == Turno.Estado.CONFIRMADO:
+                    turno_bloqueado.cambios_realizados += 1
 
-            # --- LÓGICA ESTADO B (Esperando Seña) ---
-            elif turno.estado == Turno.Estado.ESPERANDO_SENA:
-                turno.fecha = nueva_fecha
-                turno.hora_inicio = nueva_hora
-                turno.estado = Turno.Estado.SOLICITADO # REINICIO DEL FLUJO
-                turno.fecha_limite_pago = None  # Limpiar deadline de pago
-                # No suma contador
-                turno.save()
-                return Response({"mensaje": "Fecha cambiada. Tu turno espera nueva aprobación."})
+            try:
+                reservas.reprogramar_turno(turno.id, nueva_fecha, nueva_hora, verificar=verificar, aplicar=aplicar)
+            except reservas.ReservaNoDisponible as e:
+                return Response({"error": e.mensaje}, status=409)
 
-            # --- LÓGICA ESTADO C (Confirmado) ---
-            elif turno.estado == Turno.Estado.CONFIRMADO:
-                if turno.cambios_realizados >= limite_cambios:
-                    return Response({"error": "Límite de cambios excedido."}, status=400)
-                
-                turno.fecha = nueva_fecha
-                turno.hora_inicio = nueva_hora
-                turno.cambios_realizados += 1
-                # Mantiene estado Confirmado (Seña se traslada)
-                turno.save()
-                
-                return Response({"mensaje": "Turno reprogramado. Seña transferida."})
+            if estado_previo['estado'] == Turno.Estado.SOLICITADO:
+                return Response({"mensaje": "Solicitud modificada correctamente."})
+            elif estado_previo['estado'] == Turno.Estado.ESPERANDO_SENA:
+                return Response({"mensaje": "Fecha cambiada. Tu turno espera nueva aprobación."})
+            return Response({"mensaje": "Turno reprogramado. Seña transferida."})
 
         # =====================================================================
         # BLOQUE 2: ACCIÓN CANCELAR - MOTOR DE OPTIMIZACIÓN
@@ -1105,64 +1166,12 @@ class TurnoViewSet(viewsets.ModelViewSet):
         turno.estado = Turno.Estado.REALIZADO
         turno.save()
 
-        # 2. CREAR DIAGNÓSTICO POST-SERVICIO AUTOMÁTICAMENTE
-        # Se crea un nuevo diagnóstico después de cada servicio para reevaluar el estado del cabello
-        cliente = turno.cliente
-        
-        # Solo crear diagnóstico si el cliente tiene datos capilares registrados
-        if cliente.tipo_cabello or cliente.grosor_cabello or cliente.porosidad_cabello or cliente.cuero_cabelludo or cliente.estado_general:
-            diag = DiagnosticoCapilar.objects.create(
-                cliente=cliente,
-                tipo_cabello=cliente.tipo_cabello,
-                grosor_cabello=cliente.grosor_cabello,
-                porosidad_cabello=cliente.porosidad_cabello,
-                cuero_cabelludo=cliente.cuero_cabelludo,
-                estado_general=cliente.estado_general
-            )
-            
-            # Ejecutar el motor diagnóstico automáticamente
-            self._ejecutar_motor_diagnostico(diag)
-
-        # 3. PROCESO AUTOMATIZADO: Aplicar Reglas de Cuidado
-        # Buscamos todos los servicios que se hicieron en este turno
-        detalles = turno.detalles.all()
-        servicios_realizados = [d.servicio for d in detalles]
-
-        for servicio in servicios_realizados:
-            # Buscamos las reglas configuradas para este servicio
-            reglas = servicio.reglas_post_servicio.all()
-            
-            for regla in reglas:
-                # A. Notificar a la clienta (Instrucciones de cuidado)
-                Notificacion.objects.create(
-                    usuario=turno.cliente.usuario,
-                    tipo='recordatorio',
-                    titulo=f"Cuidados post {servicio.nombre}",
-                    mensaje=f"{regla.descripcion}. (Válido por {regla.dias_duracion} días)",
-                    origen_entidad='Turno',
-                    origen_id=turno.id
-                )
-
-                # B. Si la regla tiene una RUTINA asociada, se la asignamos automáticamente
-                if regla.rutina:
-                    # Verificamos si ya la tiene activa para no duplicar
-                    if not RutinaCliente.objects.filter(
-                        cliente=turno.cliente, 
-                        rutina_original=regla.rutina, 
-                        estado='activa'
-                    ).exists():
-                        RutinaCliente.objects.create(
-                            cliente=turno.cliente,
-                            rutina_original=regla.rutina,
-                            nombre=regla.rutina.nombre,
-                            objetivo=regla.rutina.objetivo,
-                            archivo=regla.rutina.archivo,
-                            version_asignada=regla.rutina.version,
-                            estado='activa'
-                        )
+        # 2 y 3. Diagnóstico post-servicio + Reglas de Cuidado: en segundo plano
+        # (ver automatizacion.post_finalizar_turno), se encola al confirmar
+        tareas.encolar_al_confirmar('post_finalizar_turno', clave=f'post_finalizar_turno:{turno.id}', turno_id=turno.id)
 
         return Response({
-            "mensaje": "Turno finalizado. Se han enviado las recomendaciones de cuidado a la clienta y se ha creado un nuevo diagnóstico.",
+            "mensaje": "Turno finalizado. Las recomendaciones de cuidado y el nuevo diagnóstico se están generando para la clienta.",
             "estado": turno.estado
         })
 
@@ -1185,20 +1194,73 @@ class NotificacionViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Endpoint para listar notificaciones.
     Solo lectura (el usuario no crea notificaciones, el sistema lo hace).
+
+    - GET ?campos=id,titulo,estado  listado con solo esos campos
+      (?campos=compacto: todos menos mensaje y datos_extra).
+    - GET no-leidas/count/           contador de la campana (índice parcial notif_no_leidas_idx).
+    - POST marcar_todas_leidas/      {"ids": [...]} o todas las no leídas, con un solo UPDATE.
     """
     serializer_class = NotificacionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionNotificaciones
+
+    CAMPOS_COMPACTOS = ['id', 'titulo', 'tipo', 'estado', 'fecha_envio', 'canal']
+
+    def _campos(self):
+        """Campos pedidos con ?campos= (None = todos)."""
+        valor = self.request.query_params.get('campos')
+        if not valor:
+            return None
+        if valor == 'compacto':
+            return self.CAMPOS_COMPACTOS
+        campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+        invalidos = [campo for campo in campos if campo not in NotificacionSerializer.Meta.fields]
+        if invalidos or not campos:
+            raise ValidationError({
+                'campos': f"Campos inválidos: {', '.join(invalidos) or valor}. "
+                          f"Opciones: {', '.join(NotificacionSerializer.Meta.fields)} o 'compacto'."
+            })
+        return campos
 
     def get_queryset(self):
         # FILTRO DE SEGURIDAD: Solo devolver las notificaciones del usuario actual
-        return Notificacion.objects.filter(usuario=self.request.user).order_by('-fecha_envio')
-    
+        queryset = Notificacion.objects.filter(usuario=self.request.user).order_by('-fecha_envio')
+        if self.action == 'list':
+            campos = self._campos()
+            if campos:
+                # fecha_envio e id arman el cursor de la paginación
+                queryset = queryset.only(*{'id', 'fecha_envio', *campos})
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            kwargs.setdefault('campos', self._campos())
+        return super().get_serializer(*args, **kwargs)
+
+    @action(detail=False, methods=['get'], url_path='no-leidas/count')
+    def no_leidas_count(self, request):
+        cantidad = Notificacion.objects.filter(
+            usuario=request.user, estado__in=Notificacion.ESTADOS_NO_LEIDAS
+        ).count()
+        return Response({'no_leidas': cantidad})
+
     @action(detail=True, methods=['post'])
     def marcar_leida(self, request, pk=None):
-        notificacion = self.get_object()
-        notificacion.estado = 'leido'
-        notificacion.save()
+        # Un UPDATE filtrado por usuario, sin leer la fila ni disparar save()
+        if not Notificacion.objects.filter(pk=pk, usuario=request.user).update(estado='leido'):
+            return Response({'error': 'Notificación no encontrada'}, status=status.HTTP_404_NOT_FOUND)
         return Response({'status': 'ok'})
+
+    @action(detail=False, methods=['post'])
+    def marcar_todas_leidas(self, request):
+        """Marca como leídas las no leídas del usuario (o solo las de `ids`). Devuelve cuántas cambió."""
+        notificaciones = Notificacion.objects.filter(usuario=request.user, estado__in=Notificacion.ESTADOS_NO_LEIDAS)
+        ids = request.data.get('ids')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+                return Response({'error': "'ids' debe ser una lista de ids numéricos"}, status=status.HTTP_400_BAD_REQUEST)
+            notificaciones = notificaciones.filter(pk__in=ids)
+        return Response({'marcadas': notificaciones.update(estado='leido')})
     
     @action(detail=True, methods=['post'])
     def aceptar(self, request, pk=None):
@@ -1222,100 +1284,130 @@ class NotificacionViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Extraer datos de la notificación
+        fecha_oferta = notificacion.datos_extra.get('fecha_oferta')
+        hora_oferta = notificacion.datos_extra.get('hora_oferta')
+        turno_actual_id = notificacion.datos_extra.get('turno_actual_id')
+
+        if not all([fecha_oferta, hora_oferta, turno_actual_id]):
+            return Response(
+                {'error': 'Datos incompletos en la oferta'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        def verificar(turno):
+            # Se ejecuta con la agenda bloqueada: el horario ofrecido sigue libre
+            if not TurnoViewSet()._validar_slot_libre(
+                fecha=dt.datetime.strptime(fecha_oferta, '%Y-%m-%d').date(),
+                hora=dt.datetime.strptime(hora_oferta, '%H:%M').time(),
+                profesional=turno.profesional,
+                duracion_minutos=turno.duracion_total or 60,
+                servicios_ids=list(turno.detalles.values_list('servicio_id', flat=True)),
+                excluir_turno_id=turno.id
+            ):
+                return 'El horario ofrecido ya no está disponible'
+            return None
+
         try:
-            # Extraer datos de la notificación
-            fecha_oferta = notificacion.datos_extra.get('fecha_oferta')
-            hora_oferta = notificacion.datos_extra.get('hora_oferta')
-            turno_actual_id = notificacion.datos_extra.get('turno_actual_id')
-            
-            if not all([fecha_oferta, hora_oferta, turno_actual_id]):
-                return Response(
-                    {'error': 'Datos incompletos en la oferta'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Obtener el turno
-            turno = Turno.objects.get(id=turno_actual_id, cliente=self.request.user.cliente)
-            
-            # Convertir strings a tipos correctos
-            import datetime as dt
-            nueva_fecha = dt.datetime.strptime(fecha_oferta, '%Y-%m-%d').date()
-            nueva_hora = dt.datetime.strptime(hora_oferta, '%H:%M').time()
-            
-            # Actualizar el turno
-            turno.fecha = nueva_fecha
-            turno.hora_inicio = nueva_hora
-            turno.save()
-            
-            # Marcar la notificación como leída
-            notificacion.estado = 'leido'
-            notificacion.save()
-            
+            # Mueve el turno y expira las ofertas hermanas en una sola transacción
+            turno = reservas.aceptar_adelanto(notificacion.id, request.user, verificar=verificar)
+
             return Response({
                 'mensaje': 'Turno adelantado correctamente',
                 'turno_id': turno.id,
-                'nueva_fecha': nueva_fecha,
-                'nueva_hora': nueva_hora
+                'nueva_fecha': turno.fecha,
+                'nueva_hora': turno.hora_inicio
             }, status=status.HTTP_200_OK)
-            
+
+        except reservas.ReservaNoDisponible as e:
+            return Response({'error': e.mensaje}, status=status.HTTP_409_CONFLICT)
         except Turno.DoesNotExist:
             return Response(
                 {'error': 'No se encontró el turno'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except Exception as e:
-            print(f"Error al aceptar oferta: {str(e)}")
+        except ValueError:
+            # fecha_oferta / hora_oferta con un formato que no se puede interpretar
+            logger.exception(f"[ADELANTO] Datos inválidos en la oferta {notificacion.id}: {notificacion.datos_extra}")
             return Response(
-                {'error': f'Error al procesar la oferta: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Datos inválidos en la oferta'},
+                status=status.HTTP_400_BAD_REQUEST
             )
     
 class AdminDashboardStatsView(APIView):
     """
     Devuelve estadísticas rápidas para la Pantalla Home del Administrador.
+    Los contadores salen de ContadorEstado más sus diferencias pendientes
+    (lectura por clave) mientras estén reconciliados; si no, de una sola
+    consulta agregada (ver gestion/contadores.py).
     """
     permission_classes = [IsAdminUser] # Solo para Staff/Yani
 
     def get(self, request):
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         # 1. Contadores Rápidos
-        turnos_hoy = Turno.objects.filter(fecha=today, estado='confirmado').count()
-        solicitudes_pendientes = Turno.objects.filter(estado='solicitado').count()
-        turnos_esperando_sena = Turno.objects.filter(estado='esperando_sena').count()
+        contadores_hoy = contadores.contadores_tablero(today) or contadores.contar_tablero(today)
         
-        # 2. Próximos Turnos (Agenda inmediata)
-        proximos_turnos = Turno.objects.filter(
-            fecha__gte=today, 
-            estado__in=['confirmado', 'esperando_sena']
-        ).prefetch_related('detalles__servicio', 'cliente__usuario').order_by('fecha', 'hora_inicio')[:5]
+        # 2. Próximos Turnos (Agenda inmediata): servicios y cliente en la misma consulta
+        proximos_turnos = TurnoListSerializer.preparar_queryset(
+            Turno.objects.filter(fecha__gte=today, estado__in=['confirmado', 'esperando_sena'])
+        ).order_by('fecha', 'hora_inicio')[:5]
         
         # Serializamos manualmente para no crear otro serializer solo para esto
         lista_proximos = []
         for t in proximos_turnos:
-            # Obtener nombres de servicios desde detalles
-            servicios = [d.servicio.nombre for d in t.detalles.all()]
-            servicios_str = ', '.join(servicios) if servicios else 'Sin servicios'
-            
             lista_proximos.append({
                 'id': t.id,
                 'cliente': f"{t.cliente.usuario.first_name} {t.cliente.usuario.last_name}",
-                'servicios': servicios_str,
+                'servicios': t.servicios_nombres or 'Sin servicios',
                 'hora': t.hora_inicio.strftime("%H:%M"),
                 'fecha': t.fecha,
                 'estado': t.estado
             })
 
         data = {
-            'turnos_hoy': turnos_hoy,
-            'pendientes_accion': solicitudes_pendientes,
-            'esperando_sena': turnos_esperando_sena,
+            'turnos_hoy': contadores_hoy['turnos_hoy'],
+            'pendientes_accion': contadores_hoy['pendientes_accion'],
+            'esperando_sena': contadores_hoy['esperando_sena'],
             'proximos_turnos': lista_proximos
         }
         
         return Response(data, status=status.HTTP_200_OK)
 
 
+class ReporteResumenView(APIView):
+    """
+    Reporte de turnos terminados, ingresos y ocupación de un rango de fechas.
+    GET ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&agrupar=dia|profesional|servicio|categoria&profesional=<id>
+    Por defecto, los últimos 30 días agrupados por día. Se lee de los
+    resúmenes diarios (ver gestion/analitica.py), no de los turnos.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            hasta = datetime.strptime(params['hasta'], '%Y-%m-%d').date() if params.get('hasta') else timezone.localdate()
+            desde = datetime.strptime(params['desde'], '%Y-%m-%d').date() if params.get('desde') else hasta - timedelta(days=30)
+        except ValueError:
+            return Response({"error": "Formato de fecha inválido. Use AAAA-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+        if desde > hasta:
+            return Response({"error": "'desde' no puede ser posterior a 'hasta'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        agrupar = params.get('agrupar', 'dia')
+        if agrupar not in analitica.AGRUPACIONES:
+            return Response(
+                {"error": f"'agrupar' debe ser uno de: {', '.join(analitica.AGRUPACIONES)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        profesional = params.get('profesional')
+        if profesional and not profesional.isdigit():
+            return Response({"error": "'profesional' debe ser un id numérico."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(analitica.reporte(desde, hasta, agrupar, int(profesional) if profesional else None))
+
+
 # ============================================
 # VIEWSETS PARA RUTINAS
 # ============================================
@@ -1337,9 +1429,10 @@ class RutinaViewSet(viewsets.ModelViewSet):
         - Clientes solo ven las publicadas
         """
         if self.request.user.is_staff:
-            return Rutina.objects.all()
+            queryset = Rutina.objects.all()
         else:
-            return Rutina.objects.filter(estado='publicada')
+            queryset = Rutina.objects.filter(estado='publicada')
+        return RutinaSerializer.preparar_queryset(queryset)
     
     def get_permissions(self):
         """
@@ -1371,7 +1464,7 @@ class RutinaViewSet(viewsets.ModelViewSet):
             
             # --- NOTIFICACIÓN MASIVA ---
             # Obtenemos todas las relaciones activas
-            asignaciones = rutina.copias_cliente.all()
+            asignaciones = rutina.copias_cliente.select_related('cliente__usuario')
             
             cont_notificados = 0
             for asignacion in asignaciones:
@@ -1458,7 +1551,7 @@ class RutinaViewSet(viewsets.ModelViewSet):
         rutina = self.get_object()
         
         # Obtener todas las asignaciones de esta rutina
-        asignaciones = rutina.copias_cliente.all()
+        asignaciones = rutina.copias_cliente.select_related('cliente__usuario')
         
         usuarios_list = []
         for asignacion in asignaciones:
@@ -1745,7 +1838,9 @@ class ReglaDiagnosticoViewSet(viewsets.ModelViewSet):
     """
     # Ordenamos por 'prioridad' descendente (de mayor a menor importancia)
     # Esto es vital para que el motor evalúe primero las reglas específicas
-    queryset = ReglaDiagnostico.objects.all().order_by('-prioridad')
+    queryset = ReglaDiagnostico.objects.all().select_related(
+        'rutina_sugerida', 'servicio_sugerido', 'tipo_cabello', 'estado_general', 'cuero_cabelludo'
+    ).order_by('-prioridad')
     
     serializer_class = ReglaDiagnosticoSerializer
     
@@ -1882,7 +1977,7 @@ class TipoEquipamientoViewSet(viewsets.ModelViewSet):
 # E. CRUD EQUIPAMIENTO
 # ----------------------------------------------------
 class EquipamientoViewSet(viewsets.ModelViewSet):
-    queryset = Equipamiento.objects.filter(is_active=True) # Solo mostramos los activos
+    queryset = Equipamiento.objects.filter(is_active=True).select_related('tipo') # Solo mostramos los activos
     serializer_class = EquipamientoSerializer
 
     def destroy(self, request, *args, **kwargs):
@@ -1996,29 +2091,35 @@ def obtener_agenda_general(request):
     """
     # 1. Obtenemos el personal (ahora pasamos el ID por parámetro para que sea flexible)
     # Si no viene ID, buscamos al primer profesional activo
+    # Personal, horarios y configuración salen del snapshot en memoria
+    snapshot = snapshot_agenda.obtener()
     personal_id = request.query_params.get('personal_id')
     
     if personal_id:
-        personal = Personal.objects.filter(id=personal_id).first()
+        try:
+            personal = snapshot.personal.get(int(personal_id))
+        except ValueError:
+            personal = None
     else:
         # Fallback: buscamos el primer profesional
-        personal = Personal.objects.filter(activo=True).first()
+        activos = [p for p in snapshot.personal.values() if p.activo]
+        personal = min(activos, key=lambda p: p.id) if activos else None
 
     if not personal:
         return Response({"error": "No se encontró personal disponible"}, status=404)
 
     # 2. Obtenemos la Regla (Horarios Base)
-    horarios = HorarioLaboral.objects.filter(personal=personal, activo=True)
+    horarios = [regla for regla in snapshot.reglas if regla.personal_id == personal.id]
     
     # 3. Obtenemos la Excepción (Bloqueos)
     hoy = timezone.now()
     bloqueos = BloqueoAgenda.objects.filter(
-        Q(personal=personal) | Q(personal__isnull=True),  # Bloqueos suyos o globales
+        Q(personal_id=personal.id) | Q(personal__isnull=True),  # Bloqueos suyos o globales
         fecha_fin__gte=hoy
     )
 
     # 4. Obtenemos la Configuración Global (Singleton)
-    config = Configuracion.objects.first()  # El ID=1 que definiste
+    config = snapshot.config  # El ID=1 que definiste
 
     return Response({
         'profesional': {
@@ -2057,41 +2158,25 @@ def crear_bloqueo(request):
         # VALIDACIÓN DE CONFLICTOS (Excepción C.U. Paso 5)
         # ------------------------------------------------------------------
         
-        # A. Filtramos primero por FECHA para no traer toda la base de datos
-        # Traemos turnos que ocurran en los días involucrados en el bloqueo
-        turnos_candidatos = Turno.objects.filter(
-            fecha__range=[bloqueo_inicio.date(), bloqueo_fin.date()],
+        # A. Solapamiento resuelto en SQL: ocupacion && [inicio_bloqueo, fin_bloqueo)
+        turnos_en_conflicto = Turno.objects.filter(
+            ocupacion__overlap=rango_ocupacion(bloqueo_inicio, bloqueo_fin),
             estado__in=[Turno.Estado.SOLICITADO, Turno.Estado.ESPERANDO_SENA, Turno.Estado.CONFIRMADO]
-        )
+        ).select_related('cliente__usuario').prefetch_related('detalles__servicio')
 
         conflictos = []
 
-        # B. Validación fina de HORARIOS (Memoria)
-        # Como Turno tiene fecha y hora separadas, las combinamos para comparar
-        for turno in turnos_candidatos:
-            # Crear datetime del inicio del turno
-            turno_inicio_dt = datetime.combine(turno.fecha, turno.hora_inicio)
-            # Crear datetime del fin del turno
-            turno_fin_dt = datetime.combine(turno.fecha, turno.hora_fin_calculada)
+        for turno in turnos_en_conflicto:
+            # Obtener servicios desde detalles
+            servicios = [d.servicio.nombre for d in turno.detalles.all()]
+            servicios_str = ', '.join(servicios) if servicios else 'Sin servicios'
             
-            # Hacemos los datetimes "aware" (con zona horaria) si Django lo usa
-            if timezone.is_aware(bloqueo_inicio):
-                turno_inicio_dt = timezone.make_aware(turno_inicio_dt)
-                turno_fin_dt = timezone.make_aware(turno_fin_dt)
-
-            # C. Fórmula de Solapamiento de Rangos:
-            # (StartA < EndB) and (EndA > StartB)
-            if (turno_inicio_dt < bloqueo_fin) and (turno_fin_dt > bloqueo_inicio):
-                # Obtener servicios desde detalles
-                servicios = [d.servicio.nombre for d in turno.detalles.all()]
-                servicios_str = ', '.join(servicios) if servicios else 'Sin servicios'
-                
-                conflictos.append({
-                    "cliente": f"{turno.cliente.nombre} {turno.cliente.apellido}",
-                    "fecha": turno.fecha.strftime('%d/%m'),
-                    "hora": f"{turno.hora_inicio.strftime('%H:%M')} - {turno.hora_fin_calculada.strftime('%H:%M')}",
-                    "servicios": servicios_str
-                })
+            conflictos.append({
+                "cliente": f"{turno.cliente.usuario.first_name} {turno.cliente.usuario.last_name}",
+                "fecha": turno.fecha.strftime('%d/%m'),
+                "hora": f"{turno.hora_inicio.strftime('%H:%M')} - {turno.hora_fin_calculada.strftime('%H:%M')}",
+                "servicios": servicios_str
+            })
 
         # D. Si encontramos conflictos, BLOQUEAMOS el guardado
         if conflictos:
@@ -2135,42 +2220,49 @@ def obtener_disponibilidad_calendario(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 1. Traer todas las reglas activas (HorarioLaboral)
-        # Filtramos por profesional si se proporciona
-        reglas = HorarioLaboral.objects.filter(activo=True)
-        
         personal_id = request.query_params.get('personal_id')
-        if personal_id:
-            reglas = reglas.filter(personal_id=personal_id)
         
-        # 2. Traer bloqueos del mes especificado
-        # Buscamos bloqueos que se sobrepongan con cualquier día del mes
-        from datetime import date, timedelta
-        
-        primer_dia = date(anio, mes, 1)
-        if mes == 12:
-            ultimo_dia = date(anio + 1, 1, 1) - timedelta(days=1)
-        else:
-            ultimo_dia = date(anio, mes + 1, 1) - timedelta(days=1)
-        
-        bloqueos = BloqueoAgenda.objects.filter(
-            fecha_inicio__lte=ultimo_dia,
-            fecha_fin__gte=primer_dia
-        )
-        
-        # Filtrar por personal si se proporciona
-        if personal_id:
-            from django.db.models import Q
-            bloqueos = bloqueos.filter(
-                Q(personal_id=personal_id) | Q(personal__isnull=True)
+        def calcular_calendario():
+            # 1. Traer todas las reglas activas (HorarioLaboral)
+            # Filtramos por profesional si se proporciona
+            reglas = HorarioLaboral.objects.filter(activo=True)
+            
+            if personal_id:
+                reglas = reglas.filter(personal_id=personal_id)
+            
+            # 2. Traer bloqueos del mes especificado
+            # Buscamos bloqueos que se sobrepongan con cualquier día del mes
+            from datetime import date, timedelta
+            
+            primer_dia = date(anio, mes, 1)
+            if mes == 12:
+                ultimo_dia = date(anio + 1, 1, 1) - timedelta(days=1)
+            else:
+                ultimo_dia = date(anio, mes + 1, 1) - timedelta(days=1)
+            
+            bloqueos = BloqueoAgenda.objects.filter(
+                fecha_inicio__lte=ultimo_dia,
+                fecha_fin__gte=primer_dia
             )
+            
+            # Filtrar por personal si se proporciona
+            if personal_id:
+                bloqueos = bloqueos.filter(
+                    Q(personal_id=personal_id) | Q(personal__isnull=True)
+                )
+            
+            return {
+                "reglas": list(HorarioLaboralSerializer(reglas, many=True).data),
+                "bloqueos": list(BloqueoAgendaSerializer(bloqueos, many=True).data)
+            }
         
-        # 3. Serializar y retornar
+        # 3. Serializar y retornar (cacheado por mes y profesional)
+        datos = obtener_calendario(anio, mes, personal_id, calcular_calendario)
         return Response({
             "mes": mes,
             "anio": anio,
-            "reglas": HorarioLaboralSerializer(reglas, many=True).data,
-            "bloqueos": BloqueoAgendaSerializer(bloqueos, many=True).data
+            "reglas": datos["reglas"],
+            "bloqueos": datos["bloqueos"]
         }, status=status.HTTP_200_OK)
     
     except ValueError:
@@ -2197,6 +2289,7 @@ class FichaTecnicaViewSet(viewsets.ModelViewSet):
     queryset = FichaTecnica.objects.all()
     serializer_class = FichaTecnicaSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
+    pagination_class = PaginacionRecientes
     
     def get_queryset(self):
         """
@@ -2206,12 +2299,19 @@ class FichaTecnicaViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
         if user.is_superuser:
-            return FichaTecnica.objects.all()
+            return self._con_relaciones(FichaTecnica.objects.all())
         elif user.is_staff:
-            return FichaTecnica.objects.filter(profesional_autor=user)
+            return self._con_relaciones(FichaTecnica.objects.filter(profesional_autor=user))
         else:
             # No staff no puede ver fichas (la permission_classes lo bloquea igual)
             return FichaTecnica.objects.none()
+
+    @staticmethod
+    def _con_relaciones(queryset):
+        """Relaciones que muestra FichaTecnicaSerializer, en la misma consulta."""
+        return queryset.select_related(
+            'detalle_turno__servicio', 'profesional_autor', 'porosidad_final', 'estado_general_final'
+        )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
     def por_turno(self, request):
@@ -2228,7 +2328,7 @@ class FichaTecnicaViewSet(viewsets.ModelViewSet):
         
         try:
             turno = Turno.objects.get(id=turno_id)
-            fichas = FichaTecnica.objects.filter(detalle_turno__turno=turno)
+            fichas = self._con_relaciones(FichaTecnica.objects.filter(detalle_turno__turno=turno))
             serializer = self.get_serializer(fichas, many=True)
             return Response(serializer.data)
         except Turno.DoesNotExist:
@@ -2243,7 +2343,7 @@ class FichaTecnicaViewSet(viewsets.ModelViewSet):
         GET /fichas-tecnicas/mis_fichas/
         Obtiene todas las fichas técnicas creadas por el usuario autenticado (profesional).
         """
-        fichas = FichaTecnica.objects.filter(profesional_autor=request.user)
+        fichas = self._con_relaciones(FichaTecnica.objects.filter(profesional_autor=request.user))
         serializer = self.get_serializer(fichas, many=True)
         return Response(serializer.data)
 
@@ -2253,7 +2353,7 @@ class RequisitoServicioViewSet(viewsets.ModelViewSet):
     ViewSet para gestionar los requisitos de equipamiento por servicio.
     Solo administradores pueden ver/crear/editar/eliminar.
     """
-    queryset = RequisitoServicio.objects.all()
+    queryset = RequisitoServicio.objects.all().select_related('servicio', 'tipo_equipamiento')
     serializer_class = RequisitoServicioSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
     
@@ -2285,14 +2385,23 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
         Staff ve todos.
         """
         if self.request.user.is_staff:
-            return DiagnosticoCapilar.objects.all()
+            return self._con_relaciones(DiagnosticoCapilar.objects.all())
         
         # Cliente solo ve sus propios diagnósticos
         try:
             cliente = Cliente.objects.get(usuario=self.request.user)
-            return DiagnosticoCapilar.objects.filter(cliente=cliente)
+            return self._con_relaciones(DiagnosticoCapilar.objects.filter(cliente=cliente))
         except Cliente.DoesNotExist:
             return DiagnosticoCapilar.objects.none()
+
+    @staticmethod
+    def _con_relaciones(queryset):
+        """Relaciones que muestra DiagnosticoCapilarSerializer, en la misma consulta."""
+        return queryset.select_related(
+            'cliente__usuario', 'profesional', 'tipo_cabello', 'grosor_cabello', 'porosidad_cabello',
+            'cuero_cabelludo', 'estado_general', 'regla_diagnostico', 'rutina_sugerida',
+            'rutina_asignada', 'servicio_urgente',
+        )
     
     def create(self, request, *args, **kwargs):
         """Solo staff puede crear diagnósticos"""
@@ -2330,7 +2439,9 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        diagnosticos = DiagnosticoCapilar.objects.filter(cliente_id=cliente_id).order_by('-fecha_diagnostico')
+        diagnosticos = self._con_relaciones(
+            DiagnosticoCapilar.objects.filter(cliente_id=cliente_id).order_by('-fecha_diagnostico')
+        )
         serializer = self.get_serializer(diagnosticos, many=True)
         return Response(serializer.data)
     
@@ -2342,7 +2453,9 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
         """
         try:
             cliente = Cliente.objects.get(usuario=request.user)
-            diagnosticos = DiagnosticoCapilar.objects.filter(cliente=cliente).order_by('-fecha_diagnostico')
+            diagnosticos = self._con_relaciones(
+                DiagnosticoCapilar.objects.filter(cliente=cliente).order_by('-fecha_diagnostico')
+            )
             serializer = self.get_serializer(diagnosticos, many=True)
             return Response(serializer.data)
         except Cliente.DoesNotExist:
@@ -2357,67 +2470,8 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
         Nivel 1: Reglas Expertas (Combinaciones específicas).
         Nivel 2: Matriz de Puntuación (Estado de salud general).
         """
-        # --- NIVEL 1: REGLAS EXPERTAS ---
-        # Buscamos reglas priorizando las de mayor peso
-        reglas = ReglaDiagnostico.objects.all().order_by('-prioridad')
-        regla_matcheada = None
-        
-        for r in reglas:
-            # Comprobamos coincidencia (si el campo de la regla no es null, debe coincidir)
-            if r.tipo_cabello and r.tipo_cabello != diagnostico.tipo_cabello: continue
-            if r.grosor_cabello and r.grosor_cabello != diagnostico.grosor_cabello: continue
-            if r.porosidad_cabello and r.porosidad_cabello != diagnostico.porosidad_cabello: continue
-            if r.cuero_cabelludo and r.cuero_cabelludo != diagnostico.cuero_cabelludo: continue
-            if r.estado_general and r.estado_general != diagnostico.estado_general: continue
-            
-            regla_matcheada = r
-            break
-
-        rutina_final = None
-        servicio_urgente = None
-
-        if regla_matcheada:
-            # Si hay regla experta (ej. Desequilibrio de pH), manda la regla
-            rutina_final = regla_matcheada.rutina_sugerida
-            # Si la regla tiene una acción que indique necesidad de turno
-            if "TURNO" in regla_matcheada.accion_resultado.upper():
-                servicio_urgente = Servicio.objects.filter(
-                    Q(nombre__icontains="Tratamiento") & Q(nombre__icontains="intensivo")).first()
-        else:
-            # --- NIVEL 2: MATRIZ DE PUNTUACIÓN (SCORING) ---
-            # Mapeo exacto según tus requerimientos técnicos
-            puntos = 0
-            
-            # 1. Tipo
-            map_tipo = {"Lacio": 2, "Ondulado": 1, "Rizado": 0, "Afro": 0}
-            # 2. Grosor
-            map_grosor = {"Fino": 2, "Medio": 1, "Grueso": 0}
-            # 3. Porosidad
-            map_porosidad = {"Baja": 4, "Media": 2, "Alta": 0}
-            # 4. Cuero Cabelludo
-            map_cuero = {"Seco": 3, "Normal": 2, "Mixto": 1, "Graso": 0}
-            # 5. Estado General
-            map_estado = {"Dañado": 0, "Normal": 1, "Sano": 2}
-
-            # Sumatoria del Score
-            puntos += map_tipo.get(diagnostico.tipo_cabello.nombre if diagnostico.tipo_cabello else "", 0)
-            puntos += map_grosor.get(diagnostico.grosor_cabello.nombre if diagnostico.grosor_cabello else "", 0)
-            puntos += map_porosidad.get(diagnostico.porosidad_cabello.nombre if diagnostico.porosidad_cabello else "", 0)
-            puntos += map_cuero.get(diagnostico.cuero_cabelludo.nombre if diagnostico.cuero_cabelludo else "", 0)
-            puntos += map_estado.get(diagnostico.estado_general.nombre if diagnostico.estado_general else "", 0)
-
-            # --- UMBRALES DE DECISIÓN (Escala 0-13) ---
-            if puntos <= 5:
-                # ESTADO CRÍTICO: Cabello dañado o muy procesado
-                rutina_final = Rutina.objects.filter(nombre__icontains="Recuperación").first()
-                servicio_urgente = Servicio.objects.filter(
-                    Q(nombre__icontains="Tratamiento") & Q(nombre__icontains="intensivo")).first()
-            elif puntos <= 9:
-                # ESTADO DE ALERTA: Requiere cuidado preventivo
-                rutina_final = Rutina.objects.filter(nombre__icontains="Nutrición").first()
-            else:
-                # ESTADO SALUDABLE: Mantenimiento básico
-                rutina_final = Rutina.objects.filter(nombre__icontains="Mantenimiento").first()
+        # Reglas compiladas en un índice cacheado (ver gestion/motor_diagnostico.py)
+        regla_matcheada, puntos, rutina_final, servicio_urgente = motor_diagnostico.evaluar(diagnostico)
 
         # --- EJECUCIÓN DE ACCIONES ---
         # 1. Asignar Rutina
@@ -2436,8 +2490,7 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
 
         # 2. GENERAR MENSAJE PROFESIONAL
         mensaje_profesional = self._generar_mensaje_diagnostico(
-            diagnostico, puntos if 'puntos' in locals() else None, 
-            servicio_urgente, regla_matcheada
+            diagnostico, puntos, servicio_urgente, regla_matcheada
         )
         
         # 3. Guardar resultados en el Diagnóstico
@@ -2450,7 +2503,11 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
         # 4. Recomendar Turno (Si el score es bajo o la regla lo pide)
         if servicio_urgente:
             try:
-                self._recomendar_primer_hueco_disponible(diagnostico, servicio_urgente)
+                # Fuera de la transacción del alta/registro: la búsqueda no
+                # alarga los locks de la creación del cliente
+                transaction.on_commit(
+                    lambda: self._recomendar_primer_hueco_disponible(diagnostico, servicio_urgente)
+                )
             except Exception as e:
                 import logging
                 logger = logging.getLogger(__name__)
@@ -2540,85 +2597,28 @@ class DiagnosticoCapilarViewSet(viewsets.ModelViewSet):
             duracion_minutos = servicio.duracion_estimada or 60
             logger.info(f"[DIAGNOSTICO] Buscando turno para: {servicio.nombre} ({duracion_minutos} min)")
             
-            # Obtener instancia de TurnoViewSet para usar su método _generar_slots_disponibles
-            turno_viewset = TurnoViewSet()
-            
-            # 3. BUSCAR PRIMER SLOT DISPONIBLE EN PRÓXIMOS 30 DÍAS
+            # 3. BUSCAR PRIMER HUECO DISPONIBLE EN PRÓXIMOS 30 DÍAS
+            # Reglas del mes en una consulta (filtradas por tipo de servicio y
+            # habilidad); el índice carga las agendas por semana y se detiene
+            # en el primer hueco donde entra el servicio
             fecha_busqueda = date.today() + timedelta(days=1)
-            fecha_fin = fecha_busqueda + timedelta(days=30)
-            slot_encontrado = None
+            fechas = [fecha_busqueda + timedelta(days=i) for i in range(31)]
+            reglas_por_fecha = TurnoViewSet()._reglas_por_fecha(servicio, fechas)
             
-            while fecha_busqueda <= fecha_fin:
-                # Obtener día de la semana (0=lunes, 6=domingo)
-                dia_semana = fecha_busqueda.weekday()
-                
-                # 4. BUSCAR HORARIOS DEL PERSONAL PARA ESTE DÍA
-                horarios_disponibles = HorarioLaboral.objects.filter(
-                    activo=True,
-                    dia_semana=dia_semana,
-                    personal__isnull=False
-                )
-                
-                # Filtrar por tipo de servicio (Diseño vs Complemento)
-                categoria_nombre = servicio.categoria.nombre if servicio.categoria else ""
-                
-                if "Diseño" in categoria_nombre or "Color" in categoria_nombre:
-                    # Servicios de color/diseño: necesitan permite_diseno_color=True
-                    horarios_disponibles = horarios_disponibles.filter(permite_diseno_color=True)
-                    tipo_servicio = "Diseño"
-                else:
-                    # Servicios cortos (corte, nutrición): necesitan permite_complemento=True
-                    horarios_disponibles = horarios_disponibles.filter(permite_complemento=True)
-                    tipo_servicio = "Complemento"
-                
-                logger.info(f"[DIAGNOSTICO] {fecha_busqueda} ({DiasSemana(dia_semana).label}): {horarios_disponibles.count()} horarios disponibles para {tipo_servicio}")
-                
-                # 5. ITERAR POR CADA HORARIO DISPONIBLE
-                for horario in horarios_disponibles:
-                    personal = horario.personal
-                    
-                    # Verificar si el personal tiene bloqueo en esta fecha
-                    bloqueo = BloqueoAgenda.objects.filter(
-                        personal=personal,
-                        fecha_inicio__date__lte=fecha_busqueda,
-                        fecha_fin__date__gte=fecha_busqueda
-                    ).exists()
-                    
-                    if bloqueo:
-                        logger.info(f"[DIAGNOSTICO] {personal.nombre} tiene bloqueo en {fecha_busqueda}")
-                        continue
-                    
-                    # 6. GENERAR SLOTS PARA ESTE HORARIO
-                    try:
-                        slots = turno_viewset._generar_slots_disponibles(
-                            fecha_busqueda,
-                            horario,
-                            duracion_minutos,
-                            intervalo_minutos=15,
-                            servicios_ids=[servicio.id]
-                        )
-                        
-                        if slots:
-                            primer_slot = slots[0]
-                            slot_encontrado = {
-                                'fecha': fecha_busqueda,
-                                'hora': primer_slot.get('hora'),
-                                'profesional': personal,
-                                'horario': horario
-                            }
-                            logger.info(f"[DIAGNOSTICO] Slot encontrado: {fecha_busqueda} {primer_slot.get('hora')} con {personal.nombre}")
-                            break
-                    except Exception as e:
-                        logger.warning(f"[DIAGNOSTICO] Error generando slots para {personal.nombre}: {str(e)}")
-                        continue
-                
-                # Si encontramos slot, salir del loop de fechas
-                if slot_encontrado:
-                    break
-                
-                fecha_busqueda += timedelta(days=1)
+            indice = IndiceHuecos(reglas_por_fecha, servicios_ids=[servicio.id])
+            hueco = indice.primer_hueco(duracion_minutos, intervalo=15)
+            
+            slot_encontrado = None
+            if hueco:
+                slot_encontrado = {
+                    'fecha': hueco['fecha'],
+                    'hora': hueco['hora'],
+                    'profesional': hueco['regla'].personal,
+                    'horario': hueco['regla']
+                }
+                logger.info(f"[DIAGNOSTICO] Slot encontrado: {hueco['fecha']} {hueco['hora']} con {hueco['regla'].personal.nombre}")
             
-            # 7. SI SE ENCONTRÓ SLOT, CREAR NOTIFICACIÓN
+            # 4. SI SE ENCONTRÓ SLOT, CREAR NOTIFICACIÓN
             if slot_encontrado:
                 logger.info(f"[DIAGNOSTICO] Creando notificación de recomendación de turno...")
                 try:
@@ -283,7 +283,7 @@ class RegistroSerializer(serializers.ModelSerializer):
         # AUTOMÁTICO: Si hay datos capilares, crear diagnóstico
         if cliente.tipo_cabello or cliente.grosor_cabello or cliente.porosidad_cabello or cliente.cuero_cabelludo or cliente.estado_general:
             from gestion.models import DiagnosticoCapilar
-            from gestion.views import DiagnosticoCapilarViewSet
+            from gestion import tareas
             
             # Crear el diagnóstico inicial
             diag = DiagnosticoCapilar.objects.create(
@@ -295,9 +295,9 @@ class RegistroSerializer(serializers.ModelSerializer):
                 estado_general=cliente.estado_general
             )
             
-            # Ejecutar el motor diagnóstico automáticamente
-            viewset = DiagnosticoCapilarViewSet()
-            viewset._ejecutar_motor_diagnostico(diag)
+            # Ejecutar el motor diagnóstico automáticamente (en segundo plano,
+            # cuando el registro confirma)
+            tareas.encolar_al_confirmar('ejecutar_motor_diagnostico', clave=f'diagnostico:{diag.id}', diagnostico_id=diag.id)
         
         return user
 
@@ -26,9 +26,11 @@ from .models import Usuario
 from .models import Cliente
 
 from gestion.models import (
-    ReglaDiagnostico, TipoCabello, GrosorCabello, 
+    TipoCabello, GrosorCabello, 
     PorosidadCabello, CueroCabelludo, EstadoGeneral, Servicio
 )
+from gestion import motor_diagnostico
+from gestion.paginacion import PaginacionClientes
 
 # Vista para redirigir a la pantalla de registro
 def home(request):
@@ -281,36 +283,24 @@ class DiagnosticoView(APIView):
         rutina_nombre = None
         
         # --- 1. NIVEL 1: REGLAS DE EXCEPCIÓN (Prioridad Alta) ---
-        # Ejemplo: Desequilibrio de pH
-        reglas_nivel_1 = ReglaDiagnostico.objects.all().order_by('prioridad')
-        
-        for regla in reglas_nivel_1:
-            match = True 
-            if regla.tipo_cabello and regla.tipo_cabello != perfil.tipo_cabello:
-                match = False
-            if match and regla.grosor_cabello and regla.grosor_cabello != perfil.grosor_cabello:
-                match = False
-            if match and regla.porosidad_cabello and regla.porosidad_cabello != perfil.porosidad_cabello:
-                match = False
-            if match and regla.cuero_cabelludo and regla.cuero_cabelludo != perfil.cuero_cabelludo:
-                match = False
-            if match and regla.estado_general and regla.estado_general != perfil.estado_general:
-                match = False
-            
-            if match:
-                # ¡COINCIDENCIA DE NIVEL 1 ENCONTRADA!
-                if regla.rutina_sugerida:
-                    rutina_id = regla.rutina_sugerida.id
-                    rutina_nombre = regla.rutina_sugerida.nombre
-
-                return Response({
-                    'mensaje_diagnostico': regla.mensaje_resultado,
-                    'accion': regla.accion_resultado,
-                    'puntaje_final': 0,
-                    'fuente': f"Análisis Directo (Regla: {regla.mensaje_resultado[:30]}...)",
-                    'rutina_id': rutina_id,          # Variable unificada
-                    'rutina_nombre': rutina_nombre,  # Variable unificada
-                }, status=status.HTTP_200_OK)
+        # Ejemplo: Desequilibrio de pH. Mismo índice compilado que el motor de
+        # DiagnosticoCapilar (la regla de mayor prioridad que coincide)
+        regla = motor_diagnostico.buscar_regla(perfil)
+
+        if regla:
+            # ¡COINCIDENCIA DE NIVEL 1 ENCONTRADA!
+            if regla.rutina_sugerida:
+                rutina_id = regla.rutina_sugerida.id
+                rutina_nombre = regla.rutina_sugerida.nombre
+
+            return Response({
+                'mensaje_diagnostico': regla.mensaje_resultado,
+                'accion': regla.accion_resultado,
+                'puntaje_final': 0,
+                'fuente': f"Análisis Directo (Regla: {regla.mensaje_resultado[:30]}...)",
+                'rutina_id': rutina_id,          # Variable unificada
+                'rutina_nombre': rutina_nombre,  # Variable unificada
+            }, status=status.HTTP_200_OK)
 
         # --- 2. NIVEL 2: LÓGICA DE MATRIZ (Si no hubo coincidencia arriba) ---
         puntaje_salud_total = 0
@@ -401,5 +391,5 @@ class ClienteViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Cliente.objects.all().select_related('usuario')
     serializer_class = ClienteListSerializer
     permission_classes = [permissions.IsAdminUser]
-    pagination_class = None
+    pagination_class = PaginacionClientes
     
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { obtenerTodasLasPaginas } from '../utils/paginacion';
 
 const API_BASE_URL = 'http://127.0.0.1:8000/api/gestion';
 
@@ -26,8 +27,8 @@ export const fichasTecnicasApi = {
    */
   obtenerTodas: async () => {
     try {
-      const res = await API_CLIENT.get('/fichas-tecnicas/');
-      return res.data;
+      // Listado paginado: { next, results }, se recorren todas las páginas
+      return await obtenerTodasLasPaginas('/fichas-tecnicas/', {}, API_CLIENT);
     } catch (error) {
       console.error('Error al obtener fichas técnicas:', error);
       throw error;
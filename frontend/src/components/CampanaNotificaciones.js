@@ -29,20 +29,63 @@ const CampanaNotificaciones = () => {
                 : (response.data?.results || []);
             
             setNotificaciones(notifData);
-            setUnreadCount(notifData.filter(n => n.estado === 'pendiente').length);
         } catch (error) {
             console.error("Error cargando notificaciones", error?.message || error);
             setNotificaciones([]);
         }
     };
 
-    // POLLING: Consultar cada 5 segundos para que se actualice solo en el video
+    // Solo el contador de no leídas (sin mensajes ni datos_extra)
+    const fetchContador = async () => {
+        try {
+            const token = localStorage.getItem('access_token');
+            if (!token) return;
+
+            const response = await axios.get('http://127.0.0.1:8000/api/gestion/notificaciones/no-leidas/count/', {
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+            setUnreadCount(response.data.no_leidas);
+        } catch (error) {
+            console.error("Error cargando contador de notificaciones", error?.message || error);
+        }
+    };
+
+    // EN VIVO: el servidor empuja cada notificación nueva por SSE (EventSource
+    // reconecta solo y retoma desde el último evento). Si el stream no está
+    // disponible (servidor WSGI, token vencido) se vuelve al POLLING del contador
+    // cada 5 segundos. La lista completa se carga al abrir la campana.
     useEffect(() => {
         fetchNotificaciones();
-        const interval = setInterval(fetchNotificaciones, 5000); 
-        return () => clearInterval(interval);
+        fetchContador();
+
+        let interval = null;
+        const iniciarPolling = () => {
+            if (!interval) interval = setInterval(fetchContador, 5000);
+        };
+
+        const token = localStorage.getItem('access_token');
+        const fuente = token && window.EventSource
+            ? new EventSource(`http://127.0.0.1:8000/api/gestion/eventos/stream/?token=${encodeURIComponent(token)}`)
+            : null;
+        if (fuente) {
+            fuente.addEventListener('notificacion', () => setUnreadCount(prev => prev + 1));
+            fuente.onerror = () => {
+                if (fuente.readyState === EventSource.CLOSED) iniciarPolling();
+            };
+        } else {
+            iniciarPolling();
+        }
+
+        return () => {
+            if (fuente) fuente.close();
+            if (interval) clearInterval(interval);
+        };
     }, []);
 
+    useEffect(() => {
+        if (showDropdown) fetchNotificaciones();
+    }, [showDropdown]);
+
     const marcarComoLeida = async (id) => {
         try {
             const token = localStorage.getItem('access_token');
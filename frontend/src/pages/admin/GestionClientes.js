@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
-import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
+import { obtenerTodasLasPaginas } from '../../utils/paginacion';
 
 const GestionClientes = () => {
     // --- ESTADOS ---
@@ -20,11 +20,11 @@ const GestionClientes = () => {
             }
 
             // Llamamos al endpoint que arreglamos (ClienteViewSet)
-            const response = await axios.get('http://127.0.0.1:8000/api/usuarios/clientes/', {
+            const listado = await obtenerTodasLasPaginas('http://127.0.0.1:8000/api/usuarios/clientes/', {
                 headers: { 'Authorization': `Bearer ${token}` }
             });
             
-            setClientes(response.data);
+            setClientes(listado);
             setError('');
         } catch (err) {
             console.error("Error cargando clientes:", err);
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import { confirmarAccion, notify } from '../../utils/notificaciones';
+import { INICIO_HISTORIAL, obtenerPagina } from '../../utils/paginacion';
 
 const GestionTurnos = () => {
     const [turnos, setTurnos] = useState([]);
@@ -9,6 +10,8 @@ const GestionTurnos = () => {
     const [filtroEstado, setFiltroEstado] = useState('solicitado'); // Tab activa por defecto
     const [loading, setLoading] = useState(false);
     const [procesandoId, setProcesandoId] = useState(null); // Para bloquear botones individualmente
+    const [siguientePagina, setSiguientePagina] = useState(null); // URL `next` del listado paginado
+    const [cargandoMas, setCargandoMas] = useState(false);
 
     // Cargar turnos cada vez que cambiamos de pestaña
     useEffect(() => {
@@ -19,13 +22,18 @@ const GestionTurnos = () => {
     const cargarTurnos = async () => {
         setLoading(true);
         try {
-            // Usamos el filtro que creamos en el backend
+            // Usamos el filtro que creamos en el backend. La ventana va explícita:
+            // sin ?desde el listado solo trae los últimos 30 días.
             const token = localStorage.getItem('access_token');
-            const res = await axios.get(
-                `http://127.0.0.1:8000/api/gestion/turnos/?estado=${filtroEstado}`,
-                { headers: { 'Authorization': `Bearer ${token}` } }
+            const { filas, siguiente } = await obtenerPagina(
+                'http://127.0.0.1:8000/api/gestion/turnos/',
+                {
+                    headers: { 'Authorization': `Bearer ${token}` },
+                    params: { estado: filtroEstado, desde: INICIO_HISTORIAL }
+                }
             );
-            setTurnos(res.data);
+            setTurnos(filas);
+            setSiguientePagina(siguiente);
         } catch (error) {
             console.error("Error cargando turnos", error);
         } finally {
@@ -33,6 +41,26 @@ const GestionTurnos = () => {
         }
     };
 
+    // Sigue el `next` del listado y agrega la página a la tabla
+    const cargarMas = async () => {
+        if (!siguientePagina) return;
+        setCargandoMas(true);
+        try {
+            const token = localStorage.getItem('access_token');
+            const { filas, siguiente } = await obtenerPagina(
+                siguientePagina,
+                { headers: { 'Authorization': `Bearer ${token}` } }
+            );
+            setTurnos((anteriores) => [...anteriores, ...filas]);
+            setSiguientePagina(siguiente);
+        } catch (error) {
+            console.error("Error cargando más turnos", error);
+            notify.error("No se pudieron cargar más turnos");
+        } finally {
+            setCargandoMas(false);
+        }
+    };
+
     // Función genérica para cambiar el estado de un turno
     const cambiarEstado = async (id, nuevoEstado) => {
         const result = await confirmarAccion({
@@ -207,6 +235,17 @@ const GestionTurnos = () => {
                         </tbody>
                     </table>
                 )}
+                {!loading && siguientePagina && (
+                    <div className="p-4 text-center border-t border-gray-200">
+                        <button
+                            onClick={cargarMas}
+                            className="text-rose-600 border border-rose-200 px-4 py-2 rounded hover:bg-rose-50"
+                            disabled={cargandoMas}
+                        >
+                            {cargandoMas ? 'Cargando...' : 'Cargar más'}
+                        </button>
+                    </div>
+                )}
             </div>
         </div>
     );
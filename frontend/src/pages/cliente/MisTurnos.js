@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import { confirmarAccion, notify } from '../../utils/notificaciones';
+import { INICIO_HISTORIAL, obtenerTodasLasPaginas } from '../../utils/paginacion';
 
 const MisTurnos = () => {
     // --- ESTADOS ---
@@ -29,11 +30,13 @@ const MisTurnos = () => {
         try {
             setLoading(true);
             const token = localStorage.getItem('access_token');
-            const response = await axios.get('http://127.0.0.1:8000/api/gestion/turnos/', {
-                headers: { 'Authorization': `Bearer ${token}` }
+            // Historia completa del cliente: ventana explícita y todas las páginas
+            const turnosCliente = await obtenerTodasLasPaginas('http://127.0.0.1:8000/api/gestion/turnos/', {
+                headers: { 'Authorization': `Bearer ${token}` },
+                params: { desde: INICIO_HISTORIAL }
             });
-            setTurnos(response.data); 
-            console.log('Turnos cargados:', response.data);
+            setTurnos(turnosCliente);
+            console.log('Turnos cargados:', turnosCliente);
         } catch (err) {
             console.error('Error cargando turnos:', err);
             notify.error('Error al cargar tus turnos');
@@ -2,6 +2,7 @@ import React, { useEffect, useState } from 'react';
 import axios from 'axios';
 import { useNavigate } from 'react-router-dom';
 import CampanaNotificaciones from '../../components/CampanaNotificaciones';
+import { obtenerTodasLasPaginas } from '../../utils/paginacion';
 
 // ============================================================================
 // COMPONENTE PRINCIPAL
@@ -54,10 +55,10 @@ const Perfil = () => {
             }
 
             try {
-                const notifResponse = await axios.get('/api/gestion/notificaciones/', {
+                const listado = await obtenerTodasLasPaginas('/api/gestion/notificaciones/', {
                     headers: { 'Authorization': `Bearer ${token}` }
                 });
-                setNotificaciones(notifResponse.data);
+                setNotificaciones(listado);
             } catch (notifErr) {
                 console.error('Error al cargar notificaciones:', notifErr);
             }
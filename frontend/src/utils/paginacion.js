@@ -0,0 +1,43 @@
+import axios from 'axios';
+
+/**
+ * Fecha anterior a cualquier turno del sistema. El listado de turnos filtra
+ * por defecto de hace 30 días al horizonte de reservas; para ver la historia
+ * completa hay que pedir la ventana de forma explícita con ?desde=.
+ */
+export const INICIO_HISTORIAL = '2000-01-01';
+
+/**
+ * Pide una página de un listado paginado por cursor ({ next, results })
+ * @param {string} url - URL de la página (la primera o el `next` de la anterior)
+ * @param {Object} config - Configuración de axios (headers, params)
+ * @param {Object} cliente - Instancia de axios a usar (default: axios)
+ * @returns {Promise} { filas, siguiente } con las filas y la URL de la próxima página (o null)
+ */
+export const obtenerPagina = async (url, config = {}, cliente = axios) => {
+    const { data } = await cliente.get(url, config);
+    // Endpoints sin paginar devuelven la lista directamente
+    if (Array.isArray(data)) {
+        return { filas: data, siguiente: null };
+    }
+    return { filas: data.results ?? [], siguiente: data.next ?? null };
+};
+
+/**
+ * Recorre todas las páginas de un listado siguiendo `next` hasta el final
+ * @param {string} url - URL de la primera página
+ * @param {Object} config - Configuración de axios (headers, params)
+ * @param {Object} cliente - Instancia de axios a usar (default: axios)
+ * @returns {Promise<Array>} Todas las filas del listado
+ */
+export const obtenerTodasLasPaginas = async (url, config = {}, cliente = axios) => {
+    let { filas, siguiente } = await obtenerPagina(url, config, cliente);
+    // `next` ya trae los filtros y el cursor: solo se reenvían los headers
+    const { params, ...configSiguiente } = config;
+    while (siguiente) {
+        const pagina = await obtenerPagina(siguiente, configSiguiente, cliente);
+        filas = filas.concat(pagina.filas);
+        siguiente = pagina.siguiente;
+    }
+    return filas;
+};